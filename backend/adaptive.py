@@ -0,0 +1,127 @@
+"""
+Adaptive probe rate controller.
+
+With a fixed TEST_COUNT and PING_INTERVAL every target gets the same packet
+rate whether the link has been clean for days or is dropping packets right
+now. The controller keeps the probe window (TEST_COUNT x PING_INTERVAL
+seconds, so still one result per test) but varies how many packets per
+second are sent within it:
+
+- trouble (loss or jitter above threshold, or average latency shifting away
+  from its recent baseline) jumps straight to the maximum rate
+- after a run of stable results the rate is halved, down to the minimum
+
+Each result records the rate it was probed at (probe_rate, packets per
+second). Every result still covers one test interval, so aggregates keep
+weighting results equally over time rather than by packet count, which
+would overweight periods probed at a high rate.
+"""
+import threading
+
+
+class AdaptiveProbeController:
+    """Chooses per-target packet rates from recent results.
+
+    Args:
+        min_rate: Lowest packet rate (packets per second)
+        max_rate: Highest packet rate (packets per second)
+        window: Seconds each test probes for
+        loss_threshold: Packet loss percentage above which a result is trouble
+        jitter_threshold: Jitter in ms above which a result is trouble
+        latency_shift: Fractional change of average latency against its
+                       baseline that counts as trouble (e.g. 0.5 = +/-50%)
+        stable_runs: Consecutive untroubled results before the rate is halved
+        smoothing: Weight of the newest result in the latency baseline (EWMA)
+    """
+
+    def __init__(self, min_rate=1.0, max_rate=10.0, window=40.0, loss_threshold=0.5,
+                 jitter_threshold=5.0, latency_shift=0.5, stable_runs=5, smoothing=0.2):
+        if not 0 < min_rate <= max_rate:
+            raise ValueError('Adaptive probe rates must satisfy 0 < min_rate <= max_rate')
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.window = window
+        self.loss_threshold = loss_threshold
+        self.jitter_threshold = jitter_threshold
+        self.latency_shift = latency_shift
+        self.stable_runs = stable_runs
+        self.smoothing = smoothing
+        # target -> {'rate', 'stable', 'baseline'}
+        self._state = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, settings):
+        """Build a controller from ADAPTIVE_* configuration values."""
+        return cls(
+            min_rate=settings.ADAPTIVE_MIN_RATE,
+            max_rate=settings.ADAPTIVE_MAX_RATE,
+            window=settings.TEST_COUNT * float(settings.PING_INTERVAL),
+            loss_threshold=settings.ADAPTIVE_LOSS_THRESHOLD,
+            jitter_threshold=settings.ADAPTIVE_JITTER_THRESHOLD,
+            latency_shift=settings.ADAPTIVE_LATENCY_SHIFT,
+            stable_runs=settings.ADAPTIVE_STABLE_RUNS
+        )
+
+    def _target_state(self, target):
+        state = self._state.get(target)
+        if state is None:
+            # Start at full resolution until the link has proven stable
+            state = self._state[target] = {'rate': self.max_rate, 'stable': 0, 'baseline': None}
+        return state
+
+    def rate(self, target):
+        """Current packet rate for a target in packets per second."""
+        with self._lock:
+            return self._target_state(target)['rate']
+
+    def settings(self, target):
+        """Return (count, interval) ping_test() arguments for the next test.
+
+        Returns:
+            Tuple of packet count and the interval between packets as the
+            string ping_test() expects
+        """
+        rate = self.rate(target)
+        count = max(1, int(round(rate * self.window)))
+        return count, f'{1 / rate:.3g}'
+
+    def is_trouble(self, result, baseline):
+        """Whether a result shows loss, jitter or a latency shift."""
+        if result.get('packet_loss', 0) > self.loss_threshold:
+            return True
+        if (result.get('jitter') or 0) > self.jitter_threshold:
+            return True
+        latency = result.get('avg_latency')
+        if baseline and latency:
+            return abs(latency - baseline) > self.latency_shift * baseline
+        return False
+
+    def observe(self, result):
+        """Update a target's rate from its latest result.
+
+        Args:
+            result: Dictionary of ping test results as returned by ping_test()
+
+        Returns:
+            The packet rate to use for the target's next test
+        """
+        with self._lock:
+            state = self._target_state(result['target'])
+            if self.is_trouble(result, state['baseline']):
+                state['rate'] = self.max_rate
+                state['stable'] = 0
+            else:
+                state['stable'] += 1
+                if state['stable'] >= self.stable_runs:
+                    state['rate'] = max(self.min_rate, state['rate'] / 2)
+                    state['stable'] = 0
+
+            # The baseline follows lasting shifts so they stop counting as
+            # trouble once they are the new normal
+            latency = result.get('avg_latency')
+            if latency:
+                baseline = state['baseline']
+                state['baseline'] = latency if baseline is None else \
+                    baseline + self.smoothing * (latency - baseline)
+            return state['rate']
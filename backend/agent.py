@@ -0,0 +1,323 @@
+"""
+Standalone probe agent that reports to a central web service.
+
+Measuring from several sites no longer needs a database and web stack at
+each of them: an agent pings locally, buffers the results in memory and
+POSTs them in gzip-compressed JSON batches to /api/ingest on the central
+service, which writes each batch in one transaction.
+
+Wire format (Content-Type: application/json, Content-Encoding: gzip):
+
+    {"agent_id": "site-a", "batch_id": "<unique per batch>",
+     "results": [{"timestamp": "2024-03-05T12:00:00.123456", "target": "1.1.1.1",
+                  "packet_loss": 0.0, ..., "rtt_samples": [...], "rtt_times": [...]}]}
+
+A batch keeps its batch_id until the server acknowledges it, so a batch
+whose response was lost is simply sent again and the server, having
+recorded the id, does not store it twice. Only the server rejecting a
+batch as malformed (400/413) drops it; anything else backs off and retries.
+
+Rollups, baselines, incidents and metrics are keyed by target address, not
+by agent, so each address should be probed by a single agent.
+
+Run with `python -m backend.agent --server https://monitor.example.com`.
+The agent imports neither Flask nor SQLAlchemy.
+"""
+import argparse
+import gzip
+import json
+import random
+import socket
+import time
+import uuid
+import zlib
+from collections import deque
+from datetime import datetime
+from urllib.error import HTTPError, URLError
+from urllib.request import Request, urlopen
+
+from backend.config import config
+
+# Result fields an agent sends and the server accepts; the server computes
+# the sample encoding, latency sketch and anomaly score itself
+NUMERIC_FIELDS = (
+    'packet_loss', 'min_latency', 'max_latency', 'avg_latency', 'jitter', 'packets_sent', 'packets_received',
+    'probe_rate', 'loss_max_run', 'loss_bursts', 'reordered_packets', 'duplicate_packets'
+)
+LIST_FIELDS = ('rtt_samples', 'rtt_times', 'loss_burst_histogram')
+REQUIRED_FIELDS = ('timestamp', 'target', 'packet_loss', 'packets_sent', 'packets_received')
+
+# Statuses that mean the batch itself is bad; retrying it cannot succeed
+REJECTED_STATUSES = (400, 413)
+
+# Longest wait between delivery attempts while the server is unreachable
+MAX_BACKOFF_SECONDS = 300
+
+
+class BatchError(ValueError):
+    """A batch that cannot be ingested as sent."""
+
+    status = 400
+
+
+class BatchTooLarge(BatchError):
+    """A batch over the configured size limits."""
+
+    status = 413
+
+
+def encode_batch(agent_id, batch_id, results):
+    """Serialize and gzip a batch of results for /api/ingest.
+
+    Args:
+        agent_id: Site/agent name
+        batch_id: Unique id of this batch
+        results: Result dictionaries from to_wire()
+
+    Returns:
+        Compressed request body (bytes)
+    """
+    body = json.dumps({'agent_id': agent_id, 'batch_id': batch_id, 'results': results},
+                      separators=(',', ':'))
+    return gzip.compress(body.encode('utf-8'), compresslevel=6)
+
+
+def to_wire(result):
+    """JSON-ready copy of a ping_test() result with only the fields sent."""
+    wire = {'timestamp': result['timestamp'].isoformat(), 'target': result['target']}
+    for name in NUMERIC_FIELDS + LIST_FIELDS:
+        if result.get(name) is not None:
+            wire[name] = result[name]
+    return wire
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _parse_result(raw):
+    """Validate one wire result and convert it to a result dictionary."""
+    if not isinstance(raw, dict):
+        raise BatchError('Each result must be an object')
+    missing = [name for name in REQUIRED_FIELDS if raw.get(name) is None]
+    if missing:
+        raise BatchError(f"Result is missing '{missing[0]}'")
+    target = raw['target']
+    if not isinstance(target, str) or not 0 < len(target) <= 50:
+        raise BatchError('target must be a string of at most 50 characters')
+    try:
+        result = {'timestamp': datetime.fromisoformat(raw['timestamp']), 'target': target}
+    except (TypeError, ValueError):
+        raise BatchError(f"Invalid timestamp {raw['timestamp']!r}")
+    if result['timestamp'].tzinfo is not None:
+        raise BatchError('Timestamps must be naive UTC')
+
+    for name in NUMERIC_FIELDS:
+        value = raw.get(name)
+        if value is not None:
+            if not _is_number(value):
+                raise BatchError(f"'{name}' must be a number")
+            result[name] = value
+    for name in LIST_FIELDS:
+        values = raw.get(name)
+        if values is not None:
+            if not isinstance(values, list) or not all(_is_number(value) for value in values):
+                raise BatchError(f"'{name}' must be a list of numbers")
+            result[name] = values
+    if len(result.get('rtt_samples', ())) != len(result.get('rtt_times', result.get('rtt_samples', ()))):
+        raise BatchError('rtt_samples and rtt_times must have the same length')
+    return result
+
+
+def decode_batch(body, content_encoding=None, max_bytes=32 * 1024 * 1024, max_results=5000):
+    """Decompress, parse and validate an /api/ingest request body.
+
+    Args:
+        body: Raw request body
+        content_encoding: Content-Encoding header ('gzip' or None)
+        max_bytes: Largest accepted decompressed body
+        max_results: Most results accepted in one batch
+
+    Returns:
+        Dictionary with 'agent_id', 'batch_id' and 'results' (result
+        dictionaries ready for backend.ingest.write_batch)
+
+    Raises:
+        BatchError: If the body is malformed; BatchTooLarge if over a limit
+    """
+    if content_encoding == 'gzip':
+        decompressor = zlib.decompressobj(wbits=31)
+        try:
+            body = decompressor.decompress(body, max_bytes + 1)
+        except zlib.error:
+            raise BatchError('Body is not valid gzip')
+        if decompressor.unconsumed_tail:
+            raise BatchTooLarge(f'Batch is larger than {max_bytes} bytes uncompressed')
+    elif content_encoding not in (None, '', 'identity'):
+        raise BatchError(f"Unsupported Content-Encoding '{content_encoding}'")
+    if len(body) > max_bytes:
+        raise BatchTooLarge(f'Batch is larger than {max_bytes} bytes uncompressed')
+
+    try:
+        payload = json.loads(body)
+    except (UnicodeDecodeError, ValueError):
+        raise BatchError('Body is not valid JSON')
+    if not isinstance(payload, dict):
+        raise BatchError('Body must be a JSON object')
+    agent_id, batch_id, results = payload.get('agent_id'), payload.get('batch_id'), payload.get('results')
+    if not isinstance(agent_id, str) or not 0 < len(agent_id) <= 100:
+        raise BatchError('agent_id must be a string of at most 100 characters')
+    if not isinstance(batch_id, str) or not 0 < len(batch_id) <= 64:
+        raise BatchError('batch_id must be a string of at most 64 characters')
+    if not isinstance(results, list):
+        raise BatchError('results must be a list')
+    if len(results) > max_results:
+        raise BatchTooLarge(f'Batches are limited to {max_results} results')
+    return {'agent_id': agent_id, 'batch_id': batch_id, 'results': [_parse_result(raw) for raw in results]}
+
+
+class Agent:
+    """Buffer results and deliver them to the central service in batches.
+
+    Args:
+        server: Base URL of the central web service
+        agent_id: Site/agent name stored with every result
+        token: Bearer token matching the server's INGEST_TOKEN
+        batch_size: Most results per POST
+        flush_seconds: Longest a result waits in the buffer before a flush
+        buffer_size: Results kept while the server is unreachable; the
+                     oldest are dropped beyond this
+        timeout: Seconds to wait for the server per request
+    """
+
+    def __init__(self, server, agent_id, token='', batch_size=500, flush_seconds=60.0,
+                 buffer_size=100000, timeout=30.0):
+        self.url = server.rstrip('/') + '/api/ingest'
+        self.agent_id = agent_id
+        self.token = token
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.timeout = timeout
+        self.buffer = deque(maxlen=buffer_size)
+        self.pending = None  # (batch_id, results) sent but not acknowledged yet
+        self.failures = 0
+        self.retry_at = 0.0
+        self.last_flush = time.monotonic()
+
+    @classmethod
+    def from_config(cls, settings, **overrides):
+        """Create an agent from the AGENT_* and INGEST_TOKEN settings."""
+        options = dict(
+            server=settings.AGENT_SERVER, agent_id=settings.AGENT_ID or socket.gethostname(),
+            token=settings.INGEST_TOKEN, batch_size=settings.AGENT_BATCH_SIZE,
+            flush_seconds=settings.AGENT_FLUSH_SECONDS, buffer_size=settings.AGENT_BUFFER_SIZE
+        )
+        options.update({name: value for name, value in overrides.items() if value is not None})
+        return cls(**options)
+
+    def add(self, result):
+        """Buffer a ping_test() result for delivery."""
+        self.buffer.append(to_wire(result))
+
+    def due(self, now=None):
+        """Whether a flush should run now."""
+        now = time.monotonic() if now is None else now
+        if now < self.retry_at or not (self.buffer or self.pending):
+            return False
+        return (self.pending is not None or len(self.buffer) >= self.batch_size
+                or now - self.last_flush >= self.flush_seconds)
+
+    def post(self, body):
+        """POST one encoded batch; raises HTTPError or URLError on failure."""
+        request = Request(self.url, data=body, method='POST', headers={
+            'Content-Type': 'application/json',
+            'Content-Encoding': 'gzip',
+            'Authorization': f'Bearer {self.token}'
+        })
+        with urlopen(request, timeout=self.timeout) as response:
+            return json.loads(response.read() or b'{}')
+
+    def flush(self):
+        """Deliver buffered results until the buffer is empty or delivery fails.
+
+        Returns:
+            Number of results the server acknowledged
+        """
+        delivered = 0
+        while self.pending is not None or self.buffer:
+            if self.pending is None:
+                results = [self.buffer.popleft() for _ in range(min(self.batch_size, len(self.buffer)))]
+                self.pending = (uuid.uuid4().hex, results)
+            batch_id, results = self.pending
+            try:
+                self.post(encode_batch(self.agent_id, batch_id, results))
+            except HTTPError as e:
+                if e.code not in REJECTED_STATUSES:
+                    self._back_off(f'server answered {e.code}')
+                    return delivered
+                print(f"Dropping batch {batch_id} of {len(results)} results rejected by the server: {e.code}")
+            except (URLError, OSError) as e:
+                self._back_off(str(e))
+                return delivered
+            else:
+                delivered += len(results)
+            self.pending = None
+            self.failures = 0
+        self.retry_at = 0.0
+        self.last_flush = time.monotonic()
+        return delivered
+
+    def _back_off(self, reason):
+        """Wait exponentially longer (with jitter) after each failed attempt."""
+        self.failures += 1
+        delay = min(MAX_BACKOFF_SECONDS, 2 ** self.failures) * random.uniform(0.5, 1.0)
+        self.retry_at = time.monotonic() + delay
+        print(f"Could not deliver results ({reason}); {len(self.buffer) + len(self.pending[1])} buffered, "
+              f"retrying in {delay:.0f}s")
+
+    def run(self, targets, count, interval, test_interval):
+        """Probe the targets every test_interval seconds, delivering results as due.
+
+        Args:
+            targets: Hosts to ping, in turn
+            count: Packets per test
+            interval: Seconds between packets (string, as for ping_test())
+            test_interval: Seconds between rounds of tests
+        """
+        from backend.pingTest import ping_test
+
+        next_round = time.monotonic()
+        try:
+            while True:
+                for target in targets:
+                    result = ping_test(target=target, count=count, interval=interval)
+                    if result:
+                        result['probe_rate'] = 1 / float(interval)
+                        self.add(result)
+                    if self.due():
+                        self.flush()
+                next_round += test_interval
+                time.sleep(max(0.0, next_round - time.monotonic()))
+        except KeyboardInterrupt:
+            # Deliver what is left before exiting
+            self.flush()
+
+
+def main():
+    settings = config['default']
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--server', default=settings.AGENT_SERVER, help='Central web service URL (AGENT_SERVER)')
+    parser.add_argument('--agent-id', help='Site/agent name (AGENT_ID, default: hostname)')
+    parser.add_argument('--target', action='append', help='Host to ping (repeatable; default: TEST_TARGET)')
+    args = parser.parse_args()
+    if not args.server:
+        parser.error('--server or AGENT_SERVER is required')
+
+    agent = Agent.from_config(settings, server=args.server, agent_id=args.agent_id)
+    print(f"Agent {agent.agent_id} reporting to {agent.url}")
+    agent.run(args.target or [settings.TEST_TARGET], settings.TEST_COUNT, settings.PING_INTERVAL,
+              float(settings.TEST_INTERVAL))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,499 @@
+"""
+Declarative alert rules evaluated on every ingested result.
+
+Rules are JSON objects (ALERT_RULES: inline JSON or a path to a JSON file),
+for example:
+
+    [{"name": "loss", "metric": "packet_loss", "op": ">", "threshold": 5, "for": 3},
+     {"name": "slow", "metric": "p95_latency", "threshold": 2, "baseline": true, "window": 900,
+      "targets": ["1.1.1.1"], "severity": "critical"}]
+
+- metric: a result field (packet_loss, avg_latency, jitter, anomaly_score,
+  loss_max_run, ...) or p50_latency / p95_latency / p99_latency over the
+  RTTs of the window
+- op / threshold: the condition that breaches the rule ('>', '>=', '<', '<=')
+- baseline: the threshold is a multiple of the target's hour-of-week
+  latency baseline (backend/baselines.py) rather than an absolute value
+- window: seconds of results the metric is averaged (or, for percentiles,
+  merged) over; without it each result is judged on its own
+- for: consecutive breaching results before the rule fires (default 1)
+- targets: targets the rule applies to (default: all)
+- webhooks: URLs notified for this rule (default: ALERT_WEBHOOKS)
+
+Evaluation is incremental and in memory: each (rule, target) keeps its
+streak and firing state, and each (target, metric, window) keeps one
+rolling window shared by the rules reading it, updated as results enter and
+leave it. Rules are indexed by target, so a result costs the same however
+many other targets and rules there are, and no SQL runs at all. A rule that
+fires sends a 'firing' event, and a 'resolved' event on the first result
+that no longer breaches it.
+
+Events are delivered by a background WebhookQueue, so ingest never waits
+on a webhook: each POST is retried with exponential backoff, and an event
+already queued or sent for a URL is not sent again. Every event carries a
+dedup_key, identical for the firing and resolved events of one alert, so
+receivers can deduplicate too.
+
+State lives in the ingesting process (the test container, or the web
+service for agent results) and starts afresh on restart.
+"""
+import heapq
+import json
+import operator
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import timedelta
+from urllib.error import HTTPError, URLError
+from urllib.request import Request, urlopen
+
+from backend.config import config
+from backend.metrics import ALERT_EVENTS, WEBHOOK_DELIVERIES
+
+OPERATORS = {'>': operator.gt, '>=': operator.ge, '<': operator.lt, '<=': operator.le}
+
+RESULT_METRICS = (
+    'packet_loss', 'min_latency', 'max_latency', 'avg_latency', 'jitter', 'anomaly_score',
+    'loss_max_run', 'loss_bursts', 'reordered_packets', 'duplicate_packets'
+)
+PERCENTILE_METRICS = {'p50_latency': 0.5, 'p95_latency': 0.95, 'p99_latency': 0.99}
+
+SEVERITIES = ('info', 'warning', 'critical')
+
+# Webhook statuses worth retrying; other 4xx responses will not change
+RETRY_STATUSES = (408, 429)
+
+
+class Rule:
+    """One alert rule; see the module docstring for the fields."""
+
+    FIELDS = ('name', 'metric', 'op', 'threshold', 'baseline', 'window', 'for', 'targets', 'severity', 'webhooks')
+
+    def __init__(self, name, metric, threshold, op='>', baseline=False, window=None, consecutive=1,
+                 targets=None, severity='warning', webhooks=None):
+        if metric not in RESULT_METRICS and metric not in PERCENTILE_METRICS:
+            raise ValueError(f"Rule '{name}': unknown metric '{metric}'")
+        if op not in OPERATORS:
+            raise ValueError(f"Rule '{name}': unknown operator '{op}', expected one of {', '.join(OPERATORS)}")
+        if metric in PERCENTILE_METRICS and not window:
+            raise ValueError(f"Rule '{name}': {metric} needs a window")
+        if window is not None and window <= 0:
+            raise ValueError(f"Rule '{name}': window must be positive")
+        if consecutive < 1:
+            raise ValueError(f"Rule '{name}': 'for' must be at least 1")
+        if severity not in SEVERITIES:
+            raise ValueError(f"Rule '{name}': unknown severity '{severity}'")
+        self.name = name
+        self.metric = metric
+        self.threshold = float(threshold)
+        self.op = op
+        self.compare = OPERATORS[op]
+        self.baseline = baseline
+        self.window = window
+        self.consecutive = consecutive
+        self.targets = frozenset(targets) if targets else None
+        self.severity = severity
+        self.webhooks = tuple(webhooks) if webhooks is not None else None
+
+    @classmethod
+    def from_dict(cls, spec):
+        """Build a rule from its JSON object.
+
+        Raises:
+            ValueError: If the rule is malformed
+        """
+        if not isinstance(spec, dict) or not isinstance(spec.get('name'), str):
+            raise ValueError('Every rule must be an object with a name')
+        unknown = set(spec) - set(cls.FIELDS)
+        if unknown:
+            raise ValueError(f"Rule '{spec['name']}': unknown field '{sorted(unknown)[0]}'")
+        for required in ('metric', 'threshold'):
+            if required not in spec:
+                raise ValueError(f"Rule '{spec['name']}': '{required}' is required")
+        try:
+            return cls(spec['name'], spec['metric'], float(spec['threshold']), op=spec.get('op', '>'),
+                       baseline=bool(spec.get('baseline', False)),
+                       window=float(spec['window']) if spec.get('window') else None,
+                       consecutive=int(spec.get('for', 1)), targets=spec.get('targets'),
+                       severity=spec.get('severity', 'warning'), webhooks=spec.get('webhooks'))
+        except (TypeError, ValueError) as e:
+            if str(e).startswith('Rule '):
+                raise
+            raise ValueError(f"Rule '{spec['name']}': {e}")
+
+    def applies_to(self, target):
+        return self.targets is None or target in self.targets
+
+    @property
+    def window_key(self):
+        """Rolling window this rule reads, shared with rules reading the same one."""
+        return self.metric, self.window
+
+
+def load_rules(source):
+    """Parse rules from JSON text or from the path of a JSON file.
+
+    Args:
+        source: JSON array of rules (or an object with a "rules" array), or a
+                file path containing one
+
+    Returns:
+        List of Rule
+
+    Raises:
+        ValueError: If the rules are malformed or two share a name
+    """
+    if not source or not source.strip():
+        return []
+    text = source
+    if not source.lstrip().startswith(('[', '{')):
+        with open(source) as f:
+            text = f.read()
+    try:
+        specs = json.loads(text)
+    except ValueError as e:
+        raise ValueError(f'Alert rules are not valid JSON: {e}')
+    if isinstance(specs, dict):
+        specs = specs.get('rules', [])
+    if not isinstance(specs, list):
+        raise ValueError('Alert rules must be a JSON array')
+    rules = [Rule.from_dict(spec) for spec in specs]
+    names = [rule.name for rule in rules]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise ValueError(f"Duplicate alert rule name '{duplicates[0]}'")
+    return rules
+
+
+class RollingWindow:
+    """A metric over the results of the last `seconds` (or just the latest result).
+
+    Args:
+        metric: Result field, or a key of PERCENTILE_METRICS for RTT percentiles
+        seconds: Window length, or None to keep only the latest value
+    """
+
+    def __init__(self, metric, seconds=None):
+        self.metric = metric
+        self.seconds = seconds
+        self.entries = deque()
+        self.latest = None
+        self.total = 0.0
+        self.sketch = None
+
+    def add(self, result, sketch=None):
+        """Add a result, dropping those that left the window.
+
+        Args:
+            result: Ping result dictionary
+            sketch: LatencySketch of the result's RTTs (percentile windows)
+        """
+        if self.metric in PERCENTILE_METRICS:
+            if sketch is not None:
+                if self.sketch is None:
+                    from backend.sketch import LatencySketch
+                    self.sketch = LatencySketch(sketch.relative_accuracy)
+                self.sketch.merge(sketch)
+                self.entries.append((result['timestamp'], sketch))
+        else:
+            value = result.get(self.metric)
+            if self.seconds is None:
+                # Judged on the latest result alone, even if it lacks the metric
+                self.latest = value
+                return
+            if value is not None:
+                self.total += value
+                self.entries.append((result['timestamp'], value))
+        self._expire(result['timestamp'])
+
+    def _expire(self, now):
+        horizon = now - timedelta(seconds=self.seconds)
+        entries = self.entries
+        while entries and entries[0][0] <= horizon:
+            _, entry = entries.popleft()
+            if self.sketch is not None:
+                self.sketch.subtract(entry)
+            else:
+                self.total -= entry
+        if not entries:
+            # Start the running sums afresh rather than carry rounding errors
+            self.total = 0.0
+
+    def value(self):
+        """Current value of the metric, or None without data."""
+        if self.metric in PERCENTILE_METRICS:
+            if not self.entries:
+                return None
+            return self.sketch.quantile(PERCENTILE_METRICS[self.metric])
+        if self.seconds is None:
+            return self.latest
+        return self.total / len(self.entries) if self.entries else None
+
+
+class AlertEngine:
+    """Evaluate rules incrementally against each ingested result.
+
+    Args:
+        rules: List of Rule
+        notify: Callable(event, urls) for each firing or resolved event
+        webhooks: Default URLs for rules that do not name their own
+    """
+
+    def __init__(self, rules, notify=None, webhooks=()):
+        self.rules = list(rules)
+        self.notify = notify
+        self.webhooks = tuple(webhooks)
+        self._plans = {}  # target -> (window keys, rules)
+        self._windows = {}  # (target, metric, seconds) -> RollingWindow
+        self._states = {}  # (rule name, target) -> {'streak', 'alert'}
+        self._lock = threading.Lock()
+
+    def _plan(self, target):
+        plan = self._plans.get(target)
+        if plan is None:
+            rules = tuple(rule for rule in self.rules if rule.applies_to(target))
+            keys = tuple(dict.fromkeys(rule.window_key for rule in rules))
+            plan = self._plans[target] = (keys, rules)
+        return plan
+
+    def evaluate(self, result):
+        """Fold a result into the rolling state of the rules for its target.
+
+        Args:
+            result: Committed ping result dictionary, with 'anomaly_score' and
+                    'baseline_latency' when scored
+
+        Returns:
+            List of events (dictionaries) that fired or resolved
+        """
+        target = result['target']
+        keys, rules = self._plan(target)
+        if not rules:
+            return []
+        events = []
+        with self._lock:
+            sketch = None
+            if any(metric in PERCENTILE_METRICS for metric, _ in keys) and result.get('rtt_samples'):
+                from backend.sketch import LatencySketch
+                sketch = LatencySketch.from_values(result['rtt_samples'])
+            for metric, seconds in keys:
+                window = self._windows.get((target, metric, seconds))
+                if window is None:
+                    window = self._windows[(target, metric, seconds)] = RollingWindow(metric, seconds)
+                window.add(result, sketch)
+
+            for rule in rules:
+                event = self._apply(rule, target, result)
+                if event is not None:
+                    events.append(event)
+
+        for rule, event in events:
+            ALERT_EVENTS.inc(rule=rule.name, status=event['status'])
+            if self.notify is not None:
+                self.notify(event, rule.webhooks if rule.webhooks is not None else self.webhooks)
+        return [event for _, event in events]
+
+    def _apply(self, rule, target, result):
+        """Update one rule's state; returns (rule, event) if it changed."""
+        value = self._windows[(target,) + rule.window_key].value()
+        limit = rule.threshold
+        if rule.baseline:
+            baseline = result.get('baseline_latency')
+            limit = None if baseline is None else rule.threshold * baseline
+        if value is None or limit is None:
+            return None
+
+        state = self._states.setdefault((rule.name, target), {'streak': 0, 'alert': None})
+        breached = rule.compare(value, limit)
+        state['streak'] = state['streak'] + 1 if breached else 0
+        alert = state['alert']
+        if alert is None and state['streak'] >= rule.consecutive:
+            alert = state['alert'] = {
+                'dedup_key': f"{rule.name}:{target}:{result['timestamp'].isoformat()}",
+                'rule': rule.name, 'target': target, 'severity': rule.severity, 'metric': rule.metric,
+                'started_at': result['timestamp'].isoformat()
+            }
+            return rule, dict(alert, status='firing', value=value, threshold=limit,
+                              timestamp=result['timestamp'].isoformat())
+        if alert is not None and not breached:
+            state['alert'] = None
+            return rule, dict(alert, status='resolved', value=value, threshold=limit,
+                              ended_at=result['timestamp'].isoformat(), timestamp=result['timestamp'].isoformat())
+        return None
+
+    def firing(self):
+        """Alerts currently firing, as (rule name, target) -> alert."""
+        with self._lock:
+            return {key: dict(state['alert']) for key, state in self._states.items() if state['alert']}
+
+
+class WebhookQueue:
+    """Deliver events to webhooks from a background thread.
+
+    Each (event, URL) is POSTed as JSON and retried with exponential backoff
+    on network errors, 5xx, 408 and 429 responses, up to max_attempts times.
+    Submitting an event already queued or sent for a URL (same dedup_key
+    and status) does nothing.
+
+    Args:
+        max_attempts: Tries per delivery before it is dropped
+        backoff: Seconds before the first retry; doubled for each further one
+        timeout: Seconds to wait for a webhook to respond
+        remember: How many sent deliveries are remembered for dedup
+        send: Callable(url, body) replacing the HTTP POST (for tests)
+    """
+
+    def __init__(self, max_attempts=5, backoff=1.0, timeout=10.0, remember=10000, send=None):
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.timeout = timeout
+        self.remember = remember
+        self.send = send or self._post
+        self._seen = OrderedDict()
+        self._due = []  # heap of (due time, sequence, url, event, attempt)
+        self._sequence = 0
+        self._outstanding = 0
+        self._condition = threading.Condition()
+        self._thread = None
+        self._stopping = False
+
+    def _post(self, url, body):
+        request = Request(url, data=body, method='POST', headers={'Content-Type': 'application/json'})
+        with urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+    def submit(self, event, urls):
+        """Queue an event for each URL.
+
+        Returns:
+            Number of deliveries queued (duplicates are skipped)
+        """
+        queued = 0
+        with self._condition:
+            for url in urls:
+                key = (event['dedup_key'], event['status'], url)
+                if key in self._seen:
+                    continue
+                self._seen[key] = True
+                while len(self._seen) > self.remember:
+                    self._seen.popitem(last=False)
+                self._schedule(time.monotonic(), url, event, 1)
+                self._outstanding += 1
+                queued += 1
+            if queued:
+                self._start()
+                self._condition.notify_all()
+        return queued
+
+    def _schedule(self, due, url, event, attempt):
+        self._sequence += 1
+        heapq.heappush(self._due, (due, self._sequence, url, event, attempt))
+
+    def _start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name='webhook-queue', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._stopping and (not self._due or self._due[0][0] > time.monotonic()):
+                    self._condition.wait(self._due[0][0] - time.monotonic() if self._due else None)
+                if self._stopping:
+                    return
+                _, _, url, event, attempt = heapq.heappop(self._due)
+            outcome = self._deliver(url, event, attempt)
+            with self._condition:
+                if outcome == 'retry':
+                    self._schedule(time.monotonic() + self.backoff * 2 ** (attempt - 1), url, event, attempt + 1)
+                else:
+                    self._outstanding -= 1
+                    WEBHOOK_DELIVERIES.inc(outcome=outcome)
+                    self._condition.notify_all()
+
+    def _deliver(self, url, event, attempt):
+        """POST once; returns 'sent', 'retry' or 'failed'."""
+        try:
+            self.send(url, json.dumps(event).encode('utf-8'))
+            return 'sent'
+        except HTTPError as e:
+            retry = e.code >= 500 or e.code in RETRY_STATUSES
+            reason = f'HTTP {e.code}'
+        except (URLError, OSError) as e:
+            retry, reason = True, str(e)
+        if retry and attempt < self.max_attempts:
+            return 'retry'
+        print(f"Giving up on alert webhook {url} for {event['dedup_key']} after {attempt} attempts: {reason}")
+        return 'failed'
+
+    def drain(self, timeout=None):
+        """Wait until every queued delivery was sent or given up.
+
+        Returns:
+            True if the queue emptied within the timeout
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while self._outstanding:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+        return True
+
+    def stop(self):
+        """Stop the delivery thread; undelivered events are dropped."""
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+
+
+# Alert engine of this process, created on first use from the configuration
+_alerting = None
+_alerting_lock = threading.Lock()
+
+
+def get_alerting(settings=None):
+    """The process-wide AlertEngine, or None if no rules are configured."""
+    global _alerting
+    if _alerting is None:
+        with _alerting_lock:
+            if _alerting is None:
+                settings = settings or config['default']
+                try:
+                    rules = load_rules(settings.ALERT_RULES)
+                except (OSError, ValueError) as e:
+                    print(f"Alerting is off, the rules could not be loaded: {e}")
+                    rules = []
+                webhooks = [url.strip() for url in settings.ALERT_WEBHOOKS.split(',') if url.strip()]
+                queue = WebhookQueue(max_attempts=settings.ALERT_WEBHOOK_ATTEMPTS,
+                                     timeout=settings.ALERT_WEBHOOK_TIMEOUT)
+                _alerting = AlertEngine(rules, notify=queue.submit, webhooks=webhooks) if rules else False
+    return _alerting or None
+
+
+def evaluate_results(results):
+    """Evaluate committed results against the configured alert rules.
+
+    Never raises: an evaluation error is logged rather than failing ingest.
+
+    Args:
+        results: Committed ping result dictionaries
+
+    Returns:
+        List of events that fired or resolved
+    """
+    try:
+        engine = get_alerting()
+        if engine is None:
+            return []
+        events = []
+        for result in sorted(results, key=lambda result: result['timestamp']):
+            events.extend(engine.evaluate(result))
+        return events
+    except Exception as e:
+        print(f"Alert evaluation failed: {e}")
+        return []
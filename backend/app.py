@@ -1,11 +1,37 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request, stream_with_context
 from flask_migrate import Migrate
 from flask_cors import CORS
 from datetime import datetime, timedelta
+import hmac
 import os
+import threading
 
-from backend.models import db, PingResult, configure_schema_if_postgres
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+
+from backend.models import db, PingResult, Target, configure_schema_if_postgres, configure_read_replica
 from backend.config import config
+from backend.compression import init_compression, send_static_asset
+from backend.cache import TTLCache
+from backend.series import DASHBOARD_METRICS, SERIES_METRICS, summarize, downsample
+from backend.planner import parse_time_range, plan_range, plan_cover, execute_plan, fetch_sketches, describe_plan
+from backend.export import EXPORT_FORMATS, export_query, generate_export
+from backend.metrics import (
+    REGISTRY, CONTENT_TYPE as METRICS_CONTENT_TYPE, API_ROWS, init_request_metrics, record_result
+)
+from backend.instrumentation import span, init_request_instrumentation
+from backend.targets import result_target_filter
+from backend.sketch import merge_sketches, percentiles
+from backend.incidents import KINDS as INCIDENT_KINDS, list_incidents
+from backend.reports import build_report, period_range
+from backend.heatmap import RESOLUTIONS as HEATMAP_RESOLUTIONS, WEEKDAYS, build_heatmap, get_zone
+from backend.compare import compare_windows, summarize_windows
+from backend.guardrails import check_query, init_guardrails
+from backend.replica import init_read_replica
+from backend.agent import BatchError, decode_batch
+from backend.alerts import evaluate_results
+from backend.ingest import ingest_batch
+from backend.schema import ingest_batches
 # ping_test import removed as it's unused
 
 def get_rounded_time(hours=0):
@@ -44,18 +70,37 @@ def create_app(config_name='default'):
     Returns:
         Configured Flask application instance
     """
-    # Initialize Flask app with static files from the Vue.js build directory
-    app = Flask(__name__, static_folder='../frontend/dist', static_url_path='')
+    # Initialize Flask app; the Vue.js build is served by catch_all() below
+    # rather than Flask's static route so precompressed files can be used
+    app = Flask(__name__, static_folder=None)
     app.config.from_object(config[config_name])
     
     # Configure PostgreSQL schema if using Postgres (not for SQLite in testing/development)
     configure_schema_if_postgres(app)
     
+    # Register the read replica, if configured, as a second engine
+    configure_read_replica(app)
+    
     # Initialize database, migrations, and cross-origin resource sharing
     db.init_app(app)
     Migrate(app, db)
     CORS(app)
     
+    # Negotiated gzip for API responses
+    init_compression(app)
+    
+    # API handler latency for /metrics
+    init_request_metrics(app)
+    
+    # Timing spans, Server-Timing headers and the opt-in request profiler
+    init_request_instrumentation(app)
+    
+    # API reads from the read replica, falling back to the primary
+    init_read_replica(app, db)
+    
+    # Statement timeouts and the handling of cancelled or refused queries
+    init_guardrails(app, db)
+    
     # Register API routes
     @app.route('/api/ping-results', methods=['GET'])
     def get_ping_results():
@@ -63,45 +108,102 @@ def create_app(config_name='default'):
         
         Query parameters:
             hours: Number of hours of history to retrieve (default: 24)
+            start: ISO 8601 start of the range (overrides hours)
+            end: ISO 8601 end of the range (default: now)
+            target: Target address to include (repeatable; default: all targets)
             limit: Maximum number of results to return (default: 1000)
+            downsample: 'false' to refuse ranges over the row budget instead
+                of downsampling them (default: true)
             
         Returns:
-            JSON array of ping test results within the specified time range
+            JSON array of ping test results within the specified time range.
+            Ranges holding more than QUERY_MAX_ROWS results (or, on
+            PostgreSQL, costing more than QUERY_MAX_COST) return up to
+            MAX_SERIES_POINTS averaged points from the rollups instead, with
+            timestamp, count and the chart metrics, and an X-Downsampled
+            header naming the guardrail
+            
+        Status codes:
+            200: Success
+            400: Invalid start/end parameters
+            422: Range over the row budget or cost limit with downsample=false
         """
-        # Parse query parameters with defaults
-        hours = request.args.get('hours', default=24, type=int)
         # limit parameter kept for API compatibility but not used in query
         limit = request.args.get('limit', default=1000, type=int)
         
-        # Use helper function to get rounded time with specified offset
-        time_filter = get_rounded_time(hours=hours)
+        # Resolve the time range from start/end or hours back from now
+        try:
+            start, end = parse_time_range(request.args, get_rounded_time())
+        except ValueError as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 400
         
         # Query database - get all results in chronological order
         # Remove limit to ensure we get the full time range requested
-        results = PingResult.query.filter(
-            PingResult.timestamp >= time_filter
-        ).order_by(
-            PingResult.timestamp.asc()
-        ).all()
+        # (the 'query' span includes ORM hydration; 'sql' spans are the DB part)
+        targets = request.args.getlist('target')
+        query = PingResult.query.filter(
+            PingResult.timestamp >= start,
+            PingResult.timestamp <= end
+        )
+        if targets:
+            query = query.filter(result_target_filter(targets))
+        query = query.order_by(PingResult.timestamp.asc())
+        
+        # Ranges too large to load row by row are answered from the rollups
+        with span('guardrails', endpoint='/api/ping-results'):
+            downsampled = check_query(
+                db.session.connection(), '/api/ping-results', query.statement, start, end, targets, app.config,
+                can_downsample=request.args.get('downsample', default='true').lower() != 'false'
+            )
+        if downsampled:
+            points = app.config['MAX_SERIES_POINTS']
+            plan = plan_range(start, end, points)
+            with span('query', endpoint='/api/ping-results', segments=len(plan)):
+                rows = execute_plan(plan, targets)
+            API_ROWS.inc(len(rows), endpoint='/api/ping-results')
+            with span('downsample', endpoint='/api/ping-results', rows=len(rows)):
+                series = downsample(rows, start, end, points, weighted=True)
+            response = jsonify([
+                dict(zip(('timestamp', 'count') + SERIES_METRICS, values))
+                for values in zip(series['timestamps'], series['counts'], *(series[m] for m in SERIES_METRICS))
+            ])
+            response.headers['X-Downsampled'] = downsampled
+            return response
+        
+        with span('query', endpoint='/api/ping-results'):
+            results = query.all()
+        
+        API_ROWS.inc(len(results), endpoint='/api/ping-results')
         
         # Return as JSON
-        return jsonify([result.to_dict() for result in results])
+        with span('serialize', endpoint='/api/ping-results', rows=len(results)):
+            return jsonify([result.to_dict() for result in results])
     
     @app.route('/api/ping-stats', methods=['GET'])
     def get_ping_stats():
         """Get summary statistics for network performance.
         
+        Query parameters:
+            target: Target address to include (repeatable; default: all targets)
+        
         Returns:
             JSON object containing:
             - The most recent ping test result
             - Statistical aggregates for the last 24 hours (avg/max/min metrics)
+            - RTT percentiles (p50/p95/p99) over the last 24 hours and 30 days
             
         Status codes:
             200: Success
             404: No ping results available in the database
         """
+        targets = request.args.getlist('target')
+        
         # Get the most recent ping test result for current status
-        latest = PingResult.query.order_by(PingResult.timestamp.desc()).first()
+        with span('query', endpoint='/api/ping-stats'):
+            latest_query = PingResult.query
+            if targets:
+                latest_query = latest_query.filter(result_target_filter(targets))
+            latest = latest_query.order_by(PingResult.timestamp.desc()).first()
         
         if not latest:
             return jsonify({
@@ -113,14 +215,27 @@ def create_app(config_name='default'):
         day_ago = get_rounded_time(hours=24)
         
         # Get statistical values for the last 24 hours
-        day_stats = db.session.query(
-            db.func.avg(PingResult.packet_loss).label('avg_packet_loss'),
-            db.func.max(PingResult.packet_loss).label('max_packet_loss'),
-            db.func.avg(PingResult.avg_latency).label('avg_latency'),
-            db.func.avg(PingResult.jitter).label('avg_jitter'),
-            db.func.min(PingResult.min_latency).label('min_latency'),
-            db.func.max(PingResult.max_latency).label('max_latency')
-        ).filter(PingResult.timestamp >= day_ago).first()
+        with span('query', endpoint='/api/ping-stats'):
+            stats_query = db.session.query(
+                db.func.avg(PingResult.packet_loss).label('avg_packet_loss'),
+                db.func.max(PingResult.packet_loss).label('max_packet_loss'),
+                db.func.avg(PingResult.avg_latency).label('avg_latency'),
+                db.func.avg(PingResult.jitter).label('avg_jitter'),
+                db.func.min(PingResult.min_latency).label('min_latency'),
+                db.func.max(PingResult.max_latency).label('max_latency')
+            ).filter(PingResult.timestamp >= day_ago)
+            if targets:
+                stats_query = stats_query.filter(result_target_filter(targets))
+            day_stats = stats_query.first()
+        
+        # Percentiles merge the per-result and per-bucket sketches covering
+        # each window, a few hundred small rows even for 30 days
+        now = get_rounded_time()
+        latency_percentiles = {}
+        with span('query', endpoint='/api/ping-stats', source='sketches'):
+            for label, hours in (('24h', 24), ('30d', 720)):
+                plan = plan_cover(get_rounded_time(hours=hours), now)
+                latency_percentiles[label] = percentiles(merge_sketches(fetch_sketches(plan, targets)))
         
         return jsonify({
             'latest': latest.to_dict(),
@@ -131,9 +246,515 @@ def create_app(config_name='default'):
                 'avg_jitter': day_stats.avg_jitter if day_stats and day_stats.avg_jitter else 0,
                 'min_latency': day_stats.min_latency if day_stats and day_stats.min_latency else 0,
                 'max_latency': day_stats.max_latency if day_stats and day_stats.max_latency else 0
+            },
+            'latency_percentiles': latency_percentiles
+        })
+    
+    @app.route('/api/compare', methods=['GET'])
+    def get_comparison():
+        """Compare a window's statistics with the same window in earlier periods.
+        
+        The window is summarized together with the same window one day, one
+        week and four weeks earlier, from rollups plus raw results at the
+        edges, in a single query (see backend/compare.py).
+        
+        Query parameters:
+            start: ISO 8601 start of the window
+            end: ISO 8601 end of the window (default: now)
+            hours: Hours back from end when start is omitted (default: 24)
+            target: Target address to include (repeatable; default: all targets)
+            
+        Returns:
+            JSON object with the current window's statistics (loss, latency,
+            jitter and p50/p95/p99) and, under 'previous', the '1d', '7d' and
+            '28d' windows with the same statistics and a 'delta' of each
+            (absolute change and percent, null where either side has no data)
+            
+        Status codes:
+            200: Success
+            400: Invalid start/end parameters
+        """
+        try:
+            start, end = parse_time_range(request.args, get_rounded_time())
+        except ValueError as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 400
+        
+        with span('query', endpoint='/api/compare'):
+            current, previous, rows = compare_windows(db.session.connection(), start, end,
+                                                      targets=request.args.getlist('target'))
+        API_ROWS.inc(rows, endpoint='/api/compare')
+        
+        with span('serialize', endpoint='/api/compare'):
+            return jsonify({'current': current, 'previous': previous})
+    
+    @app.route('/api/series', methods=['GET'])
+    def get_series():
+        """Get a downsampled metric series for an arbitrary time range.
+        
+        The query planner answers each part of the range from the cheapest
+        source with enough resolution (rollup tiers or raw results), so the
+        response time depends on the number of points, not on how wide or
+        how old the range is.
+        
+        Query parameters:
+            start: ISO 8601 start of the range
+            end: ISO 8601 end of the range (default: now)
+            hours: Hours back from end when start is omitted (default: 24)
+            points: Maximum number of points per metric (default: 500)
+            target: Target address to include (repeatable; default: all targets)
+            
+        Returns:
+            JSON object containing the resolved range, the executed plan and
+            the columnar series (timestamps, counts and one list per metric)
+            
+        Status codes:
+            200: Success
+            400: Invalid range parameters
+        """
+        points = min(max(1, request.args.get('points', default=500, type=int)),
+                     app.config['MAX_SERIES_POINTS'])
+        
+        try:
+            start, end = parse_time_range(request.args, get_rounded_time())
+        except ValueError as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 400
+        
+        plan = plan_range(start, end, points)
+        with span('query', endpoint='/api/series', segments=len(plan)):
+            rows = execute_plan(plan, request.args.getlist('target'))
+        API_ROWS.inc(len(rows), endpoint='/api/series')
+        
+        with span('downsample', endpoint='/api/series', rows=len(rows)):
+            series = downsample(rows, start, end, points, weighted=True)
+        
+        with span('serialize', endpoint='/api/series'):
+            return jsonify({
+                'start': start.isoformat(),
+                'end': end.isoformat(),
+                'points': points,
+                'plan': describe_plan(plan),
+                'series': series
+            })
+    
+    @app.route('/api/export', methods=['GET'])
+    def export_results():
+        """Stream ping results for a range as NDJSON or CSV.
+        
+        Rows are read through a server-side cursor and written in batches,
+        so memory use stays flat no matter how many rows are exported.
+        
+        Query parameters:
+            format: 'ndjson' (default) or 'csv'
+            start: ISO 8601 start of the range
+            end: ISO 8601 end of the range (default: now)
+            hours: Hours back from end when start is omitted (default: 24)
+            target: Target to include (repeatable; default: all targets)
+            gzip: 'true' to receive a gzip-compressed file
+            
+        Returns:
+            Streamed attachment in the requested format
+            
+        Status codes:
+            200: Success
+            400: Invalid format or range parameters
+            422: Query plan over QUERY_MAX_COST (PostgreSQL)
+        """
+        fmt = request.args.get('format', default='ndjson')
+        if fmt not in EXPORT_FORMATS:
+            return jsonify({
+                'status': 'error',
+                'message': f"Unsupported format '{fmt}', expected one of: {', '.join(EXPORT_FORMATS)}"
+            }), 400
+        
+        try:
+            start, end = parse_time_range(request.args, get_rounded_time())
+        except ValueError as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 400
+        
+        compress = request.args.get('gzip', default='false').lower() == 'true'
+        targets = request.args.getlist('target')
+        
+        # Streaming keeps memory flat, so only the cost check applies
+        with span('guardrails', endpoint='/api/export'):
+            check_query(db.session.connection(), '/api/export', export_query(start, end, targets),
+                        start, end, targets, app.config, can_downsample=False, row_budget=False)
+        
+        filename = f"ping-results.{fmt}" + ('.gz' if compress else '')
+        stream = generate_export(
+            start, end, fmt=fmt, targets=targets, compress=compress,
+            batch_size=app.config['EXPORT_BATCH_SIZE']
+        )
+        return Response(
+            stream_with_context(stream),
+            mimetype='application/gzip' if compress else EXPORT_FORMATS[fmt],
+            headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+        )
+    
+    # Shared between dashboard requests so concurrent refreshes reuse one scan
+    dashboard_cache = TTLCache(app.config['DASHBOARD_CACHE_SECONDS'])
+    
+    @app.route('/api/dashboard', methods=['GET'])
+    def get_dashboard():
+        """Get everything the dashboard needs in a single round trip.
+        
+        One column query over the chart window answers the latest result,
+        the summary statistics and the downsampled chart series, replacing
+        separate calls to /api/ping-stats and /api/ping-results.
+        
+        Query parameters:
+            hours: Hours of history for the chart series (default: 168)
+            stats_hours: Hours covered by the summary statistics (default: 24)
+            points: Maximum number of points per metric series (default: 1000)
+            target: Target address to include (repeatable; default: all targets)
+            
+        Returns:
+            JSON object containing:
+            - latest: The most recent ping test result
+            - day_stats: Aggregates over the last stats_hours
+            - series: Columnar downsampled series (timestamps, counts and
+              one list per metric, including the mean anomaly_score)
+            - history_start: Timestamp of the oldest stored result, which
+              tells clients how far back ranges have data
+            Windows holding more than QUERY_MAX_ROWS results are served from
+            the rollups instead, without anomaly scores.
+            
+        Status codes:
+            200: Success
+            404: No ping results available in the database
+        """
+        hours = request.args.get('hours', default=168, type=int)
+        stats_hours = request.args.get('stats_hours', default=24, type=int)
+        points = max(1, request.args.get('points', default=1000, type=int))
+        
+        targets = request.args.getlist('target')
+        
+        cache_key = (hours, stats_hours, points, tuple(sorted(targets)))
+        cached = dashboard_cache.get(cache_key)
+        if cached is not None:
+            return jsonify(cached)
+        
+        end = get_rounded_time()
+        start = get_rounded_time(hours=max(hours, stats_hours))
+        stats_start = get_rounded_time(hours=stats_hours)
+        
+        # Plain column tuples avoid ORM hydration for large windows
+        query = db.session.query(
+            PingResult.id,
+            PingResult.timestamp,
+            PingResult.packet_loss,
+            PingResult.min_latency,
+            PingResult.max_latency,
+            PingResult.avg_latency,
+            PingResult.jitter,
+            PingResult.anomaly_score
+        ).filter(
+            PingResult.timestamp >= start
+        )
+        latest_query = PingResult.query
+        if targets:
+            query = query.filter(result_target_filter(targets))
+            latest_query = latest_query.filter(result_target_filter(targets))
+        query = query.order_by(PingResult.timestamp.asc())
+        series_start = get_rounded_time(hours=hours)
+        
+        with span('guardrails', endpoint='/api/dashboard'):
+            downsampled = check_query(db.session.connection(), '/api/dashboard', query.statement,
+                                      start, end, targets, app.config)
+        if downsampled:
+            # Too many results to load: the series comes from the query
+            # planner and the statistics from rollups (no anomaly scores)
+            with span('query', endpoint='/api/dashboard', source='rollups'):
+                latest = latest_query.order_by(PingResult.timestamp.desc()).first()
+                plan = plan_range(series_start, end, points)
+                rows = execute_plan(plan, targets)
+                windows, stats_rows = summarize_windows(db.session.connection(), [('stats', stats_start, end)], targets)
+            API_ROWS.inc(len(rows) + stats_rows, endpoint='/api/dashboard')
+        else:
+            with span('query', endpoint='/api/dashboard'):
+                rows = query.all()
+                
+                # The newest row in the window is the latest result; only look
+                # further back when the window is empty
+                latest = db.session.get(PingResult, rows[-1].id) if rows else \
+                    latest_query.order_by(PingResult.timestamp.desc()).first()
+            API_ROWS.inc(len(rows), endpoint='/api/dashboard')
+        
+        if not latest:
+            return jsonify({
+                'status': 'error',
+                'message': 'No ping results available'
+            }), 404
+        
+        # The oldest result is the first entry of the timestamp index
+        history_query = db.session.query(db.func.min(PingResult.timestamp))
+        if targets:
+            history_query = history_query.filter(result_target_filter(targets))
+        with span('query', endpoint='/api/dashboard', source='history'):
+            history_start = history_query.scalar()
+        
+        with span('aggregate', endpoint='/api/dashboard', rows=len(rows)):
+            if downsampled:
+                series = downsample(rows, series_start, end, points, weighted=True)
+                series['anomaly_score'] = [None] * len(series['timestamps'])
+                stats = windows['stats']
+                day_stats = {key: stats[key] or 0 for key in (
+                    'avg_packet_loss', 'max_packet_loss', 'avg_latency', 'avg_jitter', 'min_latency', 'max_latency'
+                )}
+            else:
+                series = downsample(
+                    [row for row in rows if row.timestamp >= series_start],
+                    series_start, end, points, metrics=DASHBOARD_METRICS
+                )
+                day_stats = summarize(row for row in rows if row.timestamp >= stats_start)
+            payload = {
+                'latest': latest.to_dict(),
+                'day_stats': day_stats,
+                'series': series,
+                'history_start': history_start.isoformat()
             }
+        
+        dashboard_cache.set(cache_key, payload)
+        with span('serialize', endpoint='/api/dashboard'):
+            return jsonify(payload)
+    
+    @app.route('/api/incidents', methods=['GET'])
+    def get_incidents():
+        """List detected outages, loss bursts and latency spikes.
+        
+        Incidents are recorded as results are ingested (see
+        backend/incidents.py), so listing them reads only the incidents
+        table, however long the range.
+        
+        Query parameters:
+            start: ISO 8601 start of the range
+            end: ISO 8601 end of the range (default: now)
+            hours: Hours back from end when start is omitted (default: 720)
+            kind: 'outage', 'loss' or 'latency' (repeatable; default: all kinds)
+            target: Only incidents affecting this target (repeatable; default: all targets)
+            
+        Returns:
+            JSON object with the resolved range and the incidents overlapping
+            it, newest first
+            
+        Status codes:
+            200: Success
+            400: Invalid range or kind parameters
+        """
+        kinds = request.args.getlist('kind')
+        unknown = [kind for kind in kinds if kind not in INCIDENT_KINDS]
+        if unknown:
+            return jsonify({
+                'status': 'error',
+                'message': f"Unknown incident kind '{unknown[0]}', expected one of: {', '.join(INCIDENT_KINDS)}"
+            }), 400
+        
+        now = get_rounded_time()
+        try:
+            start, end = parse_time_range(request.args, now, default_hours=720)
+        except ValueError as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 400
+        
+        with span('query', endpoint='/api/incidents'):
+            incidents = list_incidents(db.session.connection(), start, end, now,
+                                       kinds=kinds, targets=request.args.getlist('target'))
+        API_ROWS.inc(len(incidents), endpoint='/api/incidents')
+        
+        with span('serialize', endpoint='/api/incidents', rows=len(incidents)):
+            return jsonify({
+                'start': start.isoformat(),
+                'end': end.isoformat(),
+                'incidents': incidents
+            })
+    
+    @app.route('/api/heatmap', methods=['GET'])
+    def get_heatmap():
+        """Latency and loss by day of week and time of day.
+        
+        Folds the range into a grid of 7 rows (Monday to Sunday) by 24 hours
+        or 96 quarter hours, summed from the rollup buckets (see
+        backend/heatmap.py), so a year costs no more than a few thousand
+        rollup rows.
+        
+        Query parameters:
+            start: ISO 8601 start of the range
+            end: ISO 8601 end of the range (default: now)
+            hours: Hours back from end when start is omitted (default: 672, four weeks)
+            resolution: Slots per day, 24 or 96 (default: 24)
+            tz: IANA time zone the grid is laid out in (default: UTC)
+            target: Only this target (repeatable; default: all targets)
+            
+        Returns:
+            JSON object with the resolved range and 7 x resolution grids of
+            avg_latency, p95_latency, packet_loss and result counts (null
+            where there were no results)
+            
+        Status codes:
+            200: Success
+            400: Invalid range, resolution or time zone
+        """
+        slots = request.args.get('resolution', default=24, type=int)
+        if slots not in HEATMAP_RESOLUTIONS:
+            return jsonify({
+                'status': 'error',
+                'message': f"resolution must be one of: {', '.join(map(str, HEATMAP_RESOLUTIONS))}"
+            }), 400
+        try:
+            start, end = parse_time_range(request.args, get_rounded_time(), default_hours=672)
+            zone = get_zone(request.args.get('tz'))
+        except ValueError as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 400
+        
+        with span('query', endpoint='/api/heatmap'):
+            heatmap = build_heatmap(db.session.connection(), start, end, slots,
+                                    targets=request.args.getlist('target'), zone=zone)
+        API_ROWS.inc(heatmap.pop('buckets'), endpoint='/api/heatmap')
+        
+        with span('serialize', endpoint='/api/heatmap'):
+            return jsonify(dict(
+                heatmap,
+                start=start.isoformat(),
+                end=end.isoformat(),
+                resolution=slots,
+                timezone=request.args.get('tz') or 'UTC',
+                days=list(WEEKDAYS)
+            ))
+    
+    @app.route('/api/reports', methods=['GET'])
+    def get_reports():
+        """Uptime/SLA report of a month or year per target.
+        
+        Sums the daily reports materialized nightly (see backend/reports.py),
+        so a year costs at most 365 rows per target; the current day is not
+        included until it has been materialized.
+        
+        Query parameters:
+            period: 'month' (broken down by day) or 'year' (broken down by month; default: month)
+            month: YYYY-MM for monthly reports (default: the current month)
+            year: YYYY for yearly reports (default: the current year)
+            target: Only this target (repeatable; default: all targets)
+            
+        Returns:
+            JSON object with the resolved range and per-target availability,
+            down and degraded minutes, packet loss, latency percentiles and
+            the worst hour and day, each with its breakdown
+            
+        Status codes:
+            200: Success
+            400: Invalid period, month or year
+        """
+        period = request.args.get('period', 'month')
+        try:
+            start, end = period_range(period, request.args.get(period), get_rounded_time())
+        except ValueError as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 400
+        
+        with span('query', endpoint='/api/reports'):
+            targets = build_report(db.session.connection(), period, start, end,
+                                   targets=request.args.getlist('target'))
+        API_ROWS.inc(sum(target['days'] for target in targets), endpoint='/api/reports')
+        
+        with span('serialize', endpoint='/api/reports', rows=len(targets)):
+            return jsonify({
+                'period': period,
+                'start': start.isoformat(),
+                'end': end.isoformat(),
+                'targets': targets
+            })
+    
+    # SQLite allows one writer at a time; queue ingest requests here rather
+    # than have them fail with "database is locked"
+    ingest_lock = threading.Lock()
+    
+    @app.route('/api/ingest', methods=['POST'])
+    def ingest_results():
+        """Store a batch of results from a remote probe agent.
+        
+        The body is a JSON batch as written by backend/agent.py, usually
+        gzip-compressed (Content-Encoding: gzip), authorized with
+        "Authorization: Bearer <INGEST_TOKEN>". The whole batch is written in
+        one transaction, and a batch_id that was ingested before is
+        acknowledged without being stored again, so agents can safely retry.
+        
+        Returns:
+            JSON object with the batch id, its number of results and whether
+            it was a duplicate
+            
+        Status codes:
+            200: Batch stored (or already stored)
+            400: Malformed batch
+            401: Missing or wrong token
+            403: Ingest is disabled (INGEST_TOKEN is not set)
+            413: Batch over INGEST_MAX_BYTES or INGEST_MAX_RESULTS
+        """
+        token = app.config['INGEST_TOKEN']
+        if not token:
+            return jsonify({'status': 'error', 'message': 'Ingest is disabled; set INGEST_TOKEN to enable it'}), 403
+        scheme, _, supplied = request.headers.get('Authorization', '').partition(' ')
+        if scheme.lower() != 'bearer' or not hmac.compare_digest(supplied.encode('utf-8'), token.encode('utf-8')):
+            return jsonify({'status': 'error', 'message': 'Invalid ingest token'}), 401
+        
+        max_bytes = app.config['INGEST_MAX_BYTES']
+        if request.content_length is not None and request.content_length > max_bytes:
+            return jsonify({'status': 'error', 'message': f'Batch is larger than {max_bytes} bytes'}), 413
+        with span('decode', endpoint='/api/ingest'):
+            try:
+                batch = decode_batch(request.get_data(cache=False), request.headers.get('Content-Encoding'),
+                                     max_bytes=max_bytes, max_results=app.config['INGEST_MAX_RESULTS'])
+            except BatchError as e:
+                return jsonify({'status': 'error', 'message': str(e)}), e.status
+        
+        batch_id, results = batch['batch_id'], batch['results']
+        sqlite = db.engine.dialect.name == 'sqlite'
+        with span('write', endpoint='/api/ingest', rows=len(results)):
+            if sqlite:
+                ingest_lock.acquire()
+            try:
+                written = ingest_batch(db.session.connection(), batch['agent_id'], batch_id, results)
+                db.session.commit()
+            except IntegrityError:
+                # The same batch was retried concurrently and the other
+                # request committed first
+                db.session.rollback()
+                stored = db.session.execute(
+                    select(ingest_batches.c.batch_id).where(ingest_batches.c.batch_id == batch_id)).first()
+                if stored is None:
+                    raise
+                written = False
+            finally:
+                if sqlite:
+                    ingest_lock.release()
+        if written:
+            API_ROWS.inc(len(results), endpoint='/api/ingest')
+            # Oldest first, so the per-target gauges end on the latest result
+            for result in sorted(results, key=lambda result: result['timestamp']):
+                record_result(result)
+            evaluate_results(results)
+        
+        return jsonify({
+            'status': 'success',
+            'batch_id': batch_id,
+            'results': len(results),
+            'duplicate': not written
         })
     
+    @app.route('/api/targets', methods=['GET'])
+    def get_targets():
+        """List the probed targets and their probe settings.
+        
+        Returns:
+            JSON array of targets ordered by address; each address can be
+            passed as target= to the other endpoints
+        """
+        return jsonify([target.to_dict() for target in Target.query.order_by(Target.address).all()])
+    
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        """Expose service metrics in Prometheus text format.
+        
+        Rendered purely from in-memory state; never queries the database.
+        """
+        return Response(REGISTRY.render(), content_type=METRICS_CONTENT_TYPE)
+    
     # Serve the Vue.js frontend application
     @app.route('/', defaults={'path': ''})
     @app.route('/<path:path>')
@@ -141,9 +762,15 @@ def create_app(config_name='default'):
         """Catch-all route to serve the single-page Vue.js application.
         
         This enables client-side routing by sending all unmatched routes
-        to the Vue.js application which handles routing internally.
+        to the Vue.js application which handles routing internally. Built
+        assets are served from their precompressed siblings when the client
+        accepts them, and content-hashed bundles are cached as immutable.
         """
-        return app.send_static_file('index.html')
+        return send_static_asset(
+            app.config['FRONTEND_DIST'],
+            path,
+            app.config['STATIC_MAX_AGE']
+        )
     
     return app
 
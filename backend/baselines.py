@@ -0,0 +1,192 @@
+"""
+Streaming per-target latency baselines and anomaly scores.
+
+Whether 28 ms is bad depends on the target and on the time of day and week,
+so every target keeps one baseline per hour of the week (168 slots, UTC):
+an exponentially weighted mean and variance of its average latency. Each
+ingested result is scored against its slot before being folded into it, in
+O(1) with a single keyed lookup of the slot's state row.
+
+The score is a z-score: how many standard deviations the result's average
+latency is above (positive) or below (negative) what is usual for that
+target at that hour. Results without replies are not scored, and a slot
+only scores once it has seen BASELINE_MIN_SAMPLES results.
+
+Each result weighs BASELINE_ALPHA; until a slot has seen 1 / BASELINE_ALPHA
+results it keeps the exact running mean and variance instead, so young
+slots are not biased towards their first value.
+"""
+import math
+
+from sqlalchemy import bindparam, insert, select, update
+
+from backend.config import config
+from backend.schema import latency_baselines
+
+# Once a slot is warm, values further than this many standard deviations
+# from the mean are clipped before they update it, so one spike does not
+# inflate the variance
+CLIP_STDDEVS = 4.0
+
+# Floors for the standard deviation, so very steady links do not turn
+# sub-millisecond wobble into huge scores
+MIN_STDDEV_MS = 0.1
+MIN_STDDEV_FRACTION = 0.01
+
+
+def hour_of_week(timestamp):
+    """Baseline slot of a naive UTC timestamp: 0 is Monday 00:00-01:00."""
+    return timestamp.weekday() * 24 + timestamp.hour
+
+
+def _stddev(mean, variance):
+    return max(math.sqrt(variance), MIN_STDDEV_MS, MIN_STDDEV_FRACTION * abs(mean))
+
+
+def anomaly_score(state, value, min_samples):
+    """Z-score of a value against a slot's state.
+
+    Args:
+        state: (mean, variance, samples) tuple, or None for an empty slot
+        value: Average latency in ms
+        min_samples: Samples a slot needs before it scores
+
+    Returns:
+        float, or None while the slot is warming up
+    """
+    if state is None or state[2] < min_samples:
+        return None
+    mean, variance, _ = state
+    return (value - mean) / _stddev(mean, variance)
+
+
+def ewma_update(state, value, alpha):
+    """Fold a value into a slot's state.
+
+    Args:
+        state: (mean, variance, samples) tuple, or None for an empty slot
+        value: Average latency in ms
+        alpha: Weight of the new value once the slot is warm
+
+    Returns:
+        New (mean, variance, samples) tuple
+    """
+    if state is None:
+        return value, 0.0, 1
+    mean, variance, samples = state
+    samples += 1
+    weight = max(alpha, 1 / samples)
+    if weight == alpha:
+        limit = CLIP_STDDEVS * _stddev(mean, variance)
+        value = min(max(value, mean - limit), mean + limit)
+    difference = value - mean
+    mean += weight * difference
+    variance = (1 - weight) * (variance + weight * difference * difference)
+    return mean, variance, samples
+
+
+def score_result(connection, result, settings=None):
+    """Score one result against its baseline slot and update the slot.
+
+    Runs inside the caller's transaction, with the result's insert. Once
+    the slot scores, its mean is also recorded as result['baseline_latency']
+    for baseline-relative alert rules (backend/alerts.py).
+
+    Args:
+        connection: SQLAlchemy Connection with an open transaction
+        result: Ping result dictionary as returned by ping_test()
+        settings: Configuration class (default: the default config)
+
+    Returns:
+        The anomaly score, or None if the result was not scored
+    """
+    latency = result.get('avg_latency')
+    if not result.get('packets_received') or latency is None:
+        return None
+    settings = settings or config['default']
+    key = {'target': result['target'], 'hour_of_week': hour_of_week(result['timestamp'])}
+
+    row = connection.execute(
+        select(latency_baselines.c.mean, latency_baselines.c.variance, latency_baselines.c.samples)
+        .where(latency_baselines.c.target == key['target'],
+               latency_baselines.c.hour_of_week == key['hour_of_week'])
+    ).first()
+    state = tuple(row) if row is not None else None
+    score = anomaly_score(state, latency, settings.BASELINE_MIN_SAMPLES)
+    if score is not None:
+        result['baseline_latency'] = state[0]
+
+    mean, variance, samples = ewma_update(state, latency, settings.BASELINE_ALPHA)
+    values = {'mean': mean, 'variance': variance, 'samples': samples, 'updated_at': result['timestamp']}
+    if state is None:
+        connection.execute(insert(latency_baselines).values(**key, **values))
+    else:
+        connection.execute(
+            update(latency_baselines)
+            .where(latency_baselines.c.target == key['target'],
+                   latency_baselines.c.hour_of_week == key['hour_of_week'])
+            .values(**values)
+        )
+    return score
+
+
+def score_batch(connection, results, settings=None):
+    """Score many results against their baseline slots and update the slots.
+
+    Batched score_result() for bulk ingest: every slot the results fall in
+    is loaded with one query and each touched slot is written once. Results
+    are folded in the order given, which should be by timestamp. Sets
+    result['anomaly_score'] on every result, and result['baseline_latency']
+    on those that were scored.
+
+    Args:
+        connection: SQLAlchemy Connection with an open transaction
+        results: Ping result dictionaries
+        settings: Configuration class (default: the default config)
+    """
+    settings = settings or config['default']
+    scored = []
+    for result in results:
+        result['anomaly_score'] = None
+        if result.get('packets_received') and result.get('avg_latency') is not None:
+            scored.append((result, (result['target'], hour_of_week(result['timestamp']))))
+    if not scored:
+        return
+    keys = {key for _, key in scored}
+
+    states = {}
+    rows = connection.execute(
+        select(latency_baselines.c.target, latency_baselines.c.hour_of_week, latency_baselines.c.mean,
+               latency_baselines.c.variance, latency_baselines.c.samples)
+        .where(latency_baselines.c.target.in_({target for target, _ in keys}),
+               latency_baselines.c.hour_of_week.in_({hour for _, hour in keys}))
+    )
+    for target, hour, mean, variance, samples in rows:
+        if (target, hour) in keys:
+            states[(target, hour)] = (mean, variance, samples)
+    existing = set(states)
+
+    updated_at = {}
+    for result, key in scored:
+        state = states.get(key)
+        result['anomaly_score'] = anomaly_score(state, result['avg_latency'], settings.BASELINE_MIN_SAMPLES)
+        if result['anomaly_score'] is not None:
+            result['baseline_latency'] = state[0]
+        states[key] = ewma_update(state, result['avg_latency'], settings.BASELINE_ALPHA)
+        updated_at[key] = result['timestamp']
+
+    def slot(key):
+        mean, variance, samples = states[key]
+        return {'mean': mean, 'variance': variance, 'samples': samples, 'updated_at': updated_at[key]}
+
+    created = [dict(slot(key), target=key[0], hour_of_week=key[1]) for key in keys - existing]
+    if created:
+        connection.execute(insert(latency_baselines), created)
+    changed = [dict(slot(key), slot_target=key[0], slot_hour=key[1]) for key in keys & existing]
+    if changed:
+        connection.execute(
+            update(latency_baselines)
+            .where(latency_baselines.c.target == bindparam('slot_target'),
+                   latency_baselines.c.hour_of_week == bindparam('slot_hour')),
+            changed
+        )
@@ -0,0 +1,53 @@
+import threading
+import time
+
+
+class TTLCache:
+    """Small thread-safe in-process cache with a fixed time-to-live.
+
+    Used to share expensive query results between concurrent requests. A TTL
+    of zero disables caching entirely, which is what the test configuration
+    uses so every request sees freshly inserted rows.
+    """
+
+    def __init__(self, ttl, maxsize=64):
+        """Create a cache.
+
+        Args:
+            ttl: Seconds an entry stays valid (0 disables the cache)
+            maxsize: Maximum number of entries before the oldest is evicted
+        """
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the cached value for key, or None if missing or expired."""
+        if self.ttl <= 0:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            return value
+
+    def set(self, key, value):
+        """Store a value under key for the configured TTL."""
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            if key not in self._entries and len(self._entries) >= self.maxsize:
+                # Evict the entry that expires first
+                oldest = min(self._entries, key=lambda k: self._entries[k][0])
+                del self._entries[oldest]
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+
+    def clear(self):
+        """Drop every cached entry."""
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,204 @@
+"""
+Compact encoding for per-packet RTT samples.
+
+Storing each test's packets as float pairs costs 16 bytes per sample, which
+dominates disk on long retention. Samples are stored as one blob per result
+instead:
+
+- reply times are turned back into send times (reply time minus RTT),
+  quantized (1 ms by default) and stored as the first time, the first delta
+  and then delta-of-deltas; requests go out at a fixed interval, so these
+  are almost always zero
+- RTTs are quantized to integers (1 us by default, the resolution ping
+  prints), divided by their common factor (ping prints 3 significant
+  digits) and stored as deltas from the previous packet
+
+Every integer is zigzag-encoded and written as a LEB128 varint, so typical
+samples take 2-3 bytes. Encoding and decoding work on whole NumPy arrays.
+
+Blob layout: a version byte followed by varints
+    count, time quantum (us), RTT quantum (us), count time values, count RTT values
+"""
+import numpy as np
+
+FORMAT_VERSION = 1
+
+# Default quantization steps in microseconds
+TIME_QUANTUM_US = 1000
+RTT_QUANTUM_US = 1
+
+# Highest value each varint byte count can hold (7 bits per byte)
+_VARINT_LIMITS = np.array([1 << (7 * k) for k in range(1, 10)], dtype=np.uint64)
+
+
+def _zigzag(values):
+    """Map signed int64 to uint64 so small magnitudes stay small."""
+    return ((values << 1) ^ (values >> 63)).astype(np.uint64)
+
+
+def _unzigzag(values):
+    """Inverse of _zigzag."""
+    return (values >> np.uint64(1)).astype(np.int64) ^ -(values & np.uint64(1)).astype(np.int64)
+
+
+def encode_varints(values):
+    """Encode an array of uint64 as concatenated LEB128 varints.
+
+    Args:
+        values: 1-D array of non-negative integers
+
+    Returns:
+        bytes
+    """
+    values = np.asarray(values, dtype=np.uint64)
+    lengths = 1 + (values[:, None] >= _VARINT_LIMITS).sum(axis=1)
+    starts = np.cumsum(lengths) - lengths
+    out = np.empty(int(lengths.sum()), dtype=np.uint8)
+    for k in range(int(lengths.max(initial=0))):
+        present = lengths > k
+        chunk = (values[present] >> np.uint64(7 * k)) & np.uint64(0x7F)
+        more = (lengths[present] > k + 1).astype(np.uint64) << np.uint64(7)
+        out[starts[present] + k] = chunk | more
+    return out.tobytes()
+
+
+def decode_varints(data):
+    """Decode concatenated LEB128 varints into a uint64 array.
+
+    Args:
+        data: bytes-like object
+
+    Returns:
+        1-D uint64 array
+
+    Raises:
+        ValueError: If the data ends in the middle of a varint
+    """
+    raw = np.frombuffer(data, dtype=np.uint8)
+    if raw.size == 0:
+        return np.empty(0, dtype=np.uint64)
+    if raw[-1] & 0x80:
+        raise ValueError('Truncated varint data')
+    ends = np.flatnonzero(raw < 0x80)
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    positions = np.arange(raw.size) - np.repeat(starts, ends - starts + 1)
+    parts = (raw & 0x7F).astype(np.uint64) << (positions * 7).astype(np.uint64)
+    return np.add.reduceat(parts, starts)
+
+
+def encode_samples(times, rtts, time_quantum=TIME_QUANTUM_US, rtt_quantum=RTT_QUANTUM_US):
+    """Encode one test's reply times and RTTs.
+
+    Args:
+        times: Reply times in seconds since the epoch, one per RTT
+        rtts: Round-trip times in milliseconds
+        time_quantum: Time resolution in microseconds
+        rtt_quantum: RTT resolution in microseconds
+
+    Returns:
+        bytes blob for ping_results.samples
+
+    Raises:
+        ValueError: If times and rtts differ in length
+    """
+    times = np.asarray(times, dtype=np.float64)
+    rtts = np.asarray(rtts, dtype=np.float64)
+    if times.shape != rtts.shape or times.ndim != 1:
+        raise ValueError('times and rtts must be 1-D arrays of the same length')
+
+    ticks = np.rint((times - rtts / 1e3) * (1e6 / time_quantum)).astype(np.int64)
+    time_stream = np.concatenate((ticks[:1], np.diff(ticks)[:1], np.diff(ticks, 2)))
+
+    levels = np.rint(rtts * (1e3 / rtt_quantum)).astype(np.int64)
+    # Coarser steps cost nothing to decode and shrink every delta
+    step = int(np.gcd.reduce(levels)) if levels.size else 1
+    if step > 1:
+        levels //= step
+        rtt_quantum *= step
+    rtt_stream = np.concatenate((levels[:1], np.diff(levels)))
+
+    header = np.array([rtts.size, time_quantum, rtt_quantum], dtype=np.uint64)
+    body = np.concatenate((header, _zigzag(time_stream), _zigzag(rtt_stream)))
+    return bytes([FORMAT_VERSION]) + encode_varints(body)
+
+
+def decode_samples(blob):
+    """Decode a blob from encode_samples().
+
+    Args:
+        blob: bytes from ping_results.samples
+
+    Returns:
+        Tuple of (times, rtts) float64 arrays: reply times in seconds since
+        the epoch and RTTs in milliseconds
+
+    Raises:
+        ValueError: If the blob is malformed or of an unknown version
+    """
+    if not blob or blob[0] != FORMAT_VERSION:
+        raise ValueError('Unknown sample encoding')
+    values = decode_varints(memoryview(blob)[1:])
+    if values.size < 3:
+        raise ValueError('Truncated sample data')
+    count, time_quantum, rtt_quantum = (int(value) for value in values[:3])
+    if values.size != 3 + 2 * count:
+        raise ValueError('Sample count does not match data')
+
+    time_stream = _unzigzag(values[3:3 + count])
+    ticks = np.empty(count, dtype=np.int64)
+    if count:
+        ticks[0] = time_stream[0]
+        ticks[1:] = time_stream[0] + np.cumsum(np.cumsum(time_stream[1:]))
+
+    # Scale up before dividing so printed values like 19.2 come back exactly
+    rtts = np.cumsum(_unzigzag(values[3 + count:])) * rtt_quantum / 1e3
+    return ticks * time_quantum / 1e6 + rtts / 1e3, rtts
+
+
+def decode_rtts(blobs):
+    """Decode the RTTs of many blobs at once.
+
+    The version byte is itself a one-byte varint, so the concatenated blobs
+    decode in a single call; per-blob deltas are then summed with one
+    cumulative sum over the whole batch.
+
+    Args:
+        blobs: Sequence of bytes from encode_samples()
+
+    Returns:
+        Tuple of (rtts, counts): all RTTs in milliseconds concatenated in blob
+        order, and the number of RTTs taken from each blob
+
+    Raises:
+        ValueError: If a blob is malformed or of an unknown version
+    """
+    if any(not blob or blob[0] != FORMAT_VERSION for blob in blobs):
+        raise ValueError('Unknown sample encoding')
+    values = decode_varints(b''.join(blobs))
+
+    counts = np.empty(len(blobs), dtype=np.int64)
+    quanta = np.empty(len(blobs), dtype=np.float64)
+    rtt_starts = np.empty(len(blobs), dtype=np.int64)
+    position = 0
+    for index in range(len(blobs)):
+        if position + 4 > values.size:
+            raise ValueError('Truncated sample data')
+        _, count, _, rtt_quantum = values[position:position + 4].tolist()
+        counts[index] = count
+        quanta[index] = rtt_quantum
+        rtt_starts[index] = position + 4 + count
+        position += 4 + 2 * count
+    if position != values.size:
+        raise ValueError('Sample count does not match data')
+
+    # Gather every blob's RTT deltas, then undo the deltas blob by blob
+    total = int(counts.sum())
+    segment_starts = np.cumsum(counts) - counts
+    indexes = np.arange(total) - np.repeat(segment_starts - rtt_starts, counts)
+    deltas = _unzigzag(values[indexes])
+    levels = np.cumsum(deltas)
+    nonempty = counts > 0
+    before = np.zeros(len(blobs), dtype=np.int64)
+    before[nonempty] = levels[segment_starts[nonempty]] - deltas[segment_starts[nonempty]]
+    levels -= np.repeat(before, counts)
+    return levels * np.repeat(quanta, counts) / 1e3, counts
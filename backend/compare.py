@@ -0,0 +1,137 @@
+"""
+Period-over-period comparison of summary statistics.
+
+The requested window is compared with the same window one day, one week and
+four weeks earlier. Each of the four windows is covered by plan_cover()
+(whole rollup buckets plus raw results at the unaligned edges), and all of
+their rows come back from a single UNION ALL query tagged with the window
+they belong to, so a comparison costs one round trip of a few hundred rows
+however long the window is.
+"""
+from datetime import timedelta
+
+from sqlalchemy import case, literal, select, union_all
+
+from backend.planner import plan_cover
+from backend.schema import ping_results, ping_rollups
+from backend.sketch import merge_sketches, percentiles
+from backend.targets import result_target_filter, rollup_target_filter
+
+# Label and offset of each earlier window
+OFFSETS = (('1d', timedelta(days=1)), ('7d', timedelta(days=7)), ('28d', timedelta(days=28)))
+
+# Statistics given a delta against the earlier windows
+DELTA_METRICS = ('avg_packet_loss', 'max_packet_loss', 'avg_latency', 'avg_jitter',
+                 'min_latency', 'max_latency', 'p50', 'p95', 'p99')
+
+
+def _segment_query(label, segment, targets):
+    """Rows of one planned segment in the common shape, tagged with its window."""
+    if segment.source == 'raw':
+        table = ping_results
+        latency_count = case((table.c.avg_latency.is_(None), 0), else_=1)
+        jitter_count = case((table.c.jitter.is_(None), 0), else_=1)
+        query = select(
+            literal(label).label('period'), literal(1).label('result_count'),
+            table.c.packet_loss.label('packet_loss_sum'), table.c.packet_loss.label('max_packet_loss'),
+            table.c.avg_latency.label('latency_sum'), latency_count.label('latency_count'),
+            table.c.jitter.label('jitter_sum'), jitter_count.label('jitter_count'),
+            table.c.min_latency, table.c.max_latency, table.c.latency_sketch
+        ).where(table.c.timestamp >= segment.start, table.c.timestamp < segment.end)
+        return query.where(result_target_filter(targets)) if targets else query
+
+    table = ping_rollups
+    query = select(
+        literal(label).label('period'), table.c.result_count, table.c.packet_loss_sum, table.c.max_packet_loss,
+        table.c.latency_sum, table.c.latency_count, table.c.jitter_sum, table.c.jitter_count,
+        table.c.min_latency, table.c.max_latency, table.c.latency_sketch
+    ).where(
+        table.c.tier == segment.tier,
+        table.c.bucket_start >= segment.start,
+        table.c.bucket_start < segment.end
+    )
+    return query.where(rollup_target_filter(targets)) if targets else query
+
+
+def _summarize(start, end, rows):
+    """Aggregate one window's rows into ping-stats style statistics."""
+    results = sum(row.result_count for row in rows)
+    latency_count = sum(row.latency_count for row in rows)
+    jitter_count = sum(row.jitter_count for row in rows)
+    minimums = [row.min_latency for row in rows if row.min_latency is not None]
+    maximums = [row.max_latency for row in rows if row.max_latency is not None]
+    losses = [row.max_packet_loss for row in rows if row.max_packet_loss is not None]
+    stats = {
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'results': results,
+        'avg_packet_loss': sum(row.packet_loss_sum for row in rows) / results if results else None,
+        'max_packet_loss': max(losses, default=None),
+        'avg_latency': sum(row.latency_sum or 0 for row in rows) / latency_count if latency_count else None,
+        'avg_jitter': sum(row.jitter_sum or 0 for row in rows) / jitter_count if jitter_count else None,
+        'min_latency': min(minimums, default=None),
+        'max_latency': max(maximums, default=None)
+    }
+    summary = percentiles(merge_sketches(row.latency_sketch for row in rows))
+    stats.update(p50=summary['p50'], p95=summary['p95'], p99=summary['p99'])
+    return stats
+
+
+def _delta(current, previous):
+    """Absolute and relative change of each metric from an earlier window."""
+    deltas = {}
+    for metric in DELTA_METRICS:
+        now, before = current[metric], previous[metric]
+        if now is None or before is None:
+            deltas[metric] = None
+            continue
+        deltas[metric] = {
+            'change': now - before,
+            'percent': 100.0 * (now - before) / before if before else None
+        }
+    return deltas
+
+
+def summarize_windows(connection, windows, targets=None):
+    """Summarize several windows from rollups and raw edges in one query.
+
+    Args:
+        connection: SQLAlchemy Connection
+        windows: List of (label, start, end) tuples
+        targets: Target addresses to include (default: all)
+
+    Returns:
+        Tuple of ({label: statistics}, number of rows read)
+    """
+    selects = [_segment_query(label, segment, targets)
+               for label, window_start, window_end in windows
+               for segment in plan_cover(window_start, window_end)]
+    rows = connection.execute(union_all(*selects)).all() if selects else []
+
+    by_window = {label: [] for label, _, _ in windows}
+    for row in rows:
+        by_window[row.period].append(row)
+    return {label: _summarize(window_start, window_end, by_window[label])
+            for label, window_start, window_end in windows}, len(rows)
+
+
+def compare_windows(connection, start, end, targets=None):
+    """Summarize a window and the same window 1, 7 and 28 days earlier.
+
+    Args:
+        connection: SQLAlchemy Connection
+        start: Start of the current window
+        end: End of the current window
+        targets: Target addresses to include (default: all)
+
+    Returns:
+        Tuple of (current statistics, {label: statistics with 'delta'},
+        number of rows read)
+    """
+    windows = [('current', start, end)] + [(label, start - offset, end - offset) for label, offset in OFFSETS]
+    summaries, rows = summarize_windows(connection, windows, targets)
+
+    current = summaries.pop('current')
+    for stats in summaries.values():
+        stats['delta'] = _delta(current, stats)
+    return current, summaries, rows
@@ -0,0 +1,128 @@
+import gzip
+import mimetypes
+import os
+import re
+
+from flask import request, send_file
+
+# Encodings we look for next to each built asset, in order of preference.
+# The frontend build writes these siblings (app.1a2b3c4d.js.br, .gz) so no
+# compression work happens while serving static files.
+PRECOMPRESSED_ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+# Vue CLI emits content-hashed bundles like js/app.1a2b3c4d.js; these never
+# change once built and can be cached by browsers forever.
+HASHED_ASSET_PATTERN = re.compile(r'\.[0-9a-f]{8,}\.[A-Za-z0-9]+$')
+
+# Response types worth compressing on the fly (API payloads)
+COMPRESSIBLE_MIMETYPES = {'application/json', 'text/plain', 'text/csv', 'application/x-ndjson'}
+
+
+def client_accepts(encoding):
+    """Check whether the current request accepts a given content encoding.
+
+    Args:
+        encoding: Content-coding token such as 'gzip' or 'br'
+
+    Returns:
+        True if the client's Accept-Encoding header allows the encoding
+    """
+    return request.accept_encodings[encoding] > 0
+
+
+def is_hashed_asset(path):
+    """Check whether a static asset path contains a build content hash.
+
+    Args:
+        path: Asset path relative to the frontend build directory
+
+    Returns:
+        True if the filename carries a content hash and is safe to cache forever
+    """
+    return bool(HASHED_ASSET_PATTERN.search(os.path.basename(path)))
+
+
+def send_static_asset(dist_dir, path, max_age):
+    """Serve a file from the frontend build, preferring precompressed siblings.
+
+    Unknown paths fall back to index.html so client-side routing works. The
+    response is streamed through send_file so WSGI servers can hand the file
+    to the kernel (wsgi.file_wrapper / sendfile) or to a front proxy when
+    USE_X_SENDFILE is enabled.
+
+    Args:
+        dist_dir: Absolute path to the frontend build directory
+        path: Requested path relative to the build directory
+        max_age: Cache lifetime in seconds for content-hashed assets
+
+    Returns:
+        Flask response for the asset
+    """
+    dist_dir = os.path.abspath(dist_dir)
+    file_path = os.path.abspath(os.path.join(dist_dir, path))
+
+    # Anything outside the build directory or not a file is an SPA route
+    if not file_path.startswith(dist_dir + os.sep) or not os.path.isfile(file_path):
+        path = 'index.html'
+        file_path = os.path.join(dist_dir, path)
+
+    mimetype = mimetypes.guess_type(file_path)[0] or 'application/octet-stream'
+
+    # Pick the best precompressed sibling the client can decode
+    encoding = None
+    send_path = file_path
+    for candidate, suffix in PRECOMPRESSED_ENCODINGS:
+        if client_accepts(candidate) and os.path.isfile(file_path + suffix):
+            encoding = candidate
+            send_path = file_path + suffix
+            break
+
+    response = send_file(send_path, mimetype=mimetype, conditional=True, etag=True)
+
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+
+    if is_hashed_asset(path):
+        response.headers['Cache-Control'] = f'public, max-age={max_age}, immutable'
+    else:
+        # index.html and unhashed files must be revalidated so new builds show up
+        response.headers['Cache-Control'] = 'no-cache'
+
+    return response
+
+
+def init_compression(app):
+    """Register negotiated gzip compression for dynamic responses.
+
+    Only buffered responses with a compressible mimetype and a body above
+    COMPRESS_MIN_SIZE are compressed. File responses (direct passthrough) and
+    streamed responses are left alone.
+
+    Args:
+        app: Flask application instance with configuration loaded
+    """
+    min_size = app.config.get('COMPRESS_MIN_SIZE', 500)
+    level = app.config.get('COMPRESS_LEVEL', 6)
+
+    @app.after_request
+    def compress_response(response):
+        if (response.direct_passthrough
+                or response.is_streamed
+                or response.status_code < 200
+                or response.status_code in (204, 304)
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+            return response
+
+        response.vary.add('Accept-Encoding')
+        if not client_accepts('gzip'):
+            return response
+
+        data = response.get_data()
+        if len(data) < min_size:
+            return response
+
+        response.set_data(gzip.compress(data, compresslevel=level))
+        response.headers['Content-Encoding'] = 'gzip'
+        return response
@@ -13,20 +13,119 @@ class Config:
     SQLALCHEMY_DATABASE_URI = f'postgresql://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
-    # Apply the schema when using models
+    # Query guardrails for the read API (backend/guardrails.py); 0 disables a limit
+    QUERY_TIMEOUT_MS = int(os.environ.get('QUERY_TIMEOUT_MS', '30000'))  # Statement timeout of GET /api/ requests
+    QUERY_TIMEOUTS = os.environ.get('QUERY_TIMEOUTS', '')  # Per-endpoint overrides: '/api/export=300000,...'
+    QUERY_MAX_ROWS = int(os.environ.get('QUERY_MAX_ROWS', '50000'))  # Raw rows before output is downsampled
+    QUERY_MAX_COST = float(os.environ.get('QUERY_MAX_COST', '1000000'))  # PostgreSQL EXPLAIN cost limit
+    
+    # Connection pool of each engine; pre-ping replaces connections a database restart dropped
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', '5'))  # Connections kept open
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', '10'))  # Extra connections under load
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', '1800'))  # Seconds before a connection is replaced
+    DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT', '30'))  # Seconds to wait for a free connection
+    DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', 'True').lower() == 'true'
+    
+    # Apply the schema when using models, and the pool settings (also used
+    # for the read replica's engine). The statement timeout is set per API
+    # read by backend/guardrails.py, so ingest and migrations are not limited
     SQLALCHEMY_ENGINE_OPTIONS = {
-        "connect_args": {"options": f"-csearch_path={POSTGRES_SCHEMA}"}
+        "connect_args": {"options": f"-csearch_path={POSTGRES_SCHEMA}"},
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_pre_ping": DB_POOL_PRE_PING
     }
     
+    # Optional read replica (backend/replica.py): GET /api/ requests read from
+    # it while ingest writes go to the primary. Reads fall back to the primary
+    # for REPLICA_RETRY_SECONDS whenever the replica cannot be reached
+    READ_REPLICA_URI = os.environ.get('READ_REPLICA_URI', '')
+    REPLICA_RETRY_SECONDS = int(os.environ.get('REPLICA_RETRY_SECONDS', '30'))
+    
     # App configuration
     DEBUG = os.environ.get('DEBUG', 'False').lower() == 'true'
     SECRET_KEY = os.environ.get('SECRET_KEY', 'dev-key-change-in-production')
     
+    # Static asset and response compression configuration
+    FRONTEND_DIST = os.environ.get('FRONTEND_DIST', os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'frontend', 'dist'))
+    STATIC_MAX_AGE = int(os.environ.get('STATIC_MAX_AGE', '31536000'))  # One year for hashed bundles
+    USE_X_SENDFILE = os.environ.get('USE_X_SENDFILE', 'False').lower() == 'true'  # Let a front proxy send files
+    COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', '500'))  # Bytes below which JSON is sent as-is
+    COMPRESS_LEVEL = int(os.environ.get('COMPRESS_LEVEL', '6'))
+    
+    # Seconds a computed /api/dashboard response is shared between requests
+    DASHBOARD_CACHE_SECONDS = int(os.environ.get('DASHBOARD_CACHE_SECONDS', '15'))
+    
+    # Upper bound on points a /api/series request may ask for
+    MAX_SERIES_POINTS = int(os.environ.get('MAX_SERIES_POINTS', '5000'))
+    
+    # Rows fetched per server-side cursor round trip by /api/export
+    EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', '5000'))
+    
+    # Timing instrumentation and the opt-in request profiler
+    SERVER_TIMING = os.environ.get('SERVER_TIMING', 'True').lower() == 'true'  # Add Server-Timing headers
+    TIMING_LOG = os.environ.get('TIMING_LOG', 'False').lower() == 'true'  # Write span timings as JSON log lines
+    PROFILE_REQUESTS = os.environ.get('PROFILE_REQUESTS', 'False').lower() == 'true'
+    PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', '0'))  # Fraction of requests profiled
+    PROFILE_DIR = os.environ.get('PROFILE_DIR', '/tmp/network-eval-profiles')
+    
     # Network test configuration
     TEST_TARGET = os.environ.get('TEST_TARGET', '1.1.1.1')
     TEST_COUNT = int(os.environ.get('TEST_COUNT', '400'))
     TEST_INTERVAL = os.environ.get('TEST_INTERVAL', '60')  # Time between test runs in seconds
     PING_INTERVAL = os.environ.get('PING_INTERVAL', '0.1') # Time between pings in seconds
+    STORE_SAMPLES = os.environ.get('STORE_SAMPLES', 'True').lower() == 'true'  # Keep per-packet RTTs (backend/codec.py)
+    
+    # Adaptive probing: vary the packet rate within the TEST_COUNT x PING_INTERVAL
+    # window, probing harder during trouble and backing off while stable
+    ADAPTIVE_PROBING = os.environ.get('ADAPTIVE_PROBING', 'False').lower() == 'true'
+    ADAPTIVE_MIN_RATE = float(os.environ.get('ADAPTIVE_MIN_RATE', '1'))  # Packets per second
+    ADAPTIVE_MAX_RATE = float(os.environ.get('ADAPTIVE_MAX_RATE', '10'))  # Packets per second
+    ADAPTIVE_LOSS_THRESHOLD = float(os.environ.get('ADAPTIVE_LOSS_THRESHOLD', '0.5'))  # Percent
+    ADAPTIVE_JITTER_THRESHOLD = float(os.environ.get('ADAPTIVE_JITTER_THRESHOLD', '5'))  # Milliseconds
+    ADAPTIVE_LATENCY_SHIFT = float(os.environ.get('ADAPTIVE_LATENCY_SHIFT', '0.5'))  # Fraction of baseline
+    ADAPTIVE_STABLE_RUNS = int(os.environ.get('ADAPTIVE_STABLE_RUNS', '5'))  # Stable tests before backing off
+
+    # Incident detection (backend/incidents.py), applied to every ingested result
+    INCIDENT_LOSS_THRESHOLD = float(os.environ.get('INCIDENT_LOSS_THRESHOLD', '5'))  # Percent
+    INCIDENT_MAJOR_LOSS = float(os.environ.get('INCIDENT_MAJOR_LOSS', '25'))  # Percent
+    INCIDENT_LATENCY_FACTOR = float(os.environ.get('INCIDENT_LATENCY_FACTOR', '2'))  # Multiple of baseline
+    INCIDENT_LATENCY_MIN_MS = float(os.environ.get('INCIDENT_LATENCY_MIN_MS', '10'))  # Milliseconds over baseline
+    INCIDENT_MERGE_SECONDS = int(os.environ.get('INCIDENT_MERGE_SECONDS', '300'))  # Reopen instead of starting anew
+
+    # Per-target, per-hour-of-week latency baselines for anomaly scores (backend/baselines.py)
+    BASELINE_ALPHA = float(os.environ.get('BASELINE_ALPHA', '0.01'))  # Weight of each new result
+    BASELINE_MIN_SAMPLES = int(os.environ.get('BASELINE_MIN_SAMPLES', '30'))  # Results before a slot scores
+
+    # Coordination of redundant probe workers (backend/leases.py): 'auto' uses
+    # advisory locks on PostgreSQL and a lease table elsewhere, 'off' probes
+    # on every worker
+    LEADER_ELECTION = os.environ.get('LEADER_ELECTION', 'auto')  # 'auto', 'advisory', 'lease' or 'off'
+    WORKER_ID = os.environ.get('WORKER_ID', '')  # Name in probe_leases (default: hostname:pid)
+
+    # Remote probe agents (backend/agent.py). The server accepts batches on
+    # /api/ingest only when INGEST_TOKEN is set; agents send it as a bearer token
+    INGEST_TOKEN = os.environ.get('INGEST_TOKEN', '')
+    INGEST_MAX_RESULTS = int(os.environ.get('INGEST_MAX_RESULTS', '5000'))  # Results per batch
+    INGEST_MAX_BYTES = int(os.environ.get('INGEST_MAX_BYTES', str(32 * 1024 * 1024)))  # Decompressed batch size
+    AGENT_SERVER = os.environ.get('AGENT_SERVER', '')  # Base URL of the central web service
+    AGENT_ID = os.environ.get('AGENT_ID', '')  # Site/agent name stored with its results (default: hostname)
+    AGENT_BATCH_SIZE = int(os.environ.get('AGENT_BATCH_SIZE', '500'))  # Results per POST
+    AGENT_FLUSH_SECONDS = float(os.environ.get('AGENT_FLUSH_SECONDS', '60'))  # Longest a result waits to be sent
+    AGENT_BUFFER_SIZE = int(os.environ.get('AGENT_BUFFER_SIZE', '100000'))  # Oldest results dropped beyond this
+
+    # Alert rules evaluated on every ingested result (backend/alerts.py)
+    ALERT_RULES = os.environ.get('ALERT_RULES', '')  # JSON array of rules, or the path of a JSON file
+    ALERT_WEBHOOKS = os.environ.get('ALERT_WEBHOOKS', '')  # Comma-separated URLs for rules without their own
+    ALERT_WEBHOOK_ATTEMPTS = int(os.environ.get('ALERT_WEBHOOK_ATTEMPTS', '5'))  # Tries per delivery
+    ALERT_WEBHOOK_TIMEOUT = float(os.environ.get('ALERT_WEBHOOK_TIMEOUT', '10'))  # Seconds
+
+    # Daily uptime reports (backend/reports.py), materialized nightly by the test container
+    REPORT_TIME = os.environ.get('REPORT_TIME', '00:15')  # HH:MM UTC
+    REPORT_REFRESH_DAYS = int(os.environ.get('REPORT_REFRESH_DAYS', '2'))  # Recent days recomputed each night
 
 class DevelopmentConfig(Config):
     DEBUG = True
@@ -41,6 +140,8 @@ class TestingConfig(Config):
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
     # Remove schema-specific options for SQLite
     SQLALCHEMY_ENGINE_OPTIONS = {}
+    # Always query fresh data in tests
+    DASHBOARD_CACHE_SECONDS = 0
 
 # Configuration dictionary
 config = {
@@ -0,0 +1,210 @@
+"""
+Constant-memory streaming export of ping results as NDJSON or CSV.
+
+Rows are read through a server-side cursor (yield_per / psycopg2 named
+cursor) in fixed-size batches, formatted batch by batch and optionally gzip
+compressed on the fly, so memory use does not grow with the export size.
+"""
+import csv
+import io
+import json
+import zlib
+
+from sqlalchemy import select
+
+from backend.models import db, PingResult
+from backend.targets import result_target_filter
+
+# Columns written to every export, in output order
+EXPORT_COLUMNS = (
+    'id', 'timestamp', 'target', 'packet_loss', 'min_latency', 'max_latency',
+    'avg_latency', 'jitter', 'packets_sent', 'packets_received', 'probe_rate', 'anomaly_score'
+)
+
+
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv'
+}
+
+
+def export_query(start, end, targets=None):
+    """Build the export SELECT for a time range and optional target list."""
+    columns = [getattr(PingResult, name) for name in EXPORT_COLUMNS]
+    query = select(*columns).where(
+        PingResult.timestamp >= start,
+        PingResult.timestamp < end
+    )
+    if targets:
+        query = query.where(result_target_filter(targets))
+    return query.order_by(PingResult.timestamp.asc(), PingResult.id.asc())
+
+
+def iter_batches(start, end, targets=None, batch_size=5000):
+    """Yield lists of result rows using a server-side cursor.
+
+    Runs as a Core statement on the session's connection so rows skip ORM
+    loading entirely; stream_results makes psycopg2 use a named cursor.
+
+    Args:
+        start: Start of the range (naive UTC datetime)
+        end: End of the range (naive UTC datetime)
+        targets: Optional list of targets to include
+        batch_size: Rows fetched per round trip
+
+    Yields:
+        Lists of at most batch_size row tuples in EXPORT_COLUMNS order
+    """
+    connection = db.session.connection().execution_options(
+        stream_results=True, yield_per=batch_size
+    )
+    result = connection.execute(export_query(start, end, targets))
+    try:
+        for partition in result.partitions(batch_size):
+            yield partition
+    finally:
+        result.close()
+
+
+# Row templates for the common case where no value is NULL. Formatting a
+# whole row with one %-operation keeps number formatting in C. Metrics are
+# written with 3 decimals (microsecond precision for latencies), which is
+# both finer than ping reports and much cheaper than shortest-repr floats.
+NDJSON_HEAD = (
+    '{"id":%d,"timestamp":"%s","target":%s,"packet_loss":%.3f,"min_latency":%.3f,'
+    '"max_latency":%.3f,"avg_latency":%.3f,"jitter":%.3f,"packets_sent":%d,"packets_received":%d'
+)
+CSV_HEAD = '%d,%s,%s,%.3f,%.3f,%.3f,%.3f,%.3f,%d,%d'
+
+
+def _row_templates(head, fields, nulls, end):
+    """Row templates keyed by which optional trailing columns are NULL.
+
+    probe_rate is NULL on rows written before it was recorded and
+    anomaly_score while a baseline is warming up, in otherwise complete
+    rows, so each combination gets its own fast template rather than the
+    NULL slow path.
+    """
+    templates = {}
+    for key in range(1 << len(fields)):
+        missing = tuple(bool(key & (1 << i)) for i in range(len(fields)))
+        templates[missing] = head + ''.join(
+            null if is_null else field for field, null, is_null in zip(fields, nulls, missing)) + end
+    return templates
+
+
+NDJSON_TEMPLATES = _row_templates(NDJSON_HEAD, (',"probe_rate":%.3f', ',"anomaly_score":%.3f'),
+                                  (',"probe_rate":null', ',"anomaly_score":null'), '}\n')
+CSV_TEMPLATES = _row_templates(CSV_HEAD, (',%.3f', ',%.3f'), (',', ','), '\n')
+
+
+def _null_template(template):
+    """Variant of a row template that accepts pre-formatted strings."""
+    return template.replace('%.3f', '%s').replace('%d', '%s')
+
+
+def _format_batch(batch, templates, quote, null_value, cache):
+    """Format rows with a template, falling back for rows containing NULLs."""
+    lines = []
+    append = lines.append
+    complete = templates[False, False]
+    unrated = templates[True, False]
+    unscored = templates[False, True]
+    bare = templates[True, True]
+    for row in batch:
+        target = row[2]
+        quoted = cache.get(target)
+        if quoted is None:
+            quoted = cache[target] = quote(target)
+        rate = row[10]
+        score = row[11]
+        if None in row[:10]:
+            # Rare slow path: substitute NULLs before formatting
+            metrics = [null_value(value) for value in row[3:]]
+            append(_null_template(complete) % (row[0], row[1].isoformat(), quoted, *metrics))
+        elif score is None:
+            if rate is None:
+                append(bare % (row[0], row[1].isoformat(), quoted,
+                               row[3], row[4], row[5], row[6], row[7], row[8], row[9]))
+            else:
+                append(unscored % (row[0], row[1].isoformat(), quoted,
+                                   row[3], row[4], row[5], row[6], row[7], row[8], row[9], rate))
+        elif rate is None:
+            append(unrated % (row[0], row[1].isoformat(), quoted,
+                              row[3], row[4], row[5], row[6], row[7], row[8], row[9], score))
+        else:
+            append(complete % (row[0], row[1].isoformat(), quoted,
+                               row[3], row[4], row[5], row[6], row[7], row[8], row[9], rate, score))
+    return ''.join(lines)
+
+
+def _json_value(value):
+    """Format a scalar as a JSON literal for the NULL slow path."""
+    if value is None:
+        return 'null'
+    return '%.3f' % value if isinstance(value, float) else str(value)
+
+
+def _csv_value(value):
+    """Format a scalar as a CSV field for the NULL slow path."""
+    if value is None:
+        return ''
+    return '%.3f' % value if isinstance(value, float) else str(value)
+
+
+def _csv_quote(value):
+    """Quote a CSV field only when it needs it."""
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator='').writerow([value])
+    return buffer.getvalue()
+
+
+def format_ndjson(batch, targets=None):
+    """Format a batch of rows as newline-delimited JSON.
+
+    Target strings are the only values that need escaping. Pass the same
+    targets dict for every batch of an export to memoize them.
+    """
+    return _format_batch(batch, NDJSON_TEMPLATES, json.dumps, _json_value, {} if targets is None else targets)
+
+
+def format_csv(batch, targets=None):
+    """Format a batch of rows as CSV lines (no header); see format_ndjson()."""
+    return _format_batch(batch, CSV_TEMPLATES, _csv_quote, _csv_value, {} if targets is None else targets)
+
+
+def generate_export(start, end, fmt='ndjson', targets=None, compress=False, batch_size=5000):
+    """Stream an export as encoded byte chunks.
+
+    Args:
+        start: Start of the range (naive UTC datetime)
+        end: End of the range (naive UTC datetime)
+        fmt: 'ndjson' or 'csv'
+        targets: Optional list of targets to include
+        compress: Gzip the stream on the fly
+        batch_size: Rows per database fetch and per output chunk
+
+    Yields:
+        bytes chunks of the (optionally gzip-compressed) export
+    """
+    formatter = format_csv if fmt == 'csv' else format_ndjson
+    # Level 1 keeps on-the-fly compression off the critical path; exports are
+    # highly repetitive so it still shrinks them by roughly 10x
+    compressor = zlib.compressobj(1, zlib.DEFLATED, 31) if compress else None
+
+    def encode(text):
+        data = text.encode('utf-8')
+        return compressor.compress(data) if compressor else data
+
+    if fmt == 'csv':
+        yield encode(','.join(EXPORT_COLUMNS) + '\n')
+
+    # Quoted target strings, shared by this export's batches only
+    quoted = {}
+    for batch in iter_batches(start, end, targets, batch_size):
+        chunk = encode(formatter(batch, quoted))
+        if chunk:
+            yield chunk
+
+    if compressor:
+        yield compressor.flush()
@@ -0,0 +1,261 @@
+"""
+Guardrails keeping expensive read requests from taking down the web service.
+
+Three layers, each counted in nes_api_guardrail_hits_total:
+
+- Statement timeouts. On PostgreSQL every GET /api/ request runs
+  SET LOCAL statement_timeout for its transaction, QUERY_TIMEOUT_MS unless
+  the endpoint is listed in QUERY_TIMEOUTS. Writes (/api/ingest) and
+  migrations share the engine but are never limited. SQLite has no
+  statement timeout, so a progress handler interrupts statements past the
+  request's deadline. A cancelled statement answers 503 with an explanation.
+- A row budget. Before loading raw results, the rows in the range are
+  counted on the timestamp index, stopping after QUERY_MAX_ROWS + 1. Above
+  the budget, endpoints that can switch to downsampled rollup output do so
+  instead of loading every row into memory.
+- A cost check. On PostgreSQL the raw query is EXPLAINed first, and plans
+  whose total cost is above QUERY_MAX_COST are rerouted the same way, or
+  refused with 422 where there is nothing cheaper to serve.
+
+Downsampled output is only served where the hourly rollups account for
+every raw result in the range. History written before the rollups were
+built would otherwise come back empty, so such requests are refused with
+422 until the rollups are rebuilt.
+"""
+import json
+import time
+
+from sqlalchemy import func, select
+from sqlalchemy.exc import OperationalError
+
+from backend.metrics import GUARDRAIL_HITS
+from backend.rollups import bucket_start
+from backend.schema import ping_results, ping_rollups
+from backend.targets import result_target_filter, rollup_target_filter
+
+ESTIMATE_TIER = 3600
+
+# SQLite VM instructions between deadline checks
+PROGRESS_INTERVAL = 10000
+
+
+class QueryRejected(Exception):
+    """A request whose query would be too expensive to run."""
+
+    status = 422
+
+
+def parse_timeouts(value):
+    """Parse per-endpoint statement timeouts.
+
+    Args:
+        value: Comma-separated 'endpoint=milliseconds' pairs, e.g.
+               '/api/export=300000,/api/series=5000'
+
+    Returns:
+        Dictionary of endpoint rule to milliseconds
+
+    Raises:
+        ValueError: If a pair is malformed
+    """
+    timeouts = {}
+    for pair in filter(None, (part.strip() for part in (value or '').split(','))):
+        endpoint, _, milliseconds = pair.partition('=')
+        try:
+            timeouts[endpoint.strip()] = int(milliseconds)
+        except ValueError:
+            raise ValueError(f"Invalid statement timeout '{pair}', expected endpoint=milliseconds")
+    return timeouts
+
+
+def count_rows(connection, start, end, targets=None, limit=None):
+    """Count the raw results in a range, stopping early.
+
+    Args:
+        connection: SQLAlchemy Connection
+        start: Start of the range
+        end: End of the range (exclusive)
+        targets: Target addresses to count (default: all)
+        limit: Stop counting after limit + 1 rows (default: count all)
+
+    Returns:
+        int: Number of ping_results rows, at most limit + 1
+    """
+    probe = select(ping_results.c.id).where(ping_results.c.timestamp >= start, ping_results.c.timestamp < end)
+    if targets:
+        probe = probe.where(result_target_filter(targets))
+    if limit is not None:
+        probe = probe.limit(limit + 1)
+    return int(connection.execute(select(func.count()).select_from(probe.subquery())).scalar())
+
+
+def estimate_rows(connection, start, end, targets=None):
+    """Estimate the raw results in a range from the hourly rollups.
+
+    Whole hours overlapping the range are counted, so the estimate can
+    exceed the true count by at most an hour of results at either end.
+    Results written before the rollups were built are not counted.
+
+    Returns:
+        int: Estimated number of ping_results rows
+    """
+    query = select(func.coalesce(func.sum(ping_rollups.c.result_count), 0)).where(
+        ping_rollups.c.tier == ESTIMATE_TIER,
+        ping_rollups.c.bucket_start >= bucket_start(start, ESTIMATE_TIER),
+        ping_rollups.c.bucket_start < end
+    )
+    if targets:
+        query = query.where(rollup_target_filter(targets))
+    return int(connection.execute(query).scalar())
+
+
+def rollups_complete(connection, start, end, targets=None):
+    """Whether the hourly rollups cover the raw results in a range.
+
+    Rollups are kept from the first result they saw onwards, so it is
+    enough that the range's first raw result falls into a rollup bucket;
+    both lookups are single index seeks.
+    """
+    first_result = select(func.min(ping_results.c.timestamp)).where(
+        ping_results.c.timestamp >= start, ping_results.c.timestamp < end)
+    first_bucket = select(func.min(ping_rollups.c.bucket_start)).where(
+        ping_rollups.c.tier == ESTIMATE_TIER,
+        ping_rollups.c.bucket_start >= bucket_start(start, ESTIMATE_TIER),
+        ping_rollups.c.bucket_start < end)
+    if targets:
+        first_result = first_result.where(result_target_filter(targets))
+        first_bucket = first_bucket.where(rollup_target_filter(targets))
+    first_result = connection.execute(first_result).scalar()
+    first_bucket = connection.execute(first_bucket).scalar()
+    if first_result is None:
+        return True
+    return first_bucket is not None and first_bucket <= bucket_start(first_result, ESTIMATE_TIER)
+
+
+def explain_cost(connection, query):
+    """Planner cost of a query, or None where the database does not report one.
+
+    Only PostgreSQL estimates costs; SQLite's EXPLAIN QUERY PLAN does not.
+    """
+    if connection.dialect.name != 'postgresql':
+        return None
+    compiled = query.compile(dialect=connection.dialect, compile_kwargs={'render_postcompile': True})
+    plan = connection.exec_driver_sql(f'EXPLAIN (FORMAT JSON) {compiled.string}', compiled.params).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]['Plan']['Total Cost']
+
+
+def check_query(connection, endpoint, query, start, end, targets=None, settings=None, can_downsample=True,
+                row_budget=True):
+    """Decide whether a raw-results query may run as is.
+
+    Args:
+        connection: SQLAlchemy Connection
+        endpoint: Endpoint rule, for metrics and messages
+        query: The raw-results SELECT the endpoint would run
+        start: Start of the requested range
+        end: End of the requested range
+        targets: Target addresses the query is restricted to
+        settings: Flask config or configuration class with QUERY_MAX_ROWS
+                  and QUERY_MAX_COST (0 disables either check)
+        can_downsample: Whether the endpoint can serve rollups instead
+        row_budget: Whether the row budget applies (streaming endpoints
+                    only need the cost check)
+
+    Returns:
+        None to run the query, or the reason ('row_budget' or 'cost') to
+        serve downsampled output instead
+
+    Raises:
+        QueryRejected: If the query is over a limit and cannot be
+                       downsampled, or the rollups do not cover the range
+    """
+    max_rows, max_cost = _setting(settings, 'QUERY_MAX_ROWS'), _setting(settings, 'QUERY_MAX_COST')
+    reason = message = None
+    if max_rows and row_budget:
+        if count_rows(connection, start, end, targets, limit=max_rows) > max_rows:
+            reason = 'row_budget'
+            message = f"more than the {max_rows:,} row budget of results"
+    if reason is None and max_cost:
+        cost = explain_cost(connection, query)
+        if cost is not None and cost > max_cost:
+            reason = 'cost'
+            message = f"an estimated cost of {cost:,.0f}, more than QUERY_MAX_COST ({max_cost:,})"
+    if reason is None:
+        return None
+
+    if can_downsample and not rollups_complete(connection, start, end, targets):
+        GUARDRAIL_HITS.inc(endpoint=endpoint, guardrail=reason, action='rejected')
+        raise QueryRejected(f"The requested range holds {message}, and results in it are missing from the "
+                            f"rollups downsampled output is built from; narrow the range, or rebuild the "
+                            f"rollups with 'python -m backend.recompute --steps rollups'")
+    GUARDRAIL_HITS.inc(endpoint=endpoint, guardrail=reason, action='downsampled' if can_downsample else 'rejected')
+    if not can_downsample:
+        raise QueryRejected(f"The requested range holds {message}; narrow the range or select fewer targets")
+    return reason
+
+
+def _setting(settings, name):
+    return settings[name] if isinstance(settings, dict) else getattr(settings, name)
+
+
+def is_timeout(error):
+    """Whether a database error is a statement cancelled by its timeout."""
+    original = getattr(error, 'orig', None)
+    # PostgreSQL query_canceled, or the SQLite progress handler's interrupt
+    return getattr(original, 'pgcode', None) == '57014' or 'interrupted' in str(original)
+
+
+def init_guardrails(app, db):
+    """Apply per-request statement timeouts and report cancelled statements.
+
+    Args:
+        app: Flask application instance
+        db: Flask-SQLAlchemy extension the routes query through
+    """
+    from flask import g, jsonify, request
+
+    timeouts = parse_timeouts(app.config.get('QUERY_TIMEOUTS'))
+
+    def endpoint():
+        return request.url_rule.rule if request.url_rule else request.path
+
+    @app.before_request
+    def apply_statement_timeout():
+        if request.method != 'GET' or not request.path.startswith('/api/'):
+            return
+        milliseconds = timeouts.get(endpoint(), app.config['QUERY_TIMEOUT_MS'])
+        connection = db.session.connection()
+        if connection.dialect.name == 'postgresql':
+            # Ends with the request's transaction, so the pooled connection
+            # goes back without a limit (0 turns the timeout off)
+            connection.exec_driver_sql(f'SET LOCAL statement_timeout = {int(milliseconds)}')
+        elif connection.dialect.name == 'sqlite' and milliseconds:
+            deadline = time.monotonic() + milliseconds / 1000
+            raw = connection.connection.dbapi_connection
+            raw.set_progress_handler(lambda: time.monotonic() > deadline, PROGRESS_INTERVAL)
+            g.guardrail_sqlite = raw
+        g.statement_timeout_ms = milliseconds
+
+    @app.teardown_request
+    def clear_statement_timeout(error=None):
+        raw = g.pop('guardrail_sqlite', None)
+        if raw is not None:
+            raw.set_progress_handler(None, 0)
+
+    @app.errorhandler(OperationalError)
+    def statement_timed_out(error):
+        if not is_timeout(error):
+            raise error
+        db.session.rollback()
+        GUARDRAIL_HITS.inc(endpoint=endpoint(), guardrail='timeout', action='cancelled')
+        return jsonify({
+            'status': 'error',
+            'message': f"The query was cancelled after the {g.get('statement_timeout_ms', 0):,} ms statement "
+                       f"timeout; narrow the range or select fewer targets"
+        }), 503
+
+    @app.errorhandler(QueryRejected)
+    def query_rejected(error):
+        return jsonify({'status': 'error', 'message': str(error)}), error.status
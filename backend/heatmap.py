@@ -0,0 +1,118 @@
+"""
+Time-of-day / day-of-week heatmaps from the rollup tiers.
+
+A heatmap folds a period into a 7 x 24 grid of hours (or 7 x 96 quarter
+hours) of the week, so congestion that returns every evening stands out.
+Cells are summed from the 1 hour (or 15 minute) rollup buckets, never from
+raw results: a one-year, 24-slot heatmap of one target reads 8,760 rollup
+rows, and each cell's p95 merges about 52 sketches.
+
+Rows are Monday to Sunday. Buckets are placed by their start in the
+requested time zone (UTC by default), so with a 24-slot grid a zone with a
+half-hour offset shifts each bucket by 30 minutes.
+"""
+from datetime import timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+import numpy as np
+from sqlalchemy import select
+
+from backend.rollups import EPOCH
+from backend.schema import ping_rollups
+from backend.sketch import merge_sketches
+from backend.targets import rollup_target_filter
+
+# Slots per day and the rollup tier that fills them
+RESOLUTIONS = {24: 3600, 96: 900}
+
+WEEKDAYS = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+
+
+def get_zone(name):
+    """Resolve an IANA time zone name.
+
+    Raises:
+        ValueError: If the zone is unknown
+    """
+    if not name or name.upper() == 'UTC':
+        return timezone.utc
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise ValueError(f"Unknown time zone '{name}'")
+
+
+def _slots(starts, slots, zone):
+    """Week slot (weekday * slots + slot of the day) of each UTC bucket start."""
+    seconds = np.array([(start - EPOCH).total_seconds() for start in starts], dtype=np.int64)
+    if zone is not timezone.utc:
+        seconds += np.array([start.replace(tzinfo=timezone.utc).astimezone(zone).utcoffset().total_seconds()
+                             for start in starts], dtype=np.int64)
+    slot_seconds = 86400 // slots
+    # 1970-01-01 was a Thursday, three days after the Monday each row starts on
+    return (seconds // slot_seconds + 3 * slots) % (7 * slots)
+
+
+def _grid(values, slots):
+    """Reshape a per-week-slot array into 7 rows of JSON numbers (None for NaN)."""
+    return [[None if np.isnan(value) else float(value) for value in row] for row in values.reshape(7, slots)]
+
+
+def build_heatmap(connection, start, end, slots=24, targets=None, zone=timezone.utc):
+    """Aggregate rollup buckets into a week grid of latency and loss.
+
+    Args:
+        connection: SQLAlchemy Connection
+        start: Start of the period (buckets starting at or after it are used)
+        end: End of the period (exclusive)
+        slots: Slots per day, a key of RESOLUTIONS
+        targets: Target addresses to include (default: all)
+        zone: tzinfo the grid is laid out in
+
+    Returns:
+        Dictionary of 7 x slots grids: avg_latency, p95_latency, packet_loss
+        and results (the number of results in each cell)
+    """
+    query = select(
+        ping_rollups.c.bucket_start, ping_rollups.c.result_count, ping_rollups.c.packet_loss_sum,
+        ping_rollups.c.latency_sum, ping_rollups.c.latency_count, ping_rollups.c.latency_sketch
+    ).where(
+        ping_rollups.c.tier == RESOLUTIONS[slots],
+        ping_rollups.c.bucket_start >= start,
+        ping_rollups.c.bucket_start < end
+    )
+    if targets:
+        query = query.where(rollup_target_filter(targets))
+    rows = connection.execute(query).all()
+
+    cells = 7 * slots
+    if rows:
+        starts, counts, loss_sums, latency_sums, latency_counts, sketches = zip(*rows)
+        index = _slots(starts, slots, zone)
+    else:
+        counts = loss_sums = latency_sums = latency_counts = sketches = ()
+        index = np.zeros(0, dtype=np.int64)
+
+    results = np.bincount(index, weights=counts, minlength=cells)
+    latency_count = np.bincount(index, weights=latency_counts, minlength=cells)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        packet_loss = np.bincount(index, weights=loss_sums, minlength=cells) / results
+        avg_latency = np.bincount(index, weights=latency_sums, minlength=cells) / latency_count
+
+    by_slot = [[] for _ in range(cells)]
+    for slot, sketch in zip(index.tolist(), sketches):
+        if sketch is not None:
+            by_slot[slot].append(sketch)
+    p95 = np.full(cells, np.nan)
+    for slot, blobs in enumerate(by_slot):
+        sketch = merge_sketches(blobs)
+        if sketch and sketch.count:
+            p95[slot] = sketch.quantile(0.95)
+
+    return {
+        'avg_latency': _grid(avg_latency, slots),
+        'p95_latency': _grid(p95, slots),
+        'packet_loss': _grid(packet_loss, slots),
+        'results': [[int(value) for value in row] for row in results.reshape(7, slots)],
+        'buckets': len(rows)
+    }
@@ -0,0 +1,388 @@
+"""
+Incremental outage, packet loss and latency spike detection.
+
+Every ingested result is classified against the INCIDENT_* thresholds in
+backend/config.py and folded into the open incident of each kind it shows:
+
+- outage: no replies at all
+- loss: packet loss at or above INCIDENT_LOSS_THRESHOLD
+- latency: average latency at least INCIDENT_LATENCY_FACTOR times the
+  target's baseline and INCIDENT_LATENCY_MIN_MS above it; the baseline is
+  the target's average over the previous 24 full hours, read from the
+  hourly rollup tier
+
+An incident groups every target affected while it is open. A target leaves
+it on its first clean result and the incident closes once no target is
+affected. A problem that returns within INCIDENT_MERGE_SECONDS reopens the
+incident instead of starting a new one, so a flapping link is one incident.
+
+Detection reads only the open incidents and, once per target and hour, the
+baseline, so it adds a couple of indexed queries per result; listing
+incidents never touches ping_results.
+"""
+from datetime import timedelta
+
+from sqlalchemy import delete, func, insert, or_, select, update
+
+from backend.config import config
+from backend.rollups import bucket_start
+from backend.schema import incidents, incident_targets, ping_results, ping_rollups
+
+KINDS = ('outage', 'loss', 'latency')
+
+# Ordered from least to most severe
+SEVERITIES = ('minor', 'major', 'critical')
+
+# Rollup tier and window the latency baseline is computed from
+BASELINE_TIER = 3600
+BASELINE_HOURS = 24
+
+# Results with latency needed in the window before spikes are detected
+MIN_BASELINE_RESULTS = 30
+
+INCIDENT_COLUMNS = (
+    'kind', 'severity', 'started_at', 'ended_at', 'last_seen', 'peak', 'baseline', 'result_count'
+)
+
+# Baselines by (database URL, target, hour); a baseline only changes when
+# the hour does
+_baselines = {}
+
+
+def classify(result, baseline, settings):
+    """Return the problems one result shows.
+
+    Args:
+        result: Ping result dictionary
+        baseline: The target's latency baseline in ms, or None if unknown
+        settings: Configuration class with the INCIDENT_* thresholds
+
+    Returns:
+        Dictionary mapping each kind shown to a (severity, value) tuple,
+        value being the packet loss (percent) or average latency (ms)
+    """
+    problems = {}
+    loss = result.get('packet_loss') or 0.0
+    if result.get('packets_received') == 0:
+        problems['outage'] = ('critical', loss)
+    elif loss >= settings.INCIDENT_LOSS_THRESHOLD:
+        problems['loss'] = ('major' if loss >= settings.INCIDENT_MAJOR_LOSS else 'minor', loss)
+
+    latency = result.get('avg_latency')
+    if latency and baseline:
+        threshold = baseline * settings.INCIDENT_LATENCY_FACTOR
+        if latency >= threshold and latency - baseline >= settings.INCIDENT_LATENCY_MIN_MS:
+            problems['latency'] = ('major' if latency >= threshold * 2 else 'minor', latency)
+    return problems
+
+
+def apply_result(candidates, result, problems, merge_seconds, baseline=None):
+    """Fold one classified result into the current incidents.
+
+    Args:
+        candidates: Dictionary mapping kind to its latest incident (open or
+                    recently closed), updated in place; incidents are
+                    dictionaries with the INCIDENT_COLUMNS, 'id' (None until
+                    stored) and 'targets' ({address: {'first_seen',
+                    'last_seen', 'active'}})
+        result: Ping result dictionary
+        problems: Output of classify() for the result
+        merge_seconds: Seconds after closing during which an incident reopens
+        baseline: Latency baseline recorded on new incidents
+
+    Returns:
+        List of the incidents that changed
+    """
+    timestamp = result['timestamp']
+    target = result['target']
+    changed = []
+    for kind in KINDS:
+        incident = candidates.get(kind)
+        if kind in problems:
+            severity, value = problems[kind]
+            if incident is None or (incident['ended_at'] is not None
+                                    and (timestamp - incident['ended_at']).total_seconds() > merge_seconds):
+                incident = candidates[kind] = {
+                    'id': None, 'kind': kind, 'severity': severity, 'started_at': timestamp,
+                    'ended_at': None, 'last_seen': timestamp, 'peak': value,
+                    'baseline': baseline if kind == 'latency' else None, 'result_count': 0, 'targets': {}
+                }
+            incident['ended_at'] = None
+            incident['last_seen'] = max(incident['last_seen'], timestamp)
+            incident['result_count'] += 1
+            incident['peak'] = max(incident['peak'], value)
+            if SEVERITIES.index(severity) > SEVERITIES.index(incident['severity']):
+                incident['severity'] = severity
+            member = incident['targets'].setdefault(target, {'first_seen': timestamp, 'last_seen': timestamp})
+            member['last_seen'] = max(member['last_seen'], timestamp)
+            member['active'] = True
+            changed.append(incident)
+        elif incident is not None and incident['ended_at'] is None:
+            member = incident['targets'].get(target)
+            if member is not None and member['active']:
+                member['active'] = False
+                if not any(other['active'] for other in incident['targets'].values()):
+                    incident['ended_at'] = timestamp
+                changed.append(incident)
+    return changed
+
+
+def latency_baseline(connection, target, timestamp):
+    """Average latency of a target over the 24 full hours before a timestamp.
+
+    Returns:
+        Baseline in ms, or None with fewer than MIN_BASELINE_RESULTS results
+    """
+    hour = bucket_start(timestamp, BASELINE_TIER)
+    key = (str(connection.engine.url), target, hour)
+    if key not in _baselines:
+        if len(_baselines) > 10000:
+            _baselines.clear()
+        total, count = connection.execute(
+            select(func.sum(ping_rollups.c.latency_sum), func.sum(ping_rollups.c.latency_count))
+            .where(ping_rollups.c.tier == BASELINE_TIER,
+                   ping_rollups.c.target == target,
+                   ping_rollups.c.bucket_start >= hour - timedelta(hours=BASELINE_HOURS),
+                   ping_rollups.c.bucket_start < hour)
+        ).one()
+        _baselines[key] = total / count if count and count >= MIN_BASELINE_RESULTS else None
+    return _baselines[key]
+
+
+def _load_candidates(connection, timestamp, merge_seconds):
+    """Load the latest open or recently closed incident of each kind."""
+    rows = connection.execute(
+        select(incidents)
+        .where(or_(incidents.c.ended_at.is_(None),
+                   incidents.c.ended_at >= timestamp - timedelta(seconds=merge_seconds)))
+        .order_by(incidents.c.started_at)
+    ).mappings().all()
+    candidates = {row['kind']: dict(row, targets={}) for row in rows}
+    if candidates:
+        by_id = {incident['id']: incident for incident in candidates.values()}
+        members = connection.execute(
+            select(incident_targets).where(incident_targets.c.incident_id.in_(list(by_id)))
+        ).mappings()
+        for member in members:
+            by_id[member['incident_id']]['targets'][member['target']] = {
+                'first_seen': member['first_seen'], 'last_seen': member['last_seen'], 'active': member['active']
+            }
+    return candidates
+
+
+def _store(connection, changed):
+    """Insert new incidents and write back changed ones with their targets."""
+    for incident in changed:
+        values = {name: incident[name] for name in INCIDENT_COLUMNS}
+        if incident['id'] is None:
+            incident['id'] = connection.execute(insert(incidents).values(**values)).inserted_primary_key[0]
+        else:
+            connection.execute(update(incidents).where(incidents.c.id == incident['id']).values(**values))
+            connection.execute(delete(incident_targets).where(incident_targets.c.incident_id == incident['id']))
+        connection.execute(insert(incident_targets), [
+            dict(member, incident_id=incident['id'], target=target)
+            for target, member in incident['targets'].items()
+        ])
+
+
+def detect_incidents(connection, result, settings=None):
+    """Update incidents with one newly ingested result.
+
+    Runs inside the caller's transaction, after the result's rollups were
+    updated.
+
+    Args:
+        connection: SQLAlchemy Connection with an open transaction
+        result: Ping result dictionary as returned by ping_test()
+        settings: Configuration class (default: the default config)
+
+    Returns:
+        List of the incidents that changed
+    """
+    settings = settings or config['default']
+    baseline = None
+    if result.get('avg_latency'):
+        baseline = latency_baseline(connection, result['target'], result['timestamp'])
+    problems = classify(result, baseline, settings)
+
+    candidates = _load_candidates(connection, result['timestamp'], settings.INCIDENT_MERGE_SECONDS)
+    if not candidates and not problems:
+        return []
+    changed = apply_result(candidates, result, problems, settings.INCIDENT_MERGE_SECONDS, baseline)
+    _store(connection, changed)
+    return changed
+
+
+def detect_incidents_batch(connection, results, settings=None):
+    """Update incidents with many newly ingested results.
+
+    Batched detect_incidents() for bulk ingest: the open incidents are
+    loaded once, the results are folded in order (which should be by
+    timestamp) and each changed incident is written once.
+
+    Args:
+        connection: SQLAlchemy Connection with an open transaction
+        results: Ping result dictionaries, after their rollups were updated
+        settings: Configuration class (default: the default config)
+
+    Returns:
+        List of the incidents that changed
+    """
+    if not results:
+        return []
+    settings = settings or config['default']
+    merge_seconds = settings.INCIDENT_MERGE_SECONDS
+    candidates = _load_candidates(connection, min(result['timestamp'] for result in results), merge_seconds)
+
+    found = {}
+    for result in results:
+        baseline = None
+        if result.get('avg_latency'):
+            baseline = latency_baseline(connection, result['target'], result['timestamp'])
+        problems = classify(result, baseline, settings)
+        if not problems and not candidates:
+            continue
+        for incident in apply_result(candidates, result, problems, merge_seconds, baseline):
+            found[id(incident)] = incident
+
+    changed = sorted(found.values(), key=lambda incident: incident['started_at'])
+    _store(connection, changed)
+    return changed
+
+
+def _baseline_table(connection, start, end):
+    """Hourly latency sums per target for replaying [start, end)."""
+    rows = connection.execute(
+        select(ping_rollups.c.target, ping_rollups.c.bucket_start,
+               ping_rollups.c.latency_sum, ping_rollups.c.latency_count)
+        .where(ping_rollups.c.tier == BASELINE_TIER,
+               ping_rollups.c.bucket_start >= start - timedelta(hours=BASELINE_HOURS),
+               ping_rollups.c.bucket_start < end)
+    )
+    hours = {}
+    for target, hour, total, count in rows:
+        hours[(target, hour)] = (total, count)
+    return hours
+
+
+def rebuild_incidents(connection, start, end, settings=None, batch_size=10000):
+    """Replace the incidents that started in [start, end) by replaying results.
+
+    Used to detect incidents in history ingested before detection existed
+    (or seeded in bulk). Incidents open at `start` are not continued.
+
+    Args:
+        connection: SQLAlchemy Connection with an open transaction
+        start: Range start (naive UTC datetime)
+        end: Range end
+        settings: Configuration class (default: the default config)
+        batch_size: Results fetched per round trip
+
+    Returns:
+        Number of incidents stored
+    """
+    settings = settings or config['default']
+    merge_seconds = settings.INCIDENT_MERGE_SECONDS
+    stale = select(incidents.c.id).where(incidents.c.started_at >= start, incidents.c.started_at < end)
+    connection.execute(delete(incident_targets).where(incident_targets.c.incident_id.in_(stale)))
+    connection.execute(delete(incidents).where(incidents.c.started_at >= start, incidents.c.started_at < end))
+
+    hours = _baseline_table(connection, start, end)
+    baselines = {}
+
+    def baseline(target, timestamp):
+        hour = bucket_start(timestamp, BASELINE_TIER)
+        key = (target, hour)
+        if key not in baselines:
+            total = count = 0
+            for back in range(1, BASELINE_HOURS + 1):
+                total_hour, count_hour = hours.get((target, hour - timedelta(hours=back)), (0.0, 0))
+                total += total_hour
+                count += count_hour
+            baselines[key] = total / count if count >= MIN_BASELINE_RESULTS else None
+        return baselines[key]
+
+    columns = ('timestamp', 'target', 'packet_loss', 'avg_latency', 'packets_received')
+    results = connection.execution_options(yield_per=batch_size).execute(
+        select(*(ping_results.c[name] for name in columns))
+        .where(ping_results.c.timestamp >= start, ping_results.c.timestamp < end)
+        .order_by(ping_results.c.timestamp, ping_results.c.id)
+    ).mappings()
+
+    candidates = {}
+    found = {}
+    for result in results:
+        level = baseline(result['target'], result['timestamp']) if result['avg_latency'] else None
+        problems = classify(result, level, settings)
+        if not problems and not candidates:
+            continue
+        for incident in apply_result(candidates, result, problems, merge_seconds, level):
+            found[id(incident)] = incident
+
+    _store(connection, sorted(found.values(), key=lambda incident: incident['started_at']))
+    return len(found)
+
+
+def list_incidents(connection, start, end, now, kinds=None, targets=None):
+    """Incidents overlapping [start, end], newest first.
+
+    Args:
+        connection: SQLAlchemy Connection
+        start: Range start (naive UTC datetime)
+        end: Range end
+        now: Current UTC time, for the duration of ongoing incidents
+        kinds: Kinds to include (default: all)
+        targets: Only incidents affecting one of these addresses (default: all)
+
+    Returns:
+        List of incident dictionaries ready for JSON, with ISO 8601 times,
+        'ongoing', 'duration_seconds', 'targets' (every affected address)
+        and 'active_targets' (those still affected)
+    """
+    query = (
+        select(incidents.c.id, incidents.c.kind, incidents.c.severity, incidents.c.started_at,
+               incidents.c.ended_at, incidents.c.last_seen, incidents.c.peak, incidents.c.baseline,
+               incidents.c.result_count, incident_targets.c.target, incident_targets.c.active)
+        .join(incident_targets, incident_targets.c.incident_id == incidents.c.id)
+        .where(incidents.c.started_at <= end,
+               or_(incidents.c.ended_at.is_(None), incidents.c.ended_at >= start))
+        .order_by(incidents.c.started_at.desc(), incidents.c.id.desc())
+    )
+    if kinds:
+        query = query.where(incidents.c.kind.in_(kinds))
+    if targets:
+        query = query.where(incidents.c.id.in_(
+            select(incident_targets.c.incident_id).where(incident_targets.c.target.in_(targets))
+        ))
+
+    # One row per affected target; rows of an incident are adjacent
+    listed = []
+    incident = None
+    for (incident_id, kind, severity, started_at, ended_at, last_seen, peak, baseline, result_count,
+         target, active) in connection.execute(query):
+        if incident is None or incident['id'] != incident_id:
+            incident = {
+                'id': incident_id,
+                'kind': kind,
+                'severity': severity,
+                'started_at': started_at.isoformat(),
+                'ended_at': ended_at.isoformat() if ended_at else None,
+                'last_seen': last_seen.isoformat(),
+                'ongoing': ended_at is None,
+                'duration_seconds': ((ended_at or now) - started_at).total_seconds(),
+                'peak': peak,
+                'baseline': baseline,
+                'result_count': result_count,
+                'targets': [],
+                'active_targets': []
+            }
+            listed.append(incident)
+        incident['targets'].append(target)
+        if active:
+            incident['active_targets'].append(target)
+
+    for incident in listed:
+        if len(incident['targets']) > 1:
+            incident['targets'].sort()
+            incident['active_targets'].sort()
+    return listed
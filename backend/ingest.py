@@ -0,0 +1,271 @@
+"""
+Flask-free ingest path for the probe worker.
+
+The test container only needs to run a ping and write one row (plus its
+rollup buckets) per interval, so it uses SQLAlchemy Core against the shared
+tables in backend/schema.py instead of building a Flask app for every test.
+The engine is created once per process and reused across scheduled runs,
+and heavier imports are deferred until they are first needed so the worker
+starts quickly.
+
+Results from remote probe agents (backend/agent.py) arrive in batches
+through /api/ingest and are written by write_batch(), which inserts a batch
+with one statement and folds it into the derived tables bucket by bucket.
+"""
+import time
+from datetime import datetime
+
+from backend.config import config
+from backend.metrics import PROBE_DURATION, DB_WRITE_LATENCY, record_result
+from backend.instrumentation import span, enable_timing_log, install_sql_timing
+
+# Engines by database URI, created on first use
+_engines = {}
+
+# PostgreSQL advisory lock serializing writers of the derived tables
+WRITE_LOCK_KEY = 0x6e657331
+
+# Adaptive probe rate state, kept for the life of the worker process
+_controller = None
+
+
+def get_controller():
+    """Return the process-wide adaptive probe controller."""
+    global _controller
+    if _controller is None:
+        from backend.adaptive import AdaptiveProbeController
+        _controller = AdaptiveProbeController.from_config(config['default'])
+    return _controller
+
+
+def get_engine(uri=None):
+    """Return this process's engine for a database, creating it on first use.
+
+    Args:
+        uri: SQLAlchemy database URI (default: the configured database)
+
+    Returns:
+        sqlalchemy.engine.Engine shared by every ingest in this process
+    """
+    settings = config['default']
+    uri = uri or settings.SQLALCHEMY_DATABASE_URI
+    engine = _engines.get(uri)
+    if engine is None:
+        from sqlalchemy import create_engine
+
+        # The search_path option only applies to PostgreSQL connections; the
+        # web service's statement timeout does not apply to workers and
+        # maintenance jobs, which hold few connections
+        options = {} if uri.startswith('sqlite') else {
+            'connect_args': {'options': f'-csearch_path={settings.POSTGRES_SCHEMA}'},
+            'pool_recycle': settings.DB_POOL_RECYCLE,
+            'pool_pre_ping': settings.DB_POOL_PRE_PING
+        }
+        install_sql_timing()
+        engine = _engines[uri] = create_engine(uri, **options)
+    return engine
+
+
+def _lock_writes(connection):
+    """Serialize writers of rollups, baselines and incidents.
+
+    Their updates are read-modify-writes, so concurrent writers (test
+    containers and agent batches) take a transaction-scoped advisory lock
+    on PostgreSQL. SQLite already allows only one writer at a time.
+    """
+    if connection.dialect.name == 'postgresql':
+        from sqlalchemy import text
+        connection.execute(text('SELECT pg_advisory_xact_lock(:key)'), {'key': WRITE_LOCK_KEY})
+
+
+def _row_values(result):
+    """ping_results column values for a result, encoding samples and sketch."""
+    from backend.schema import ping_results
+
+    values = {column.name: result[column.name] for column in ping_results.columns if column.name in result}
+    if 'samples' not in values and result.get('rtt_times') and config['default'].STORE_SAMPLES:
+        from backend.codec import encode_samples
+        values['samples'] = encode_samples(result['rtt_times'], result['rtt_samples'])
+    if 'latency_sketch' not in values and result.get('rtt_samples'):
+        from backend.sketch import LatencySketch
+        values['latency_sketch'] = LatencySketch.from_values(result['rtt_samples']).to_bytes()
+    return values
+
+
+def write_result(connection, result):
+    """Insert one ping result, fold it into its rollup buckets and incidents.
+
+    The result is first scored against (and folded into) its latency
+    baseline, which sets result['anomaly_score']. Runs inside the caller's
+    transaction so the raw row, the baseline, the rollups and any incident
+    it opens or closes are committed together.
+
+    Args:
+        connection: SQLAlchemy Connection with an open transaction
+        result: Dictionary of ping test results as returned by ping_test()
+    """
+    from backend.schema import ping_results
+    from backend.rollups import update_rollups
+    from backend.incidents import detect_incidents
+    from backend.baselines import score_result
+    from backend.targets import ensure_targets
+
+    _lock_writes(connection)
+    ensure_targets(connection, [result['target']])
+    if 'anomaly_score' not in result:
+        result['anomaly_score'] = score_result(connection, result)
+    values = _row_values(result)
+    connection.execute(ping_results.insert().values(**values))
+    update_rollups(connection, dict(result, latency_sketch=values.get('latency_sketch')))
+    detect_incidents(connection, result)
+
+
+def write_batch(connection, results, agent=None):
+    """Insert many ping results and fold them into the derived tables.
+
+    Batched write_result(): the rows are inserted with one executemany
+    statement, and baselines, rollup buckets and incidents are each loaded
+    and written once per batch rather than once per result. Results are
+    applied in timestamp order. Runs inside the caller's transaction.
+
+    Args:
+        connection: SQLAlchemy Connection with an open transaction
+        results: Ping result dictionaries
+        agent: Remote agent the results came from, stored with each row
+    """
+    from backend.schema import ping_results
+    from backend.rollups import update_rollups_batch
+    from backend.incidents import detect_incidents_batch
+    from backend.baselines import score_batch
+    from backend.targets import ensure_targets
+
+    if not results:
+        return
+    results = sorted(results, key=lambda result: result['timestamp'])
+    _lock_writes(connection)
+    ensure_targets(connection, {result['target'] for result in results})
+    score_batch(connection, [result for result in results if 'anomaly_score' not in result])
+
+    rows = [_row_values(result) for result in results]
+    # executemany needs the same columns in every row
+    columns = set().union(*rows, ('agent',))
+    connection.execute(ping_results.insert(), [
+        {name: row.get(name, agent if name == 'agent' else None) for name in columns} for row in rows
+    ])
+    update_rollups_batch(connection, [
+        dict(result, latency_sketch=row.get('latency_sketch')) for result, row in zip(results, rows)
+    ])
+    detect_incidents_batch(connection, results)
+
+
+def ingest_batch(connection, agent, batch_id, results):
+    """Write a batch from a remote agent unless it was ingested before.
+
+    Agents retry a batch with the same batch_id until it is acknowledged,
+    so recording the id in the batch's own transaction makes retries
+    idempotent.
+
+    Args:
+        connection: SQLAlchemy Connection with an open transaction
+        agent: Agent/site id the batch is tagged with
+        batch_id: Batch id chosen by the agent
+        results: Ping result dictionaries
+
+    Returns:
+        True if the batch was written, False if it had been already
+    """
+    from sqlalchemy import insert, select
+    from backend.schema import ingest_batches
+
+    _lock_writes(connection)
+    seen = connection.execute(
+        select(ingest_batches.c.batch_id).where(ingest_batches.c.batch_id == batch_id)).first()
+    if seen is not None:
+        return False
+    connection.execute(insert(ingest_batches).values(
+        batch_id=batch_id, agent=agent, received_at=datetime.utcnow(), result_count=len(results)))
+    write_batch(connection, results, agent=agent)
+    return True
+
+
+def save_result(engine, result):
+    """Write one ping result in its own transaction and update metrics.
+
+    Args:
+        engine: Engine from get_engine()
+        result: Dictionary of ping test results as returned by ping_test()
+
+    Returns:
+        True if the result was committed, False if the write failed
+    """
+    try:
+        write_started = time.perf_counter()
+        with span('db.write'):
+            with engine.begin() as connection:
+                write_result(connection, result)
+        DB_WRITE_LATENCY.observe(time.perf_counter() - write_started)
+        record_result(result)
+        from backend.alerts import evaluate_results
+        evaluate_results([result])
+        print(f"Saved ping test results to database at {datetime.now()}")
+        return True
+    except Exception as e:
+        print(f"Error saving results: {str(e)}")
+        return False
+
+
+def run_probe(engine=None, target=None, count=None, interval=None):
+    """Run one ping test and store its result.
+
+    Packet count and interval come from, in order: the arguments, the
+    target's registered probe settings, the adaptive controller (when
+    ADAPTIVE_PROBING is on) and finally TEST_COUNT / PING_INTERVAL.
+
+    Args:
+        engine: Engine to write to (default: get_engine())
+        target: Host to ping (default: TEST_TARGET)
+        count: Packets per test (default: the target's packet_count, then TEST_COUNT)
+        interval: Seconds between packets (default: the target's ping_interval,
+                  then PING_INTERVAL)
+
+    Returns:
+        The result dictionary, or None if the test failed or could not be saved
+    """
+    from backend.pingTest import ping_test
+
+    from backend.targets import target_settings
+
+    settings = config['default']
+    target = target or settings.TEST_TARGET
+    engine = engine or get_engine()
+    if settings.TIMING_LOG:
+        enable_timing_log()
+
+    # Per-target probe settings override the configured defaults
+    with engine.connect() as connection:
+        registered = target_settings(connection, target)
+    if registered is not None:
+        count = count or registered.packet_count
+        interval = interval or (str(registered.ping_interval) if registered.ping_interval else None)
+    adaptive = settings.ADAPTIVE_PROBING and not (count or interval)
+    if adaptive:
+        count, interval = get_controller().settings(target)
+    count = count or settings.TEST_COUNT
+    interval = interval or settings.PING_INTERVAL
+
+    probe_started = time.perf_counter()
+    with span('probe', target=target):
+        result = ping_test(target=target, count=count, interval=interval)
+    PROBE_DURATION.observe(time.perf_counter() - probe_started, target=target)
+
+    if not result:
+        print("Test failed or was aborted.")
+        return None
+
+    result['probe_rate'] = 1 / float(interval)
+    if adaptive:
+        get_controller().observe(result)
+
+    if not save_result(engine, result):
+        return None
+    return result
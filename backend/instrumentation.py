@@ -0,0 +1,237 @@
+"""
+Lightweight timing instrumentation for the hot paths.
+
+Code marks phases with span(); SQL statements are timed through SQLAlchemy
+engine events. Every finished span is written as a structured (JSON) log
+line, and spans recorded while handling a web request are summarized in the
+response's Server-Timing header so browser dev tools show where the time
+went (database, ORM hydration, serialization) next to the network timing.
+
+An opt-in profiler can capture a whole request to disk for deeper digging.
+
+The module has no Flask dependency at import time so the probe worker can
+use it too.
+"""
+import json
+import logging
+import os
+import sys
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+
+logger = logging.getLogger('network_eval.timing')
+# Quiet unless explicitly enabled (TIMING_LOG), even if the root logger is verbose
+logger.setLevel(logging.WARNING)
+
+# Spans recorded for the request (or job) currently running in this context
+_current_trace = ContextVar('current_trace', default=None)
+
+
+def enable_timing_log(stream=None):
+    """Write span timings as one JSON object per line.
+
+    Args:
+        stream: Output stream (default: stdout)
+    """
+    if not any(getattr(handler, 'timing_handler', False) for handler in logger.handlers):
+        handler = logging.StreamHandler(stream or sys.stdout)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        handler.timing_handler = True
+        logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+
+def start_trace():
+    """Begin collecting spans for the current request or job.
+
+    Returns:
+        The list spans will be appended to as (name, duration_ms) tuples
+    """
+    trace = []
+    _current_trace.set(trace)
+    return trace
+
+
+def end_trace():
+    """Stop collecting spans and return what was recorded."""
+    trace = _current_trace.get()
+    _current_trace.set(None)
+    return trace or []
+
+
+def _record(name, duration_ms, fields):
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.append((name, duration_ms))
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(json.dumps(dict(fields, span=name, duration_ms=round(duration_ms, 3)), default=str))
+
+
+@contextmanager
+def span(name, **fields):
+    """Time a block of code as a named span.
+
+    Args:
+        name: Span name, e.g. 'query' or 'ping.read'
+        **fields: Extra structured fields written to the log line
+
+    Example:
+        with span('serialize', endpoint='/api/ping-results'):
+            payload = jsonify(...)
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        _record(name, (time.perf_counter() - started) * 1000, fields)
+
+
+def server_timing_header(trace, total_ms=None):
+    """Build a Server-Timing header value from recorded spans.
+
+    Spans with the same name (e.g. several SQL statements) are summed.
+
+    Args:
+        trace: List of (name, duration_ms) tuples
+        total_ms: Optional total handler time to append as 'total'
+
+    Returns:
+        Header value such as 'sql;dur=3.1;desc="2 statements", serialize;dur=0.8'
+    """
+    totals = {}
+    counts = {}
+    for name, duration in trace:
+        totals[name] = totals.get(name, 0.0) + duration
+        counts[name] = counts.get(name, 0) + 1
+
+    entries = []
+    for name, duration in totals.items():
+        metric = name.replace('.', '-').replace(' ', '-')
+        entry = f'{metric};dur={duration:.2f}'
+        if counts[name] > 1:
+            entry += f';desc="{counts[name]} statements"' if name == 'sql' else f';desc="x{counts[name]}"'
+        entries.append(entry)
+    if total_ms is not None:
+        entries.append(f'total;dur={total_ms:.2f}')
+    return ', '.join(entries)
+
+
+_sql_timing_installed = False
+
+
+def install_sql_timing():
+    """Time every SQL statement on every engine as an 'sql' span.
+
+    Safe to call more than once; listeners are only attached the first time.
+    """
+    global _sql_timing_installed
+    if _sql_timing_installed:
+        return
+    _sql_timing_installed = True
+
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    @event.listens_for(Engine, 'before_cursor_execute')
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+    @event.listens_for(Engine, 'after_cursor_execute')
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info['query_started'].pop()
+        duration_ms = (time.perf_counter() - started) * 1000
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.append(('sql', duration_ms))
+        if logger.isEnabledFor(logging.INFO):
+            # Only the first line of the statement keeps log lines readable
+            logger.info(json.dumps({
+                'span': 'sql',
+                'duration_ms': round(duration_ms, 3),
+                'statement': statement.strip().split('\n', 1)[0][:200],
+                'executemany': executemany
+            }))
+
+
+def _start_profiler():
+    """Start a sampling profiler if available, else the deterministic one."""
+    try:
+        from pyinstrument import Profiler
+        profiler = Profiler()
+        profiler.start()
+        return 'pyinstrument', profiler
+    except ImportError:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return 'cprofile', profiler
+
+
+def _stop_profiler(kind, profiler, directory, label):
+    """Stop a profiler and write its output, returning the file path."""
+    os.makedirs(directory, exist_ok=True)
+    stamp = datetime.utcnow().strftime('%Y%m%dT%H%M%S%f')
+    base = os.path.join(directory, f"{stamp}-{label.strip('/').replace('/', '_') or 'root'}")
+    if kind == 'pyinstrument':
+        profiler.stop()
+        path = base + '.html'
+        with open(path, 'w') as f:
+            f.write(profiler.output_html())
+    else:
+        profiler.disable()
+        path = base + '.prof'
+        profiler.dump_stats(path)
+    return path
+
+
+def init_request_instrumentation(app):
+    """Attach request tracing, Server-Timing headers and the opt-in profiler.
+
+    Profiling only happens when PROFILE_REQUESTS is enabled, and then only
+    for requests carrying ?profile=1 or randomly at PROFILE_SAMPLE_RATE.
+    Profiles are written to PROFILE_DIR.
+
+    Args:
+        app: Flask application instance with configuration loaded
+    """
+    import random
+    from flask import g, request
+
+    install_sql_timing()
+    if app.config.get('TIMING_LOG'):
+        enable_timing_log()
+
+    @app.before_request
+    def begin_request_trace():
+        g.trace_started = time.perf_counter()
+        start_trace()
+
+        g.profiler = None
+        if app.config.get('PROFILE_REQUESTS') and (
+                request.args.get('profile') == '1'
+                or random.random() < app.config.get('PROFILE_SAMPLE_RATE', 0.0)):
+            g.profiler = _start_profiler()
+
+    @app.after_request
+    def finish_request_trace(response):
+        started = g.pop('trace_started', None)
+        trace = end_trace()
+        if started is None:
+            return response
+
+        total_ms = (time.perf_counter() - started) * 1000
+        profiler = g.pop('profiler', None)
+        if profiler:
+            path = _stop_profiler(*profiler, app.config['PROFILE_DIR'], request.path)
+            logger.info(json.dumps({'event': 'profile', 'path': request.path, 'file': path}))
+
+        if app.config.get('SERVER_TIMING', True):
+            response.headers['Server-Timing'] = server_timing_header(trace, total_ms)
+        if request.path.startswith('/api/'):
+            _record('request', total_ms, {
+                'method': request.method, 'path': request.path, 'status': response.status_code
+            })
+        return response
@@ -0,0 +1,305 @@
+"""
+Leader election for redundant probe workers.
+
+Two test containers can run side by side for redundancy without doubling
+every measurement. Each target's schedule is divided into slots of
+TEST_INTERVAL seconds (aligned to the epoch) and every slot is probed by
+exactly one worker:
+
+- Leadership: on PostgreSQL the leader holds a session-level advisory lock
+  on a dedicated connection, which the server drops together with the
+  connection if the worker dies. Elsewhere (SQLite) the leader holds an
+  expiring lease row in probe_leases, renewed on every heartbeat, that a
+  standby takes over once it has expired.
+- Slots: the leader claims each slot in probe_leases with a conditional
+  UPDATE before probing it, so a slot is never probed twice, not even
+  while a deposed leader has yet to notice.
+
+Workers heartbeat HEARTBEATS_PER_INTERVAL times per interval and leases
+last LEASE_INTERVALS of an interval, so a standby takes over well within
+one interval of the leader dying. Lease expiry compares the workers'
+clocks, which are assumed to be kept in sync (NTP).
+"""
+import hashlib
+import os
+from abc import ABC, abstractmethod
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert, or_, select, text, update
+from sqlalchemy.exc import DBAPIError, IntegrityError
+
+from backend.schema import probe_leases
+
+HEARTBEATS_PER_INTERVAL = 4
+LEASE_INTERVALS = 0.5
+
+ELECTION_METHODS = ('auto', 'advisory', 'lease', 'off')
+
+
+def default_owner():
+    """Name identifying this worker process in probe_leases."""
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def lock_key(target):
+    """Stable signed 64-bit advisory lock key for a target."""
+    digest = hashlib.blake2b(f'probe:{target}'.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big', signed=True)
+
+
+class Election(ABC):
+    """Leadership of one target's probe schedule.
+
+    Subclasses decide who leads in heartbeat(); claim() then lets only the
+    leader take each schedule slot, once.
+    """
+
+    def __init__(self, engine, target, owner=None):
+        self.engine = engine
+        self.target = target
+        self.owner = owner or default_owner()
+        self.leader = False
+        self._created = False
+
+    def _ensure_row(self):
+        """Create the target's probe_leases row if it does not exist yet."""
+        if self._created:
+            return
+        with self.engine.begin() as connection:
+            exists = connection.execute(
+                select(probe_leases.c.target).where(probe_leases.c.target == self.target)
+            ).first()
+        if exists is None:
+            try:
+                with self.engine.begin() as connection:
+                    connection.execute(insert(probe_leases).values(target=self.target))
+            except IntegrityError:
+                pass  # Another worker created it first
+        self._created = True
+
+    def _claim_conditions(self, now):
+        """Extra WHERE clauses that hold only while this worker leads."""
+        return (probe_leases.c.owner == self.owner,)
+
+    @abstractmethod
+    def heartbeat(self, now=None):
+        """Renew or try to take leadership.
+
+        Returns:
+            True if this worker leads the target's schedule
+        """
+
+    def claim(self, slot, now=None):
+        """Claim a schedule slot for probing.
+
+        Args:
+            slot: Slot number (seconds since the epoch // interval)
+            now: Current naive UTC datetime (default: now)
+
+        Returns:
+            True if this worker leads and the slot was not claimed before
+        """
+        if not self.leader:
+            return False
+        now = now or datetime.utcnow()
+        with self.engine.begin() as connection:
+            claimed = connection.execute(
+                update(probe_leases)
+                .where(probe_leases.c.target == self.target,
+                       or_(probe_leases.c.last_slot.is_(None), probe_leases.c.last_slot < slot),
+                       *self._claim_conditions(now))
+                .values(last_slot=slot, claimed_at=now)
+            ).rowcount
+        return claimed == 1
+
+    @abstractmethod
+    def release(self):
+        """Give up leadership so a standby can take over at once."""
+
+
+class LeaseElection(Election):
+    """Leadership through an expiring lease row in probe_leases."""
+
+    def __init__(self, engine, target, owner=None, lease_seconds=30.0):
+        super().__init__(engine, target, owner)
+        self.lease = timedelta(seconds=lease_seconds)
+
+    def _claim_conditions(self, now):
+        return (probe_leases.c.owner == self.owner, probe_leases.c.expires_at > now)
+
+    def heartbeat(self, now=None):
+        now = now or datetime.utcnow()
+        self._ensure_row()
+        with self.engine.begin() as connection:
+            taken = connection.execute(
+                update(probe_leases)
+                .where(probe_leases.c.target == self.target,
+                       or_(probe_leases.c.owner == self.owner,
+                           probe_leases.c.owner.is_(None),
+                           probe_leases.c.expires_at < now))
+                .values(owner=self.owner, expires_at=now + self.lease)
+            ).rowcount
+        self.leader = taken == 1
+        return self.leader
+
+    def release(self):
+        if self.leader:
+            with self.engine.begin() as connection:
+                connection.execute(
+                    update(probe_leases)
+                    .where(probe_leases.c.target == self.target, probe_leases.c.owner == self.owner)
+                    .values(owner=None, expires_at=None)
+                )
+        self.leader = False
+
+
+class AdvisoryLockElection(Election):
+    """Leadership through a PostgreSQL session-level advisory lock."""
+
+    def __init__(self, engine, target, owner=None):
+        super().__init__(engine, target, owner)
+        self.key = lock_key(target)
+        self.connection = None
+
+    def _disconnect(self):
+        if self.connection is not None:
+            try:
+                self.connection.close()
+            except DBAPIError:
+                pass
+        self.connection = None
+        self.leader = False
+
+    def heartbeat(self, now=None):
+        self._ensure_row()
+        try:
+            if self.connection is None:
+                self.connection = self.engine.connect().execution_options(isolation_level='AUTOCOMMIT')
+            if self.leader:
+                # The lock lasts as long as this session; make sure it is alive
+                self.connection.execute(text('SELECT 1'))
+                return True
+            acquired = self.connection.execute(
+                text('SELECT pg_try_advisory_lock(:key)'), {'key': self.key}).scalar()
+        except DBAPIError:
+            self._disconnect()
+            return False
+        if acquired:
+            # Record the new owner so a deposed leader can no longer claim slots
+            with self.engine.begin() as connection:
+                connection.execute(
+                    update(probe_leases).where(probe_leases.c.target == self.target).values(owner=self.owner))
+        self.leader = bool(acquired)
+        return self.leader
+
+    def release(self):
+        if self.leader and self.connection is not None:
+            try:
+                self.connection.execute(text('SELECT pg_advisory_unlock(:key)'), {'key': self.key})
+            except DBAPIError:
+                pass
+        self._disconnect()
+
+
+def make_election(engine, target, interval, method='auto', owner=None):
+    """Create the election for a target's schedule.
+
+    Args:
+        engine: SQLAlchemy Engine shared by the workers
+        target: Probed host
+        interval: Seconds between scheduled probes
+        method: 'auto' (advisory locks on PostgreSQL, leases elsewhere),
+                'advisory', 'lease' or 'off'
+        owner: Name of this worker (default: hostname:pid)
+
+    Returns:
+        An Election, or None if election is off
+    """
+    if method not in ELECTION_METHODS:
+        raise ValueError(f"Unknown election method {method!r}; expected one of {', '.join(ELECTION_METHODS)}")
+    if method == 'off':
+        return None
+    if method == 'advisory' or (method == 'auto' and engine.dialect.name == 'postgresql'):
+        return AdvisoryLockElection(engine, target, owner)
+    return LeaseElection(engine, target, owner, lease_seconds=interval * LEASE_INTERVALS)
+
+
+class ElectedProbe:
+    """Run a probe for the schedule slots this worker wins.
+
+    Args:
+        election: Election for the probed target
+        interval: Seconds per schedule slot
+        probe: Callable run once per claimed slot
+    """
+
+    def __init__(self, election, interval, probe):
+        self.election = election
+        self.interval = interval
+        self.probe = probe
+        self._running = threading.Lock()
+
+    def heartbeat(self):
+        """Renew leadership, logging when it changes hands."""
+        was_leader = self.election.leader
+        try:
+            leader = self.election.heartbeat()
+        except DBAPIError as e:
+            print(f"Leader election heartbeat failed: {e}")
+            self.election.leader = leader = False
+        if leader != was_leader:
+            role = 'now leads' if leader else 'no longer leads'
+            print(f"Worker {self.election.owner} {role} the schedule for {self.election.target}")
+        return leader
+
+    def run_due(self, now=None):
+        """Probe the current slot if this worker leads and nobody probed it yet.
+
+        Args:
+            now: Current time in seconds since the epoch (default: now)
+
+        Returns:
+            The probed slot, or None
+        """
+        if not self.election.leader or not self._running.acquire(blocking=False):
+            return None
+        try:
+            now = time.time() if now is None else now
+            slot = int(now // self.interval)
+            try:
+                claimed = self.election.claim(slot, datetime.utcfromtimestamp(now))
+            except DBAPIError as e:
+                print(f"Could not claim schedule slot {slot}: {e}")
+                return None
+            if not claimed:
+                return None
+            self.probe()
+            return slot
+        finally:
+            self._running.release()
+
+    def add_jobs(self, scheduler):
+        """Schedule heartbeats and slot checks on an APScheduler scheduler.
+
+        Both run HEARTBEATS_PER_INTERVAL times per interval on a grid aligned
+        to the slots, so the leader probes right at each slot's start and a
+        new leader picks up a slot its predecessor did not get to.
+
+        A probe usually outlasts several ticks. The slot check may therefore
+        overlap itself (the checks that find a probe running return at once)
+        instead of APScheduler skipping them with a warning on every tick.
+        Late ticks are coalesced, and dropped once the next one is due.
+        """
+        tick = self.interval / HEARTBEATS_PER_INTERVAL
+        aligned = datetime.fromtimestamp((time.time() // tick + 1) * tick)
+        self.heartbeat()
+        scheduler.add_job(self.heartbeat, 'interval', seconds=tick, start_date=aligned, id='heartbeat',
+                          coalesce=True, misfire_grace_time=max(1, int(tick)))
+        scheduler.add_job(self.run_due, 'interval', seconds=tick, start_date=aligned, id='probe',
+                          max_instances=HEARTBEATS_PER_INTERVAL + 1, coalesce=True,
+                          misfire_grace_time=max(1, int(tick)))
+        # Probe the current slot right away rather than at the next tick
+        scheduler.add_job(self.run_due, id='initial-probe')
@@ -0,0 +1,317 @@
+"""
+In-process metrics with Prometheus text exposition.
+
+Metrics live in memory and are updated by the code paths that produce them
+(ingest, the probe scheduler and API handlers), so rendering /metrics never
+touches the database. Each process exposes its own registry: the web
+service through its /metrics route and the probe worker through a small
+standalone HTTP listener (see start_metrics_server()).
+
+This module deliberately has no Flask dependency so the probe worker can use
+it without importing the web stack.
+"""
+import bisect
+import threading
+from calendar import timegm
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Bucket boundaries
+RTT_BUCKETS_MS = (1, 2, 5, 10, 15, 20, 30, 50, 75, 100, 150, 250, 500, 1000)
+DURATION_BUCKETS_S = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+def _escape(value):
+    """Escape a label value per the exposition format."""
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """Base class holding one value per label combination."""
+
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_sample(key, value))
+        return lines
+
+    def _render_sample(self, key, value):
+        return [f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}']
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(_Metric):
+    """Monotonically increasing count."""
+
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    """Value that can go up and down (e.g. latest measurement)."""
+
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels))
+
+
+class Histogram(_Metric):
+    """Cumulative histogram with fixed bucket boundaries."""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DURATION_BUCKETS_S):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        self.observe_many((value,), **labels)
+
+    def observe_many(self, values, **labels):
+        """Record several observations under one lock acquisition."""
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # [per-bucket counts (+Inf last), sum, count]
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            counts = state[0]
+            for value in values:
+                counts[bisect.bisect_left(self.buckets, value)] += 1
+                state[1] += value
+                state[2] += 1
+
+    def count(self, **labels):
+        state = self._values.get(self._key(labels))
+        return state[2] if state else 0
+
+    def _render_sample(self, key, state):
+        counts, total, count = state
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += bucket_count
+            labels = _format_labels(self.labelnames, key, ('le', _format_value(float(bound))))
+            lines.append(f'{self.name}_bucket{labels} {cumulative}')
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+        lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+
+class Registry:
+    """Collection of metrics rendered together."""
+
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, *args, **kwargs):
+        return self.register(Counter(*args, **kwargs))
+
+    def gauge(self, *args, **kwargs):
+        return self.register(Gauge(*args, **kwargs))
+
+    def histogram(self, *args, **kwargs):
+        return self.register(Histogram(*args, **kwargs))
+
+    def render(self):
+        """Render every metric in Prometheus text exposition format."""
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+    def clear(self):
+        for metric in self._metrics.values():
+            metric.clear()
+
+
+REGISTRY = Registry()
+
+# Latest measurement per target, updated by ingest
+TARGET_PACKET_LOSS = REGISTRY.gauge(
+    'nes_target_packet_loss_percent', 'Packet loss of the latest test per target', ['target'])
+TARGET_LATENCY = REGISTRY.gauge(
+    'nes_target_latency_milliseconds', 'Latency of the latest test per target', ['target', 'stat'])
+TARGET_JITTER = REGISTRY.gauge(
+    'nes_target_jitter_milliseconds', 'Jitter of the latest test per target', ['target'])
+TARGET_LAST_RESULT = REGISTRY.gauge(
+    'nes_target_last_result_timestamp_seconds', 'Unix time of the latest test per target', ['target'])
+TARGET_PROBE_RATE = REGISTRY.gauge(
+    'nes_target_probe_rate_packets_per_second', 'Packet rate of the latest test per target', ['target'])
+TARGET_ANOMALY_SCORE = REGISTRY.gauge(
+    'nes_target_latency_anomaly_score', 'Latency z-score of the latest test per target against its baseline',
+    ['target'])
+TARGET_SEQUENCE = REGISTRY.gauge(
+    'nes_target_packet_sequence', 'Loss runs, reordered and duplicate replies of the latest test per target',
+    ['target', 'stat'])
+TARGET_RTT = REGISTRY.histogram(
+    'nes_target_rtt_milliseconds', 'Individual ping round-trip times per target', ['target'],
+    buckets=RTT_BUCKETS_MS)
+
+# Service internals
+RESULTS_WRITTEN = REGISTRY.counter(
+    'nes_results_written_total', 'Ping results committed to the database', ['target'])
+PROBE_DURATION = REGISTRY.histogram(
+    'nes_probe_duration_seconds', 'Wall time of one ping test', ['target'])
+SCHEDULER_LAG = REGISTRY.histogram(
+    'nes_scheduler_lag_seconds', 'Delay between scheduled and actual test start')
+DB_WRITE_LATENCY = REGISTRY.histogram(
+    'nes_db_write_seconds', 'Time to write and commit one ingested result')
+API_LATENCY = REGISTRY.histogram(
+    'nes_api_request_seconds', 'API handler latency', ['endpoint', 'method', 'status'])
+API_ROWS = REGISTRY.counter(
+    'nes_api_rows_returned_total', 'Rows returned by API handlers', ['endpoint'])
+ALERT_EVENTS = REGISTRY.counter(
+    'nes_alert_events_total', 'Alert rule firing and resolved events', ['rule', 'status'])
+WEBHOOK_DELIVERIES = REGISTRY.counter(
+    'nes_alert_webhook_deliveries_total', 'Alert webhook deliveries sent or given up', ['outcome'])
+GUARDRAIL_HITS = REGISTRY.counter(
+    'nes_api_guardrail_hits_total', 'Requests downsampled, rejected or cancelled by a query guardrail',
+    ['endpoint', 'guardrail', 'action'])
+REPLICA_READS = REGISTRY.counter(
+    'nes_api_replica_reads_total', 'API reads served by the read replica, or by the primary while it was down',
+    ['source'])
+
+
+def record_result(result):
+    """Update per-target gauges and counters for a committed ping result.
+
+    Args:
+        result: Dictionary of ping test results as returned by ping_test();
+                individual RTTs are read from 'rtt_samples' when present
+    """
+    target = result['target']
+    TARGET_PACKET_LOSS.set(result['packet_loss'], target=target)
+    for stat in ('min', 'avg', 'max'):
+        value = result.get(f'{stat}_latency')
+        if value is not None:
+            TARGET_LATENCY.set(value, target=target, stat=stat)
+    if result.get('jitter') is not None:
+        TARGET_JITTER.set(result['jitter'], target=target)
+    if result.get('probe_rate') is not None:
+        TARGET_PROBE_RATE.set(result['probe_rate'], target=target)
+    if result.get('anomaly_score') is not None:
+        TARGET_ANOMALY_SCORE.set(result['anomaly_score'], target=target)
+    for stat in ('loss_max_run', 'loss_bursts', 'reordered_packets', 'duplicate_packets'):
+        if result.get(stat) is not None:
+            TARGET_SEQUENCE.set(result[stat], target=target, stat=stat)
+    timestamp = result.get('timestamp')
+    if timestamp is not None:
+        TARGET_LAST_RESULT.set(_utc_seconds(timestamp), target=target)
+    samples = result.get('rtt_samples')
+    if samples:
+        TARGET_RTT.observe_many(samples, target=target)
+    RESULTS_WRITTEN.inc(target=target)
+
+
+def _utc_seconds(timestamp):
+    """Unix seconds for a naive UTC datetime."""
+    return timegm(timestamp.utctimetuple()) + timestamp.microsecond / 1e6
+
+
+def metrics_app(environ, start_response):
+    """Minimal WSGI application serving the registry at any path."""
+    body = REGISTRY.render().encode('utf-8')
+    start_response('200 OK', [('Content-Type', CONTENT_TYPE), ('Content-Length', str(len(body)))])
+    return [body]
+
+
+def start_metrics_server(port, host='0.0.0.0'):
+    """Serve this process's metrics on a background HTTP listener.
+
+    Used by the probe worker, which has no web framework of its own.
+
+    Args:
+        port: TCP port to listen on
+        host: Interface to bind
+
+    Returns:
+        The running server (call shutdown() to stop it)
+    """
+    from wsgiref.simple_server import make_server, WSGIRequestHandler
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+    server = make_server(host, port, metrics_app, handler_class=QuietHandler)
+    thread = threading.Thread(target=server.serve_forever, name='metrics-server', daemon=True)
+    thread.start()
+    return server
+
+
+def init_request_metrics(app):
+    """Record latency of every API request handled by a Flask app.
+
+    Args:
+        app: Flask application instance
+    """
+    import time
+    from flask import g, request
+
+    @app.before_request
+    def start_request_timer():
+        g.metrics_started = time.perf_counter()
+
+    @app.after_request
+    def observe_request_latency(response):
+        started = g.pop('metrics_started', None)
+        if started is not None and request.path.startswith('/api/'):
+            endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+            API_LATENCY.observe(
+                time.perf_counter() - started,
+                endpoint=endpoint, method=request.method, status=response.status_code
+            )
+        return response
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Idempotent schema upgrades for existing installs.
+
+db.create_all() creates missing tables but never changes existing ones, so
+columns and indexes added to existing tables are applied here. Every step
+checks the live schema first and can be re-run safely; db-init runs
+upgrade() after creating tables on every start.
+
+Usage:
+    python -m backend.migrate [--database URI] [--batch-size 10000]
+"""
+import argparse
+import os
+import sys
+
+# Add the parent directory to the path so we can import our modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import JSON, LargeBinary, inspect, text
+
+from backend.rollups import backfill_rollups
+from backend.schema import metadata, ping_results
+from backend.targets import register_result_targets
+
+
+def _columns(engine, table):
+    return {column['name'] for column in inspect(engine).get_columns(table)}
+
+
+def _add_column(engine, table, column, definition, log):
+    """Add a column to an existing table unless it is already there."""
+    if column not in _columns(engine, table):
+        log(f"Adding {table}.{column}")
+        with engine.begin() as connection:
+            connection.execute(text(f'ALTER TABLE {table} ADD COLUMN {column} {definition}'))
+
+
+def add_targets(engine, batch_size=10000, log=print):
+    """Add the (target, timestamp) index and register the targets of existing results."""
+    for index in ping_results.indexes:
+        if index.name == 'ix_ping_results_target_time':
+            index.create(engine, checkfirst=True)
+
+    register_result_targets(engine, log=log)
+
+
+def add_probe_rate(engine, batch_size=10000, log=print):
+    """Add ping_results.probe_rate; older rows keep NULL (rate not recorded)."""
+    _add_column(engine, 'ping_results', 'probe_rate', 'FLOAT', log)
+
+
+def add_samples(engine, batch_size=10000, log=print):
+    """Add ping_results.samples (BYTEA on PostgreSQL, BLOB on SQLite)."""
+    _add_column(engine, 'ping_results', 'samples', LargeBinary().compile(dialect=engine.dialect), log)
+
+
+def add_latency_sketches(engine, batch_size=10000, log=print):
+    """Add latency_sketch to ping_results and ping_rollups.
+
+    Existing rows keep NULL and are left out of percentiles.
+    """
+    binary = LargeBinary().compile(dialect=engine.dialect)
+    for table in ('ping_results', 'ping_rollups'):
+        _add_column(engine, table, 'latency_sketch', binary, log)
+
+
+def add_anomaly_score(engine, batch_size=10000, log=print):
+    """Add ping_results.anomaly_score; older rows keep NULL (not scored)."""
+    _add_column(engine, 'ping_results', 'anomaly_score', 'FLOAT', log)
+
+
+def add_sequence_metrics(engine, batch_size=10000, log=print):
+    """Add the icmp_seq loss run, reorder and duplicate columns to ping_results.
+
+    Older rows keep NULL (not recorded).
+    """
+    for name in ('loss_max_run', 'loss_bursts', 'reordered_packets', 'duplicate_packets'):
+        _add_column(engine, 'ping_results', name, 'INTEGER', log)
+    _add_column(engine, 'ping_results', 'loss_burst_histogram', JSON().compile(dialect=engine.dialect), log)
+
+
+def add_agent(engine, batch_size=10000, log=print):
+    """Add ping_results.agent; older rows keep NULL (measured locally)."""
+    _add_column(engine, 'ping_results', 'agent', 'VARCHAR(100)', log)
+
+
+def add_rollup_history(engine, batch_size=10000, log=print):
+    """Roll up results recorded before the rollup tiers were introduced.
+
+    Series, percentiles, comparisons, heatmaps and downsampled responses
+    read the rollups, so without this older history looks empty.
+    """
+    backfill_rollups(engine, log=log)
+
+
+# Applied in order by upgrade()
+MIGRATIONS = (
+    add_targets,
+    add_probe_rate,
+    add_samples,
+    add_latency_sketches,
+    add_anomaly_score,
+    add_sequence_metrics,
+    add_agent,
+    add_rollup_history,
+)
+
+
+def upgrade(engine, batch_size=10000, log=print):
+    """Create missing tables and apply every migration.
+
+    Args:
+        engine: SQLAlchemy Engine for the database to upgrade
+        batch_size: Rows per transaction for data backfills
+        log: Progress callback taking a message string
+    """
+    metadata.create_all(engine)
+    for migration in MIGRATIONS:
+        migration(engine, batch_size=batch_size, log=log)
+
+
+def main():
+    from backend.ingest import get_engine
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database', help='SQLAlchemy URI (default: the configured database)')
+    parser.add_argument('--batch-size', type=int, default=10000)
+    args = parser.parse_args()
+
+    upgrade(get_engine(args.database), batch_size=args.batch_size)
+    print("Database schema is up to date")
+
+
+if __name__ == '__main__':
+    main()
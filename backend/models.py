@@ -1,15 +1,26 @@
 from flask_sqlalchemy import SQLAlchemy
-from datetime import datetime
-from sqlalchemy.schema import MetaData
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.orm import deferred
 from backend.config import config
+from backend.schema import metadata, targets, ping_results, ping_rollups
+from backend.targets import ensure_targets
 
-# Create a MetaData object without a schema initially
-# This allows for flexibility with different database backends
-metadata = MetaData()
+class RoutingSession(Session):
+    """Session that can be pointed at the read replica for one request.
+    
+    backend/replica.py sets info['read_bind'] for API reads; every other
+    session (ingest, migrations, tests) uses the primary as before.
+    """
+    
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self.info.get('read_bind') is not None:
+            return self.info['read_bind']
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
 
-# Initialize SQLAlchemy with the metadata configuration
+# Initialize SQLAlchemy with the shared table metadata (see backend/schema.py)
 # This creates the core database interface used throughout the application
-db = SQLAlchemy(metadata=metadata)
+db = SQLAlchemy(metadata=metadata, session_options={'class_': RoutingSession})
 
 def configure_schema_if_postgres(app):
     """Configure the PostgreSQL schema for database tables.
@@ -27,31 +38,43 @@ def configure_schema_if_postgres(app):
         # This ensures all tables will be created in the specified schema
         db.metadata.schema = config['default'].POSTGRES_SCHEMA
 
+def configure_read_replica(app):
+    """Register READ_REPLICA_URI, if set, as the 'replica' bind.
+    
+    Must be called before db.init_app() so Flask-SQLAlchemy creates the
+    replica's engine with the same SQLALCHEMY_ENGINE_OPTIONS as the primary.
+    
+    Args:
+        app: Flask application instance with configuration loaded
+    """
+    uri = app.config.get('READ_REPLICA_URI')
+    if uri:
+        app.config['SQLALCHEMY_BINDS'] = {**(app.config.get('SQLALCHEMY_BINDS') or {}), 'replica': uri}
+
 class PingResult(db.Model):
     """Database model for storing network ping test results.
     
     This model represents the core data structure of the application,
     storing all network performance metrics collected by ping tests.
     """
-    __tablename__ = 'ping_results'
-    
-    # Primary key and timestamp (indexed for efficient time-based queries)
-    id = db.Column(db.Integer, primary_key=True)
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
-    
-    # Network test parameters
-    target = db.Column(db.String(50), nullable=False)  # IP address or hostname that was pinged
-    
-    # Core network metrics
-    packet_loss = db.Column(db.Float, nullable=False)  # Percentage of packets lost (0-100)
-    min_latency = db.Column(db.Float)  # Minimum round-trip time in milliseconds
-    max_latency = db.Column(db.Float)  # Maximum round-trip time in milliseconds
-    avg_latency = db.Column(db.Float)  # Average round-trip time in milliseconds
-    jitter = db.Column(db.Float)  # Variation in latency (calculated from consecutive packets)
+    # Columns are declared once in backend/schema.py
+    __table__ = ping_results
+    # Encoded samples and sketches are only loaded when accessed, keeping
+    # list queries light
+    samples = deferred(ping_results.c.samples)
+    latency_sketch = deferred(ping_results.c.latency_sketch)
     
-    # Test details
-    packets_sent = db.Column(db.Integer, nullable=False)  # Total number of packets sent
-    packets_received = db.Column(db.Integer, nullable=False)  # Total number of packets received
+    def decode_samples(self):
+        """Return the stored per-packet samples.
+        
+        Returns:
+            Tuple of (times, rtts) NumPy arrays (reply times in seconds since
+            the epoch, RTTs in milliseconds), or None if no samples were stored
+        """
+        if self.samples is None:
+            return None
+        from backend.codec import decode_samples
+        return decode_samples(self.samples)
     
     def to_dict(self):
         """Convert model instance to dictionary for JSON serialization.
@@ -69,5 +92,39 @@ class PingResult(db.Model):
             'avg_latency': self.avg_latency,
             'jitter': self.jitter,
             'packets_sent': self.packets_sent,
-            'packets_received': self.packets_received
-        }
\ No newline at end of file
+            'packets_received': self.packets_received,
+            'probe_rate': self.probe_rate,
+            'anomaly_score': self.anomaly_score
+        }
+
+@event.listens_for(PingResult, 'before_insert')
+def register_target(mapper, connection, result):
+    """Register the target of ORM inserts like the ingest path does."""
+    if result.target:
+        ensure_targets(connection, [result.target])
+
+class Target(db.Model):
+    """Database model for a probed host and its probe settings."""
+    __table__ = targets
+    
+    def to_dict(self):
+        """Convert model instance to dictionary for JSON serialization."""
+        return {
+            'id': self.id,
+            'address': self.address,
+            'label': self.label,
+            'packet_count': self.packet_count,
+            'ping_interval': self.ping_interval,
+            'enabled': self.enabled
+        }
+
+class PingRollup(db.Model):
+    """Database model for pre-aggregated ping results over fixed time buckets.
+    
+    Each row summarizes every ping result for one target inside one bucket of
+    a rollup tier (e.g. 15 minutes, 1 hour, 1 day). Sums and counts are stored
+    instead of averages so buckets can be updated incrementally at ingest and
+    merged exactly at query time.
+    """
+    __table__ = ping_rollups
+    latency_sketch = deferred(ping_rollups.c.latency_sketch)
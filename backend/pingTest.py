@@ -1,8 +1,140 @@
 import subprocess
 import re
 import datetime
+import functools
+import shutil
+import sys
+import time
 from typing import Dict, List, Optional, Union, Tuple
 
+from backend.instrumentation import span
+
+# Loss runs are counted in power-of-two length buckets: 1, 2-3, 4-7, 8-15,
+# 16-31 and 32+ consecutive lost packets
+BURST_BUCKETS = 6
+
+
+class SequenceTracker:
+    """Streaming icmp_seq bookkeeping for one ping test.
+
+    Replies are marked in a bytearray with one byte per sequence number,
+    allocated once for the whole test, so tracking costs no allocation per
+    packet. Reordered and duplicate replies are counted as they arrive;
+    loss runs are read off the bitmap once the test is over.
+    """
+
+    __slots__ = ('count', 'first', 'replied', 'highest', 'reordered', 'duplicates')
+
+    def __init__(self, count: int, first: int = 1):
+        self.count = count
+        self.first = first  # icmp_seq of the first packet (see first_sequence())
+        self.replied = bytearray(first + count)  # Indexed by icmp_seq
+        self.highest = -1
+        self.reordered = 0
+        self.duplicates = 0
+
+    def reply(self, seq: int) -> bool:
+        """Record a reply for a sequence number.
+
+        Returns:
+            False if the sequence number already had a reply (a duplicate
+            that must not be counted as received), True otherwise
+        """
+        if not self.first <= seq < self.first + self.count:
+            return True
+        if self.replied[seq]:
+            self.duplicates += 1
+            return False
+        self.replied[seq] = 1
+        if seq < self.highest:
+            # A later packet's reply arrived first
+            self.reordered += 1
+        else:
+            self.highest = seq
+        return True
+
+    def loss_runs(self) -> Tuple[int, int, List[int]]:
+        """Summarize runs of consecutive lost packets.
+
+        Returns:
+            Tuple of (longest run, number of runs, run length histogram in
+            BURST_BUCKETS power-of-two buckets)
+        """
+        replied = self.replied
+        first = self.first
+        end = first + self.count
+        longest = bursts = 0
+        histogram = [0] * BURST_BUCKETS
+        position = replied.find(0, first, end)
+        while position != -1:
+            stop = replied.find(1, position, end)
+            if stop == -1:
+                stop = end
+            length = stop - position
+            bursts += 1
+            longest = max(longest, length)
+            histogram[min(length.bit_length() - 1, BURST_BUCKETS - 1)] += 1
+            position = replied.find(0, stop, end)
+        return longest, bursts, histogram
+
+
+@functools.lru_cache(maxsize=None)
+def _probe_ping(ping_path: Optional[str]) -> Tuple[bool, Optional[int]]:
+    """Probe the ping at ping_path with one packet to the loopback address.
+
+    Returns:
+        Tuple of (whether -D prints reply timestamps, icmp_seq of the first
+        packet or None if the probe printed no reply)
+    """
+    timestamps = False
+    for options in (["-D"], []):
+        try:
+            probe = subprocess.run([ping_path or "ping", *options, "-c", "1", "-W", "1", "127.0.0.1"],
+                                   capture_output=True, text=True, timeout=5)
+        except Exception:
+            # Whatever stops the probe, tests still run with arrival times
+            return False, None
+        if probe.returncode != 0:
+            # BusyBox rejects -D; probe again without it for the numbering
+            continue
+        if options:
+            timestamps = re.search(r"^\[\d+\.\d+\]", probe.stdout, re.MULTILINE) is not None
+        seq = re.search(r"seq=(\d+)", probe.stdout)
+        return timestamps, int(seq.group(1)) if seq else None
+    return False, None
+
+
+def _bsd_ping() -> bool:
+    """Whether the system ping is the macOS/BSD one."""
+    return sys.platform == "darwin" or "bsd" in sys.platform
+
+
+def timestamps_supported() -> bool:
+    """Whether the system ping can prefix replies with their unix timestamp.
+
+    iputils ping does with -D. BusyBox ping rejects the option, and on macOS
+    and the BSDs -D sets the Don't Fragment bit instead, so it is only
+    passed where a one-packet probe of the loopback address shows it works.
+    The probe runs once per ping binary.
+    """
+    if _bsd_ping():
+        return False
+    return _probe_ping(shutil.which("ping"))[0]
+
+
+def first_sequence() -> int:
+    """icmp_seq of the first packet the system ping sends.
+
+    iputils numbers packets from 1; BusyBox, macOS and the BSDs from 0. Read
+    off the same loopback probe as timestamps_supported(), falling back to
+    the platform's usual numbering if the probe gets no reply.
+    """
+    if _bsd_ping():
+        return 0
+    first = _probe_ping(shutil.which("ping"))[1]
+    return 1 if first is None else first
+
+
 def ping_test(target: str = "1.1.1.1", count: int = 100, interval: str = "0.1") -> Dict[str, Union[float, str, datetime.datetime]]:
     """Run a network ping test to measure connectivity and performance metrics.
     
@@ -26,33 +158,69 @@ def ping_test(target: str = "1.1.1.1", count: int = 100, interval: str = "0.1")
         - jitter: Variation in latency (calculated from consecutive packets)
         - packets_sent: Total packets transmitted
         - packets_received: Total packets successfully received
+        - rtt_samples: Individual round-trip times in milliseconds
+        - rtt_times: Reply time of each RTT sample in seconds since the epoch
+        - loss_max_run: Longest run of consecutive lost packets
+        - loss_bursts: Number of runs of consecutive lost packets
+        - loss_burst_histogram: Runs by length (see BURST_BUCKETS)
+        - reordered_packets: Replies that arrived after a later packet's reply
+        - duplicate_packets: Duplicate replies, which are not counted as received
+        The sequence metrics are None if ping printed no sequence numbers.
     """
     # Construct ping command with appropriate parameters
     # -c: count of pings to send
     # -i: interval between pings
     # -W: timeout for each ping in seconds 
-    command = ["ping", "-c", str(count), "-i", interval, "-W", "1", target]
+    # -D: prefix each reply with its unix timestamp, where ping supports it
+    command = ["ping", "-c", str(count), "-i", interval, "-W", "1"]
+    if timestamps_supported():
+        command.append("-D")
+    command.append(target)
 
     # Initialize data collection variables
     latencies = []  # Store all successful ping times
+    reply_times = []  # Reply timestamps matching latencies
+    sequence = SequenceTracker(count, first_sequence())  # Loss runs, reordering and duplicates by icmp_seq
+    sequenced = True  # False once a reply without a sequence number is seen
 
     # Run ping command and parse output line by line in real-time
     try:
         # Start process with pipe to capture output
-        process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+        with span('ping.spawn', target=target):
+            process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
         
         # Process each line of output as it comes in
-        while True:
-            line = process.stdout.readline()
-            if not line:  # End of output
-                break
-                
-            # Parse successful ping responses by extracting the time value
-            # The regex looks for patterns like "time=23.4 ms"
-            match = re.search(r"time=([\d.]+)\s*ms", line)
-            if match:
-                # Convert the matched time value to float and store it
-                latencies.append(float(match.group(1)))
+        with span('ping.read', target=target, count=count):
+            while True:
+                line = process.stdout.readline()
+                if not line:  # End of output
+                    break
+                    
+                # Duplicate replies repeat a sequence number that was already
+                # counted; including them would make received exceed sent
+                if "(DUP!)" in line:
+                    sequence.duplicates += 1
+                    continue
+                    
+                # Parse successful ping responses by extracting the time value
+                # The regex looks for patterns like "time=23.4 ms"
+                match = re.search(r"time=([\d.]+)\s*ms", line)
+                if match:
+                    # "icmp_seq=12" (iputils, BSD) or "seq=12" (BusyBox)
+                    seq = re.search(r"seq=(\d+)", line)
+                    if seq is None:
+                        sequenced = False
+                    elif not sequence.reply(int(seq.group(1))):
+                        continue
+                    # Convert the matched time value to float and store it
+                    latencies.append(float(match.group(1)))
+                    # Lines are read as they arrive, so the local clock is a
+                    # close stand-in if ping printed no timestamp
+                    stamp = re.match(r"\[(\d+\.\d+)\]", line)
+                    reply_times.append(float(stamp.group(1)) if stamp else time.time())
+            
+            # Reap the process so many probes don't leave zombies behind
+            process.wait()
     except KeyboardInterrupt:
         # Handle user interruption gracefully
         print("\nTest aborted by user")
@@ -87,6 +255,13 @@ def ping_test(target: str = "1.1.1.1", count: int = 100, interval: str = "0.1")
         # No packets received, set all metrics to zero
         min_latency = max_latency = avg_latency = jitter = 0
 
+    # Loss runs tell a few spread-out drops apart from a short outage
+    if sequenced:
+        loss_max_run, loss_bursts, loss_burst_histogram = sequence.loss_runs()
+        reordered_packets, duplicate_packets = sequence.reordered, sequence.duplicates
+    else:
+        loss_max_run = loss_bursts = loss_burst_histogram = reordered_packets = duplicate_packets = None
+
     # Print results
     print(f"\n--- Ping statistics for {target} ---")
     print(f"Packet loss: {packet_loss:.2f}%")
@@ -116,7 +291,19 @@ def ping_test(target: str = "1.1.1.1", count: int = 100, interval: str = "0.1")
         
         # Additional test details
         "packets_sent": total_packets,
-        "packets_received": received_packets
+        "packets_received": received_packets,
+        
+        # Raw per-packet round-trip times and when each reply arrived
+        # (stored encoded in ping_results.samples, see backend/codec.py)
+        "rtt_samples": latencies,
+        "rtt_times": reply_times,
+        
+        # Packet sequence metrics
+        "loss_max_run": loss_max_run,
+        "loss_bursts": loss_bursts,
+        "loss_burst_histogram": loss_burst_histogram,
+        "reordered_packets": reordered_packets,
+        "duplicate_packets": duplicate_packets
     }
 
 if __name__ == "__main__":
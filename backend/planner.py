@@ -0,0 +1,240 @@
+"""
+Query planner for arbitrary time-range requests.
+
+A requested range is split into sub-ranges, each answered from the cheapest
+source that still gives the resolution the caller asked for: whole buckets of
+the coarsest suitable rollup tier in the middle, finer tiers towards the
+edges, and raw ping results only for the unaligned minutes at either end.
+This keeps the number of rows read proportional to the requested point
+count rather than to the width or age of the range.
+"""
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select, union_all
+
+from backend.models import db, PingResult, PingRollup
+from backend.schema import ping_results, ping_rollups
+from backend.rollups import ROLLUP_TIERS, bucket_start, bucket_end
+from backend.targets import result_target_filter, rollup_target_filter
+
+# One planned sub-range; tier is None for raw results
+Segment = namedtuple('Segment', ['source', 'tier', 'start', 'end'])
+
+# Uniform row shape for raw and rollup sources; weight is the number of
+# ping results the row stands for, and latency_weight and jitter_weight the
+# number of those with a latency or jitter (results losing every packet have
+# neither)
+SeriesRow = namedtuple('SeriesRow', [
+    'timestamp', 'weight', 'packet_loss', 'avg_latency', 'jitter', 'min_latency', 'max_latency',
+    'latency_weight', 'jitter_weight'
+])
+
+
+def parse_timestamp(value):
+    """Parse an ISO 8601 timestamp into a naive UTC datetime.
+
+    Args:
+        value: ISO string, with or without offset ('Z' is accepted)
+
+    Returns:
+        datetime: Naive datetime in UTC, matching how timestamps are stored
+
+    Raises:
+        ValueError: If the value is not a valid ISO 8601 timestamp
+    """
+    try:
+        parsed = datetime.fromisoformat(value.strip().replace('Z', '+00:00'))
+    except (AttributeError, ValueError):
+        raise ValueError(f"Invalid timestamp '{value}', expected ISO 8601")
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def parse_time_range(args, now, default_hours=24):
+    """Resolve start/end (or hours) query parameters into a UTC range.
+
+    `start` and `end` take precedence; a missing `end` means now and a
+    missing `start` means `hours` before the end.
+
+    Args:
+        args: Request query parameters (werkzeug MultiDict)
+        now: Current UTC time
+        default_hours: Window size used when neither start nor hours is given
+
+    Returns:
+        Tuple of (start, end) naive UTC datetimes
+
+    Raises:
+        ValueError: If a timestamp is invalid or the range is empty
+    """
+    end = parse_timestamp(args['end']) if args.get('end') else now
+    if args.get('start'):
+        start = parse_timestamp(args['start'])
+    else:
+        hours = args.get('hours', default=default_hours, type=int)
+        start = end - timedelta(hours=hours)
+
+    if start >= end:
+        raise ValueError('Range start must be before its end')
+    return start, end
+
+
+def plan_range(start, end, points, tiers=ROLLUP_TIERS):
+    """Split a range into raw and rollup sub-ranges for the given resolution.
+
+    Only tiers no wider than one output point are considered, so rollups
+    never make the result coarser than requested.
+
+    Args:
+        start: Start of the range (naive UTC datetime)
+        end: End of the range (naive UTC datetime)
+        points: Number of output points the caller wants
+        tiers: Available rollup tiers in seconds
+
+    Returns:
+        List of Segment tuples in time order covering [start, end)
+    """
+    resolution = (end - start).total_seconds() / max(points, 1)
+    usable = [tier for tier in sorted(tiers) if tier <= resolution]
+    return _plan(start, end, usable)
+
+
+def _plan(start, end, tiers):
+    if start >= end:
+        return []
+    if not tiers:
+        return [Segment('raw', None, start, end)]
+
+    tier = tiers[-1]
+    first = bucket_end(start, tier)
+    last = bucket_start(end, tier)
+    if first >= last:
+        # No complete bucket of this tier fits; try a finer one
+        return _plan(start, end, tiers[:-1])
+
+    return (
+        _plan(start, first, tiers[:-1])
+        + [Segment('rollup', tier, first, last)]
+        + _plan(last, end, tiers[:-1])
+    )
+
+
+def plan_cover(start, end, tiers=ROLLUP_TIERS):
+    """Split a range into the fewest raw and rollup sub-ranges.
+
+    Unlike plan_range() there is no output resolution to respect, so the
+    coarsest tiers are used wherever whole buckets fit. Used for summaries
+    over the whole range, such as percentiles.
+
+    Returns:
+        List of Segment tuples in time order covering [start, end)
+    """
+    return _plan(start, end, sorted(tiers))
+
+
+def fetch_segment(segment, targets=None):
+    """Load the rows for one planned segment as SeriesRow tuples.
+
+    Args:
+        segment: Segment produced by plan_range()
+        targets: Optional list of target addresses to include
+
+    Returns:
+        List of SeriesRow in ascending time order
+    """
+    if segment.source == 'raw':
+        rows = db.session.query(
+            PingResult.timestamp,
+            PingResult.packet_loss,
+            PingResult.avg_latency,
+            PingResult.jitter,
+            PingResult.min_latency,
+            PingResult.max_latency
+        ).filter(
+            PingResult.timestamp >= segment.start,
+            PingResult.timestamp < segment.end
+        )
+        if targets:
+            rows = rows.filter(result_target_filter(targets))
+        rows = rows.order_by(PingResult.timestamp.asc())
+        return [SeriesRow(row.timestamp, 1, row.packet_loss, row.avg_latency, row.jitter,
+                          row.min_latency, row.max_latency, 1, 1) for row in rows]
+
+    rows = PingRollup.query.filter(
+        PingRollup.tier == segment.tier,
+        PingRollup.bucket_start >= segment.start,
+        PingRollup.bucket_start < segment.end
+    )
+    if targets:
+        rows = rows.filter(rollup_target_filter(targets))
+    rows = rows.order_by(PingRollup.bucket_start.asc())
+
+    # Rollup rows are placed at the middle of their bucket
+    half = timedelta(seconds=segment.tier / 2)
+    return [SeriesRow(
+        rollup.bucket_start + half,
+        rollup.result_count,
+        rollup.packet_loss_sum / rollup.result_count,
+        rollup.latency_sum / rollup.latency_count if rollup.latency_count else None,
+        rollup.jitter_sum / rollup.jitter_count if rollup.jitter_count else None,
+        rollup.min_latency,
+        rollup.max_latency,
+        rollup.latency_count,
+        rollup.jitter_count
+    ) for rollup in rows if rollup.result_count]
+
+
+def execute_plan(segments, targets=None):
+    """Fetch every segment of a plan and concatenate the rows in time order."""
+    rows = []
+    for segment in segments:
+        rows.extend(fetch_segment(segment, targets))
+    return rows
+
+
+def fetch_sketches(segments, targets=None):
+    """Load the serialized latency sketches covering a plan.
+
+    Args:
+        segments: Segments from plan_cover() or plan_range()
+        targets: Optional list of target addresses to include
+
+    Returns:
+        List of sketch blobs (rows without a sketch are skipped)
+    """
+    # One UNION ALL round trip instead of a query per segment
+    selects = []
+    for segment in segments:
+        if segment.source == 'raw':
+            query = select(ping_results.c.latency_sketch).where(
+                ping_results.c.timestamp >= segment.start,
+                ping_results.c.timestamp < segment.end,
+                ping_results.c.latency_sketch.isnot(None)
+            )
+            if targets:
+                query = query.where(result_target_filter(targets))
+        else:
+            query = select(ping_rollups.c.latency_sketch).where(
+                ping_rollups.c.tier == segment.tier,
+                ping_rollups.c.bucket_start >= segment.start,
+                ping_rollups.c.bucket_start < segment.end,
+                ping_rollups.c.latency_sketch.isnot(None)
+            )
+            if targets:
+                query = query.where(rollup_target_filter(targets))
+        selects.append(query)
+    if not selects:
+        return []
+    return db.session.execute(union_all(*selects)).scalars().all()
+
+
+def describe_plan(segments):
+    """Serialize a plan for API responses."""
+    return [{
+        'source': segment.source,
+        'tier': segment.tier,
+        'start': segment.start.isoformat(),
+        'end': segment.end.isoformat()
+    } for segment in segments]
@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""
+Recompute derived data for stored history.
+
+When the way per-result statistics or rollups are computed changes, rows
+already in the database keep the old values. This reprocesses a time range:
+
+- results: packets_received, packet_loss, min/avg/max latency, jitter and
+  the latency sketch of every result with stored samples (backend/codec.py)
+- rollups: every rollup tier, rebuilt from the (recomputed) results
+- incidents: replayed from the results once every chunk is written (see
+  backend/incidents.py); a single ordered pass, so it runs in the main process
+
+The range is split into chunks aligned to the coarsest rollup tier. Worker
+processes read and compute chunks in parallel with NumPy; the main process
+writes each chunk in bulk in a single transaction, so there is only ever one
+writer, and records it in a checkpoint file. An interrupted run continues
+where it stopped with --resume.
+
+Usage:
+    python -m backend.recompute [--start ISO] [--end ISO] [--steps results rollups incidents]
+                                [--workers N] [--chunk-days 1] [--resume]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime, timedelta, timezone
+
+# Add the parent directory to the path so we can import our modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from sqlalchemy import bindparam, func, select, update
+
+from backend.codec import decode_rtts
+from backend.incidents import rebuild_incidents
+from backend.rollups import ROLLUP_SOURCE_COLUMNS, ROLLUP_TIERS, aggregate_rollups, bucket_start, bucket_end, replace_rollups
+from backend.schema import ping_results
+from backend.sketch import LatencySketch
+
+STEPS = ('results', 'rollups', 'incidents')
+
+# Steps computed chunk by chunk in the worker processes
+CHUNK_STEPS = ('results', 'rollups')
+
+# Columns rewritten by the results step
+RESULT_COLUMNS = (
+    'packets_received', 'packet_loss', 'min_latency', 'max_latency', 'avg_latency', 'jitter', 'latency_sketch'
+)
+
+DEFAULT_CHECKPOINT = 'recompute-checkpoint.json'
+
+
+def result_statistics(blobs, packets_sent):
+    """Per-result statistics from encoded samples, computed for a whole batch.
+
+    Matches how ping_test() summarizes a test: jitter is the mean absolute
+    difference between consecutive RTTs, and tests without replies report 0
+    for every latency metric.
+
+    Args:
+        blobs: Encoded samples, one per result
+        packets_sent: Packets sent by each result
+
+    Returns:
+        Dictionary mapping each RESULT_COLUMNS name to a list with one value
+        per result
+    """
+    rtts, counts = decode_rtts(blobs)
+    sent = np.asarray(packets_sent, dtype=np.int64)
+    size = len(blobs)
+    starts = np.cumsum(counts) - counts
+    replied = counts > 0
+
+    minimum = np.zeros(size)
+    maximum = np.zeros(size)
+    average = np.zeros(size)
+    jitter = np.zeros(size)
+    if rtts.size:
+        first = starts[replied]
+        minimum[replied] = np.minimum.reduceat(rtts, first)
+        maximum[replied] = np.maximum.reduceat(rtts, first)
+        average[replied] = np.add.reduceat(rtts, first) / counts[replied]
+        # Summing steps between a test's first and last packet never crosses
+        # into the neighbouring test
+        running = np.concatenate(([0.0], np.cumsum(np.abs(np.diff(rtts)))))
+        several = counts > 1
+        ends = starts + counts - 1
+        jitter[several] = (running[ends[several]] - running[starts[several]]) / (counts[several] - 1)
+
+    loss = np.where(sent > 0, (sent - counts) / np.maximum(sent, 1) * 100, 0.0)
+    sketches = [
+        LatencySketch.from_values(rtts[start:start + count]).to_bytes() if count else None
+        for start, count in zip(starts.tolist(), counts.tolist())
+    ]
+    return {
+        'packets_received': counts.tolist(),
+        'packet_loss': loss.tolist(),
+        'min_latency': minimum.tolist(),
+        'max_latency': maximum.tolist(),
+        'avg_latency': average.tolist(),
+        'jitter': jitter.tolist(),
+        'latency_sketch': sketches
+    }
+
+
+def plan_chunks(start, end, chunk_days=1):
+    """Split [start, end) into chunks aligned to the coarsest rollup tier.
+
+    Returns:
+        List of (chunk_start, chunk_end) tuples covering whole buckets
+    """
+    coarsest = max(ROLLUP_TIERS)
+    start = bucket_start(start, coarsest)
+    end = bucket_end(end, coarsest)
+    step = timedelta(days=chunk_days)
+    chunks = []
+    while start < end:
+        chunks.append((start, min(start + step, end)))
+        start += step
+    return chunks
+
+
+def compute_chunk(uri, start, end, steps=STEPS):
+    """Read one chunk and compute its new derived data (runs in a worker).
+
+    Args:
+        uri: Database URI
+        start: Chunk start (aligned to the coarsest rollup tier)
+        end: Chunk end
+        steps: Steps to run, from STEPS
+
+    Returns:
+        Dictionary with the chunk bounds, 'rows' read, 'updates' for
+        ping_results and rollup 'buckets' (None when rollups are skipped)
+    """
+    from backend.ingest import get_engine
+
+    names = ('id', 'samples') + ROLLUP_SOURCE_COLUMNS
+    with get_engine(uri).connect() as connection:
+        rows = [dict(row) for row in connection.execute(
+            select(*(ping_results.c[name] for name in names))
+            .where(ping_results.c.timestamp >= start, ping_results.c.timestamp < end)
+            .order_by(ping_results.c.timestamp, ping_results.c.id)
+        ).mappings()]
+
+    updates = []
+    if 'results' in steps:
+        sampled = [row for row in rows if row['samples'] is not None]
+        if sampled:
+            stats = result_statistics([row['samples'] for row in sampled],
+                                      [row['packets_sent'] for row in sampled])
+            for index, row in enumerate(sampled):
+                values = {name: stats[name][index] for name in RESULT_COLUMNS}
+                row.update(values)
+                updates.append(dict(values, _id=row['id']))
+
+    buckets = aggregate_rollups(rows) if 'rollups' in steps else None
+    return {'start': start, 'end': end, 'rows': len(rows), 'updates': updates, 'buckets': buckets}
+
+
+def write_chunk(engine, output):
+    """Write one computed chunk in a single transaction."""
+    with engine.begin() as connection:
+        if output['updates']:
+            connection.execute(
+                update(ping_results).where(ping_results.c.id == bindparam('_id')),
+                output['updates']
+            )
+        if output['buckets'] is not None:
+            replace_rollups(connection, output['start'], output['end'], output['buckets'])
+
+
+def _load_checkpoint(path, run, resume):
+    """Return the set of finished chunk starts for this run."""
+    if not os.path.exists(path):
+        return set()
+    if not resume:
+        raise SystemExit(f"Checkpoint {path} exists: pass --resume to continue it or delete it")
+    with open(path) as handle:
+        state = json.load(handle)
+    if state['run'] != run:
+        raise SystemExit(f"Checkpoint {path} belongs to a different run: {state['run']}")
+    return set(state['done'])
+
+
+def _save_checkpoint(path, run, done):
+    temporary = path + '.tmp'
+    with open(temporary, 'w') as handle:
+        json.dump({'run': run, 'done': sorted(done)}, handle)
+    os.replace(temporary, path)
+
+
+def recompute(uri, start, end, steps=STEPS, workers=None, chunk_days=1,
+              checkpoint=DEFAULT_CHECKPOINT, resume=False, log=print):
+    """Recompute derived data for [start, end).
+
+    Args:
+        uri: Database URI
+        start: Start of the range (naive UTC datetime)
+        end: End of the range (naive UTC datetime)
+        steps: Steps to run, from STEPS
+        workers: Worker processes (default: one per CPU; 1 runs in-process)
+        chunk_days: Days per chunk
+        checkpoint: Path of the checkpoint file, or None to disable it
+        resume: Continue the run recorded in an existing checkpoint
+        log: Progress callback taking a message string
+
+    Returns:
+        Dictionary with 'chunks', 'rows', 'updated', 'seconds' and 'rows_per_sec'
+        (plus 'incidents' found when that step runs)
+    """
+    from backend.ingest import get_engine
+
+    engine = get_engine(uri)
+    workers = workers or os.cpu_count() or 1
+    chunks = plan_chunks(start, end, chunk_days)
+    run = {'start': chunks[0][0].isoformat() if chunks else None,
+           'end': chunks[-1][1].isoformat() if chunks else None,
+           'steps': sorted(steps), 'chunk_days': chunk_days}
+    done = _load_checkpoint(checkpoint, run, resume) if checkpoint else set()
+    pending = [chunk for chunk in chunks if chunk[0].isoformat() not in done]
+    if not set(steps) & set(CHUNK_STEPS):
+        pending = []
+    if done:
+        log(f"Resuming: {len(done)} of {len(chunks)} chunks already done")
+
+    totals = {'chunks': 0, 'rows': 0, 'updated': 0}
+    began = time.perf_counter()
+
+    def finish(output):
+        write_chunk(engine, output)
+        done.add(output['start'].isoformat())
+        if checkpoint:
+            _save_checkpoint(checkpoint, run, done)
+        totals['chunks'] += 1
+        totals['rows'] += output['rows']
+        totals['updated'] += len(output['updates'])
+        elapsed = time.perf_counter() - began
+        log(f"{len(done)}/{len(chunks)} chunks, {totals['rows']:,} rows "
+            f"({totals['rows'] / elapsed:,.0f} rows/sec)")
+
+    if workers == 1:
+        for chunk_start, chunk_end in pending:
+            finish(compute_chunk(uri, chunk_start, chunk_end, steps))
+    else:
+        # Spawned workers open their own engines instead of inheriting the
+        # parent's pooled connections
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            queue = iter(pending)
+            running = set()
+            try:
+                while True:
+                    # Keep every worker busy without holding every chunk in memory
+                    while len(running) < workers * 2:
+                        chunk = next(queue, None)
+                        if chunk is None:
+                            break
+                        running.add(pool.submit(compute_chunk, uri, chunk[0], chunk[1], steps))
+                    if not running:
+                        break
+                    finished, running = wait(running, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        finish(future.result())
+            except BaseException:
+                pool.shutdown(wait=False, cancel_futures=True)
+                raise
+
+    if 'incidents' in steps and chunks:
+        log("Replaying incidents")
+        with engine.begin() as connection:
+            totals['incidents'] = rebuild_incidents(connection, chunks[0][0], chunks[-1][1])
+
+    if checkpoint and os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    seconds = time.perf_counter() - began
+    totals.update(seconds=seconds, rows_per_sec=totals['rows'] / seconds if seconds else 0.0)
+    return totals
+
+
+def _timestamp(value):
+    """Parse an ISO 8601 argument into a naive UTC datetime."""
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def main():
+    from backend.ingest import get_engine
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database', help='SQLAlchemy URI (default: the configured database)')
+    parser.add_argument('--start', type=_timestamp, help='ISO 8601 start (default: oldest result)')
+    parser.add_argument('--end', type=_timestamp, help='ISO 8601 end (default: newest result)')
+    parser.add_argument('--steps', nargs='+', choices=STEPS, default=list(STEPS))
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Worker processes (default: one per CPU)')
+    parser.add_argument('--chunk-days', type=int, default=1)
+    parser.add_argument('--checkpoint', default=DEFAULT_CHECKPOINT)
+    parser.add_argument('--resume', action='store_true', help='Continue an interrupted run')
+    args = parser.parse_args()
+
+    engine = get_engine(args.database)
+    with engine.connect() as connection:
+        oldest, newest = connection.execute(
+            select(func.min(ping_results.c.timestamp), func.max(ping_results.c.timestamp))
+        ).one()
+    if oldest is None:
+        print("No ping results to recompute")
+        return
+    start = args.start or oldest
+    end = args.end or newest + timedelta(seconds=1)
+
+    try:
+        totals = recompute(engine.url.render_as_string(hide_password=False), start, end, steps=args.steps,
+                           workers=args.workers, chunk_days=args.chunk_days,
+                           checkpoint=args.checkpoint, resume=args.resume)
+    except KeyboardInterrupt:
+        print(f"\nInterrupted; run again with --resume to continue from {args.checkpoint}")
+        sys.exit(130)
+    print(f"Recomputed {totals['rows']:,} rows ({totals['updated']:,} results updated) in "
+          f"{totals['chunks']} chunks, {totals['seconds']:.1f}s, {totals['rows_per_sec']:,.0f} rows/sec")
+    if 'incidents' in totals:
+        print(f"Detected {totals['incidents']:,} incidents")
+
+
+if __name__ == '__main__':
+    main()
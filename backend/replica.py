@@ -0,0 +1,76 @@
+"""
+Routing of API reads to an optional read replica.
+
+With READ_REPLICA_URI set, GET requests under /api/ run their queries on the
+replica, so dashboard and export scans do not compete with ingest for the
+primary; /api/ingest, the probe workers and maintenance jobs keep writing to
+the primary. The replica connection is checked out (and pre-pinged) before
+the handler runs. If that fails the request reads from the primary instead,
+and so do later requests until REPLICA_RETRY_SECONDS have passed and the
+replica is tried again.
+
+Reads from a replica lag ingest by its replication delay, usually well under
+a second with streaming replication.
+"""
+import time
+
+from sqlalchemy.exc import DBAPIError
+
+from backend.metrics import REPLICA_READS
+
+
+class ReplicaState:
+    """Whether reads currently go to the replica, and since when they do not."""
+
+    def __init__(self, retry_seconds):
+        self.retry_seconds = retry_seconds
+        self.down_until = 0.0
+
+    def available(self):
+        return time.monotonic() >= self.down_until
+
+    def failed(self, error):
+        if self.available():
+            print(f"Read replica unreachable, reading from the primary for {self.retry_seconds}s: {error}")
+        self.down_until = time.monotonic() + self.retry_seconds
+
+
+def init_read_replica(app, db):
+    """Send the queries of API reads to the 'replica' bind, if configured.
+
+    Must be registered before other before_request hooks that query the
+    database, so their statements run on the same connection.
+
+    Args:
+        app: Flask application instance
+        db: Flask-SQLAlchemy extension, set up with configure_read_replica()
+    """
+    if 'replica' not in (app.config.get('SQLALCHEMY_BINDS') or {}):
+        return
+
+    from flask import request
+
+    state = ReplicaState(app.config['REPLICA_RETRY_SECONDS'])
+
+    @app.before_request
+    def route_reads():
+        if request.method != 'GET' or not request.path.startswith('/api/'):
+            return
+        if state.available():
+            engine = db.engines['replica']
+            try:
+                # Begins the session's transaction on the replica; the
+                # request's queries reuse this connection
+                db.session.connection(bind_arguments={'bind': engine})
+            except DBAPIError as e:
+                db.session.rollback()
+                state.failed(e)
+            else:
+                db.session.info['read_bind'] = engine
+                REPLICA_READS.inc(source='replica')
+                return
+        REPLICA_READS.inc(source='primary')
+
+    @app.teardown_request
+    def clear_read_bind(error=None):
+        db.session.info.pop('read_bind', None)
@@ -0,0 +1,333 @@
+"""
+Precomputed uptime/SLA reports per day, month and year.
+
+A nightly job materializes one daily_reports row per target and UTC day:
+how much of the day was monitored, down (tests without a single reply) and
+degraded (packet loss of INCIDENT_LOSS_THRESHOLD or more, or a latency
+anomaly score of DEGRADED_ANOMALY_SCORE or more), packet and latency sums,
+the hour with the worst packet loss and RTT percentiles. /api/reports then
+answers month and year reports by summing at most a few hundred of those
+rows, merging their latency sketches for percentiles.
+
+Time is weighted by the results: each result covers the time until the
+next result of its target, at most twice TEST_INTERVAL, so gaps in
+monitoring count as unmonitored rather than up or down.
+
+Days are recomputed from the raw results, so rerunning a day (for example
+after a late agent batch) replaces its rows. The nightly run recomputes the
+last REPORT_REFRESH_DAYS days and any missing days since the latest report.
+Backfill history with `python -m backend.reports --start 2024-01-01`.
+"""
+import argparse
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func, insert, select
+
+from backend.config import config
+from backend.schema import daily_reports, ping_results, ping_rollups
+from backend.sketch import LatencySketch, merge_sketches, percentiles
+
+DAY = timedelta(days=1)
+DAILY_TIER = 86400
+
+# Results scoring at least this far above their baseline count as degraded
+# (the dashboard highlights the same results)
+DEGRADED_ANOMALY_SCORE = 3.0
+
+PERIODS = ('month', 'year')
+
+
+def day_start(timestamp):
+    """UTC midnight starting the day of a naive UTC timestamp."""
+    return datetime(timestamp.year, timestamp.month, timestamp.day)
+
+
+def _target_day(target, day, results, max_gap, loss_threshold):
+    """Daily report values of one target from its (sorted) results of the day."""
+    values = {
+        'target': target, 'day': day, 'result_count': len(results),
+        'monitored_seconds': 0.0, 'down_seconds': 0.0, 'degraded_seconds': 0.0,
+        'packets_sent': 0, 'packets_received': 0, 'latency_sum': 0.0, 'latency_count': 0
+    }
+    hours = {}
+    end = day + DAY
+    for i, (timestamp, sent, received, loss, latency, score) in enumerate(results):
+        following = results[i + 1][0] if i + 1 < len(results) else end
+        covered = min((following - timestamp).total_seconds(), max_gap)
+        values['monitored_seconds'] += covered
+        if not received:
+            values['down_seconds'] += covered
+        elif loss >= loss_threshold or (score is not None and score >= DEGRADED_ANOMALY_SCORE):
+            values['degraded_seconds'] += covered
+        values['packets_sent'] += sent or 0
+        values['packets_received'] += received or 0
+        if received and latency is not None:
+            values['latency_sum'] += latency
+            values['latency_count'] += 1
+        hour = hours.setdefault(timestamp.replace(minute=0, second=0, microsecond=0), [0.0, 0])
+        hour[0] += loss
+        hour[1] += 1
+
+    worst = max(hours.items(), key=lambda item: (item[1][0] / item[1][1], -item[0].timestamp()))
+    worst_loss = worst[1][0] / worst[1][1]
+    values['worst_hour'] = worst[0] if worst_loss > 0 else None
+    values['worst_hour_loss'] = worst_loss
+    return values
+
+
+def compute_day(connection, day, settings=None):
+    """Compute the daily report rows of every target with results on a day.
+
+    Args:
+        connection: SQLAlchemy Connection
+        day: UTC midnight starting the day
+        settings: Configuration class (default: the default config)
+
+    Returns:
+        List of daily_reports row dictionaries
+    """
+    settings = settings or config['default']
+    max_gap = 2 * float(settings.TEST_INTERVAL)
+    rows = connection.execute(
+        select(ping_results.c.target, ping_results.c.timestamp, ping_results.c.packets_sent,
+               ping_results.c.packets_received, ping_results.c.packet_loss, ping_results.c.avg_latency,
+               ping_results.c.anomaly_score)
+        .where(ping_results.c.timestamp >= day, ping_results.c.timestamp < day + DAY)
+        .order_by(ping_results.c.target, ping_results.c.timestamp)
+    )
+    by_target = {}
+    for target, *result in rows:
+        by_target.setdefault(target, []).append(tuple(result))
+    if not by_target:
+        return []
+
+    # The day's rollup bucket already holds the merged RTT sketch
+    sketches = dict(connection.execute(
+        select(ping_rollups.c.target, ping_rollups.c.latency_sketch)
+        .where(ping_rollups.c.tier == DAILY_TIER, ping_rollups.c.bucket_start == day)
+    ).all())
+
+    computed_at = datetime.utcnow()
+    reports = []
+    for target, results in by_target.items():
+        values = _target_day(target, day, results, max_gap, settings.INCIDENT_LOSS_THRESHOLD)
+        sketch = sketches.get(target)
+        summary = percentiles(LatencySketch.from_bytes(sketch) if sketch else None)
+        values.update(p50_latency=summary['p50'], p95_latency=summary['p95'], p99_latency=summary['p99'],
+                      latency_sketch=sketch, computed_at=computed_at)
+        reports.append(values)
+    return reports
+
+
+def materialize_days(engine, days, settings=None, log=print):
+    """Recompute and store the daily reports of the given days.
+
+    Each day is replaced in its own transaction, so a rerun is safe.
+
+    Args:
+        engine: SQLAlchemy Engine
+        days: UTC midnights of the days to materialize
+        settings: Configuration class (default: the default config)
+        log: Progress callback taking a message string
+
+    Returns:
+        Number of report rows written
+    """
+    from backend.ingest import _lock_writes
+
+    written = 0
+    for day in days:
+        with engine.begin() as connection:
+            _lock_writes(connection)
+            reports = compute_day(connection, day, settings)
+            connection.execute(delete(daily_reports).where(daily_reports.c.day == day))
+            if reports:
+                connection.execute(insert(daily_reports), reports)
+        written += len(reports)
+        log(f"Report for {day.date()}: {len(reports)} targets")
+    return written
+
+
+def pending_days(connection, today, refresh_days=2):
+    """Days the nightly run should (re)materialize, oldest first.
+
+    The last `refresh_days` complete days are always recomputed, so results
+    that arrive late are included; before those, any day after the latest
+    report (or since the first result, without reports) is filled in.
+
+    Args:
+        connection: SQLAlchemy Connection
+        today: UTC midnight of the current (incomplete) day
+        refresh_days: Complete days recomputed every night
+
+    Returns:
+        List of UTC midnights
+    """
+    latest = connection.execute(select(func.max(daily_reports.c.day))).scalar()
+    if latest is not None:
+        start = latest + DAY
+    else:
+        first = connection.execute(select(func.min(ping_results.c.timestamp))).scalar()
+        if first is None:
+            return []
+        start = day_start(first)
+    start = min(start, today - refresh_days * DAY)
+    return [start + i * DAY for i in range((today - start).days)]
+
+
+def run_nightly(engine=None, now=None, settings=None, log=print):
+    """Materialize the reports due, as scheduled by the test container.
+
+    Args:
+        engine: SQLAlchemy Engine (default: the configured database)
+        now: Current UTC time (default: now)
+        settings: Configuration class (default: the default config)
+        log: Progress callback taking a message string
+
+    Returns:
+        Number of report rows written
+    """
+    from backend.ingest import get_engine
+
+    settings = settings or config['default']
+    engine = engine or get_engine()
+    today = day_start(now or datetime.utcnow())
+    with engine.connect() as connection:
+        days = pending_days(connection, today, settings.REPORT_REFRESH_DAYS)
+    return materialize_days(engine, days, settings, log)
+
+
+def period_range(period, value=None, now=None):
+    """Resolve a report period into a UTC range.
+
+    Args:
+        period: 'month' or 'year'
+        value: 'YYYY-MM' for months, 'YYYY' for years (default: the current one)
+        now: Current UTC time (default: now)
+
+    Returns:
+        Tuple of (start, end) naive UTC datetimes
+
+    Raises:
+        ValueError: If the period or value is invalid
+    """
+    if period not in PERIODS:
+        raise ValueError(f"Unknown report period '{period}', expected one of: {', '.join(PERIODS)}")
+    now = now or datetime.utcnow()
+    try:
+        if period == 'month':
+            start = datetime.strptime(value, '%Y-%m') if value else datetime(now.year, now.month, 1)
+            end = datetime(start.year + start.month // 12, start.month % 12 + 1, 1)
+        else:
+            start = datetime.strptime(value, '%Y') if value else datetime(now.year, 1, 1)
+            end = datetime(start.year + 1, 1, 1)
+    except ValueError:
+        raise ValueError(f"Invalid {period} '{value}', expected {'YYYY-MM' if period == 'month' else 'YYYY'}")
+    return start, end
+
+
+def _ratio(part, whole, scale=100.0):
+    return scale * part / whole if whole else None
+
+
+def summarize(rows):
+    """Sum daily report rows into one period summary.
+
+    Args:
+        rows: daily_reports rows (mappings) of one target
+
+    Returns:
+        Dictionary of availability, down/degraded minutes, loss, latency
+        percentiles and the worst hour and day
+    """
+    monitored = sum(row['monitored_seconds'] for row in rows)
+    down = sum(row['down_seconds'] for row in rows)
+    degraded = sum(row['degraded_seconds'] for row in rows)
+    sent = sum(row['packets_sent'] for row in rows)
+    received = sum(row['packets_received'] for row in rows)
+    latency_count = sum(row['latency_count'] for row in rows)
+    worst_hour = max((row for row in rows if row['worst_hour'] is not None),
+                     key=lambda row: row['worst_hour_loss'], default=None)
+    worst_day = max((row for row in rows if row['down_seconds'] or row['degraded_seconds']),
+                    key=lambda row: (row['down_seconds'], row['degraded_seconds']), default=None)
+    latency = percentiles(merge_sketches(row['latency_sketch'] for row in rows))
+    return {
+        'days': len(rows),
+        'results': sum(row['result_count'] for row in rows),
+        'monitored_minutes': round(monitored / 60, 1),
+        'coverage': _ratio(monitored, len(rows) * DAY.total_seconds()),
+        'availability': 100.0 - _ratio(down, monitored) if monitored else None,
+        'down_minutes': round(down / 60, 1),
+        'degraded_minutes': round(degraded / 60, 1),
+        'packet_loss': 100.0 - _ratio(received, sent) if sent else None,
+        'avg_latency': sum(row['latency_sum'] for row in rows) / latency_count if latency_count else None,
+        'p50_latency': latency['p50'],
+        'p95_latency': latency['p95'],
+        'p99_latency': latency['p99'],
+        'worst_hour': {'start': worst_hour['worst_hour'].isoformat(), 'packet_loss': worst_hour['worst_hour_loss']}
+        if worst_hour else None,
+        'worst_day': {'day': worst_day['day'].date().isoformat(), 'down_minutes': round(worst_day['down_seconds'] / 60, 1),
+                      'degraded_minutes': round(worst_day['degraded_seconds'] / 60, 1)}
+        if worst_day else None
+    }
+
+
+def build_report(connection, period, start, end, targets=None):
+    """Summarize the daily reports of a month or year per target.
+
+    Args:
+        connection: SQLAlchemy Connection
+        period: 'month' (broken down by day) or 'year' (broken down by month)
+        start: Start of the period
+        end: End of the period
+        targets: Target addresses to include (default: all)
+
+    Returns:
+        List of per-target summaries, each with a 'breakdown' list
+    """
+    query = (select(daily_reports)
+             .where(daily_reports.c.day >= start, daily_reports.c.day < end)
+             .order_by(daily_reports.c.target, daily_reports.c.day))
+    if targets:
+        query = query.where(daily_reports.c.target.in_(targets))
+    by_target = {}
+    for row in connection.execute(query).mappings():
+        by_target.setdefault(row['target'], []).append(row)
+
+    summaries = []
+    for target, rows in by_target.items():
+        groups = {}
+        for row in rows:
+            key = row['day'].date().isoformat() if period == 'month' else row['day'].strftime('%Y-%m')
+            groups.setdefault(key, []).append(row)
+        summaries.append(dict(
+            summarize(rows), target=target,
+            breakdown=[dict(summarize(group), period=key) for key, group in groups.items()]
+        ))
+    return summaries
+
+
+def _day(value):
+    return day_start(datetime.fromisoformat(value))
+
+
+def main():
+    from backend.ingest import get_engine
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database', help='SQLAlchemy URI (default: the configured database)')
+    parser.add_argument('--start', type=_day, help='First day to materialize (default: as the nightly run)')
+    parser.add_argument('--end', type=_day, help='Day after the last one (default: today)')
+    args = parser.parse_args()
+
+    engine = get_engine(args.database)
+    if args.start is None:
+        written = run_nightly(engine)
+    else:
+        end = args.end or day_start(datetime.utcnow())
+        written = materialize_days(engine, [args.start + i * DAY for i in range((end - args.start).days)])
+    print(f"Wrote {written:,} daily report rows")
+
+
+if __name__ == '__main__':
+    main()
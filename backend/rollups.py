@@ -0,0 +1,421 @@
+"""
+Incrementally maintained rollup tiers for ping results.
+
+Every ingested result is folded into one bucket per tier (15 minutes, 1 hour
+and 1 day by default). Queries over long ranges can then read a few hundred
+rollup rows instead of scanning raw results. Each bucket also keeps the merge
+of its results' latency sketches (backend/sketch.py) for percentiles.
+"""
+import math
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import and_, bindparam, case, delete, func, insert, or_, select, update
+
+from backend.schema import ping_results, ping_rollups
+from backend.sketch import LatencySketch, merge_sketches
+
+# Bucket widths in seconds, finest first
+ROLLUP_TIERS = (900, 3600, 86400)
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def bucket_start(timestamp, tier):
+    """Return the start of the tier bucket containing a timestamp.
+
+    Args:
+        timestamp: Naive UTC datetime
+        tier: Bucket width in seconds
+
+    Returns:
+        datetime: Bucket start aligned to the Unix epoch
+    """
+    seconds = int((timestamp - EPOCH).total_seconds())
+    return EPOCH + timedelta(seconds=seconds - seconds % tier)
+
+
+def bucket_end(timestamp, tier):
+    """Return the first bucket boundary at or after a timestamp."""
+    start = bucket_start(timestamp, tier)
+    return start if start == timestamp else start + timedelta(seconds=tier)
+
+
+def _rollup_values(result):
+    """Initial column values for a bucket containing only this result."""
+    has_latency = result.get('avg_latency') is not None
+    has_jitter = result.get('jitter') is not None
+    return {
+        'target': result['target'],
+        'result_count': 1,
+        'packets_sent': result.get('packets_sent') or 0,
+        'packets_received': result.get('packets_received') or 0,
+        'packet_loss_sum': result['packet_loss'],
+        'max_packet_loss': result['packet_loss'],
+        'latency_sum': result['avg_latency'] if has_latency else 0.0,
+        'latency_count': 1 if has_latency else 0,
+        'jitter_sum': result['jitter'] if has_jitter else 0.0,
+        'jitter_count': 1 if has_jitter else 0,
+        'min_latency': result.get('min_latency'),
+        'max_latency': result.get('max_latency')
+    }
+
+
+def _lowest(column, value):
+    """SQL expression keeping the smaller of a nullable column and a value."""
+    if value is None:
+        return column
+    return case((or_(column.is_(None), column > value), value), else_=column)
+
+
+def _highest(column, value):
+    """SQL expression keeping the larger of a nullable column and a value."""
+    if value is None:
+        return column
+    return case((or_(column.is_(None), column < value), value), else_=column)
+
+
+def _merge_bucket(connection, tier, start, values, sketch):
+    """Add a result's (or several results' combined) values to one bucket."""
+    table = ping_rollups
+    key = and_(
+        table.c.tier == tier,
+        table.c.target == values['target'],
+        table.c.bucket_start == start
+    )
+
+    merged = {}
+    if sketch is not None:
+        existing = connection.execute(select(table.c.latency_sketch).where(key)).scalar()
+        merged['latency_sketch'] = sketch if existing is None else \
+            LatencySketch.from_bytes(existing).merge(LatencySketch.from_bytes(sketch)).to_bytes()
+
+    updated = connection.execute(
+        update(table).where(key).values(**merged,
+            result_count=table.c.result_count + values['result_count'],
+            packets_sent=table.c.packets_sent + values['packets_sent'],
+            packets_received=table.c.packets_received + values['packets_received'],
+            packet_loss_sum=table.c.packet_loss_sum + values['packet_loss_sum'],
+            max_packet_loss=_highest(table.c.max_packet_loss, values['max_packet_loss']),
+            latency_sum=table.c.latency_sum + values['latency_sum'],
+            latency_count=table.c.latency_count + values['latency_count'],
+            jitter_sum=table.c.jitter_sum + values['jitter_sum'],
+            jitter_count=table.c.jitter_count + values['jitter_count'],
+            min_latency=_lowest(table.c.min_latency, values['min_latency']),
+            max_latency=_highest(table.c.max_latency, values['max_latency'])
+        )
+    )
+
+    if updated.rowcount == 0:
+        connection.execute(insert(table).values(tier=tier, bucket_start=start, **values,
+                                                latency_sketch=sketch))
+
+
+def update_rollups(connection, result, tiers=ROLLUP_TIERS):
+    """Fold one ping result into its bucket for every rollup tier.
+
+    Uses an UPDATE-then-INSERT per tier so the same statements work on
+    PostgreSQL and SQLite. Must run inside the transaction that stores the
+    result so rollups never drift from the raw data.
+    
+    A result carrying a serialized 'latency_sketch' is merged into each
+    bucket's sketch. The merge is a read-modify-write, which relies on the
+    single ingest writer like target registration does.
+
+    Args:
+        connection: SQLAlchemy connection (e.g. db.session.connection())
+        result: Dictionary of ping test results as returned by ping_test()
+        tiers: Rollup tiers to update
+    """
+    values = _rollup_values(result)
+    sketch = result.get('latency_sketch')
+    for tier in tiers:
+        _merge_bucket(connection, tier, bucket_start(result['timestamp'], tier), values, sketch)
+
+
+def _combine(total, values):
+    """Add one result's bucket values to a running combination in place."""
+    for name in ('result_count', 'packets_sent', 'packets_received', 'packet_loss_sum',
+                 'latency_sum', 'latency_count', 'jitter_sum', 'jitter_count'):
+        total[name] += values[name]
+    total['max_packet_loss'] = max(total['max_packet_loss'], values['max_packet_loss'])
+    for name, pick in (('min_latency', min), ('max_latency', max)):
+        if values[name] is not None:
+            total[name] = values[name] if total[name] is None else pick(total[name], values[name])
+
+
+def update_rollups_batch(connection, results, tiers=ROLLUP_TIERS):
+    """Fold many ping results into their rollup buckets.
+
+    Batched update_rollups() for bulk ingest: results are combined per
+    bucket in memory, the touched buckets that already exist are read with
+    one query and merged in Python, and the buckets are then written with
+    one UPDATE and one INSERT executemany. Like the sketch merge this is a
+    read-modify-write, so it relies on writers being serialized.
+
+    Args:
+        connection: SQLAlchemy connection with an open transaction
+        results: Ping result dictionaries, optionally with 'latency_sketch'
+        tiers: Rollup tiers to update
+    """
+    if not results:
+        return
+    buckets = {}
+    for result in results:
+        values = _rollup_values(result)
+        sketch = result.get('latency_sketch')
+        for tier in tiers:
+            key = (tier, bucket_start(result['timestamp'], tier), values['target'])
+            bucket = buckets.get(key)
+            if bucket is None:
+                bucket = buckets[key] = (dict(values, tier=tier, bucket_start=key[1]), [])
+            else:
+                _combine(bucket[0], values)
+            if sketch is not None:
+                bucket[1].append(sketch)
+
+    table = ping_rollups
+    timestamps = [result['timestamp'] for result in results]
+    existing = connection.execute(
+        select(table).where(
+            table.c.tier.in_(list(tiers)),
+            table.c.target.in_({target for _, _, target in buckets}),
+            table.c.bucket_start >= bucket_start(min(timestamps), max(tiers)),
+            table.c.bucket_start <= max(timestamps)
+        )
+    ).mappings()
+
+    updates = []
+    for row in existing:
+        key = (row['tier'], row['bucket_start'], row['target'])
+        if key not in buckets:
+            continue
+        values, sketches = buckets.pop(key)
+        sketch = merge_sketches([row['latency_sketch']] + sketches)
+        merged = dict(row, max_packet_loss=row['max_packet_loss'] if row['max_packet_loss'] is not None
+                      else values['max_packet_loss'],
+                      latency_sketch=sketch.to_bytes() if sketch is not None else None)
+        _combine(merged, values)
+        merged['bucket_id'] = merged.pop('id')
+        for name in ('tier', 'bucket_start', 'target'):
+            del merged[name]
+        updates.append(merged)
+    if updates:
+        # SET covers the columns in the parameter dictionaries
+        connection.execute(update(table).where(table.c.id == bindparam('bucket_id')), updates)
+
+    inserts = []
+    for values, sketches in buckets.values():
+        if len(sketches) > 1:
+            values['latency_sketch'] = merge_sketches(sketches).to_bytes()
+        else:
+            values['latency_sketch'] = sketches[0] if sketches else None
+        inserts.append(values)
+    if inserts:
+        connection.execute(insert(table), inserts)
+
+
+# Raw result columns needed to build rollup buckets
+ROLLUP_SOURCE_COLUMNS = (
+    'timestamp', 'target', 'packet_loss', 'min_latency', 'max_latency', 'avg_latency',
+    'jitter', 'packets_sent', 'packets_received', 'latency_sketch'
+)
+
+
+def _group_min(groups, values, size):
+    """Per-group minimum ignoring NaN; None for groups without values."""
+    out = np.full(size, np.inf)
+    np.fmin.at(out, groups, values)
+    return [None if math.isinf(value) else value for value in out.tolist()]
+
+
+def _group_max(groups, values, size):
+    """Per-group maximum ignoring NaN; None for groups without values."""
+    out = np.full(size, -np.inf)
+    np.fmax.at(out, groups, values)
+    return [None if math.isinf(value) else value for value in out.tolist()]
+
+
+def aggregate_rollups(rows, tiers=ROLLUP_TIERS):
+    """Build rollup bucket rows from raw results with vectorized grouping.
+
+    Produces the same buckets as folding each result in with
+    update_rollups(), including merged latency sketches.
+
+    Args:
+        rows: Sequence of mappings with ROLLUP_SOURCE_COLUMNS keys, in
+              timestamp order
+        tiers: Rollup tiers to build
+
+    Returns:
+        List of dictionaries ready to insert into ping_rollups
+    """
+    if not rows:
+        return []
+
+    def column(name, dtype=np.float64):
+        return np.array([np.nan if row[name] is None else row[name] for row in rows], dtype=dtype)
+
+    seconds = np.array([row['timestamp'] for row in rows], dtype='datetime64[s]').astype(np.int64)
+    names, target_codes = np.unique([row['target'] for row in rows], return_inverse=True)
+    packet_loss = column('packet_loss')
+    latency = column('avg_latency')
+    jitter = column('jitter')
+    min_latency = column('min_latency')
+    max_latency = column('max_latency')
+    sent = np.array([row['packets_sent'] or 0 for row in rows], dtype=np.int64)
+    received = np.array([row['packets_received'] or 0 for row in rows], dtype=np.int64)
+    sketches = [row['latency_sketch'] for row in rows]
+    has_latency = ~np.isnan(latency)
+    has_jitter = ~np.isnan(jitter)
+
+    buckets = []
+    for tier in tiers:
+        # One group per (target, bucket)
+        keys = np.stack((target_codes, seconds - seconds % tier), axis=1)
+        unique, groups = np.unique(keys, axis=0, return_inverse=True)
+        groups = groups.reshape(-1)
+        size = len(unique)
+
+        def total(values):
+            return np.bincount(groups, weights=values, minlength=size).tolist()
+
+        result_counts = np.bincount(groups, minlength=size).tolist()
+        sent_sums = np.bincount(groups, weights=sent, minlength=size).astype(np.int64).tolist()
+        received_sums = np.bincount(groups, weights=received, minlength=size).astype(np.int64).tolist()
+        loss_sums = total(packet_loss)
+        latency_sums = total(np.where(has_latency, latency, 0.0))
+        latency_counts = np.bincount(groups, weights=has_latency, minlength=size).astype(np.int64).tolist()
+        jitter_sums = total(np.where(has_jitter, jitter, 0.0))
+        jitter_counts = np.bincount(groups, weights=has_jitter, minlength=size).astype(np.int64).tolist()
+        max_losses = _group_max(groups, packet_loss, size)
+        minimums = _group_min(groups, min_latency, size)
+        maximums = _group_max(groups, max_latency, size)
+
+        group_sketches = [[] for _ in range(size)]
+        for group, sketch in zip(groups.tolist(), sketches):
+            if sketch is not None:
+                group_sketches[group].append(sketch)
+
+        for group, (code, start) in enumerate(unique.tolist()):
+            merged = merge_sketches(group_sketches[group])
+            buckets.append({
+                'tier': tier,
+                'target': str(names[code]),
+                'bucket_start': EPOCH + timedelta(seconds=start),
+                'result_count': result_counts[group],
+                'packets_sent': sent_sums[group],
+                'packets_received': received_sums[group],
+                'packet_loss_sum': loss_sums[group],
+                'max_packet_loss': max_losses[group],
+                'latency_sum': latency_sums[group],
+                'latency_count': latency_counts[group],
+                'jitter_sum': jitter_sums[group],
+                'jitter_count': jitter_counts[group],
+                'min_latency': minimums[group],
+                'max_latency': maximums[group],
+                'latency_sketch': merged.to_bytes() if merged is not None else None
+            })
+    return buckets
+
+
+def replace_rollups(connection, start, end, buckets, tiers=ROLLUP_TIERS):
+    """Delete the rollup buckets in [start, end) and insert new ones.
+
+    start and end must be aligned to the coarsest tier.
+    """
+    connection.execute(delete(ping_rollups).where(and_(
+        ping_rollups.c.tier.in_(tiers),
+        ping_rollups.c.bucket_start >= start,
+        ping_rollups.c.bucket_start < end
+    )))
+    if buckets:
+        connection.execute(insert(ping_rollups), buckets)
+
+
+def rebuild_rollups(connection, start, end, tiers=ROLLUP_TIERS, chunk_buckets=7):
+    """Recompute rollup buckets from raw ping results for a time range.
+
+    The range is widened to whole buckets of the coarsest tier so no bucket
+    is left partially rebuilt, then processed a few coarsest buckets at a
+    time so memory stays bounded on long ranges.
+
+    Args:
+        connection: SQLAlchemy connection
+        start: Start of the range (naive UTC datetime)
+        end: End of the range (naive UTC datetime)
+        tiers: Rollup tiers to rebuild
+        chunk_buckets: Coarsest-tier buckets rebuilt per step
+
+    Returns:
+        int: Number of raw results processed
+    """
+    coarsest = max(tiers)
+    start = bucket_start(start, coarsest)
+    end = bucket_end(end, coarsest)
+    step = timedelta(seconds=coarsest * chunk_buckets)
+    columns = [ping_results.c[name] for name in ROLLUP_SOURCE_COLUMNS]
+
+    processed = 0
+    chunk_start = start
+    while chunk_start < end:
+        chunk_end = min(chunk_start + step, end)
+        rows = connection.execute(
+            select(*columns)
+            .where(and_(ping_results.c.timestamp >= chunk_start, ping_results.c.timestamp < chunk_end))
+            .order_by(ping_results.c.timestamp, ping_results.c.id)
+        ).mappings().all()
+        replace_rollups(connection, chunk_start, chunk_end, aggregate_rollups(rows, tiers), tiers)
+        processed += len(rows)
+        chunk_start = chunk_end
+
+    return processed
+
+
+def backfill_rollups(engine, chunk_days=7, log=print):
+    """Build rollups for results recorded before the rollups existed.
+
+    History is missing from the rollups when its first raw result is older
+    than the first daily bucket, or when that first day's bucket holds
+    fewer results than the raw table (rollups introduced during the day).
+    Those days are rebuilt newest first, chunk_days per transaction, so an
+    interrupted backfill leaves the rollups covering an unbroken recent
+    range and resumes where it stopped on the next run.
+
+    Args:
+        engine: SQLAlchemy Engine
+        chunk_days: Days rebuilt per transaction
+        log: Progress callback taking a message string
+
+    Returns:
+        int: Number of raw results processed
+    """
+    day = ROLLUP_TIERS[-1]
+    with engine.connect() as connection:
+        first_result = connection.execute(select(func.min(ping_results.c.timestamp))).scalar()
+        if first_result is None:
+            return 0
+        first_bucket = connection.execute(
+            select(func.min(ping_rollups.c.bucket_start)).where(ping_rollups.c.tier == day)).scalar()
+        if first_bucket is None:
+            last_result = connection.execute(select(func.max(ping_results.c.timestamp))).scalar()
+            end = bucket_start(last_result, day) + timedelta(seconds=day)
+        else:
+            end = first_bucket + timedelta(seconds=day)
+            raw = connection.execute(select(func.count()).select_from(ping_results).where(
+                ping_results.c.timestamp >= first_bucket, ping_results.c.timestamp < end)).scalar()
+            rolled_up = connection.execute(select(func.coalesce(func.sum(ping_rollups.c.result_count), 0)).where(
+                ping_rollups.c.tier == day, ping_rollups.c.bucket_start == first_bucket)).scalar()
+            if first_result >= first_bucket and raw == rolled_up:
+                return 0
+
+    start = bucket_start(first_result, day)
+    log(f"Building rollups for results from {start:%Y-%m-%d} to {end:%Y-%m-%d}")
+    processed = 0
+    while end > start:
+        chunk_start = max(start, end - timedelta(days=chunk_days))
+        with engine.begin() as connection:
+            processed += rebuild_rollups(connection, chunk_start, end)
+        log(f"Rolled up {processed} results (back to {chunk_start:%Y-%m-%d})")
+        end = chunk_start
+    return processed
@@ -0,0 +1,199 @@
+"""
+Table definitions shared by the web service and the probe worker.
+
+Tables are declared with plain SQLAlchemy Core on a shared MetaData so the
+probe worker can write results without importing Flask. backend/models.py
+maps its ORM models onto these same Table objects, so there is exactly one
+definition of every column.
+"""
+from datetime import datetime
+
+from sqlalchemy import (
+    BigInteger, Boolean, Column, DateTime, Float, ForeignKey, Index, Integer, JSON, LargeBinary, MetaData,
+    String, Table, UniqueConstraint
+)
+
+# Create a MetaData object without a schema initially
+# This allows for flexibility with different database backends
+metadata = MetaData()
+
+# Probed hosts and their probe settings, registered on their first result
+targets = Table(
+    'targets', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('address', String(255), nullable=False, unique=True),  # IP address or hostname
+    Column('label', String(100)),  # Display name, e.g. 'Cloudflare DNS'
+
+    # Probe settings; NULL falls back to TEST_COUNT / PING_INTERVAL
+    Column('packet_count', Integer),
+    Column('ping_interval', Float),
+    Column('enabled', Boolean, nullable=False, default=True),
+    Column('created_at', DateTime, default=datetime.utcnow, nullable=False),
+)
+
+# Network ping test results, one row per test
+ping_results = Table(
+    'ping_results', metadata,
+    # Primary key and timestamp (indexed for efficient time-based queries)
+    Column('id', Integer, primary_key=True),
+    Column('timestamp', DateTime, default=datetime.utcnow, nullable=False, index=True),
+
+    # Network test parameters
+    Column('target', String(50), nullable=False),  # IP address or hostname that was pinged (see targets)
+    Column('agent', String(100)),  # Remote probe agent that measured it (NULL: a local test container)
+
+    # Core network metrics
+    Column('packet_loss', Float, nullable=False),  # Percentage of packets lost (0-100)
+    Column('min_latency', Float),  # Minimum round-trip time in milliseconds
+    Column('max_latency', Float),  # Maximum round-trip time in milliseconds
+    Column('avg_latency', Float),  # Average round-trip time in milliseconds
+    Column('jitter', Float),  # Variation in latency (calculated from consecutive packets)
+
+    # Test details
+    Column('packets_sent', Integer, nullable=False),  # Total number of packets sent
+    Column('packets_received', Integer, nullable=False),  # Total number of packets received
+    Column('probe_rate', Float),  # Packets per second the test was probed at (NULL: before it was recorded)
+    Column('samples', LargeBinary),  # Per-packet reply times and RTTs, encoded by backend/codec.py
+    Column('latency_sketch', LargeBinary),  # RTT quantile sketch, see backend/sketch.py
+    Column('anomaly_score', Float),  # Latency z-score against the target's hourly baseline (backend/baselines.py)
+
+    # Packet sequence metrics from icmp_seq (NULL: not recorded)
+    Column('loss_max_run', Integer),  # Longest run of consecutive lost packets
+    Column('loss_bursts', Integer),  # Number of runs of consecutive lost packets
+    Column('loss_burst_histogram', JSON),  # Runs of 1, 2-3, 4-7, 8-15, 16-31 and 32+ lost packets
+    Column('reordered_packets', Integer),  # Replies that arrived after a later packet's reply
+    Column('duplicate_packets', Integer),  # Duplicate replies (not counted as received)
+
+    # Per-target time range scans
+    Index('ix_ping_results_target_time', 'target', 'timestamp'),
+)
+
+# Pre-aggregated ping results over fixed time buckets (see backend/rollups.py)
+ping_rollups = Table(
+    'ping_rollups', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('tier', Integer, nullable=False),  # Bucket width in seconds
+    Column('bucket_start', DateTime, nullable=False),  # UTC start of the bucket
+    Column('target', String(50), nullable=False),
+
+    # Number of ping results merged into this bucket
+    Column('result_count', Integer, nullable=False, default=0),
+    Column('packets_sent', Integer, nullable=False, default=0),
+    Column('packets_received', Integer, nullable=False, default=0),
+
+    # Running sums and counts for averaged metrics
+    Column('packet_loss_sum', Float, nullable=False, default=0.0),
+    Column('max_packet_loss', Float),
+    Column('latency_sum', Float, nullable=False, default=0.0),
+    Column('latency_count', Integer, nullable=False, default=0),
+    Column('jitter_sum', Float, nullable=False, default=0.0),
+    Column('jitter_count', Integer, nullable=False, default=0),
+
+    # Extremes across the bucket
+    Column('min_latency', Float),
+    Column('max_latency', Float),
+
+    # Merged RTT quantile sketch of every result in the bucket
+    Column('latency_sketch', LargeBinary),
+
+    UniqueConstraint('tier', 'target', 'bucket_start', name='uq_ping_rollups_bucket'),
+    Index('ix_ping_rollups_tier_bucket', 'tier', 'bucket_start'),
+)
+
+# Detected outages, loss bursts and latency spikes (see backend/incidents.py)
+incidents = Table(
+    'incidents', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('kind', String(20), nullable=False),  # 'outage', 'loss' or 'latency'
+    Column('severity', String(20), nullable=False),  # 'minor', 'major' or 'critical'
+    Column('started_at', DateTime, nullable=False),  # First affected result
+    Column('ended_at', DateTime),  # First result after recovery; NULL while ongoing
+    Column('last_seen', DateTime, nullable=False),  # Latest affected result
+
+    # Worst packet loss (percent) or average latency (ms) seen, and the
+    # latency baseline (ms) a latency spike was measured against
+    Column('peak', Float),
+    Column('baseline', Float),
+    Column('result_count', Integer, nullable=False, default=0),  # Affected results
+
+    Index('ix_incidents_started_at', 'started_at'),
+    Index('ix_incidents_ended_at', 'ended_at'),
+)
+
+# Targets affected by each incident
+incident_targets = Table(
+    'incident_targets', metadata,
+    Column('incident_id', Integer, ForeignKey('incidents.id', ondelete='CASCADE'), primary_key=True),
+    Column('target', String(50), primary_key=True),
+    Column('first_seen', DateTime, nullable=False),
+    Column('last_seen', DateTime, nullable=False),
+    Column('active', Boolean, nullable=False, default=True),  # Still affected while the incident is open
+
+    Index('ix_incident_targets_target', 'target'),
+)
+
+# Per-target latency baseline for each hour of the week (see backend/baselines.py)
+latency_baselines = Table(
+    'latency_baselines', metadata,
+    Column('target', String(50), primary_key=True),
+    Column('hour_of_week', Integer, primary_key=True),  # 0 = Monday 00:00-01:00 UTC
+    Column('mean', Float, nullable=False),  # Exponentially weighted average latency (ms)
+    Column('variance', Float, nullable=False),  # Exponentially weighted variance (ms^2)
+    Column('samples', Integer, nullable=False),  # Results folded in so far
+    Column('updated_at', DateTime, nullable=False),
+)
+
+# Which probe worker leads each target's schedule, and the latest schedule
+# slot it claimed (see backend/leases.py)
+probe_leases = Table(
+    'probe_leases', metadata,
+    Column('target', String(50), primary_key=True),
+    Column('owner', String(100)),  # Worker leading the schedule; NULL once released
+    Column('expires_at', DateTime),  # End of the owner's lease (lease election only)
+    Column('last_slot', BigInteger),  # Latest probed slot: seconds since the epoch // TEST_INTERVAL
+    Column('claimed_at', DateTime),  # When last_slot was claimed
+)
+
+# Batches received from remote probe agents, so a retried batch is ingested
+# only once (see backend/agent.py)
+ingest_batches = Table(
+    'ingest_batches', metadata,
+    Column('batch_id', String(64), primary_key=True),  # Chosen by the agent, unique per batch
+    Column('agent', String(100), nullable=False),
+    Column('received_at', DateTime, default=datetime.utcnow, nullable=False),
+    Column('result_count', Integer, nullable=False),
+)
+
+# Per-target daily availability and latency, materialized nightly (see
+# backend/reports.py) so month and year reports only sum these rows
+daily_reports = Table(
+    'daily_reports', metadata,
+    Column('target', String(50), primary_key=True),
+    Column('day', DateTime, primary_key=True),  # UTC midnight starting the day
+    Column('result_count', Integer, nullable=False),
+
+    # Time covered by results, split by how the link was doing: down (no
+    # replies) and degraded (packet loss or a latency anomaly); the rest was up
+    Column('monitored_seconds', Float, nullable=False),
+    Column('down_seconds', Float, nullable=False),
+    Column('degraded_seconds', Float, nullable=False),
+
+    Column('packets_sent', Integer, nullable=False),
+    Column('packets_received', Integer, nullable=False),
+    Column('latency_sum', Float, nullable=False),  # Sum of average latencies, for the mean
+    Column('latency_count', Integer, nullable=False),
+
+    # Hour with the highest average packet loss, and that loss (percent)
+    Column('worst_hour', DateTime),
+    Column('worst_hour_loss', Float),
+
+    # RTT percentiles over the day and the sketch they came from, merged for
+    # longer periods
+    Column('p50_latency', Float),
+    Column('p95_latency', Float),
+    Column('p99_latency', Float),
+    Column('latency_sketch', LargeBinary),
+    Column('computed_at', DateTime, nullable=False),
+
+    Index('ix_daily_reports_day', 'day'),
+)
@@ -0,0 +1,118 @@
+"""
+Helpers for turning ping result rows into chart series and summary statistics.
+
+These operate on plain row tuples (as returned by a column query) rather than
+ORM objects so large windows can be processed without model hydration.
+"""
+from datetime import timedelta
+
+# Metrics plotted on the dashboard charts
+SERIES_METRICS = ('avg_latency', 'jitter', 'packet_loss')
+
+# Dashboard series also carry each bucket's mean anomaly score (see
+# backend/baselines.py) for highlighting unusual latency
+DASHBOARD_METRICS = SERIES_METRICS + ('anomaly_score',)
+
+# Weighted rows' attributes counting the results behind a metric's mean;
+# other metrics are weighted by every result the row stands for
+METRIC_WEIGHTS = {'avg_latency': 'latency_weight', 'jitter': 'jitter_weight'}
+
+
+def summarize(rows):
+    """Compute window aggregates matching the /api/ping-stats day_stats format.
+
+    Args:
+        rows: Iterable of rows exposing packet_loss, avg_latency, jitter,
+              min_latency and max_latency attributes
+
+    Returns:
+        Dictionary of aggregate metrics, with 0 for metrics that have no data
+    """
+    loss_sum = latency_sum = jitter_sum = 0.0
+    loss_count = latency_count = jitter_count = 0
+    max_loss = min_latency = max_latency = None
+
+    for row in rows:
+        if row.packet_loss is not None:
+            loss_sum += row.packet_loss
+            loss_count += 1
+            if max_loss is None or row.packet_loss > max_loss:
+                max_loss = row.packet_loss
+        if row.avg_latency is not None:
+            latency_sum += row.avg_latency
+            latency_count += 1
+        if row.jitter is not None:
+            jitter_sum += row.jitter
+            jitter_count += 1
+        if row.min_latency is not None and (min_latency is None or row.min_latency < min_latency):
+            min_latency = row.min_latency
+        if row.max_latency is not None and (max_latency is None or row.max_latency > max_latency):
+            max_latency = row.max_latency
+
+    return {
+        'avg_packet_loss': loss_sum / loss_count if loss_count else 0,
+        'max_packet_loss': max_loss or 0,
+        'avg_latency': latency_sum / latency_count if latency_count else 0,
+        'avg_jitter': jitter_sum / jitter_count if jitter_count else 0,
+        'min_latency': min_latency or 0,
+        'max_latency': max_latency or 0
+    }
+
+
+def downsample(rows, start, end, points, metrics=SERIES_METRICS, weighted=False):
+    """Reduce rows to at most `points` evenly spaced buckets per metric.
+
+    Each bucket reports the mean of every metric and the mean timestamp of the
+    rows that fell into it, so sparse data keeps its exact timestamps and
+    empty buckets are simply omitted (gaps stay visible on the charts).
+
+    Args:
+        rows: Rows in ascending timestamp order exposing `timestamp` and metrics
+        start: Start of the window (datetime)
+        end: End of the window (datetime)
+        points: Maximum number of buckets to return
+        metrics: Metric attribute names to include
+        weighted: Use each row's `weight` attribute (number of results it
+                  stands for, e.g. for rollup rows) instead of counting 1,
+                  and its METRIC_WEIGHTS attributes for the metrics only
+                  some of those results have
+
+    Returns:
+        Columnar dictionary with a 'timestamps' list (ISO strings), one list
+        per metric and a 'counts' list of rows per bucket
+    """
+    span = max((end - start).total_seconds(), 1.0)
+    width = span / max(points, 1)
+    weights = [METRIC_WEIGHTS.get(metric, 'weight') if weighted else None for metric in metrics]
+
+    buckets = {}
+    for row in rows:
+        offset = (row.timestamp - start).total_seconds()
+        index = min(max(int(offset / width), 0), points - 1)
+        bucket = buckets.get(index)
+        if bucket is None:
+            # [row count, timestamp offset sum, then (sum, count) per metric]
+            bucket = buckets[index] = [0, 0.0] + [0.0, 0] * len(metrics)
+        weight = row.weight if weighted else 1
+        bucket[0] += weight
+        bucket[1] += offset * weight
+        for i, metric in enumerate(metrics):
+            value = getattr(row, metric)
+            if value is not None:
+                metric_weight = getattr(row, weights[i]) if weighted else 1
+                bucket[2 + 2 * i] += value * metric_weight
+                bucket[3 + 2 * i] += metric_weight
+
+    series = {'timestamps': [], 'counts': []}
+    for metric in metrics:
+        series[metric] = []
+
+    for index in sorted(buckets):
+        bucket = buckets[index]
+        series['timestamps'].append((start + timedelta(seconds=bucket[1] / bucket[0])).isoformat())
+        series['counts'].append(bucket[0])
+        for i, metric in enumerate(metrics):
+            total, count = bucket[2 + 2 * i], bucket[3 + 2 * i]
+            series[metric].append(total / count if count else None)
+
+    return series
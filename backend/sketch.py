@@ -0,0 +1,226 @@
+"""
+Mergeable latency quantile sketches (DDSketch).
+
+avg/min/max columns cannot answer "what was the 99th percentile RTT over the
+last 30 days", and rescanning per-packet samples for that is expensive. Each
+ping result therefore stores a small DDSketch of its RTTs, and every rollup
+bucket stores the merge of its results' sketches. A percentile over any
+range is then answered by merging a few hundred sketches (see
+planner.plan_cover()).
+
+A DDSketch counts values in logarithmic bins of width gamma = (1 + a) / (1 - a),
+so any quantile it reports is within relative accuracy a (1% by default) of
+the true value. Merging is adding bin counts, which makes it exact: merging
+two sketches gives the same sketch as adding all values to one. RTTs range
+from microseconds to the ping timeout, so the bin count stays below a few
+hundred and no bins are ever collapsed.
+
+Percentiles are over packets, not tests: a test probed at a higher rate
+(see backend/adaptive.py) contributes more packets.
+
+Serialized layout: a version byte followed by varints (backend/codec.py)
+    accuracy (parts per million), zero count, first bin index (zigzag),
+    number of bins, bin counts
+"""
+import math
+
+import numpy as np
+
+from backend.codec import encode_varints, decode_varints
+
+FORMAT_VERSION = 1
+
+# Relative accuracy of reported quantiles
+RELATIVE_ACCURACY = 0.01
+
+# RTTs at or below this many milliseconds are counted as zero
+MIN_VALUE = 1e-3
+
+
+class LatencySketch:
+    """DDSketch of positive values (RTTs in milliseconds).
+
+    Args:
+        relative_accuracy: Maximum relative error of reported quantiles
+    """
+
+    def __init__(self, relative_accuracy=RELATIVE_ACCURACY):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError('relative_accuracy must be between 0 and 1')
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.zero_count = 0
+        self.offset = 0  # Bin index of counts[0]
+        self.counts = np.zeros(0, dtype=np.int64)
+
+    @classmethod
+    def from_values(cls, values, relative_accuracy=RELATIVE_ACCURACY):
+        """Build a sketch of a sequence of values."""
+        sketch = cls(relative_accuracy)
+        sketch.add(values)
+        return sketch
+
+    @property
+    def count(self):
+        """Number of values in the sketch."""
+        return self.zero_count + int(self.counts.sum())
+
+    def _grow(self, low, high):
+        """Extend the bin array to cover bin indexes low..high."""
+        if not self.counts.size:
+            self.offset, self.counts = low, np.zeros(high - low + 1, dtype=np.int64)
+            return
+        low, high = min(low, self.offset), max(high, self.offset + self.counts.size - 1)
+        if low == self.offset and high - low + 1 == self.counts.size:
+            return
+        counts = np.zeros(high - low + 1, dtype=np.int64)
+        counts[self.offset - low:self.offset - low + self.counts.size] = self.counts
+        self.offset, self.counts = low, counts
+
+    def add(self, values):
+        """Add values (scalar or array-like) to the sketch."""
+        values = np.atleast_1d(np.asarray(values, dtype=np.float64))
+        positive = values[values > MIN_VALUE]
+        self.zero_count += int(values.size - positive.size)
+        if not positive.size:
+            return
+        indexes = np.ceil(np.log(positive) / self._log_gamma).astype(np.int64)
+        low, high = int(indexes.min()), int(indexes.max())
+        self._grow(low, high)
+        start = low - self.offset
+        self.counts[start:start + high - low + 1] += np.bincount(indexes - low)
+
+    def merge(self, other):
+        """Add another sketch's counts into this one.
+
+        Raises:
+            ValueError: If the sketches use different accuracies
+        """
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError('Cannot merge sketches with different accuracies')
+        self.zero_count += other.zero_count
+        if other.counts.size:
+            self._grow(other.offset, other.offset + other.counts.size - 1)
+            start = other.offset - self.offset
+            self.counts[start:start + other.counts.size] += other.counts
+        return self
+
+    def subtract(self, other):
+        """Remove a sketch previously merged into this one.
+
+        Lets a sketch cover a sliding window: merge each value's sketch as it
+        enters and subtract it as it leaves.
+
+        Raises:
+            ValueError: If the sketches use different accuracies
+        """
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError('Cannot subtract sketches with different accuracies')
+        self.zero_count -= other.zero_count
+        if other.counts.size:
+            self._grow(other.offset, other.offset + other.counts.size - 1)
+            start = other.offset - self.offset
+            self.counts[start:start + other.counts.size] -= other.counts
+        return self
+
+    def quantile(self, q):
+        """Estimate the q-quantile (0 <= q <= 1), or None for an empty sketch."""
+        total = self.count
+        if not total:
+            return None
+        rank = q * (total - 1)
+        if rank < self.zero_count:
+            return 0.0
+        cumulative = np.cumsum(self.counts)
+        position = int(np.searchsorted(cumulative, rank - self.zero_count, side='right'))
+        position = min(position, self.counts.size - 1)
+        # Midpoint of the bin in relative terms
+        return 2 * self.gamma ** (self.offset + position) / (self.gamma + 1)
+
+    def to_bytes(self):
+        """Serialize the sketch for storage."""
+        header = [round(self.relative_accuracy * 1e6), self.zero_count,
+                  (self.offset << 1) ^ (self.offset >> 63), self.counts.size]
+        values = np.concatenate((np.array(header, dtype=np.uint64), self.counts.astype(np.uint64)))
+        return bytes([FORMAT_VERSION]) + encode_varints(values)
+
+    @classmethod
+    def from_bytes(cls, blob):
+        """Load a sketch serialized by to_bytes().
+
+        Raises:
+            ValueError: If the blob is malformed or of an unknown version
+        """
+        if not blob or blob[0] != FORMAT_VERSION:
+            raise ValueError('Unknown sketch encoding')
+        values = decode_varints(memoryview(blob)[1:])
+        if values.size < 4 or values.size != 4 + int(values[3]):
+            raise ValueError('Truncated sketch data')
+        sketch = cls(int(values[0]) / 1e6)
+        sketch.zero_count = int(values[1])
+        zigzag = int(values[2])
+        sketch.offset = (zigzag >> 1) ^ -(zigzag & 1)
+        sketch.counts = values[4:].astype(np.int64)
+        return sketch
+
+
+def merge_sketches(blobs):
+    """Merge serialized sketches, skipping missing ones.
+
+    The version byte is itself a one-byte varint, so the concatenated blobs
+    decode in a single call and are then added into one bin array.
+
+    Args:
+        blobs: Iterable of bytes from LatencySketch.to_bytes() or None
+
+    Returns:
+        LatencySketch, or None if there was nothing to merge
+
+    Raises:
+        ValueError: If a blob is malformed or the accuracies differ
+    """
+    blobs = [blob for blob in blobs if blob is not None]
+    if not blobs:
+        return None
+    if any(blob[0] != FORMAT_VERSION for blob in blobs):
+        raise ValueError('Unknown sketch encoding')
+    values = decode_varints(b''.join(blobs)).tolist()
+
+    parts = []
+    position = 0
+    accuracies = set()
+    zero_count = 0
+    for _ in blobs:
+        if position + 5 > len(values):
+            raise ValueError('Truncated sketch data')
+        _, accuracy, zeros, zigzag, size = values[position:position + 5]
+        position += 5
+        accuracies.add(accuracy)
+        zero_count += zeros
+        if size:
+            parts.append(((zigzag >> 1) ^ -(zigzag & 1), position, size))
+        position += size
+    if position != len(values):
+        raise ValueError('Truncated sketch data')
+    if len(accuracies) > 1:
+        raise ValueError('Cannot merge sketches with different accuracies')
+
+    merged = LatencySketch(accuracies.pop() / 1e6)
+    merged.zero_count = zero_count
+    if parts:
+        counts = np.asarray(values, dtype=np.int64)
+        low = min(offset for offset, _, _ in parts)
+        high = max(offset + size for offset, _, size in parts)
+        merged.offset = low
+        merged.counts = np.zeros(high - low, dtype=np.int64)
+        for offset, start, size in parts:
+            merged.counts[offset - low:offset - low + size] += counts[start:start + size]
+    return merged
+
+
+def percentiles(sketch, quantiles=(0.5, 0.95, 0.99)):
+    """Summarize a sketch as {'p50': ..., 'p95': ..., 'p99': ..., 'samples': n}."""
+    summary = {f'p{round(q * 100):g}': sketch.quantile(q) if sketch else None for q in quantiles}
+    summary['samples'] = sketch.count if sketch else 0
+    return summary
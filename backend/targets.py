@@ -0,0 +1,88 @@
+"""
+Target registry helpers.
+
+Every probed address gets a row in the targets table (label and probe
+settings) on its first result. Results, rollups, incidents, baselines,
+leases and reports are keyed by the address itself, and per-target queries
+use the (target, timestamp) index on ping_results. These helpers register
+addresses at ingest, build per-target filters for queries and register the
+targets of results written before the table existed. They use SQLAlchemy
+Core only so the probe worker can use them too.
+"""
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from backend.schema import targets, ping_results, ping_rollups
+
+
+def ensure_targets(connection, addresses):
+    """Register the addresses that have no targets row yet.
+
+    Args:
+        connection: SQLAlchemy Connection (inside the caller's transaction)
+        addresses: IP addresses or hostnames
+    """
+    addresses = set(addresses)
+    if not addresses:
+        return
+    known = set(connection.execute(
+        select(targets.c.address).where(targets.c.address.in_(addresses))
+    ).scalars())
+    register_targets(connection, sorted(addresses - known))
+
+
+def register_targets(connection, addresses):
+    """Add targets rows for addresses, skipping ones that already exist.
+
+    Probe workers, agent ingests and upgrades may register the same new
+    address at the same time; the loser's insert does nothing instead of
+    failing its whole transaction on the unique address.
+
+    Args:
+        connection: SQLAlchemy Connection (inside the caller's transaction)
+        addresses: IP addresses or hostnames
+    """
+    if not addresses:
+        return
+    # INSERT ... ON CONFLICT DO NOTHING, supported by both databases
+    dialect = postgresql if connection.dialect.name == 'postgresql' else sqlite
+    connection.execute(dialect.insert(targets).on_conflict_do_nothing(index_elements=['address']),
+                       [{'address': address, 'enabled': True} for address in addresses])
+
+
+def target_settings(connection, address):
+    """Return the targets row for an address, or None if it is unknown."""
+    return connection.execute(select(targets).where(targets.c.address == address)).first()
+
+
+def result_target_filter(addresses):
+    """WHERE clause restricting ping_results to the given target addresses.
+
+    Uses the (target, timestamp) index.
+    """
+    return ping_results.c.target.in_(addresses)
+
+
+def rollup_target_filter(addresses):
+    """WHERE clause restricting ping_rollups to the given target addresses."""
+    return ping_rollups.c.target.in_(addresses)
+
+
+def register_result_targets(engine, log=print):
+    """Register every target seen in ping_results that has no targets row.
+
+    Args:
+        engine: SQLAlchemy Engine
+        log: Progress callback taking a message string
+
+    Returns:
+        Number of targets registered
+    """
+    with engine.begin() as connection:
+        known = set(connection.execute(select(targets.c.address)).scalars())
+        seen = connection.execute(select(ping_results.c.target).distinct()).scalars().all()
+        missing = sorted(address for address in seen if address not in known)
+        if missing:
+            register_targets(connection, missing)
+            log(f"Registered {len(missing)} target(s)")
+    return len(missing)
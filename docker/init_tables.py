@@ -7,12 +7,20 @@ sys.path.append('/app')
 
 from backend.models import db, PingResult
 from backend.app import create_app
+from backend.migrate import upgrade
+from backend.ingest import get_engine
 
 try:
     app = create_app()
     with app.app_context():
         print("Creating database tables...")
-        db.create_all()
+        # Only on the primary; a read replica gets the tables by replication
+        db.create_all(bind_key=None)
+        
+        # Add columns/indexes introduced since the tables were first created,
+        # on a worker engine: index builds and backfills on a large table may
+        # run far longer than any request
+        upgrade(get_engine(app.config['SQLALCHEMY_DATABASE_URI']))
         
         # SQLAlchemy 2.x compatible way to get table names
         from sqlalchemy import inspect
@@ -11,6 +11,11 @@ Key features:
 - Automatic recovery from test failures
 - Logging of test execution and results
 - Dynamic loading of the test module
+- Optional Prometheus metrics listener (METRICS_PORT)
+- Leader election between redundant workers, so each scheduled test runs
+  on exactly one of them (LEADER_ELECTION, see backend/leases.py)
+- Nightly materialization of the daily uptime reports (REPORT_TIME, see
+  backend/reports.py)
 """
 import os
 import sys
@@ -19,6 +24,10 @@ import importlib.util
 import time
 from datetime import datetime
 from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.events import EVENT_JOB_SUBMITTED
+
+from backend.config import config
+from backend.metrics import SCHEDULER_LAG, start_metrics_server
 
 # Configure logging
 logging.basicConfig(
@@ -95,22 +104,70 @@ def run_test():
         # Catch and log any exception to prevent the scheduler from crashing
         logger.error(f"Error running network test: {e}")
 
+def run_reports():
+    """Materialize the daily uptime reports due since the last run.
+
+    Every worker runs this; days are replaced under the write lock, so a
+    second run only repeats the work.
+    """
+    try:
+        # Reports need numpy and SQLAlchemy; keep them out of worker startup
+        from backend.reports import run_nightly
+
+        written = run_nightly(log=logger.info)
+        logger.info(f"Daily reports completed: {written} rows")
+    except Exception as e:
+        logger.error(f"Error materializing daily reports: {e}")
+
+def record_scheduler_lag(event):
+    """Record how late a test started relative to its scheduled time."""
+    now = datetime.now(event.scheduled_run_times[0].tzinfo)
+    for scheduled in event.scheduled_run_times:
+        SCHEDULER_LAG.observe(max((now - scheduled).total_seconds(), 0.0))
+
 def main():
     """Initialize and start the test scheduler.
     
     This function:
     1. Reads configuration from environment variables
-    2. Sets up a recurring job to execute network tests
+    2. Sets up a recurring job to execute network tests, run only while this
+       worker leads the target's schedule when leader election is on
     3. Keeps the scheduler running until process termination
     """
     # Get test interval from environment variables with a sensible default
     interval_seconds = float(os.environ.get('TEST_INTERVAL', '60'))
     logger.info(f"Starting scheduler with interval: {interval_seconds} seconds")
     
+    # Expose this worker's metrics (probe duration, scheduler lag, DB write
+    # latency and per-target results) for Prometheus if a port is configured
+    metrics_port = os.environ.get('METRICS_PORT')
+    if metrics_port:
+        start_metrics_server(int(metrics_port))
+        logger.info(f"Serving metrics on port {metrics_port}")
+    
     # Create the scheduler
     scheduler = BackgroundScheduler()
-    scheduler.add_job(run_test, 'interval', seconds=interval_seconds, 
-                      next_run_time=datetime.now())
+    scheduler.add_listener(record_scheduler_lag, EVENT_JOB_SUBMITTED)
+    settings = config['default']
+    election = None
+    if settings.LEADER_ELECTION != 'off':
+        # SQLAlchemy is only loaded when workers elect a leader
+        from backend.ingest import get_engine
+        from backend.leases import make_election
+
+        election = make_election(get_engine(), settings.TEST_TARGET, interval_seconds,
+                                 method=settings.LEADER_ELECTION, owner=settings.WORKER_ID or None)
+    if election is None:
+        scheduler.add_job(run_test, 'interval', seconds=interval_seconds, 
+                          next_run_time=datetime.now())
+    else:
+        from backend.leases import ElectedProbe
+
+        logger.info(f"Leader election on: worker {election.owner} ({type(election).__name__})")
+        ElectedProbe(election, interval_seconds, run_test).add_jobs(scheduler)
+    report_hour, report_minute = settings.REPORT_TIME.split(':')
+    scheduler.add_job(run_reports, 'cron', hour=int(report_hour), minute=int(report_minute),
+                      timezone='UTC', misfire_grace_time=3600, coalesce=True)
     
     try:
         scheduler.start()
@@ -126,6 +183,9 @@ def main():
     except (KeyboardInterrupt, SystemExit):
         logger.info("Scheduler stopped")
         scheduler.shutdown()
+        if election is not None:
+            # Hand the schedule to a standby right away
+            election.release()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -39,6 +39,7 @@ export default createStore({
   state: {
     pingResults: [],
     stats: null,
+    historyStart: null,
     loading: false,
     error: null,
     theme: getThemeFromLocalStorage()
@@ -67,6 +68,9 @@ export default createStore({
     SET_STATS(state, stats) {
       state.stats = stats
     },
+    SET_HISTORY_START(state, historyStart) {
+      state.historyStart = historyStart
+    },
     SET_LOADING(state, loading) {
       state.loading = loading
     },
@@ -105,6 +109,33 @@ export default createStore({
       }
     },
     
+    async fetchDashboard({ commit }, { hours = 3, statsHours = 24, points = 180 } = {}) {
+      commit('SET_LOADING', true)
+      try {
+        const params = { hours, stats_hours: statsHours, points }
+        const response = await axios.get(`${API_URL}/dashboard`, { params })
+        const { latest, day_stats, series, history_start } = response.data
+        
+        // Expand the columnar series back into rows for the chart getters
+        const results = series.timestamps.map((timestamp, i) => ({
+          timestamp,
+          avg_latency: series.avg_latency[i],
+          jitter: series.jitter[i],
+          packet_loss: series.packet_loss[i],
+          anomaly_score: series.anomaly_score ? series.anomaly_score[i] : null
+        }))
+        
+        commit('SET_STATS', { latest, day_stats })
+        commit('SET_HISTORY_START', history_start)
+        commit('SET_PING_RESULTS', results)
+      } catch (error) {
+        commit('SET_ERROR', error.message || 'Failed to fetch dashboard data')
+        console.error('Error fetching dashboard data:', error)
+      } finally {
+        commit('SET_LOADING', false)
+      }
+    },
+    
     setTheme({ commit }, theme) {
       // Update store
       commit('SET_THEME', theme)
@@ -47,7 +47,8 @@ export const formatMetricData = (results, metricKey) => {
   const formattedData = results
     .map(result => ({
       timestamp: parseUtcTimestamp(result.timestamp),
-      value: result[metricKey]
+      value: result[metricKey],
+      anomaly: result.anomaly_score
     }))
     .sort((a, b) => a.timestamp - b.timestamp);
     
@@ -1,5 +1,10 @@
 const fs = require('fs');
 const path = require('path');
+const zlib = require('zlib');
+const CompressionPlugin = require('compression-webpack-plugin');
+
+// File types worth precompressing; Flask serves these .gz/.br siblings directly
+const compressibleAssets = /\.(js|css|html|svg|json|map|txt)$/;
 
 // Copy VERSION file from repo root to public directory during build time
 const copyVersionFile = () => {
@@ -50,5 +55,25 @@ module.exports = {
       copyVersionFile();
       return args;
     });
+
+    // Precompress build output so the server never compresses static files
+    if (process.env.NODE_ENV === 'production') {
+      config.plugin('compress-gzip').use(CompressionPlugin, [{
+        filename: '[path][base].gz',
+        algorithm: 'gzip',
+        compressionOptions: { level: 9 },
+        test: compressibleAssets,
+        threshold: 1024,
+        minRatio: 0.9
+      }]);
+      config.plugin('compress-brotli').use(CompressionPlugin, [{
+        filename: '[path][base].br',
+        algorithm: 'brotliCompress',
+        compressionOptions: { params: { [zlib.constants.BROTLI_PARAM_QUALITY]: 11 } },
+        test: compressibleAssets,
+        threshold: 1024,
+        minRatio: 0.9
+      }]);
+    }
   }
 }
\ No newline at end of file
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Size and speed of the per-packet sample encoding (backend/codec.py).
+
+Generates tests the way ping reports them: requests every PING_INTERVAL
+with a little timer jitter, RTTs around a per-test base latency with
+lognormal jitter, occasional spikes and lost packets, and RTTs printed
+with 3 significant digits. Each link profile is encoded test by test and
+compared with plain float storage.
+
+Reported per profile:
+- bytes per sample for float64 pairs, float32 pairs, zlib-compressed
+  float64 pairs and the codec
+- encode and decode throughput in samples per second (one blob per test)
+
+Usage:
+    python tests/benchmarks/bench_codec.py --tests 2000
+"""
+import argparse
+import time
+import zlib
+
+import numpy as np
+
+import common  # noqa: F401
+
+from backend.codec import encode_samples, decode_samples
+
+# name: (base RTT ms, jitter sigma, spike probability, loss probability)
+PROFILES = {
+    'lan': (0.8, 0.15, 0.001, 0.0),
+    'broadband': (15.0, 0.08, 0.01, 0.002),
+    'cellular': (60.0, 0.35, 0.03, 0.02),
+}
+
+
+def generate_tests(profile, tests, count=400, interval=0.1, seed=42):
+    """Yield (times, rtts) arrays for consecutive simulated ping tests."""
+    base, sigma, spike, loss = PROFILES[profile]
+    rng = np.random.default_rng(seed)
+    started = 1.7e9
+    for test in range(tests):
+        # Slow drift of the base latency across the day
+        drift = 1 + 0.2 * np.sin(2 * np.pi * test / 1440)
+        sent = started + test * 60 + np.arange(count) * interval + rng.normal(0, 50e-6, count)
+        rtts = base * drift * rng.lognormal(0, sigma, count)
+        spikes = rng.random(count) < spike
+        rtts[spikes] += rng.exponential(base * 5, spikes.sum())
+        kept = rng.random(count) >= loss
+        # ping prints e.g. time=0.812 ms, time=15.3 ms, time=123 ms
+        rtts = np.array([float(f'{rtt:.3g}') for rtt in rtts[kept]])
+        yield sent[kept] + rtts / 1e3, rtts
+
+
+def bench_profile(profile, tests):
+    data = list(generate_tests(profile, tests))
+    samples = sum(len(rtts) for _, rtts in data)
+
+    sizes = {
+        'float64': 16 * samples,
+        'float32': 8 * samples,
+        'zlib': sum(len(zlib.compress(np.column_stack(pair).tobytes())) for pair in data),
+    }
+
+    began = time.perf_counter()
+    blobs = [encode_samples(times, rtts) for times, rtts in data]
+    encode_seconds = time.perf_counter() - began
+    sizes['codec'] = sum(len(blob) for blob in blobs)
+
+    began = time.perf_counter()
+    decoded = [decode_samples(blob) for blob in blobs]
+    decode_seconds = time.perf_counter() - began
+
+    # Lossless up to the quantization steps (1 ms times, ping's RTT digits)
+    for (times, rtts), (out_times, out_rtts) in zip(data, decoded):
+        assert np.allclose(out_rtts, rtts, rtol=0, atol=1e-9)
+        assert np.abs(out_times - times).max(initial=0) <= 0.0005 + 1e-6
+
+    return samples, sizes, samples / encode_seconds, samples / decode_seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tests', type=int, default=2000, help='Ping tests per profile (400 packets each)')
+    parser.add_argument('--profiles', nargs='+', choices=sorted(PROFILES), default=list(PROFILES))
+    args = parser.parse_args()
+
+    print(f"{'profile':<11}{'samples':>9}{'float64':>9}{'float32':>9}{'zlib':>7}{'codec':>7}"
+          f"{'encode/s':>12}{'decode/s':>12}   (bytes per sample)")
+    for profile in args.profiles:
+        samples, sizes, encode_rate, decode_rate = bench_profile(profile, args.tests)
+        per_sample = {name: size / samples for name, size in sizes.items()}
+        print(f"{profile:<11}{samples:>9}{per_sample['float64']:>9.2f}{per_sample['float32']:>9.2f}"
+              f"{per_sample['zlib']:>7.2f}{per_sample['codec']:>7.2f}"
+              f"{encode_rate:>12,.0f}{decode_rate:>12,.0f}")
+
+
+if __name__ == '__main__':
+    main()
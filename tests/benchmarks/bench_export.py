@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the streaming /api/export path.
+
+Seeds a file database with synthetic ping results, then drains the export
+generator and reports throughput and how much resident memory grew while
+streaming. Exits non-zero if throughput is below --min-rate.
+
+Usage:
+    python tests/benchmarks/bench_export.py --rows 1000000 --format ndjson
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from common import create_bench_app, current_rss_mb
+
+from backend.models import db, PingResult
+from backend.export import generate_export
+
+
+def seed(rows, chunk=50000):
+    """Bulk insert synthetic one-minute results ending now."""
+    table = PingResult.__table__
+    start = datetime.utcnow() - timedelta(minutes=rows)
+    for offset in range(0, rows, chunk):
+        batch = []
+        for i in range(offset, min(offset + chunk, rows)):
+            latency = random.gauss(15.0, 2.0)
+            batch.append({
+                'timestamp': start + timedelta(minutes=i),
+                'target': '1.1.1.1',
+                'packet_loss': 0.0 if random.random() > 0.05 else 2.5,
+                'min_latency': latency - 3,
+                'max_latency': latency + 8,
+                'avg_latency': latency,
+                'jitter': abs(random.gauss(1.0, 0.3)),
+                'packets_sent': 400,
+                'packets_received': 400
+            })
+        db.session.execute(table.insert(), batch)
+        db.session.commit()
+    return start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1000000, help='Rows to seed and export')
+    parser.add_argument('--format', choices=['ndjson', 'csv'], default='ndjson')
+    parser.add_argument('--gzip', action='store_true', help='Compress the stream on the fly')
+    parser.add_argument('--database', help='SQLAlchemy URI (default: temporary SQLite file)')
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--min-rate', type=float, default=100000, help='Minimum rows/sec to pass')
+    args = parser.parse_args()
+
+    tmpdir = None
+    uri = args.database
+    if not uri:
+        tmpdir = tempfile.mkdtemp()
+        uri = f"sqlite:///{os.path.join(tmpdir, 'bench.db')}"
+
+    app = create_bench_app(uri)
+    with app.app_context():
+        db.create_all()
+        print(f"Seeding {args.rows:,} rows into {uri.split('@')[-1]}...")
+        start = seed(args.rows)
+
+        baseline = current_rss_mb()
+        peak = baseline
+        total_bytes = 0
+        began = time.perf_counter()
+        for i, chunk in enumerate(generate_export(start, datetime.utcnow() + timedelta(minutes=1), fmt=args.format,
+                                                  compress=args.gzip, batch_size=args.batch_size)):
+            total_bytes += len(chunk)
+            if i % 20 == 0:
+                peak = max(peak, current_rss_mb())
+        elapsed = time.perf_counter() - began
+
+        rate = args.rows / elapsed
+        print(f"Format:        {args.format}{' (gzip)' if args.gzip else ''}")
+        print(f"Rows:          {args.rows:,}")
+        print(f"Elapsed:       {elapsed:.2f}s")
+        print(f"Throughput:    {rate:,.0f} rows/sec")
+        print(f"Output:        {total_bytes / (1024 * 1024):.1f} MB")
+        print(f"RSS growth:    {peak - baseline:.1f} MB (baseline {baseline:.1f} MB)")
+
+        db.session.remove()
+        db.drop_all()
+
+    if tmpdir:
+        os.remove(os.path.join(tmpdir, 'bench.db'))
+        os.rmdir(tmpdir)
+
+    if rate < args.min_rate:
+        print(f"FAIL: throughput below {args.min_rate:,.0f} rows/sec")
+        sys.exit(1)
+    print("PASS")
+
+
+if __name__ == '__main__':
+    main()
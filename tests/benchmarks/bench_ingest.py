@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Benchmark for /api/ingest with many agents posting at once.
+
+Serves the app over HTTP on a local port and has several agent threads POST
+pre-encoded gzip batches of synthetic results concurrently, each agent
+covering its own targets. Reports end-to-end throughput (results stored
+per second, including rollups, baselines and incident detection) and
+exits non-zero if it is below --min-rate.
+
+Usage:
+    python tests/benchmarks/bench_ingest.py --agents 8 --results 100000
+"""
+import argparse
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+from werkzeug.serving import make_server
+
+from common import create_bench_app
+
+from backend.agent import Agent, encode_batch, to_wire
+from backend.models import db, PingResult
+
+TOKEN = 'bench-token'
+
+
+def synthetic_batches(agent_number, results, batch_size, targets):
+    """Encoded batches of one-minute results for an agent's targets."""
+    start = datetime.utcnow() - timedelta(minutes=results // targets + 1)
+    wire = []
+    for i in range(results):
+        latency = random.gauss(15.0, 2.0)
+        loss = 0.0 if random.random() > 0.02 else 100.0
+        rtts = [] if loss else [round(random.gauss(latency, 1.0), 3) for _ in range(10)]
+        wire.append(to_wire({
+            'timestamp': start + timedelta(minutes=i // targets),
+            'target': f'10.{agent_number}.0.{i % targets}',
+            'packet_loss': loss,
+            'min_latency': min(rtts, default=0), 'max_latency': max(rtts, default=0),
+            'avg_latency': latency if rtts else 0, 'jitter': 1.0 if rtts else 0,
+            'packets_sent': 10, 'packets_received': len(rtts),
+            'rtt_samples': rtts, 'rtt_times': [0.1 * n for n in range(len(rtts))]
+        }))
+    agent_id = f'agent-{agent_number}'
+    return [encode_batch(agent_id, f'{agent_id}-{offset}', wire[offset:offset + batch_size])
+            for offset in range(0, results, batch_size)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--agents', type=int, default=8, help='Concurrent agents')
+    parser.add_argument('--results', type=int, default=100000, help='Results in total across agents')
+    parser.add_argument('--batch-size', type=int, default=500, help='Results per POST')
+    parser.add_argument('--targets', type=int, default=4, help='Targets per agent')
+    parser.add_argument('--database', help='SQLAlchemy URI (default: temporary SQLite file)')
+    parser.add_argument('--min-rate', type=float, default=2000, help='Minimum results/sec to pass')
+    args = parser.parse_args()
+
+    tmpdir = None
+    uri = args.database
+    if not uri:
+        tmpdir = tempfile.mkdtemp()
+        uri = f"sqlite:///{os.path.join(tmpdir, 'bench.db')}"
+
+    app = create_bench_app(uri)
+    app.config['INGEST_TOKEN'] = TOKEN
+    with app.app_context():
+        db.create_all()
+
+    per_agent = args.results // args.agents
+    print(f"Encoding {per_agent * args.agents:,} results for {args.agents} agents...")
+    batches = [synthetic_batches(number, per_agent, args.batch_size, args.targets) for number in range(args.agents)]
+    payload = sum(len(body) for agent_batches in batches for body in agent_batches)
+
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_port}'
+
+    errors = []
+
+    def deliver(agent_batches, number):
+        agent = Agent(url, f'agent-{number}', TOKEN, timeout=300)
+        for body in agent_batches:
+            try:
+                agent.post(body)
+            except OSError as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=deliver, args=(agent_batches, number))
+               for number, agent_batches in enumerate(batches)]
+    began = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - began
+    server.shutdown()
+
+    with app.app_context():
+        stored = PingResult.query.count()
+        db.session.remove()
+        db.drop_all()
+        db.engine.dispose()
+
+    rate = stored / elapsed
+    print(f"Agents:        {args.agents}")
+    print(f"Batches:       {sum(len(agent_batches) for agent_batches in batches):,} of {args.batch_size}")
+    print(f"Stored:        {stored:,} results ({len(errors)} failed posts)")
+    print(f"Payload:       {payload / (1024 * 1024):.1f} MB gzip")
+    print(f"Elapsed:       {elapsed:.2f}s")
+    print(f"Throughput:    {rate:,.0f} results/sec")
+
+    if tmpdir:
+        os.remove(os.path.join(tmpdir, 'bench.db'))
+        os.rmdir(tmpdir)
+
+    if errors or stored != per_agent * args.agents:
+        print(f"FAIL: {len(errors)} posts failed, first: {errors[0] if errors else None}")
+        sys.exit(1)
+    if rate < args.min_rate:
+        print(f"FAIL: throughput below {args.min_rate:,.0f} results/sec")
+        sys.exit(1)
+    print("PASS")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Probe engine load harness.
+
+Runs ping_test() against the simulated ping binary in tests/utility/fakeping
+for 1, 10, 100 and 1000 targets and ingests every result through the same
+write path as the probe worker (backend.ingest.save_result). Probes run on a
+thread pool and feed a single writer, mirroring one worker probing many
+targets against one database.
+
+For each target count it reports:
+- CPU per probe: process plus child (ping) CPU time divided by probes
+- memory per target: peak RSS growth during the round divided by targets
+- end-to-end latency: from the last reply being parsed to the row committed
+
+The fake ping's RTT, loss, duplicate and delay behaviour comes from the
+FAKE_PING_* environment variables (see tests/utility/fakeping/ping); by
+default it answers instantly so the harness measures the engine, not the
+simulated network.
+
+Usage:
+    python tests/benchmarks/bench_probe.py --targets 1 10 100 --count 100
+    FAKE_PING_LOSS=0.02 FAKE_PING_SPEED=0.01 python tests/benchmarks/bench_probe.py
+"""
+import argparse
+import contextlib
+import io
+import os
+import queue
+import resource
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import common  # noqa: F401  (puts the project root on sys.path)
+from bench_api import RssSampler, percentile
+from seed_data import target_names
+
+from sqlalchemy import func, select
+
+from backend.ingest import get_engine, save_result
+from backend.pingTest import ping_test
+from backend.schema import metadata, ping_results
+
+FAKEPING_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'utility', 'fakeping'
+)
+
+
+def cpu_seconds():
+    """CPU time used by this process and its reaped children."""
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+
+def run_round(engine, targets, count, interval, workers):
+    """Probe every target once and commit the results.
+
+    Returns:
+        Dictionary of measurements for the round
+    """
+    results = queue.Queue()
+
+    def probe(target):
+        test_results = ping_test(target=target, count=count, interval=interval)
+        # ping_test returns right after parsing the final reply
+        results.put((time.perf_counter(), test_results))
+
+    cpu_before = cpu_seconds()
+    latencies = []
+    committed = 0
+    began = time.perf_counter()
+    # ping_test prints a summary per target; keep the report readable
+    with RssSampler() as sampler, contextlib.redirect_stdout(io.StringIO()):
+        with ThreadPoolExecutor(max_workers=min(workers, len(targets))) as pool:
+            futures = [pool.submit(probe, target) for target in targets]
+            # Single writer: commit results in arrival order while probes run
+            for _ in targets:
+                replied, test_results = results.get()
+                if test_results and save_result(engine, test_results):
+                    committed += 1
+                    latencies.append((time.perf_counter() - replied) * 1000)
+            for future in futures:
+                future.result()
+    elapsed = time.perf_counter() - began
+    cpu = cpu_seconds() - cpu_before
+
+    return {
+        'targets': len(targets),
+        'committed': committed,
+        'elapsed_s': elapsed,
+        'cpu_ms_per_probe': cpu * 1000 / len(targets),
+        'rss_kb_per_target': sampler.growth * 1024 / len(targets),
+        'e2e_p50_ms': percentile(latencies, 50) if latencies else None,
+        'e2e_p99_ms': percentile(latencies, 99) if latencies else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--targets', type=int, nargs='+', default=[1, 10, 100, 1000],
+                        help='Target counts to run')
+    parser.add_argument('--count', type=int, default=400, help='Pings per test (TEST_COUNT)')
+    parser.add_argument('--interval', default='0.1', help='Seconds between pings (PING_INTERVAL)')
+    parser.add_argument('--workers', type=int, default=32, help='Concurrent probes')
+    parser.add_argument('--database', help='SQLAlchemy URI (default: temporary SQLite file)')
+    args = parser.parse_args()
+
+    # Resolve "ping" to the simulator for this process and its children
+    os.environ['PATH'] = FAKEPING_DIR + os.pathsep + os.environ.get('PATH', '')
+    os.environ.setdefault('FAKE_PING_SEED', '42')
+
+    tmpdir = None
+    uri = args.database
+    if not uri:
+        tmpdir = tempfile.mkdtemp()
+        uri = f"sqlite:///{os.path.join(tmpdir, 'bench.db')}"
+
+    engine = get_engine(uri)
+    try:
+        metadata.create_all(engine)
+        print(f"{'targets':>8}{'committed':>11}{'elapsed s':>11}{'cpu ms/probe':>14}"
+              f"{'rss KB/target':>15}{'e2e p50 ms':>12}{'e2e p99 ms':>12}")
+        for count in args.targets:
+            row = run_round(engine, target_names(count), args.count, args.interval, args.workers)
+            print(f"{row['targets']:>8}{row['committed']:>11}{row['elapsed_s']:>11.2f}"
+                  f"{row['cpu_ms_per_probe']:>14.1f}{row['rss_kb_per_target']:>15.1f}"
+                  f"{row['e2e_p50_ms'] or 0:>12.1f}{row['e2e_p99_ms'] or 0:>12.1f}")
+        with engine.connect() as connection:
+            total = connection.execute(select(func.count()).select_from(ping_results)).scalar()
+        print(f"\n{total:,} rows committed")
+        metadata.drop_all(engine)
+    finally:
+        if tmpdir:
+            shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Cold-start time and memory of the probe worker's ingest path.
+
+Each measurement runs in a fresh interpreter that imports the ingest stack,
+connects and commits one result, so it captures what the test container
+pays on every start. Two paths are compared:
+
+- flask: a minimal Flask app with Flask-SQLAlchemy, as run_network_test()
+  used to build for every test
+- core: backend.ingest (SQLAlchemy Core, no Flask)
+
+Usage:
+    python tests/benchmarks/bench_worker_startup.py --runs 5
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+RESULT = """
+import datetime
+result = {'timestamp': datetime.datetime.utcnow(), 'target': '1.1.1.1', 'packet_loss': 0.0,
+          'min_latency': 10.0, 'max_latency': 20.0, 'avg_latency': 15.0, 'jitter': 1.0,
+          'packets_sent': 400, 'packets_received': 400}
+"""
+
+SCRIPTS = {
+    'flask': RESULT + """
+from flask import Flask
+from backend.models import db, PingResult
+from backend.rollups import update_rollups
+app = Flask(__name__)
+app.config['SQLALCHEMY_DATABASE_URI'] = DATABASE_URI
+db.init_app(app)
+with app.app_context():
+    db.session.add(PingResult(**result))
+    update_rollups(db.session.connection(), result)
+    db.session.commit()
+""",
+    'core': RESULT + """
+from backend.ingest import get_engine, save_result
+save_result(get_engine(DATABASE_URI), result)
+""",
+}
+
+
+def measure(mode, database_uri):
+    """Run one cold start and return (seconds, peak RSS in MB)."""
+    code = f'DATABASE_URI = {database_uri!r}\n' + SCRIPTS[mode]
+    began = time.perf_counter()
+    process = subprocess.Popen([sys.executable, '-c', code], cwd=PROJECT_ROOT)
+    _, status, usage = os.wait4(process.pid, 0)
+    elapsed = time.perf_counter() - began
+    if status:
+        raise RuntimeError(f'{mode} run failed with status {status}')
+    # ru_maxrss is kilobytes on Linux
+    return elapsed, usage.ru_maxrss / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--modes', nargs='+', choices=sorted(SCRIPTS), default=['flask', 'core'])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        uri = f"sqlite:///{os.path.join(tmpdir, 'bench.db')}"
+        # Create the tables once, outside the measured runs
+        sys.path.insert(0, PROJECT_ROOT)
+        from sqlalchemy import create_engine
+        from backend.schema import metadata
+        metadata.create_all(create_engine(uri))
+
+        print(f"{'path':<8}{'cold start ms':>15}{'peak RSS MB':>13}")
+        for mode in args.modes:
+            samples = [measure(mode, uri) for _ in range(args.runs)]
+            print(f"{mode:<8}{statistics.median(s[0] for s in samples) * 1000:>15.0f}"
+                  f"{statistics.median(s[1] for s in samples):>13.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""
+Shared helpers for the benchmark scripts in this directory.
+"""
+import os
+import sys
+import resource
+
+# Add project root to the path so imports work
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from backend.config import config, TestingConfig
+
+
+def create_bench_app(database_uri):
+    """Create an application bound to a benchmark database.
+
+    Benchmarks need a real file or server database rather than the in-memory
+    SQLite used by the test configuration, so a throwaway configuration
+    profile is registered for the given URI.
+
+    Args:
+        database_uri: SQLAlchemy database URI to benchmark against
+
+    Returns:
+        Configured Flask application instance
+    """
+    from backend.app import create_app
+
+    class BenchmarkConfig(TestingConfig):
+        DEBUG = False
+        SQLALCHEMY_DATABASE_URI = database_uri
+        SQLALCHEMY_ENGINE_OPTIONS = {} if database_uri.startswith('sqlite') else {
+            "connect_args": {"options": f"-csearch_path={TestingConfig.POSTGRES_SCHEMA}"}
+        }
+
+    config['benchmark'] = BenchmarkConfig
+    return create_app('benchmark')
+
+
+def current_rss_mb():
+    """Current resident set size of this process in megabytes."""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError):
+        # Not Linux: fall back to the peak, which is the best we have
+        return peak_rss_mb()
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in megabytes."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is kilobytes on Linux and bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Synthetic ping history generator.
+
+Bulk-generates realistic PingResult rows for N targets at one result per
+TEST_INTERVAL, with:
+- a diurnal latency pattern (evening congestion peak, quiet nights)
+- random latency spikes
+- loss bursts (a two-state Markov model: short runs of heavy loss)
+- collection gaps (hours where the probe container was down)
+- an RTT quantile sketch per result, shaped like a test's packets around
+  its average latency, and optionally the encoded packets themselves
+
+Rollup tiers are rebuilt and incidents detected for the seeded range so
+rollup- and incident-backed endpoints see the same data as raw ones.
+
+Usage:
+    python tests/benchmarks/seed_data.py --database sqlite:////tmp/nes.db --targets 2 --days 365
+"""
+import argparse
+import math
+import random
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from common import create_bench_app
+
+from backend.codec import encode_samples
+from backend.incidents import rebuild_incidents
+from backend.models import db, PingResult
+from backend.rollups import rebuild_rollups
+from backend.sketch import LatencySketch
+from backend.targets import ensure_targets
+
+DEFAULT_TARGETS = ['1.1.1.1', '8.8.8.8', '9.9.9.9', '208.67.222.222']
+
+# Result timestamps are naive UTC
+EPOCH = datetime(1970, 1, 1)
+
+
+def target_names(count):
+    """Return `count` distinct target addresses."""
+    names = DEFAULT_TARGETS[:count]
+    names += [f'10.0.{i // 256}.{i % 256}' for i in range(count - len(names))]
+    return names
+
+
+class PacketFactory:
+    """Cheap per-result sketches (and samples) for synthetic results.
+
+    Scaling every value by gamma^k shifts a DDSketch's bins by k, so a few
+    sketches of a unit-median RTT shape are built once and shifted to each
+    result's latency. Results with loss, and results that also store their
+    samples, are sketched from the actual packets.
+    """
+
+    def __init__(self, rng, packets, interval=0.1, samples=False, shapes=16):
+        generator = np.random.default_rng(rng.randrange(2 ** 32))
+        self.rng = rng
+        self.samples = samples
+        self.offsets = np.arange(packets) * interval
+        self.values = [generator.lognormal(0, 0.08, packets) for _ in range(shapes)]
+        self.sketches = [LatencySketch.from_values(values) for values in self.values]
+
+    def __call__(self, timestamp, latency, received):
+        if not received:
+            return {'latency_sketch': None, 'samples': None}
+        choice = self.rng.randrange(len(self.values))
+        if self.samples or received < len(self.values[choice]):
+            # ping prints RTTs with 3 significant digits
+            rtts = np.round(self.values[choice][:received] * latency, 2 - int(math.floor(math.log10(latency))))
+            sketch = LatencySketch.from_values(rtts).to_bytes()
+            if not self.samples:
+                return {'latency_sketch': sketch, 'samples': None}
+            started = (timestamp - EPOCH).total_seconds()
+            times = started + self.offsets[:received] + rtts / 1e3
+            return {'latency_sketch': sketch, 'samples': encode_samples(times, rtts)}
+        template = self.sketches[choice]
+        sketch = LatencySketch(template.relative_accuracy)
+        sketch.offset = template.offset + round(math.log(latency) / math.log(sketch.gamma))
+        sketch.counts = template.counts
+        return {'latency_sketch': sketch.to_bytes(), 'samples': None}
+
+
+def generate_results(targets, start, end, interval=60, packets=400, seed=42, samples=False):
+    """Yield synthetic ping_test()-style result dictionaries in time order.
+
+    Args:
+        targets: List of target addresses
+        start: First timestamp (naive UTC datetime)
+        end: Timestamp to stop before
+        interval: Seconds between results per target
+        packets: Packets sent per test
+        seed: Random seed so runs are reproducible
+        samples: Also generate encoded per-packet samples
+
+    Yields:
+        Result dictionaries with the PingResult columns
+    """
+    rng = random.Random(seed)
+    step = timedelta(seconds=interval)
+    # Per-target baseline latency and whether it is currently in a loss burst
+    base = {target: rng.uniform(8, 35) for target in targets}
+    burst_left = {target: 0 for target in targets}
+    gap_until = start
+    make_packets = PacketFactory(rng, packets, samples=samples)
+
+    timestamp = start
+    while timestamp < end:
+        # Occasionally the whole collector is down for a few hours
+        if timestamp >= gap_until and rng.random() < 1 / (60 * 24 * 20):
+            gap_until = timestamp + timedelta(hours=rng.uniform(0.5, 6))
+        if timestamp < gap_until:
+            timestamp += step
+            continue
+
+        hour = timestamp.hour + timestamp.minute / 60
+        # Peak around 20:00 UTC, trough around 08:00
+        diurnal = math.cos((hour - 20) / 24 * 2 * math.pi)
+
+        for target in targets:
+            latency = base[target] * (1 + 0.25 * max(diurnal, 0)) + rng.gauss(0, 1.2)
+            if rng.random() < 0.002:
+                latency *= rng.uniform(2, 6)  # Latency spike
+            latency = max(latency, 0.5)
+
+            if burst_left[target] == 0 and rng.random() < 0.003 * (1 + max(diurnal, 0)):
+                burst_left[target] = rng.randint(1, 15)
+            if burst_left[target]:
+                burst_left[target] -= 1
+                lost = int(packets * rng.uniform(0.05, 1.0))
+            else:
+                lost = sum(1 for _ in range(3) if rng.random() < 0.01)
+
+            received = packets - lost
+            jitter = abs(rng.gauss(latency * 0.06, latency * 0.02))
+            if received:
+                min_latency = latency - abs(rng.gauss(latency * 0.15, 0.5))
+                max_latency = latency + abs(rng.gauss(latency * 0.8, 2))
+                avg_latency = latency
+            else:
+                min_latency = max_latency = avg_latency = jitter = 0
+
+            tested_at = timestamp + timedelta(seconds=rng.uniform(0, 2))
+            yield {
+                'timestamp': tested_at,
+                'target': target,
+                'packet_loss': lost / packets * 100,
+                'min_latency': max(min_latency, 0),
+                'max_latency': max_latency,
+                'avg_latency': avg_latency,
+                'jitter': jitter,
+                'packets_sent': packets,
+                'packets_received': received,
+                **make_packets(tested_at, avg_latency, received)
+            }
+        timestamp += step
+
+
+def seed_database(targets, days, end=None, interval=60, chunk=20000, seed=42, samples=False, verbose=True):
+    """Insert synthetic history into the current app's database.
+
+    Must be called inside an application context.
+
+    Args:
+        targets: Number of targets to generate
+        days: Days of history ending at `end`
+        end: End of the history (default: now)
+        interval: Seconds between results per target
+        chunk: Rows per bulk INSERT
+        seed: Random seed
+        samples: Also store encoded per-packet samples
+
+    Returns:
+        Number of rows inserted
+    """
+    end = end or datetime.utcnow()
+    start = end - timedelta(days=days)
+    table = PingResult.__table__
+    names = target_names(targets)
+    # Bulk Core inserts bypass the ORM hook that registers targets
+    ensure_targets(db.session.connection(), names)
+
+    began = time.perf_counter()
+    batch = []
+    inserted = 0
+    for result in generate_results(names, start, end, interval=interval, seed=seed, samples=samples):
+        batch.append(result)
+        if len(batch) >= chunk:
+            db.session.execute(table.insert(), batch)
+            inserted += len(batch)
+            batch = []
+            if verbose and inserted % (chunk * 10) == 0:
+                print(f"  {inserted:,} rows ({inserted / (time.perf_counter() - began):,.0f} rows/sec)")
+    if batch:
+        db.session.execute(table.insert(), batch)
+        inserted += len(batch)
+    db.session.commit()
+
+    rebuild_rollups(db.session.connection(), start, end)
+    rebuild_incidents(db.session.connection(), start, end)
+    db.session.commit()
+
+    if verbose:
+        print(f"Seeded {inserted:,} rows for {len(names)} target(s) in {time.perf_counter() - began:.1f}s")
+    return inserted
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database', required=True, help='SQLAlchemy URI to seed')
+    parser.add_argument('--targets', type=int, default=1)
+    parser.add_argument('--days', type=float, default=365)
+    parser.add_argument('--interval', type=int, default=60, help='Seconds between results')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--samples', action='store_true', help='Also store per-packet samples')
+    parser.add_argument('--reset', action='store_true', help='Drop and recreate tables first')
+    args = parser.parse_args()
+
+    app = create_bench_app(args.database)
+    with app.app_context():
+        if args.reset:
+            db.drop_all()
+        db.create_all()
+        seed_database(args.targets, args.days, interval=args.interval, seed=args.seed, samples=args.samples)
+
+
+if __name__ == '__main__':
+    main()
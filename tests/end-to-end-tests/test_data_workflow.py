@@ -73,7 +73,7 @@ class TestEndToEndWorkflow(unittest.TestCase):
                 count_before = PingResult.query.count()
                 
                 # Directly call the ping_test function and store the results
-                # instead of using run_network_test() which creates its own Flask app
+                # instead of using run_network_test() which writes through its own engine
                 test_results = ping_test(
                     target=self.app.config['TEST_TARGET'],
                     count=self.app.config['TEST_COUNT'],
@@ -228,6 +228,63 @@ class TestEndToEndWorkflow(unittest.TestCase):
         # max_latency should be the maximum of all max_latency values (24.0)
         self.assertEqual(data['day_stats']['max_latency'], 24.0)
     
+    def test_dashboard_api(self):
+        """Test the combined dashboard endpoint returns latest, stats and series"""
+        # One result every 4 hours over two days
+        for i in range(12):
+            timestamp = datetime.datetime.utcnow() - datetime.timedelta(hours=i*4)
+            ping_result = PingResult(
+                timestamp=timestamp,
+                target="8.8.8.8",
+                packet_loss=i*1.0,
+                min_latency=10.0 - i*0.5,
+                max_latency=20.0 + i,
+                avg_latency=15.0 + i*0.5,
+                jitter=1.0 + i*0.2,
+                packets_sent=100,
+                packets_received=100 - i
+            )
+            db.session.add(ping_result)
+        
+        db.session.commit()
+        
+        response = self.client.get('/api/dashboard?hours=168&stats_hours=24&points=500')
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()
+        
+        # Latest and day stats must match what the separate endpoints return
+        stats = self.client.get('/api/ping-stats').get_json()
+        self.assertEqual(data['latest'], stats['latest'])
+        for key, value in stats['day_stats'].items():
+            self.assertAlmostEqual(data['day_stats'][key], value, places=6)
+        
+        # With more points than rows every result keeps its own bucket
+        series = data['series']
+        self.assertEqual(len(series['timestamps']), 12)
+        self.assertEqual(series['counts'], [1] * 12)
+        self.assertAlmostEqual(series['avg_latency'][-1], 15.0, places=6)
+        self.assertAlmostEqual(series['packet_loss'][0], 11.0, places=6)
+        
+        # Downsampling to 4 points over 168h merges rows into fewer buckets
+        response = self.client.get('/api/dashboard?hours=168&points=4')
+        series = response.get_json()['series']
+        self.assertLessEqual(len(series['timestamps']), 4)
+        self.assertEqual(sum(series['counts']), 12)
+        
+        # Short ranges only carry their own rows, and history_start tells how
+        # far back longer ranges have data
+        response = self.client.get('/api/dashboard?hours=10&points=600')
+        data = response.get_json()
+        self.assertEqual(data['series']['counts'], [1] * 3)
+        oldest = db.session.query(db.func.min(PingResult.timestamp)).scalar()
+        self.assertEqual(data['history_start'], oldest.isoformat())
+    
+    def test_dashboard_api_empty(self):
+        """Test the dashboard endpoint reports missing data like ping-stats"""
+        response = self.client.get('/api/dashboard')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.get_json()['status'], 'error')
+    
     def test_full_workflow(self):
         """Test the complete workflow from ping collection to API response"""
         # Mock the ping subprocess call
@@ -247,7 +304,7 @@ class TestEndToEndWorkflow(unittest.TestCase):
             
             try:
                 # Step 1: Collect ping data and directly store it 
-                # (skip run_network_test which creates its own Flask app)
+                # (skip run_network_test which writes through its own engine)
                 test_results = ping_test(
                     target=self.app.config['TEST_TARGET'],
                     count=self.app.config['TEST_COUNT'],
@@ -0,0 +1,124 @@
+import unittest
+import os
+import sys
+import tempfile
+from unittest.mock import patch
+
+# Add the main project directory to the Python path
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(PROJECT_ROOT)
+
+from sqlalchemy import select
+
+from backend import ingest
+from backend.adaptive import AdaptiveProbeController
+from backend.config import config
+from backend.schema import metadata, ping_results
+
+# Simulated ping binary used instead of the system ping
+FAKEPING_DIR = os.path.join(PROJECT_ROOT, 'tests', 'utility', 'fakeping')
+
+
+def make_result(target='1.1.1.1', packet_loss=0.0, avg_latency=20.0, jitter=1.0):
+    return {'target': target, 'packet_loss': packet_loss, 'avg_latency': avg_latency, 'jitter': jitter}
+
+
+class TestAdaptiveProbeController(unittest.TestCase):
+    """Test rate decisions of the adaptive probe controller."""
+
+    def setUp(self):
+        self.controller = AdaptiveProbeController(min_rate=1.0, max_rate=8.0, window=10.0, stable_runs=3)
+
+    def test_relaxes_to_min_rate_when_stable(self):
+        """The rate halves after each run of stable results, down to the minimum"""
+        self.assertEqual(self.controller.rate('1.1.1.1'), 8.0)
+        rates = [self.controller.observe(make_result()) for _ in range(12)]
+        self.assertEqual(rates[2], 4.0)
+        self.assertEqual(rates[5], 2.0)
+        self.assertEqual(rates[8], 1.0)
+        self.assertEqual(rates[11], 1.0)
+
+    def test_loss_and_jitter_ramp_to_max_rate(self):
+        """Loss or jitter above threshold jumps straight back to the maximum"""
+        for _ in range(9):
+            self.controller.observe(make_result())
+        self.assertEqual(self.controller.observe(make_result(packet_loss=2.0)), 8.0)
+
+        for _ in range(9):
+            self.controller.observe(make_result())
+        self.assertEqual(self.controller.observe(make_result(jitter=25.0)), 8.0)
+
+    def test_latency_shift_is_trouble(self):
+        """A jump in average latency against the baseline counts as trouble"""
+        for _ in range(9):
+            self.controller.observe(make_result(avg_latency=20.0))
+        self.assertEqual(self.controller.rate('1.1.1.1'), 1.0)
+        self.assertEqual(self.controller.observe(make_result(avg_latency=45.0)), 8.0)
+
+    def test_targets_are_independent(self):
+        """Trouble on one target does not change another's rate"""
+        for _ in range(3):
+            self.controller.observe(make_result(target='8.8.8.8'))
+        self.controller.observe(make_result(target='1.1.1.1', packet_loss=50.0))
+        self.assertEqual(self.controller.rate('8.8.8.8'), 4.0)
+        self.assertEqual(self.controller.rate('1.1.1.1'), 8.0)
+
+    def test_settings_keep_the_probe_window(self):
+        """Packet count scales with the rate so each test covers the same time"""
+        self.assertEqual(self.controller.settings('1.1.1.1'), (80, '0.125'))
+        for _ in range(9):
+            self.controller.observe(make_result())
+        self.assertEqual(self.controller.settings('1.1.1.1'), (10, '1'))
+
+    def test_invalid_rates_rejected(self):
+        """min_rate must be positive and not above max_rate"""
+        with self.assertRaises(ValueError):
+            AdaptiveProbeController(min_rate=5.0, max_rate=2.0)
+        with self.assertRaises(ValueError):
+            AdaptiveProbeController(min_rate=0.0)
+
+
+class TestAdaptiveProbing(unittest.TestCase):
+    """Test the probe worker with adaptive probing enabled."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.engine = ingest.get_engine(f"sqlite:///{os.path.join(self.tmpdir.name, 'adaptive.db')}")
+        metadata.create_all(self.engine)
+        self.controller = AdaptiveProbeController(min_rate=2.0, max_rate=20.0, window=1.0, stable_runs=1)
+
+    def tearDown(self):
+        metadata.drop_all(self.engine)
+        self.engine.dispose()
+        self.tmpdir.cleanup()
+
+    def test_probe_rate_recorded_per_result(self):
+        """Each stored result carries the rate it was probed at"""
+        env = {'PATH': FAKEPING_DIR + os.pathsep + os.environ.get('PATH', ''),
+               'FAKE_PING_RTT': 'constant:12', 'FAKE_PING_SEED': '1'}
+        with patch.dict(os.environ, env), patch('sys.stdout'), \
+                patch.object(config['default'], 'ADAPTIVE_PROBING', True), \
+                patch.object(ingest, '_controller', self.controller):
+            first = ingest.run_probe(self.engine, target='192.0.2.1')
+            second = ingest.run_probe(self.engine, target='192.0.2.1')
+
+        self.assertEqual((first['packets_sent'], first['probe_rate']), (20, 20.0))
+        self.assertEqual((second['packets_sent'], second['probe_rate']), (10, 10.0))
+        with self.engine.connect() as connection:
+            stored = connection.execute(select(ping_results.c.probe_rate).order_by(ping_results.c.id)).scalars().all()
+        self.assertEqual(stored, [20.0, 10.0])
+
+    def test_explicit_settings_bypass_controller(self):
+        """Explicit count and interval are used as given"""
+        env = {'PATH': FAKEPING_DIR + os.pathsep + os.environ.get('PATH', ''), 'FAKE_PING_SEED': '1'}
+        with patch.dict(os.environ, env), patch('sys.stdout'), \
+                patch.object(config['default'], 'ADAPTIVE_PROBING', True), \
+                patch.object(ingest, '_controller', self.controller):
+            result = ingest.run_probe(self.engine, target='192.0.2.1', count=5, interval='0.5')
+
+        self.assertEqual((result['packets_sent'], result['probe_rate']), (5, 2.0))
+        self.assertEqual(self.controller.rate('192.0.2.1'), 20.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
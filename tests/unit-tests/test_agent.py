@@ -0,0 +1,278 @@
+import unittest
+import gzip
+import json
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+from unittest.mock import patch
+from urllib.error import HTTPError, URLError
+
+# Add the main project directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from sqlalchemy import create_engine, func, select
+
+from backend.agent import Agent, BatchError, BatchTooLarge, decode_batch, encode_batch, to_wire
+from backend.app import create_app
+from backend.ingest import write_batch, write_result
+from backend.metrics import RESULTS_WRITTEN, TARGET_LAST_RESULT, TARGET_RTT
+from backend.models import db
+from backend.schema import (
+    incident_targets, incidents, ingest_batches, latency_baselines, metadata, ping_results, ping_rollups
+)
+
+TOKEN = 'secret-token'
+START = datetime(2024, 3, 4)
+
+
+def ping(timestamp, target, loss=0.0, latency=20.0):
+    """A ping_test()-style result with the given loss and average latency."""
+    received = round(100 * (1 - loss / 100))
+    rtts = [latency] * 5 if received else []
+    return {
+        'timestamp': timestamp, 'target': target, 'packet_loss': loss,
+        'min_latency': latency * 0.9 if received else 0, 'max_latency': latency * 1.2 if received else 0,
+        'avg_latency': latency if received else 0, 'jitter': 1.0 if received else 0,
+        'packets_sent': 100, 'packets_received': received,
+        'rtt_samples': rtts, 'rtt_times': [0.1 * i for i in range(len(rtts))]
+    }
+
+
+def history(hours=26):
+    """Clean results for two targets with an outage and a latency spike at the end."""
+    results = [ping(START + timedelta(minutes=minute), target)
+               for minute in range(0, hours * 60, 15) for target in ('1.1.1.1', '8.8.8.8')]
+    end = START + timedelta(hours=hours)
+    results += [ping(end, '1.1.1.1', loss=100), ping(end + timedelta(minutes=1), '1.1.1.1'),
+                ping(end + timedelta(minutes=2), '8.8.8.8', latency=95),
+                ping(end + timedelta(minutes=3), '8.8.8.8', loss=100)]
+    return results
+
+
+class TestWireFormat(unittest.TestCase):
+    """Test encoding and validating agent batches."""
+
+    def test_round_trip(self):
+        """An encoded batch decodes to the same results"""
+        result = dict(ping(START, '1.1.1.1'), loss_burst_histogram=[0, 0, 0, 0, 0, 0], loss_max_run=0)
+        batch = decode_batch(encode_batch('site-a', 'b1', [to_wire(result)]), 'gzip')
+        self.assertEqual((batch['agent_id'], batch['batch_id']), ('site-a', 'b1'))
+        self.assertEqual(batch['results'], [result])
+
+    def test_rejects_malformed_batches(self):
+        """Bad JSON, types and missing fields are rejected with a 400"""
+        good = to_wire(ping(START, '1.1.1.1'))
+        for body in (b'not json', b'[]', json.dumps({'agent_id': 'a', 'results': []}).encode(),
+                     json.dumps({'agent_id': 'a', 'batch_id': 'b', 'results': [dict(good, packet_loss='x')]}).encode(),
+                     json.dumps({'agent_id': 'a', 'batch_id': 'b', 'results': [dict(good, timestamp='soon')]}).encode(),
+                     json.dumps({'agent_id': 'a', 'batch_id': 'b', 'results': [{'target': 'x'}]}).encode()):
+            with self.assertRaises(BatchError) as caught:
+                decode_batch(body)
+            self.assertEqual(caught.exception.status, 400)
+        with self.assertRaises(BatchError):
+            decode_batch(b'not gzip', 'gzip')
+
+    def test_limits(self):
+        """Batches over the result or decompressed size limit are rejected with a 413"""
+        results = [to_wire(ping(START, '1.1.1.1'))] * 3
+        with self.assertRaises(BatchTooLarge):
+            decode_batch(encode_batch('a', 'b', results), 'gzip', max_results=2)
+        # A small gzip body inflating past the limit is stopped while decompressing
+        bomb = gzip.compress(b' ' * 10 ** 6)
+        with self.assertRaises(BatchTooLarge) as caught:
+            decode_batch(bomb, 'gzip', max_bytes=1000)
+        self.assertEqual(caught.exception.status, 413)
+
+
+class TestWriteBatch(unittest.TestCase):
+    """write_batch() leaves the derived tables as writing results one by one does."""
+
+    def snapshot(self, engine):
+        with engine.connect() as connection:
+            rollups = connection.execute(
+                select(ping_rollups).order_by(ping_rollups.c.tier, ping_rollups.c.target, ping_rollups.c.bucket_start)
+            ).all()
+            return {
+                'results': connection.execute(
+                    select(ping_results.c.target, ping_results.c.timestamp, ping_results.c.anomaly_score,
+                           ping_results.c.latency_sketch).order_by(ping_results.c.timestamp, ping_results.c.target)
+                ).all(),
+                'rollups': [row[1:] for row in rollups],
+                'baselines': connection.execute(
+                    select(latency_baselines.c.target, latency_baselines.c.hour_of_week, latency_baselines.c.mean,
+                           latency_baselines.c.variance, latency_baselines.c.samples)
+                    .order_by(latency_baselines.c.target, latency_baselines.c.hour_of_week)
+                ).all(),
+                'incidents': connection.execute(
+                    select(incidents).order_by(incidents.c.started_at, incidents.c.kind)).all(),
+                'incident_targets': connection.execute(
+                    select(incident_targets).order_by(incident_targets.c.incident_id, incident_targets.c.target)
+                ).all()
+            }
+
+    def test_matches_write_result(self):
+        """Scores, rollups, baselines and incidents match result-by-result ingest"""
+        results = history()
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        # Separate files: latency baselines are cached by database URL
+        one_by_one, batched = (create_engine(f"sqlite:///{os.path.join(tmpdir.name, name)}.db")
+                               for name in ('one_by_one', 'batched'))
+        for engine in (one_by_one, batched):
+            metadata.create_all(engine)
+            self.addCleanup(engine.dispose)
+        with one_by_one.begin() as connection:
+            for result in results:
+                write_result(connection, dict(result))
+        # Out of order, across several batches
+        with batched.begin() as connection:
+            for offset in range(0, len(results), 70):
+                write_batch(connection, [dict(result) for result in reversed(results[offset:offset + 70])])
+
+        expected, actual = self.snapshot(one_by_one), self.snapshot(batched)
+        self.assertTrue(expected['incidents'])
+        for name in expected:
+            self.assertEqual(len(actual[name]), len(expected[name]), name)
+        for name in ('results', 'baselines'):
+            for got, want in zip(actual[name], expected[name]):
+                self.assertEqual(got[:2], want[:2])
+                for a, b in zip(got[2:], want[2:]):
+                    if isinstance(b, float):
+                        self.assertAlmostEqual(a, b)
+                    else:
+                        self.assertEqual(a, b)
+        for name in ('rollups', 'incidents', 'incident_targets'):
+            self.assertEqual(actual[name], expected[name], name)
+
+
+class TestIngestAPI(unittest.TestCase):
+    """Test /api/ingest and an agent delivering to it."""
+
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app.config['INGEST_TOKEN'] = TOKEN
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def post(self, body, token=TOKEN, encoding='gzip'):
+        headers = {'Authorization': f'Bearer {token}'}
+        if encoding:
+            headers['Content-Encoding'] = encoding
+        return self.client.post('/api/ingest', data=body, headers=headers, content_type='application/json')
+
+    def count(self, table):
+        return db.session.execute(select(func.count()).select_from(table)).scalar()
+
+    def test_ingest_batch(self):
+        """A gzip batch is stored in one go, tagged with its agent, and folded into the derived tables"""
+        results = [to_wire(ping(START + timedelta(minutes=minute), '1.1.1.1')) for minute in range(10)]
+        written, observed = RESULTS_WRITTEN.value(target='1.1.1.1'), TARGET_RTT.count(target='1.1.1.1')
+        response = self.post(encode_batch('site-a', 'batch-1', results))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json(),
+                         {'status': 'success', 'batch_id': 'batch-1', 'results': 10, 'duplicate': False})
+
+        self.assertEqual(db.session.execute(select(ping_results.c.agent).distinct()).scalars().all(), ['site-a'])
+        self.assertEqual(self.count(ping_results), 10)
+        self.assertEqual(db.session.execute(select(ping_rollups.c.result_count)
+                                            .where(ping_rollups.c.tier == 86400)).scalar(), 10)
+        self.assertEqual(db.session.execute(select(latency_baselines.c.samples)).scalar(), 10)
+        self.assertEqual(db.session.execute(select(ingest_batches.c.result_count)).scalar(), 10)
+
+        # The web service's /metrics covers agent-measured targets too
+        self.assertEqual(RESULTS_WRITTEN.value(target='1.1.1.1'), written + 10)
+        self.assertEqual(TARGET_RTT.count(target='1.1.1.1'), observed + 50)
+        self.assertEqual(TARGET_LAST_RESULT.value(target='1.1.1.1'),
+                         (START + timedelta(minutes=9) - datetime(1970, 1, 1)).total_seconds())
+
+    def test_duplicate_batch(self):
+        """A batch sent again is acknowledged without being stored twice"""
+        body = encode_batch('site-a', 'batch-1', [to_wire(ping(START, '1.1.1.1'))])
+        self.assertFalse(self.post(body).get_json()['duplicate'])
+        self.assertTrue(self.post(body).get_json()['duplicate'])
+        self.assertEqual(self.count(ping_results), 1)
+
+    def test_errors(self):
+        """Malformed, unauthorized, oversized and disabled requests are refused"""
+        self.assertEqual(self.post(b'{"agent_id": "a"}', encoding=None).status_code, 400)
+        self.assertEqual(self.post(b'garbage').status_code, 400)
+        self.assertEqual(self.post(encode_batch('a', 'b', []), token='wrong').status_code, 401)
+        self.assertEqual(self.client.post('/api/ingest', data=encode_batch('a', 'b', [])).status_code, 401)
+        self.app.config['INGEST_MAX_RESULTS'] = 1
+        results = [to_wire(ping(START, '1.1.1.1'))] * 2
+        self.assertEqual(self.post(encode_batch('a', 'b', results)).status_code, 413)
+        self.app.config['INGEST_TOKEN'] = ''
+        self.assertEqual(self.post(encode_batch('a', 'b', []), token='').status_code, 403)
+        self.assertEqual(self.count(ping_results), 0)
+
+    def agent(self, failures=()):
+        """An agent posting through the test client; failures are raised in turn before each post."""
+        client, failures = self.client, list(failures)
+        sent = []
+
+        class TestAgent(Agent):
+            def post(self, body):
+                batch_id = json.loads(gzip.decompress(body))['batch_id']
+                failure = failures.pop(0) if failures else None
+                if isinstance(failure, HTTPError) and failure.code >= 500:
+                    raise failure
+                response = client.post('/api/ingest', data=body, content_type='application/json', headers={
+                    'Authorization': f'Bearer {self.token}', 'Content-Encoding': 'gzip'})
+                sent.append((batch_id, response.get_json().get('duplicate')))
+                if response.status_code != 200:
+                    raise HTTPError(self.url, response.status_code, 'error', None, None)
+                if failure is not None:
+                    # Stored by the server, but the response never arrives
+                    raise failure
+                return response.get_json()
+
+        return TestAgent('http://monitor', 'site-a', TOKEN, batch_size=4), sent
+
+    def test_agent_retries_lost_acknowledgement(self):
+        """An unacknowledged batch is resent with the same id and not stored twice"""
+        agent, sent = self.agent([URLError('connection reset'), HTTPError('', 503, 'busy', None, None)])
+        for minute in range(6):
+            agent.add(ping(START + timedelta(minutes=minute), '1.1.1.1'))
+        with patch('sys.stdout'):
+            self.assertEqual(agent.flush(), 0)
+            self.assertTrue(agent.retry_at > 0)
+            self.assertEqual(agent.flush(), 0)
+            self.assertEqual(agent.failures, 2)
+            self.assertEqual(agent.flush(), 6)
+
+        self.assertEqual(len(sent), 3)
+        self.assertEqual(sent[0][0], sent[1][0])
+        self.assertEqual([duplicate for _, duplicate in sent], [False, True, False])
+        self.assertEqual(self.count(ping_results), 6)
+        self.assertEqual((agent.pending, len(agent.buffer), agent.failures), (None, 0, 0))
+
+    def test_agent_drops_rejected_batch(self):
+        """A batch the server rejects as malformed is dropped rather than retried forever"""
+        agent, sent = self.agent()
+        agent.add(ping(START, 'x' * 60))
+        agent.add(ping(START, '1.1.1.1'))
+        agent.batch_size = 1
+        with patch('sys.stdout'):
+            self.assertEqual(agent.flush(), 1)
+        self.assertEqual(len(sent), 2)
+        self.assertEqual(self.count(ping_results), 1)
+
+    def test_agent_buffer_is_bounded(self):
+        """While the server is unreachable only the newest results are kept"""
+        agent = Agent('http://monitor', 'site-a', buffer_size=3)
+        for minute in range(5):
+            agent.add(ping(START + timedelta(minutes=minute), '1.1.1.1'))
+        self.assertEqual([result['timestamp'] for result in agent.buffer],
+                         [(START + timedelta(minutes=minute)).isoformat() for minute in (2, 3, 4)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,246 @@
+import unittest
+import json
+import os
+import sys
+import tempfile
+import threading
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+# Add the main project directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from backend import alerts
+from backend.alerts import AlertEngine, Rule, WebhookQueue, load_rules
+from backend.ingest import get_engine, save_result
+from backend.schema import metadata
+
+START = datetime(2024, 3, 4, 12)
+
+
+def ping(minutes, target='1.1.1.1', loss=0.0, latency=20.0, baseline=None):
+    """A result `minutes` after START, with RTT samples around the given latency."""
+    received = round(100 * (1 - loss / 100))
+    rtts = [latency * (0.9 + 0.002 * i) for i in range(min(received, 100))]
+    result = {
+        'timestamp': START + timedelta(minutes=minutes), 'target': target, 'packet_loss': loss,
+        'min_latency': min(rtts, default=0), 'max_latency': max(rtts, default=0),
+        'avg_latency': latency if received else 0, 'jitter': 1.0, 'packets_sent': 100,
+        'packets_received': received, 'rtt_samples': rtts, 'rtt_times': [0.1 * i for i in range(len(rtts))]
+    }
+    if baseline is not None:
+        result['baseline_latency'] = baseline
+    return result
+
+
+class WebhookReceiver:
+    """Local HTTP stand-in for a webhook, answering with queued status codes (then 200)."""
+
+    def __init__(self, statuses=()):
+        self.statuses = list(statuses)
+        self.received = []
+        receiver = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers['Content-Length']))
+                status = receiver.statuses.pop(0) if receiver.statuses else 200
+                if status == 200:
+                    receiver.received.append(json.loads(body))
+                self.send_response(status)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.server.server_port}/hook'
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class TestRules(unittest.TestCase):
+    """Test parsing rule definitions."""
+
+    def test_load_rules(self):
+        """Rules load from inline JSON or a file"""
+        spec = [{'name': 'loss', 'metric': 'packet_loss', 'threshold': 5, 'for': 3},
+                {'name': 'slow', 'metric': 'p95_latency', 'threshold': 2, 'baseline': True, 'window': 900}]
+        rules = load_rules(json.dumps(spec))
+        self.assertEqual([(rule.name, rule.consecutive, rule.window) for rule in rules],
+                         [('loss', 3, None), ('slow', 1, 900.0)])
+        with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as f:
+            json.dump({'rules': spec}, f)
+        self.addCleanup(os.remove, f.name)
+        self.assertEqual(len(load_rules(f.name)), 2)
+        self.assertEqual(load_rules(''), [])
+
+    def test_invalid_rules(self):
+        """Malformed rules are reported by name"""
+        for spec in ([{'name': 'a', 'metric': 'nope', 'threshold': 1}],
+                     [{'name': 'a', 'metric': 'p95_latency', 'threshold': 1}],
+                     [{'name': 'a', 'metric': 'jitter', 'threshold': 1, 'op': '=='}],
+                     [{'name': 'a', 'metric': 'jitter', 'threshold': 'high'}],
+                     [{'name': 'a', 'metric': 'jitter', 'threshold': 1, 'color': 'red'}],
+                     [{'name': 'a', 'metric': 'jitter', 'threshold': 1}, {'name': 'a', 'metric': 'jitter', 'threshold': 2}]):
+            with self.assertRaises(ValueError):
+                load_rules(json.dumps(spec))
+
+
+class TestAlertEngine(unittest.TestCase):
+    """Test incremental rule evaluation."""
+
+    def test_consecutive_results(self):
+        """A rule fires after `for` breaching results in a row, once, and resolves on recovery"""
+        engine = AlertEngine([Rule('loss', 'packet_loss', 5, consecutive=3)])
+        losses = [10, 10, 0, 10, 10, 10, 20, 0, 0]
+        events = [engine.evaluate(ping(minute, loss=loss)) for minute, loss in enumerate(losses)]
+        self.assertEqual([[event['status'] for event in batch] for batch in events],
+                         [[], [], [], [], [], ['firing'], [], ['resolved'], []])
+        firing, resolved = events[5][0], events[7][0]
+        self.assertEqual(firing['dedup_key'], resolved['dedup_key'])
+        self.assertEqual((firing['started_at'], resolved['ended_at']),
+                         (ping(5)['timestamp'].isoformat(), ping(7)['timestamp'].isoformat()))
+        self.assertEqual(engine.firing(), {})
+
+    def test_windowed_percentile_against_baseline(self):
+        """p95 over a window is compared with a multiple of the baseline, and recovers as the window slides"""
+        engine = AlertEngine([Rule('slow', 'p95_latency', 2, baseline=True, window=900)])
+        statuses = []
+        for minute in range(60):
+            latency = 50.0 if 10 <= minute < 13 else 20.0
+            statuses += [(minute, event['status']) for event in engine.evaluate(ping(minute, latency=latency,
+                                                                                      baseline=20.0))]
+        # Fires on the first slow result (100 of 1100 packets); resolves once
+        # the last one has left the 15 minute window
+        self.assertEqual(statuses, [(10, 'firing'), (27, 'resolved')])
+        # No baseline yet: the rule cannot be judged
+        self.assertEqual(engine.evaluate(ping(61, latency=90.0)), [])
+
+    def test_windowed_average(self):
+        """Scalar windows average the results inside them"""
+        engine = AlertEngine([Rule('jittery', 'avg_latency', 30, window=300)])
+        statuses = []
+        for minute, latency in enumerate([20, 20, 20, 20, 20, 90, 20, 20, 20, 20, 20]):
+            statuses += [(minute, event['status']) for event in engine.evaluate(ping(minute, latency=latency))]
+        # (4 * 20 + 90) / 5 = 34 breaches; the spike leaves the window after 5 minutes
+        self.assertEqual(statuses, [(5, 'firing'), (10, 'resolved')])
+
+    def test_rules_indexed_by_target(self):
+        """Only a target's own rules are evaluated, and windows are shared between them"""
+        rules = [Rule(f'other-{n}', 'packet_loss', 5, targets=[f'10.0.0.{n}']) for n in range(1000)]
+        rules += [Rule('warning', 'p95_latency', 30, window=900), Rule('critical', 'p95_latency', 60, window=900)]
+        engine = AlertEngine(rules)
+        engine.evaluate(ping(0))
+        keys, applicable = engine._plan('1.1.1.1')
+        self.assertEqual([rule.name for rule in applicable], ['warning', 'critical'])
+        self.assertEqual(keys, (('p95_latency', 900),))
+        self.assertEqual(len(engine._windows), 1)
+
+    def test_notify(self):
+        """Events go to the rule's own webhooks, or the default ones"""
+        sent = []
+        engine = AlertEngine([Rule('own', 'packet_loss', 5, webhooks=['http://own']), Rule('default', 'jitter', 0.5)],
+                             notify=lambda event, urls: sent.append((event['rule'], urls)), webhooks=['http://all'])
+        engine.evaluate(ping(0, loss=50))
+        self.assertEqual(sent, [('own', ('http://own',)), ('default', ('http://all',))])
+
+
+class TestWebhookQueue(unittest.TestCase):
+    """Test webhook delivery against a local HTTP server."""
+
+    def setUp(self):
+        self.event = {'dedup_key': 'loss:1.1.1.1:2024-03-04T12:00:00', 'status': 'firing', 'rule': 'loss'}
+
+    def receiver(self, statuses=()):
+        receiver = WebhookReceiver(statuses)
+        self.addCleanup(receiver.close)
+        return receiver
+
+    def queue(self, **options):
+        queue = WebhookQueue(backoff=0.01, timeout=5, **options)
+        self.addCleanup(queue.stop)
+        return queue
+
+    def test_retries_until_delivered(self):
+        """Server errors are retried with backoff until the webhook accepts the event"""
+        receiver = self.receiver([500, 503])
+        queue = self.queue()
+        self.assertEqual(queue.submit(self.event, [receiver.url]), 1)
+        self.assertTrue(queue.drain(timeout=10))
+        self.assertEqual(receiver.received, [self.event])
+        self.assertEqual(receiver.statuses, [])
+
+    def test_dedup(self):
+        """An event already queued or sent for a URL is not sent again"""
+        receiver = self.receiver()
+        queue = self.queue()
+        queue.submit(self.event, [receiver.url])
+        self.assertEqual(queue.submit(dict(self.event), [receiver.url]), 0)
+        queue.drain(timeout=10)
+        self.assertEqual(queue.submit(self.event, [receiver.url]), 0)
+        # The resolved event of the same alert is a different delivery
+        self.assertEqual(queue.submit(dict(self.event, status='resolved'), [receiver.url]), 1)
+        queue.drain(timeout=10)
+        self.assertEqual([event['status'] for event in receiver.received], ['firing', 'resolved'])
+
+    def test_gives_up(self):
+        """Client errors and exhausted retries drop the delivery"""
+        receiver = self.receiver([400, 500, 500, 500])
+        queue = self.queue(max_attempts=3)
+        with patch('sys.stdout'):
+            queue.submit(self.event, [receiver.url])
+            queue.submit(dict(self.event, dedup_key='other'), [receiver.url])
+            self.assertTrue(queue.drain(timeout=10))
+        self.assertEqual(receiver.received, [])
+
+
+class TestIngestAlerts(unittest.TestCase):
+    """Committed results are evaluated against the configured rules."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.engine = get_engine(f"sqlite:///{os.path.join(self.tmpdir.name, 'alerts.db')}")
+        metadata.create_all(self.engine)
+        self.receiver = WebhookReceiver()
+        self.queue = WebhookQueue(backoff=0.01)
+        rules = load_rules(json.dumps([
+            {'name': 'loss', 'metric': 'packet_loss', 'threshold': 5, 'for': 2},
+            {'name': 'slow', 'metric': 'avg_latency', 'threshold': 2, 'baseline': True}
+        ]))
+        self.alerting = AlertEngine(rules, notify=self.queue.submit, webhooks=[self.receiver.url])
+        patcher = patch.object(alerts, '_alerting', self.alerting)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.queue.stop()
+        self.receiver.close()
+        metadata.drop_all(self.engine)
+        self.engine.dispose()
+        self.tmpdir.cleanup()
+
+    def test_save_result_notifies(self):
+        """Loss and baseline-relative latency alerts reach the webhook"""
+        # Warm up the baseline slot of one hour of the week at 20 ms
+        results = [ping(week * 7 * 24 * 60) for week in range(35)]
+        results += [ping(35 * 7 * 24 * 60 + minute, loss=loss, latency=latency)
+                    for minute, (loss, latency) in enumerate([(10, 20), (10, 20), (0, 20), (0, 60), (0, 20)])]
+        with patch('sys.stdout'):
+            for result in results:
+                self.assertTrue(save_result(self.engine, result))
+        self.assertTrue(self.queue.drain(timeout=10))
+        self.assertEqual([(event['rule'], event['status']) for event in self.receiver.received],
+                         [('loss', 'firing'), ('loss', 'resolved'), ('slow', 'firing'), ('slow', 'resolved')])
+        slow = self.receiver.received[2]
+        self.assertAlmostEqual(slow['threshold'], 40.0)
+        self.assertEqual(slow['value'], 60)
+
+
+if __name__ == '__main__':
+    unittest.main()
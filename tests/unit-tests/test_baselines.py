@@ -0,0 +1,124 @@
+import unittest
+import os
+import sys
+from datetime import datetime, timedelta
+
+# Add the main project directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import numpy as np
+from sqlalchemy import event, select
+
+from backend.app import create_app
+from backend.baselines import anomaly_score, ewma_update, hour_of_week, score_result
+from backend.ingest import write_result
+from backend.models import db, PingResult
+from backend.schema import latency_baselines
+
+# A Monday, so the hour of the week is the hour of the day
+MONDAY = datetime(2024, 3, 4)
+
+
+def ping(timestamp, latency, received=100):
+    return {
+        'timestamp': timestamp, 'target': '1.1.1.1', 'packet_loss': 100 - received,
+        'min_latency': latency, 'max_latency': latency, 'avg_latency': latency if received else 0,
+        'jitter': 0.5, 'packets_sent': 100, 'packets_received': received
+    }
+
+
+class TestEwma(unittest.TestCase):
+    """Test the streaming mean and variance."""
+
+    def test_exact_while_young(self):
+        """Until 1/alpha samples the state is the exact mean and variance"""
+        values = np.random.default_rng(3).normal(25, 4, 50)
+        state = None
+        for value in values:
+            state = ewma_update(state, value, 0.01)
+        self.assertAlmostEqual(state[0], values.mean(), places=9)
+        self.assertAlmostEqual(state[1], values.var(), places=9)
+        self.assertEqual(state[2], 50)
+
+    def test_tracks_shifts_and_resists_spikes(self):
+        """A warm slot follows a lasting shift but barely moves for one spike"""
+        rng = np.random.default_rng(4)
+        state = None
+        for value in rng.normal(20, 1, 300):
+            state = ewma_update(state, value, 0.05)
+        spiked = ewma_update(state, 500.0, 0.05)
+        self.assertLess(spiked[0] - state[0], 0.05 * 4 * np.sqrt(state[1]) + 1e-9)
+
+        for value in rng.normal(30, 1, 200):
+            state = ewma_update(state, value, 0.05)
+        self.assertAlmostEqual(state[0], 30, delta=0.5)
+
+    def test_score(self):
+        """Scores are z-scores with a floor on the deviation, and None while warming up"""
+        self.assertIsNone(anomaly_score(None, 20.0, 30))
+        self.assertIsNone(anomaly_score((20.0, 4.0, 29), 30.0, 30))
+        self.assertEqual(anomaly_score((20.0, 4.0, 30), 26.0, 30), 3.0)
+        # A perfectly steady slot still scores on a 1% deviation floor
+        self.assertAlmostEqual(anomaly_score((20.0, 0.0, 30), 20.4, 30), 2.0)
+        self.assertEqual(hour_of_week(MONDAY + timedelta(days=6, hours=23)), 167)
+
+
+class TestIngestScoring(unittest.TestCase):
+    """Test scoring results as they are ingested."""
+
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_results_scored_against_their_hour(self):
+        """Each result is scored against its target's hour-of-week slot"""
+        connection = db.session.connection()
+        rng = np.random.default_rng(5)
+        # 40 results in Monday's 10:00 slot at ~20 ms, one at 20:00 at 50 ms
+        for minute, latency in enumerate(rng.normal(20, 1, 40)):
+            write_result(connection, ping(MONDAY + timedelta(hours=10, minutes=minute), latency))
+        write_result(connection, ping(MONDAY + timedelta(hours=20), 50.0))
+        slow = ping(MONDAY + timedelta(hours=10, minutes=45), 28.0)
+        write_result(connection, slow)
+        write_result(connection, ping(MONDAY + timedelta(hours=10, minutes=46), 0, received=0))
+        db.session.commit()
+
+        scores = [result.anomaly_score for result in PingResult.query.order_by(PingResult.timestamp)]
+        self.assertEqual(scores[:30], [None] * 30)
+        self.assertTrue(all(abs(score) < 4 for score in scores[30:40]))
+        self.assertGreater(slow['anomaly_score'], 5)
+        self.assertEqual(scores[40:], [slow['anomaly_score'], None, None])
+
+        slots = {row.hour_of_week: row.samples for row in db.session.execute(select(latency_baselines))}
+        self.assertEqual(slots, {10: 41, 20: 1})
+
+        results = self.client.get('/api/ping-results?start=2024-03-04T00:00:00&end=2024-03-05T00:00:00').get_json()
+        self.assertEqual(results[40]['anomaly_score'], slow['anomaly_score'])
+
+    def test_one_keyed_lookup(self):
+        """Scoring reads nothing but the slot's row"""
+        connection = db.session.connection()
+        write_result(connection, ping(MONDAY, 20.0))
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement.split()[0].upper())
+
+        event.listen(connection.engine, 'before_cursor_execute', record)
+        try:
+            score_result(connection, ping(MONDAY + timedelta(minutes=1), 21.0))
+        finally:
+            event.remove(connection.engine, 'before_cursor_execute', record)
+        self.assertEqual(statements, ['SELECT', 'UPDATE'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+import unittest
+import os
+import sys
+import tempfile
+from datetime import datetime
+from unittest.mock import patch
+
+# Add the main project directory to the Python path
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(PROJECT_ROOT)
+
+import numpy as np
+from sqlalchemy import select
+
+from backend.app import create_app
+from backend.codec import encode_samples, decode_samples, encode_varints, decode_varints
+from backend.ingest import get_engine, run_probe
+from backend.models import db, PingResult
+from backend.schema import metadata, ping_results
+
+# Simulated ping binary used instead of the system ping
+FAKEPING_DIR = os.path.join(PROJECT_ROOT, 'tests', 'utility', 'fakeping')
+
+
+class TestCodec(unittest.TestCase):
+    """Test the per-packet sample encoding."""
+
+    def test_varint_round_trip(self):
+        """Varints round-trip across every byte length"""
+        values = np.array([0, 1, 127, 128, 300, 2 ** 35, 2 ** 63, 2 ** 64 - 1], dtype=np.uint64)
+        encoded = encode_varints(values)
+        self.assertEqual(len(encoded), 1 + 1 + 1 + 2 + 2 + 6 + 10 + 10)
+        np.testing.assert_array_equal(decode_varints(encoded), values)
+
+    def test_samples_round_trip(self):
+        """Times come back within the time quantum and RTTs exactly"""
+        rng = np.random.default_rng(7)
+        sent = 1.7e9 + np.arange(400) * 0.1
+        rtts = np.array([float(f'{rtt:.3g}') for rtt in rng.lognormal(np.log(15), 0.3, 400)])
+        kept = rng.random(400) > 0.05  # Lost packets leave gaps in the times
+        times = sent[kept] + rtts[kept] / 1e3
+
+        blob = encode_samples(times, rtts[kept])
+        decoded_times, decoded_rtts = decode_samples(blob)
+        np.testing.assert_allclose(decoded_rtts, rtts[kept], rtol=0, atol=1e-9)
+        self.assertLessEqual(np.abs(decoded_times - times).max(), 0.0005 + 1e-6)
+        self.assertLess(len(blob) / kept.sum(), 4)
+
+    def test_empty_and_single_sample(self):
+        """Tests with no or one reply encode too"""
+        times, rtts = decode_samples(encode_samples([], []))
+        self.assertEqual((times.size, rtts.size), (0, 0))
+        times, rtts = decode_samples(encode_samples([1.7e9], [12.5]))
+        self.assertAlmostEqual(times[0], 1.7e9, delta=0.0005 + 1e-6)
+        self.assertEqual(rtts.tolist(), [12.5])
+
+    def test_malformed_blobs_rejected(self):
+        """Unknown versions and truncated data raise ValueError"""
+        blob = encode_samples([1.7e9, 1.7e9 + 0.1], [10.0, 11.0])
+        for bad in (b'', b'\x09' + blob[1:], blob[:-1], blob + b'\x80'):
+            with self.assertRaises(ValueError):
+                decode_samples(bad)
+        with self.assertRaises(ValueError):
+            encode_samples([1.7e9], [10.0, 11.0])
+
+
+class TestSampleStorage(unittest.TestCase):
+    """Test storing encoded samples with each ping result."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.uri = f"sqlite:///{os.path.join(self.tmpdir.name, 'samples.db')}"
+        self.engine = get_engine(self.uri)
+        metadata.create_all(self.engine)
+
+    def tearDown(self):
+        metadata.drop_all(self.engine)
+        self.engine.dispose()
+        self.tmpdir.cleanup()
+
+    def test_probe_stores_samples(self):
+        """run_probe stores the simulated ping's replies with the result"""
+        env = {'PATH': FAKEPING_DIR + os.pathsep + os.environ.get('PATH', ''),
+               'FAKE_PING_RTT': 'normal:20:3', 'FAKE_PING_LOSS': '0.1', 'FAKE_PING_SEED': '3'}
+        with patch.dict(os.environ, env), patch('sys.stdout'):
+            result = run_probe(self.engine, target='192.0.2.1', count=50, interval='0.2')
+
+        with self.engine.connect() as connection:
+            blob = connection.execute(select(ping_results.c.samples)).scalar()
+        times, rtts = decode_samples(blob)
+        self.assertEqual(rtts.tolist(), result['rtt_samples'])
+        np.testing.assert_allclose(times, result['rtt_times'], rtol=0, atol=0.0005 + 1e-6)
+        # Replies follow the 0.2 s request interval
+        self.assertTrue(np.all(np.round(np.diff(times - rtts / 1e3) / 0.2) >= 1))
+
+    def test_model_defers_and_decodes_samples(self):
+        """PingResult loads samples lazily and decodes them"""
+        app = create_app('testing')
+        with app.app_context():
+            db.create_all()
+            db.session.add(PingResult(
+                timestamp=datetime(2024, 3, 5, 12, 0), target='1.1.1.1', packet_loss=0.0,
+                avg_latency=10.5, packets_sent=2, packets_received=2,
+                samples=encode_samples([1.7e9, 1.7e9 + 0.1], [10.2, 10.8])
+            ))
+            db.session.commit()
+            db.session.expunge_all()
+
+            stored = PingResult.query.one()
+            self.assertNotIn('samples', stored.__dict__)
+            self.assertEqual(stored.decode_samples()[1].tolist(), [10.2, 10.8])
+            self.assertNotIn('samples', stored.to_dict())
+            db.session.remove()
+            db.drop_all()
+
+    def test_samples_can_be_disabled(self):
+        """STORE_SAMPLES=false leaves the column empty"""
+        from backend.config import config
+        from backend.ingest import save_result
+
+        result = {
+            'timestamp': datetime(2024, 3, 5, 12, 0), 'target': '1.1.1.1', 'packet_loss': 0.0,
+            'min_latency': 10.0, 'max_latency': 10.0, 'avg_latency': 10.0, 'jitter': 0.0,
+            'packets_sent': 1, 'packets_received': 1, 'rtt_samples': [10.0], 'rtt_times': [1.7e9]
+        }
+        with patch.object(config['default'], 'STORE_SAMPLES', False), patch('sys.stdout'):
+            self.assertTrue(save_result(self.engine, result))
+        with self.engine.connect() as connection:
+            self.assertIsNone(connection.execute(select(ping_results.c.samples)).scalar())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+import unittest
+import os
+import sys
+from datetime import datetime, timedelta
+
+# Add the main project directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import numpy as np
+from sqlalchemy import event
+
+from backend.app import create_app
+from backend.ingest import write_batch
+from backend.models import db
+
+# The compared window, deliberately not aligned to rollup buckets
+END = datetime(2024, 3, 30, 18, 7)
+START = END - timedelta(hours=24)
+
+
+def ping(timestamp, target='1.1.1.1', loss=0.0, latency=20.0):
+    """A result with RTT samples around the given latency."""
+    received = round(100 * (1 - loss / 100))
+    rtts = [latency * (0.9 + 0.002 * i) for i in range(received)]
+    return {
+        'timestamp': timestamp, 'target': target, 'packet_loss': loss,
+        'min_latency': min(rtts, default=0), 'max_latency': max(rtts, default=0),
+        'avg_latency': latency if received else 0, 'jitter': 1.0 if received else 0,
+        'packets_sent': 100, 'packets_received': received, 'rtt_samples': rtts,
+        'rtt_times': [0.1 * i for i in range(received)]
+    }
+
+
+class TestCompare(unittest.TestCase):
+    """Test /api/compare against the raw results of each window."""
+
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.client = self.app.test_client()
+
+        # Results every 4 minutes around each compared window: the last day
+        # is slow and lossy, the week before it a little slow
+        rng = np.random.default_rng(8)
+        self.results = []
+        for days in (28, 7, 1):
+            timestamp = START - timedelta(days=days, hours=1)
+            while timestamp < END - timedelta(days=days - 1 if days == 1 else days, hours=-1):
+                age = END - timestamp
+                latency = 40.0 if age <= timedelta(days=1) else 25.0 if age <= timedelta(days=8) else 20.0
+                loss = 5.0 if age <= timedelta(days=1) and rng.random() < 0.2 else 0.0
+                self.results.append(ping(timestamp, loss=loss, latency=latency + rng.normal(0, 2)))
+                self.results.append(ping(timestamp, target='8.8.8.8', latency=90.0))
+                timestamp += timedelta(minutes=4)
+        write_batch(db.session.connection(), self.results)
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def compare(self, query=''):
+        response = self.client.get(f'/api/compare?start={START.isoformat()}&end={END.isoformat()}{query}')
+        self.assertEqual(response.status_code, 200)
+        return response.get_json()
+
+    def raw(self, days):
+        offset = timedelta(days=days)
+        return [r for r in self.results if r['target'] == '1.1.1.1'
+                and START - offset <= r['timestamp'] < END - offset]
+
+    def test_windows_match_raw_results(self):
+        """Each window's statistics equal those of its raw results"""
+        comparison = self.compare('&target=1.1.1.1')
+        windows = {'current': comparison['current'], **comparison['previous']}
+        self.assertEqual(set(comparison['previous']), {'1d', '7d', '28d'})
+        for label, days in (('current', 0), ('1d', 1), ('7d', 7), ('28d', 28)):
+            stats, raw = windows[label], self.raw(days)
+            self.assertEqual(stats['start'], (START - timedelta(days=days)).isoformat())
+            self.assertEqual(stats['results'], len(raw))
+            self.assertAlmostEqual(stats['avg_latency'], np.mean([r['avg_latency'] for r in raw]))
+            self.assertAlmostEqual(stats['avg_packet_loss'], np.mean([r['packet_loss'] for r in raw]))
+            self.assertEqual(stats['max_latency'], max(r['max_latency'] for r in raw))
+            exact = np.quantile(np.concatenate([r['rtt_samples'] for r in raw]), 0.95, method='lower')
+            self.assertLessEqual(abs(stats['p95'] - exact) / exact, 0.0101)
+
+    def test_deltas(self):
+        """Deltas show today against each earlier window"""
+        comparison = self.compare('&target=1.1.1.1')
+        current = comparison['current']
+        for label in ('1d', '7d', '28d'):
+            previous = comparison['previous'][label]
+            delta = previous['delta']['avg_latency']
+            self.assertAlmostEqual(delta['change'], current['avg_latency'] - previous['avg_latency'])
+            self.assertAlmostEqual(delta['percent'], 100 * delta['change'] / previous['avg_latency'])
+        self.assertGreater(comparison['previous']['28d']['delta']['avg_latency']['percent'], 80)
+        # No loss a week ago: the change is known, the percentage is not
+        self.assertIsNone(comparison['previous']['7d']['delta']['avg_packet_loss']['percent'])
+        self.assertGreater(comparison['previous']['7d']['delta']['avg_packet_loss']['change'], 0)
+
+    def test_single_query(self):
+        """All four windows are read in one statement"""
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        event.listen(db.engine, 'before_cursor_execute', listener)
+        self.addCleanup(event.remove, db.engine, 'before_cursor_execute', listener)
+        self.compare()
+        self.assertEqual(len([s for s in statements if 'ping_rollups' in s]), 1)
+
+    def test_empty_and_invalid(self):
+        """Windows without data report nulls; bad ranges are rejected"""
+        response = self.client.get('/api/compare?start=2020-01-01T00:00:00&end=2020-01-02T00:00:00')
+        self.assertEqual(response.status_code, 200)
+        comparison = response.get_json()
+        self.assertEqual((comparison['current']['results'], comparison['current']['avg_latency']), (0, None))
+        self.assertIsNone(comparison['previous']['1d']['delta']['p95'])
+        self.assertEqual(self.client.get('/api/compare?start=nope').status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+import unittest
+import os
+import sys
+import gzip
+import json
+import shutil
+import tempfile
+
+# Add the main project directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from backend.app import create_app
+from backend.models import db, PingResult
+from backend.compression import is_hashed_asset
+
+
+class TestStaticAssetDelivery(unittest.TestCase):
+    """Test precompressed static files and negotiated API compression."""
+
+    def setUp(self):
+        # Build a fake frontend dist directory with precompressed siblings
+        self.dist_dir = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.dist_dir, 'js'))
+        self.bundle = b'console.log("network eval");' * 100
+        with open(os.path.join(self.dist_dir, 'index.html'), 'wb') as f:
+            f.write(b'<html><body>app</body></html>')
+        with open(os.path.join(self.dist_dir, 'js', 'app.1a2b3c4d.js'), 'wb') as f:
+            f.write(self.bundle)
+        with open(os.path.join(self.dist_dir, 'js', 'app.1a2b3c4d.js.gz'), 'wb') as f:
+            f.write(gzip.compress(self.bundle))
+        with open(os.path.join(self.dist_dir, 'js', 'app.1a2b3c4d.js.br'), 'wb') as f:
+            f.write(b'brotli-bytes')
+
+        self.app = create_app('testing')
+        self.app.config['FRONTEND_DIST'] = self.dist_dir
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+        shutil.rmtree(self.dist_dir)
+
+    def test_hashed_asset_detection(self):
+        """Content-hashed bundles are recognised, index.html is not"""
+        self.assertTrue(is_hashed_asset('js/app.1a2b3c4d.js'))
+        self.assertTrue(is_hashed_asset('css/chunk-vendors.0f9e8d7c.css'))
+        self.assertFalse(is_hashed_asset('index.html'))
+        self.assertFalse(is_hashed_asset('VERSION'))
+
+    def test_brotli_sibling_preferred(self):
+        """Clients accepting br get the .br sibling with immutable caching"""
+        response = self.client.get('/js/app.1a2b3c4d.js', headers={'Accept-Encoding': 'gzip, br'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['Content-Encoding'], 'br')
+        self.assertIn('immutable', response.headers['Cache-Control'])
+        self.assertIn('Accept-Encoding', response.headers['Vary'])
+        self.assertEqual(response.mimetype, 'text/javascript')
+        self.assertEqual(response.get_data(), b'brotli-bytes')
+        response.close()
+
+    def test_gzip_sibling_and_identity_fallback(self):
+        """gzip-only clients get the .gz sibling, others get the original file"""
+        response = self.client.get('/js/app.1a2b3c4d.js', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.get_data()), self.bundle)
+        response.close()
+
+        response = self.client.get('/js/app.1a2b3c4d.js', headers={'Accept-Encoding': 'identity'})
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertEqual(response.get_data(), self.bundle)
+        response.close()
+
+    def test_spa_routes_serve_index(self):
+        """Unknown paths fall back to index.html which is always revalidated"""
+        response = self.client.get('/history')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'app', response.get_data())
+        self.assertEqual(response.headers['Cache-Control'], 'no-cache')
+        response.close()
+
+    def test_api_json_compression(self):
+        """Large API responses are gzipped when the client accepts gzip"""
+        for i in range(50):
+            db.session.add(PingResult(
+                target="1.1.1.1", packet_loss=0.0, min_latency=10.0, max_latency=20.0,
+                avg_latency=15.0, jitter=1.0, packets_sent=100, packets_received=100
+            ))
+        db.session.commit()
+
+        response = self.client.get('/api/ping-results', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        data = json.loads(gzip.decompress(response.get_data()))
+        self.assertEqual(len(data), 50)
+
+        # Without gzip support the JSON is sent uncompressed
+        response = self.client.get('/api/ping-results')
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertEqual(len(response.get_json()), 50)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -111,6 +111,18 @@ class TestConfigModule(unittest.TestCase):
         self.assertEqual(Config.PING_INTERVAL, '0.5')
         self.assertEqual(Config.TEST_INTERVAL, '120')
     
+    @mock.patch.dict(os.environ, {'DB_POOL_SIZE': '20', 'DB_POOL_RECYCLE': '600', 'DB_POOL_PRE_PING': 'false'})
+    def test_pool_options(self):
+        """Test that pool settings are passed to the engine options."""
+        importlib.reload(sys.modules['backend.config'])
+        from backend.config import Config
+        
+        options = Config.SQLALCHEMY_ENGINE_OPTIONS
+        self.assertEqual((options['pool_size'], options['max_overflow']), (20, 10))
+        self.assertEqual((options['pool_recycle'], options['pool_timeout']), (600, 30))
+        self.assertFalse(options['pool_pre_ping'])
+        self.assertEqual(Config.READ_REPLICA_URI, '')
+    
     def test_debug_flag_parsing(self):
         """Test that the DEBUG flag is correctly parsed from string to boolean."""
         # Test with 'true' (should be True)
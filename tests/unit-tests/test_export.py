@@ -0,0 +1,105 @@
+import unittest
+import os
+import sys
+import csv
+import gzip
+import io
+import json
+from datetime import datetime, timedelta
+
+# Add the main project directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from backend.app import create_app
+from backend.export import format_csv, format_ndjson
+from backend.models import db, PingResult
+
+
+class TestExportEndpoint(unittest.TestCase):
+    """Test the streaming NDJSON/CSV export endpoint."""
+
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app.config['EXPORT_BATCH_SIZE'] = 7  # Force several batches
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.client = self.app.test_client()
+
+        start = datetime(2024, 3, 5)
+        for i in range(30):
+            db.session.add(PingResult(
+                timestamp=start + timedelta(minutes=i),
+                target="1.1.1.1" if i % 2 == 0 else "8.8.8.8",
+                packet_loss=float(i % 4),
+                min_latency=10.0,
+                max_latency=20.0,
+                avg_latency=15.0 + i,
+                jitter=None if i == 3 else 1.5,
+                packets_sent=100,
+                packets_received=100 - i % 4
+            ))
+        db.session.commit()
+        self.range = 'start=2024-03-05T00:00:00&end=2024-03-06T00:00:00'
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_ndjson_export(self):
+        """NDJSON export returns one valid JSON object per result, in order"""
+        response = self.client.get(f'/api/export?{self.range}')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_streamed)
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+
+        rows = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        self.assertEqual(len(rows), 30)
+        self.assertEqual(rows[0]['timestamp'], '2024-03-05T00:00:00')
+        self.assertEqual(rows[3]['jitter'], None)
+        self.assertEqual(rows[29]['avg_latency'], 44.0)
+        self.assertEqual(rows[29]['packets_received'], 99)
+        for row, result in zip(rows, PingResult.query.order_by(PingResult.timestamp).all()):
+            expected = result.to_dict()
+            for key, value in expected.items():
+                if isinstance(value, float):
+                    self.assertAlmostEqual(row[key], value, places=3)
+                else:
+                    self.assertEqual(row[key], value)
+
+    def test_csv_export_with_target_filter(self):
+        """CSV export has a header row and honours target filters"""
+        response = self.client.get(f'/api/export?{self.range}&format=csv&target=8.8.8.8')
+        self.assertEqual(response.status_code, 200)
+        rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+        self.assertEqual(len(rows), 15)
+        self.assertTrue(all(row['target'] == '8.8.8.8' for row in rows))
+        self.assertEqual(rows[0]['timestamp'], '2024-03-05T00:01:00')
+
+    def test_gzip_export(self):
+        """gzip=true streams a gzip file that decompresses to the export"""
+        plain = self.client.get(f'/api/export?{self.range}').get_data()
+        response = self.client.get(f'/api/export?{self.range}&gzip=true')
+        self.assertEqual(response.mimetype, 'application/gzip')
+        self.assertIn('ping-results.ndjson.gz', response.headers['Content-Disposition'])
+        self.assertEqual(gzip.decompress(response.get_data()), plain)
+
+    def test_target_memo_per_export(self):
+        """Quoted targets are memoized in the caller's dict, not across exports"""
+        row = (1, datetime(2024, 3, 5), '1.1.1.1', 0.0, 10.0, 20.0, 15.0, 1.5, 100, 100, None, None)
+        quoted = {}
+        self.assertIn('"target":"1.1.1.1"', format_ndjson([row], quoted))
+        self.assertEqual(quoted, {'1.1.1.1': '"1.1.1.1"'})
+        self.assertIn(',1.1.1.1,', format_csv([row]))
+        self.assertIn('"target":"1.1.1.1"', format_ndjson([row]))
+        self.assertEqual(len(quoted), 1)
+
+    def test_invalid_format(self):
+        """Unknown formats are rejected before streaming starts"""
+        response = self.client.get('/api/export?format=xml')
+        self.assertEqual(response.status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,183 @@
+import unittest
+import os
+import sys
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+# Add the main project directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import numpy as np
+
+from backend.agent import encode_batch, to_wire
+from backend.app import create_app
+from backend.config import Config, TestingConfig
+from backend.guardrails import count_rows, estimate_rows, parse_timeouts
+from backend.ingest import write_batch
+from backend.metrics import GUARDRAIL_HITS
+from backend.models import db, PingResult
+from backend.schema import ping_rollups
+
+
+def ping(timestamp, latency):
+    """A result with the given average latency."""
+    return {
+        'timestamp': timestamp, 'target': '1.1.1.1', 'packet_loss': 0.0,
+        'min_latency': latency - 1, 'max_latency': latency + 1, 'avg_latency': latency,
+        'jitter': 1.0, 'packets_sent': 10, 'packets_received': 10
+    }
+
+
+class GuardrailTestCase(unittest.TestCase):
+    """Three days of one-minute results and a 1000-row budget."""
+
+    settings = {'QUERY_TIMEOUTS': ''}
+
+    def setUp(self):
+        with patch.multiple(TestingConfig, **self.settings):
+            self.app = create_app('testing')
+        self.app.config['QUERY_MAX_ROWS'] = 1000
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.client = self.app.test_client()
+
+        rng = np.random.default_rng(4)
+        now = datetime.utcnow().replace(second=0, microsecond=0)
+        self.results = [ping(now - timedelta(minutes=minute), 20 + rng.normal(0, 2)) for minute in range(3 * 24 * 60)]
+        write_batch(db.session.connection(), self.results)
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def hits(self, endpoint, guardrail, action):
+        return GUARDRAIL_HITS.value(endpoint=endpoint, guardrail=guardrail, action=action)
+
+
+class TestRowBudget(GuardrailTestCase):
+    """Test downsampling and refusing ranges over the row budget."""
+
+    def test_estimate(self):
+        """The rollup estimate is within an hour of results of the true count"""
+        now = datetime.utcnow()
+        estimate = estimate_rows(db.session.connection(), now - timedelta(hours=30), now)
+        self.assertGreaterEqual(estimate, 30 * 60 - 1)
+        self.assertLessEqual(estimate, 31 * 60)
+
+    def test_ping_results_downsampled(self):
+        """Ranges over the budget return averaged points from the rollups"""
+        before = self.hits('/api/ping-results', 'row_budget', 'downsampled')
+        response = self.client.get('/api/ping-results?hours=48')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['X-Downsampled'], 'row_budget')
+        points = response.get_json()
+        self.assertLessEqual(len(points), self.app.config['MAX_SERIES_POINTS'])
+        self.assertEqual(set(points[0]), {'timestamp', 'count', 'avg_latency', 'jitter', 'packet_loss'})
+        # Every result in whole rollup buckets is accounted for
+        self.assertGreater(sum(point['count'] for point in points), 47 * 60)
+        self.assertEqual(self.hits('/api/ping-results', 'row_budget', 'downsampled'), before + 1)
+
+        # Within the budget the rows are returned as they are
+        response = self.client.get('/api/ping-results?hours=6')
+        self.assertNotIn('X-Downsampled', response.headers)
+        self.assertIn('packets_sent', response.get_json()[0])
+
+    def test_ping_results_refused(self):
+        """downsample=false refuses instead, with an explanation"""
+        before = self.hits('/api/ping-results', 'row_budget', 'rejected')
+        response = self.client.get('/api/ping-results?hours=48&downsample=false')
+        self.assertEqual(response.status_code, 422)
+        self.assertIn('row budget', response.get_json()['message'])
+        self.assertEqual(self.hits('/api/ping-results', 'row_budget', 'rejected'), before + 1)
+
+    def test_history_without_rollups(self):
+        """Raw results missing from the rollups are still counted, and refused instead of served empty"""
+        db.session.execute(ping_rollups.delete())
+        db.session.commit()
+        now = datetime.utcnow()
+        self.assertEqual(estimate_rows(db.session.connection(), now - timedelta(hours=48), now), 0)
+        self.assertEqual(count_rows(db.session.connection(), now - timedelta(hours=48), now, limit=1000), 1001)
+
+        for url in ('/api/ping-results?hours=100000', '/api/dashboard?hours=72'):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 422, url)
+            self.assertIn('rollups', response.get_json()['message'])
+        with patch('backend.guardrails.explain_cost', return_value=5e6):
+            self.assertEqual(self.client.get('/api/ping-results?hours=1').status_code, 422)
+        self.assertEqual(self.client.get('/api/ping-results?hours=6').status_code, 200)
+
+    def test_dashboard_from_rollups(self):
+        """Dashboard windows over the budget keep their statistics and series shape"""
+        self.app.config['QUERY_MAX_ROWS'] = 0
+        exact = self.client.get('/api/dashboard?hours=72&points=200').get_json()
+        self.app.config['QUERY_MAX_ROWS'] = 1000
+        budgeted = self.client.get('/api/dashboard?hours=72&points=200').get_json()
+
+        self.assertEqual(budgeted['latest'], exact['latest'])
+        self.assertAlmostEqual(budgeted['day_stats']['avg_latency'], exact['day_stats']['avg_latency'], places=6)
+        self.assertEqual(budgeted['day_stats']['max_latency'], exact['day_stats']['max_latency'])
+        series = budgeted['series']
+        self.assertEqual(set(series), set(exact['series']))
+        self.assertEqual(len(series['anomaly_score']), len(series['timestamps']))
+        self.assertLessEqual(len(series['timestamps']), 200)
+
+
+class TestCostCheck(GuardrailTestCase):
+    """Test plans rejected or rerouted by their EXPLAIN cost."""
+
+    def test_expensive_plans(self):
+        """Costly exports are refused; costly result queries are downsampled"""
+        self.app.config['QUERY_MAX_ROWS'] = 0
+        with patch('backend.guardrails.explain_cost', return_value=5e6):
+            response = self.client.get('/api/export?hours=48')
+            self.assertEqual(response.status_code, 422)
+            self.assertIn('QUERY_MAX_COST', response.get_json()['message'])
+            response = self.client.get('/api/ping-results?hours=1')
+            self.assertEqual(response.headers['X-Downsampled'], 'cost')
+        with patch('backend.guardrails.explain_cost', return_value=10.0):
+            self.assertEqual(self.client.get('/api/export?hours=1').status_code, 200)
+
+
+class TestStatementTimeout(GuardrailTestCase):
+    """Test statement timeouts on SQLite (via its progress handler)."""
+
+    settings = {'QUERY_TIMEOUTS': '/api/ping-results=1'}
+
+    def test_timeout_cancels_query(self):
+        """A statement past the endpoint's timeout is cancelled with 503"""
+        self.app.config['QUERY_MAX_ROWS'] = 0
+        before = self.hits('/api/ping-results', 'timeout', 'cancelled')
+        with patch('backend.guardrails.time.monotonic', side_effect=[0.0] + [1.0] * 10000):
+            response = self.client.get('/api/ping-results?hours=72')
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('1 ms statement timeout', response.get_json()['message'])
+        self.assertEqual(self.hits('/api/ping-results', 'timeout', 'cancelled'), before + 1)
+
+        # The handler is removed again: other endpoints and later requests run
+        self.assertEqual(self.client.get('/api/series?hours=72').status_code, 200)
+        self.assertEqual(db.session.query(PingResult).count(), len(self.results))
+
+    def test_writes_not_limited(self):
+        """Ingest requests and the engine itself carry no statement timeout"""
+        self.app.config.update(QUERY_TIMEOUT_MS=1, INGEST_TOKEN='secret-token')
+        body = encode_batch('site-a', 'batch-1', [to_wire(ping(datetime.utcnow().replace(microsecond=0), 20.0))])
+        with patch('backend.guardrails.time.monotonic', side_effect=[0.0] + [1.0] * 10000):
+            response = self.client.post('/api/ingest', data=body, content_type='application/json', headers={
+                'Authorization': 'Bearer secret-token', 'Content-Encoding': 'gzip'})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('statement_timeout', Config.SQLALCHEMY_ENGINE_OPTIONS['connect_args']['options'])
+
+    def test_parse_timeouts(self):
+        """Per-endpoint timeouts parse from endpoint=milliseconds pairs"""
+        self.assertEqual(parse_timeouts('/api/export=300000, /api/series=5000'),
+                         {'/api/export': 300000, '/api/series': 5000})
+        self.assertEqual(parse_timeouts(''), {})
+        with self.assertRaises(ValueError):
+            parse_timeouts('/api/export=soon')
+
+
+if __name__ == '__main__':
+    unittest.main()
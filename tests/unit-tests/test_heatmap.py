@@ -0,0 +1,113 @@
+import unittest
+import os
+import sys
+from datetime import datetime, timedelta
+
+# Add the main project directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import numpy as np
+
+from backend.app import create_app
+from backend.ingest import write_batch
+from backend.models import db
+
+# A Monday
+START = datetime(2024, 1, 1)
+WEEKS = 2
+
+
+def ping(timestamp, target='1.1.1.1', loss=0.0, latency=20.0):
+    """A result with RTT samples around the given latency."""
+    received = round(100 * (1 - loss / 100))
+    rtts = [latency * (0.9 + 0.002 * i) for i in range(received)]
+    return {
+        'timestamp': timestamp, 'target': target, 'packet_loss': loss,
+        'min_latency': min(rtts, default=0), 'max_latency': max(rtts, default=0),
+        'avg_latency': latency if received else 0, 'jitter': 1.0 if received else 0,
+        'packets_sent': 100, 'packets_received': received, 'rtt_samples': rtts,
+        'rtt_times': [0.1 * i for i in range(received)]
+    }
+
+
+class TestHeatmap(unittest.TestCase):
+    """Test /api/heatmap against the raw results it summarizes."""
+
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.client = self.app.test_client()
+
+        # Results every 5 minutes: weekday evenings from 20:00 UTC are slow,
+        # Saturday nights lose packets, and 8.8.8.8 is always at 30 ms
+        rng = np.random.default_rng(3)
+        self.results = []
+        for step in range(WEEKS * 7 * 24 * 12):
+            timestamp = START + timedelta(minutes=5 * step)
+            evening = timestamp.weekday() < 5 and timestamp.hour == 20
+            loss = 10.0 if timestamp.weekday() == 5 and timestamp.hour == 3 else 0.0
+            self.results.append(ping(timestamp, loss=loss, latency=(50.0 if evening else 20.0) + rng.normal(0, 1)))
+            self.results.append(ping(timestamp, target='8.8.8.8', latency=30.0))
+        write_batch(db.session.connection(), self.results)
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def heatmap(self, query=''):
+        end = (START + timedelta(weeks=WEEKS)).isoformat()
+        response = self.client.get(f'/api/heatmap?start={START.isoformat()}&end={end}&target=1.1.1.1{query}')
+        self.assertEqual(response.status_code, 200)
+        return response.get_json()
+
+    def test_matches_raw_results(self):
+        """Every cell averages the raw results of its weekday and hour"""
+        heatmap = self.heatmap()
+        self.assertEqual(heatmap['days'][0], 'Mon')
+        self.assertEqual((len(heatmap['avg_latency']), len(heatmap['avg_latency'][0])), (7, 24))
+        for day in range(7):
+            for hour in range(24):
+                cell = [r for r in self.results if r['target'] == '1.1.1.1'
+                        and r['timestamp'].weekday() == day and r['timestamp'].hour == hour]
+                self.assertEqual(heatmap['results'][day][hour], len(cell))
+                self.assertAlmostEqual(heatmap['avg_latency'][day][hour],
+                                       np.mean([r['avg_latency'] for r in cell]))
+                self.assertAlmostEqual(heatmap['packet_loss'][day][hour], np.mean([r['packet_loss'] for r in cell]))
+
+        self.assertGreater(heatmap['p95_latency'][2][20], 50)
+        self.assertLess(heatmap['p95_latency'][2][19], 25)
+        self.assertLess(heatmap['p95_latency'][5][20], 25)
+        self.assertEqual(heatmap['packet_loss'][5][3], 10.0)
+
+    def test_quarter_hours_and_time_zone(self):
+        """96 slots per day come from the 15 minute tier; grids follow the requested zone"""
+        heatmap = self.heatmap('&resolution=96')
+        self.assertEqual(len(heatmap['avg_latency'][0]), 96)
+        self.assertGreater(min(heatmap['avg_latency'][0][80:84]), 45)
+        self.assertLess(heatmap['avg_latency'][0][79], 25)
+
+        # 20:00 UTC is 15:00 in New York in January
+        local = self.heatmap('&tz=America/New_York')
+        self.assertGreater(local['avg_latency'][0][15], 45)
+        self.assertLess(local['avg_latency'][0][20], 25)
+
+    def test_empty_and_invalid(self):
+        """Empty ranges give empty cells; bad resolutions and zones are rejected"""
+        response = self.client.get('/api/heatmap?start=2020-01-01T00:00:00&end=2020-02-01T00:00:00')
+        self.assertEqual(response.status_code, 200)
+        heatmap = response.get_json()
+        self.assertEqual(heatmap['avg_latency'][0][0], None)
+        self.assertEqual(heatmap['results'][6][23], 0)
+
+        for query in ('resolution=48', 'tz=Mars/Olympus', 'start=yesterday'):
+            response = self.client.get(f'/api/heatmap?{query}')
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.get_json()['status'], 'error')
+
+
+if __name__ == '__main__':
+    unittest.main()
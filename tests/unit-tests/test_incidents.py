@@ -0,0 +1,151 @@
+import unittest
+import os
+import sys
+from datetime import datetime, timedelta
+
+# Add the main project directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from backend.app import create_app
+from backend.config import config
+from backend.incidents import classify, list_incidents, rebuild_incidents
+from backend.ingest import write_result
+from backend.models import db
+
+START = datetime(2024, 3, 4)
+OUTAGE_AT = START + timedelta(hours=25, minutes=3)
+
+
+def ping(timestamp, target, loss=0.0, latency=20.0):
+    """A ping_test()-style result with the given loss and average latency."""
+    received = round(100 * (1 - loss / 100))
+    return {
+        'timestamp': timestamp, 'target': target, 'packet_loss': loss,
+        'min_latency': latency * 0.9 if received else 0, 'max_latency': latency * 1.2 if received else 0,
+        'avg_latency': latency if received else 0, 'jitter': 1.0 if received else 0,
+        'packets_sent': 100, 'packets_received': received
+    }
+
+
+class TestClassify(unittest.TestCase):
+    """Test classifying a single result."""
+
+    def test_thresholds(self):
+        """Outages, loss and latency spikes are told apart by the configured thresholds"""
+        settings = config['default']
+        self.assertEqual(classify(ping(START, 'a'), 20.0, settings), {})
+        self.assertEqual(classify(ping(START, 'a', loss=100), 20.0, settings), {'outage': ('critical', 100)})
+        self.assertEqual(classify(ping(START, 'a', loss=6), 20.0, settings), {'loss': ('minor', 6)})
+        self.assertEqual(classify(ping(START, 'a', loss=30), 20.0, settings), {'loss': ('major', 30)})
+        self.assertEqual(classify(ping(START, 'a', latency=45), 20.0, settings), {'latency': ('minor', 45)})
+        self.assertEqual(classify(ping(START, 'a', latency=85), 20.0, settings), {'latency': ('major', 85)})
+        # Twice a tiny baseline is still not a spike, and no baseline means no spikes
+        self.assertEqual(classify(ping(START, 'a', latency=3), 1.0, settings), {})
+        self.assertEqual(classify(ping(START, 'a', latency=500), None, settings), {})
+
+
+class TestIncidents(unittest.TestCase):
+    """Test incremental incident detection and /api/incidents."""
+
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.client = self.app.test_client()
+
+        # A day of clean history at ~20 ms gives both targets a baseline
+        results = []
+        for minute in range(0, 25 * 60, 20):
+            for target in ('1.1.1.1', '8.8.8.8'):
+                results.append(ping(START + timedelta(minutes=minute), target))
+
+        def at(minutes, target, **values):
+            results.append(ping(OUTAGE_AT + timedelta(minutes=minutes), target, **values))
+
+        # Both targets go down, recovering one after the other
+        at(0, '1.1.1.1', loss=100)
+        at(1, '8.8.8.8', loss=100)
+        at(2, '1.1.1.1')
+        at(3, '8.8.8.8')
+        # A loss burst that comes back within the merge window is one incident
+        at(5, '1.1.1.1', loss=10)
+        at(6, '1.1.1.1', loss=40)
+        at(7, '1.1.1.1')
+        at(9, '1.1.1.1', loss=8)
+        at(10, '1.1.1.1')
+        # A latency spike on one target
+        at(20, '8.8.8.8', latency=90)
+        at(21, '8.8.8.8')
+        # An outage that is still going on
+        at(40, '8.8.8.8', loss=100)
+
+        connection = db.session.connection()
+        for result in results:
+            write_result(connection, result)
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def incidents(self, query=''):
+        end = (OUTAGE_AT + timedelta(hours=1)).isoformat()
+        response = self.client.get(f'/api/incidents?start={START.isoformat()}&end={end}{query}')
+        self.assertEqual(response.status_code, 200)
+        return response.get_json()['incidents']
+
+    def test_incidents_open_extend_and_close(self):
+        """Each problem becomes one incident with its span, severity and targets"""
+        listed = self.incidents()
+        self.assertEqual([incident['kind'] for incident in listed], ['outage', 'latency', 'loss', 'outage'])
+        ongoing, latency, loss, outage = listed
+
+        self.assertEqual(outage['targets'], ['1.1.1.1', '8.8.8.8'])
+        self.assertEqual(outage['started_at'], OUTAGE_AT.isoformat())
+        self.assertEqual(outage['ended_at'], (OUTAGE_AT + timedelta(minutes=3)).isoformat())
+        self.assertEqual((outage['severity'], outage['result_count'], outage['ongoing']), ('critical', 2, False))
+
+        self.assertEqual(loss['targets'], ['1.1.1.1'])
+        self.assertEqual((loss['severity'], loss['peak'], loss['result_count']), ('major', 40.0, 3))
+        self.assertEqual(loss['ended_at'], (OUTAGE_AT + timedelta(minutes=10)).isoformat())
+
+        self.assertEqual((latency['severity'], latency['peak'], latency['targets']), ('major', 90.0, ['8.8.8.8']))
+        self.assertAlmostEqual(latency['baseline'], 20.0)
+        self.assertEqual(latency['duration_seconds'], 60.0)
+
+        self.assertTrue(ongoing['ongoing'])
+        self.assertIsNone(ongoing['ended_at'])
+        self.assertEqual(ongoing['active_targets'], ['8.8.8.8'])
+
+    def test_filters(self):
+        """kind, target and the range select incidents; unknown kinds are rejected"""
+        self.assertEqual(len(self.incidents('&kind=outage')), 2)
+        self.assertEqual([incident['kind'] for incident in self.incidents('&kind=loss&kind=latency')],
+                         ['latency', 'loss'])
+        self.assertEqual([incident['kind'] for incident in self.incidents('&target=1.1.1.1')], ['loss', 'outage'])
+        # Ongoing incidents overlap any later range
+        response = self.client.get(f'/api/incidents?start={(OUTAGE_AT + timedelta(days=3)).isoformat()}'
+                                   f'&end={(OUTAGE_AT + timedelta(days=4)).isoformat()}')
+        self.assertEqual([incident['ongoing'] for incident in response.get_json()['incidents']], [True])
+
+        response = self.client.get('/api/incidents?kind=flood')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.get_json()['status'], 'error')
+
+    def test_rebuild_matches_incremental(self):
+        """Replaying stored results finds the same incidents"""
+        connection = db.session.connection()
+        end = OUTAGE_AT + timedelta(hours=1)
+
+        def without_ids(listed):
+            return [{key: value for key, value in incident.items() if key != 'id'} for incident in listed]
+
+        before = without_ids(list_incidents(connection, START, end, end))
+        self.assertEqual(rebuild_incidents(connection, START, end), 4)
+        self.assertEqual(without_ids(list_incidents(connection, START, end, end)), before)
+
+
+if __name__ == '__main__':
+    unittest.main()
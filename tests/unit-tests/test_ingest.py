@@ -0,0 +1,83 @@
+import unittest
+import os
+import sys
+import subprocess
+import tempfile
+from datetime import datetime
+from unittest.mock import patch
+
+# Add the main project directory to the Python path
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(PROJECT_ROOT)
+
+from sqlalchemy import select
+
+from backend.ingest import get_engine, save_result, run_probe
+from backend.models import PingResult, PingRollup
+from backend.schema import metadata, ping_results, ping_rollups
+
+# Simulated ping binary used instead of the system ping
+FAKEPING_DIR = os.path.join(PROJECT_ROOT, 'tests', 'utility', 'fakeping')
+
+
+class TestIngest(unittest.TestCase):
+    """Test the Flask-free ingest path used by the probe worker."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.engine = get_engine(f"sqlite:///{os.path.join(self.tmpdir.name, 'ingest.db')}")
+        metadata.create_all(self.engine)
+
+    def tearDown(self):
+        metadata.drop_all(self.engine)
+        self.engine.dispose()
+        self.tmpdir.cleanup()
+
+    def test_models_share_table_definitions(self):
+        """ORM models map the same Table objects the ingest path writes"""
+        self.assertIs(PingResult.__table__, ping_results)
+        self.assertIs(PingRollup.__table__, ping_rollups)
+
+    def test_save_result_writes_row_and_rollups(self):
+        """A saved result lands in ping_results and every rollup tier"""
+        result = {
+            'timestamp': datetime(2024, 3, 5, 12, 7), 'target': '1.1.1.1', 'packet_loss': 2.5,
+            'min_latency': 10.0, 'max_latency': 20.0, 'avg_latency': 15.0, 'jitter': 1.0,
+            'packets_sent': 400, 'packets_received': 390, 'rtt_samples': [15.0]
+        }
+        with patch('sys.stdout'):
+            self.assertTrue(save_result(self.engine, result))
+
+        with self.engine.connect() as connection:
+            rows = connection.execute(select(ping_results)).all()
+            tiers = connection.execute(select(ping_rollups.c.tier).order_by(ping_rollups.c.tier)).scalars().all()
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0].packets_received, 390)
+        self.assertEqual(tiers, [900, 3600, 86400])
+
+    def test_run_probe_with_simulated_ping(self):
+        """run_probe pings, parses and stores one result"""
+        env = {'PATH': FAKEPING_DIR + os.pathsep + os.environ.get('PATH', ''),
+               'FAKE_PING_RTT': 'constant:12', 'FAKE_PING_SEED': '1'}
+        with patch.dict(os.environ, env), patch('sys.stdout'):
+            result = run_probe(self.engine, target='192.0.2.1', count=20, interval='0.01')
+
+        self.assertEqual(result['avg_latency'], 12.0)
+        with self.engine.connect() as connection:
+            stored = connection.execute(select(ping_results)).one()
+        self.assertEqual(stored.target, '192.0.2.1')
+        self.assertEqual(stored.packets_received, 20)
+        self.assertEqual((stored.loss_max_run, stored.reordered_packets), (0, 0))
+        self.assertEqual(stored.loss_burst_histogram, [0, 0, 0, 0, 0, 0])
+
+    def test_worker_does_not_import_flask(self):
+        """The probe worker's entry point stays off the web stack"""
+        code = ("import sys, backend.run_test; "
+                "print(sorted(m for m in ('flask', 'flask_sqlalchemy', 'sqlalchemy.orm') if m in sys.modules))")
+        output = subprocess.run([sys.executable, '-c', code], cwd=PROJECT_ROOT,
+                                capture_output=True, text=True, check=True).stdout
+        self.assertEqual(output.strip(), '[]')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import unittest
+import os
+import sys
+import io
+import json
+import shutil
+import tempfile
+
+# Add the main project directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from backend.app import create_app
+from backend.models import db, PingResult
+from backend import instrumentation
+
+
+class TestInstrumentation(unittest.TestCase):
+    """Test timing spans, Server-Timing headers and the request profiler."""
+
+    def setUp(self):
+        self.profile_dir = tempfile.mkdtemp()
+        self.app = create_app('testing')
+        self.app.config['PROFILE_DIR'] = self.profile_dir
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        db.session.add(PingResult(
+            target="1.1.1.1", packet_loss=0.0, min_latency=10.0, max_latency=20.0,
+            avg_latency=15.0, jitter=1.0, packets_sent=100, packets_received=100
+        ))
+        db.session.commit()
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+        shutil.rmtree(self.profile_dir)
+        instrumentation.logger.handlers = []
+        instrumentation.logger.setLevel('WARNING')
+
+    def test_server_timing_header(self):
+        """API responses break down query, SQL, serialization and total time"""
+        response = self.client.get('/api/ping-results')
+        header = response.headers['Server-Timing']
+        names = [entry.split(';')[0] for entry in header.split(', ')]
+        for name in ('query', 'sql', 'serialize', 'total'):
+            self.assertIn(name, names)
+
+    def test_server_timing_aggregates_repeated_spans(self):
+        """Repeated spans are summed into a single header entry"""
+        header = instrumentation.server_timing_header([('sql', 1.0), ('sql', 2.5), ('query', 4.0)], 10.0)
+        self.assertEqual(header, 'sql;dur=3.50;desc="2 statements", query;dur=4.00, total;dur=10.00')
+
+    def test_structured_span_logs(self):
+        """Enabled timing logs are one JSON object per span"""
+        stream = io.StringIO()
+        instrumentation.enable_timing_log(stream)
+        with instrumentation.span('ping.read', target='1.1.1.1'):
+            pass
+        record = json.loads(stream.getvalue().splitlines()[-1])
+        self.assertEqual(record['span'], 'ping.read')
+        self.assertEqual(record['target'], '1.1.1.1')
+        self.assertGreaterEqual(record['duration_ms'], 0)
+
+    def test_profiler_is_opt_in(self):
+        """Profiles are only written when PROFILE_REQUESTS is enabled"""
+        self.client.get('/api/ping-stats?profile=1')
+        self.assertEqual(os.listdir(self.profile_dir), [])
+
+        self.app.config['PROFILE_REQUESTS'] = True
+        self.client.get('/api/ping-stats?profile=1')
+        files = os.listdir(self.profile_dir)
+        self.assertEqual(len(files), 1)
+        self.assertIn('api_ping-stats', files[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,208 @@
+import unittest
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from multiprocessing.connection import wait
+
+# Add the main project directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from sqlalchemy import create_engine
+
+from backend.leases import (
+    HEARTBEATS_PER_INTERVAL, LEASE_INTERVALS, AdvisoryLockElection, ElectedProbe, Election, LeaseElection,
+    make_election
+)
+from backend.schema import metadata
+
+TARGET = '192.0.2.1'
+NOW = datetime(2024, 3, 4, 12)
+
+
+def probe_worker(uri, owner, method, interval, reports):
+    """Worker process: probe on the elected schedule, reporting each claimed slot.
+
+    Each worker reports through its own pipe. Workers sharing a Queue would
+    share its write lock, which a worker killed mid-write never releases.
+    """
+    from apscheduler.schedulers.background import BackgroundScheduler
+
+    engine = create_engine(uri)
+    election = make_election(engine, TARGET, interval, method=method, owner=owner)
+    scheduler = BackgroundScheduler()
+    elected = ElectedProbe(election, interval, lambda: None)
+    run_due = elected.run_due
+
+    def report_run_due(now=None):
+        slot = run_due(now)
+        if slot is not None:
+            reports.send((owner, slot, time.time()))
+        return slot
+
+    elected.run_due = report_run_due
+    elected.add_jobs(scheduler)
+    scheduler.start()
+    while True:
+        time.sleep(1)
+
+
+class TestLeaseElection(unittest.TestCase):
+    """Test lease-based leadership and slot claims."""
+
+    def setUp(self):
+        self.engine = create_engine('sqlite://')
+        metadata.create_all(self.engine)
+        self.first = LeaseElection(self.engine, TARGET, 'first', lease_seconds=30)
+        self.second = LeaseElection(self.engine, TARGET, 'second', lease_seconds=30)
+
+    def test_one_leader_claims_each_slot_once(self):
+        """Only the leader claims a slot, and only once"""
+        self.assertTrue(self.first.heartbeat(NOW))
+        self.assertFalse(self.second.heartbeat(NOW))
+        self.assertTrue(self.first.claim(100, NOW))
+        self.assertFalse(self.first.claim(100, NOW))
+        self.assertFalse(self.second.claim(101, NOW))
+        # Renewing keeps the lease past its first expiry
+        self.assertTrue(self.first.heartbeat(NOW + timedelta(seconds=20)))
+        self.assertFalse(self.second.heartbeat(NOW + timedelta(seconds=40)))
+
+    def test_standby_takes_over_expired_lease(self):
+        """A standby takes an expired lease and the old leader can no longer claim"""
+        self.first.heartbeat(NOW)
+        self.first.claim(100, NOW)
+        later = NOW + timedelta(seconds=31)
+        self.assertTrue(self.second.heartbeat(later))
+        self.assertFalse(self.first.claim(101, later))
+        self.assertTrue(self.second.claim(101, later))
+        self.assertFalse(self.first.heartbeat(later))
+
+    def test_release_hands_over_immediately(self):
+        """A released lease is free for the next heartbeat"""
+        self.first.heartbeat(NOW)
+        self.first.release()
+        self.assertTrue(self.second.heartbeat(NOW + timedelta(seconds=1)))
+
+    def test_elected_probe(self):
+        """Only the leader probes, once per slot"""
+        probes = []
+        leader = ElectedProbe(self.first, 60, lambda: probes.append('first'))
+        standby = ElectedProbe(self.second, 60, lambda: probes.append('second'))
+        leader.heartbeat()
+        standby.heartbeat()
+        now = time.time()
+        self.assertEqual(leader.run_due(now), int(now // 60))
+        self.assertIsNone(leader.run_due(now + 1))
+        self.assertIsNone(standby.run_due(now + 60))
+        self.assertEqual(probes, ['first'])
+
+    def test_scheduled_jobs(self):
+        """Slot checks may overlap a running probe instead of being skipped with a warning"""
+        from apscheduler.schedulers.background import BackgroundScheduler
+
+        with self.assertRaises(TypeError):
+            Election(self.engine, TARGET)
+        scheduler = BackgroundScheduler()
+        ElectedProbe(self.first, 60, lambda: None).add_jobs(scheduler)
+        probe = scheduler.get_job('probe')
+        self.assertEqual(probe.max_instances, HEARTBEATS_PER_INTERVAL + 1)
+        self.assertTrue(probe.coalesce)
+        self.assertEqual(probe.misfire_grace_time, 60 // HEARTBEATS_PER_INTERVAL)
+
+    def test_make_election(self):
+        """auto picks leases on SQLite; off disables election"""
+        election = make_election(self.engine, TARGET, 60)
+        self.assertIsInstance(election, LeaseElection)
+        self.assertEqual(election.lease, timedelta(seconds=60 * LEASE_INTERVALS))
+        self.assertIsInstance(make_election(self.engine, TARGET, 60, method='advisory'), AdvisoryLockElection)
+        self.assertIsNone(make_election(self.engine, TARGET, 60, method='off'))
+        with self.assertRaises(ValueError):
+            make_election(self.engine, TARGET, 60, method='raft')
+
+
+class TestFailover(unittest.TestCase):
+    """Run competing worker processes against one database and kill the leader."""
+
+    INTERVAL = 1.0
+
+    def run_workers(self, uri, method, workers=3, before=3.5, after=3.5):
+        context = multiprocessing.get_context('fork')
+        processes = {}
+        readers = {}
+        for number in range(workers):
+            owner = f'worker-{number}'
+            reader, writer = context.Pipe(duplex=False)
+            processes[owner] = context.Process(target=probe_worker, args=(uri, owner, method, self.INTERVAL, writer))
+            processes[owner].start()
+            writer.close()
+            readers[reader] = owner
+
+        probes = []
+
+        def collect(until, stop_after=None):
+            while readers and time.time() < until and len(probes) != stop_after:
+                for reader in wait(list(readers), timeout=0.05):
+                    try:
+                        probes.append(reader.recv())
+                    except EOFError:
+                        del readers[reader]
+
+        try:
+            collect(time.time() + before)
+            # Kill the leader right after it reports a probe, far from the
+            # next slot, so it cannot die between claiming and reporting one
+            collect(time.time() + 2 * self.INTERVAL, stop_after=len(probes) + 1)
+            self.assertTrue(probes, 'No worker probed before the failover')
+            leader = probes[-1][0]
+            processes[leader].kill()
+            killed_at = time.time()
+            collect(killed_at + after)
+        finally:
+            for process in processes.values():
+                process.kill()
+                process.join()
+            for reader in readers:
+                reader.close()
+        return probes, leader, killed_at
+
+    def check_failover(self, uri, method):
+        probes, leader, killed_at = self.run_workers(uri, method)
+        # Count the slots the workers claimed: a probe reported just after
+        # a slot boundary still belongs to the slot it was claimed for
+        slots = [slot for _, slot, _ in probes]
+        duplicates = len(slots) - len(set(slots))
+        missed = (max(slots) - min(slots) + 1) - len(set(slots))
+        successors = [(owner, at) for owner, _, at in probes if at > killed_at]
+
+        self.assertEqual(duplicates, 0)
+        self.assertEqual(missed, 0)
+        self.assertTrue(successors, 'No standby took over from the killed leader')
+        self.assertNotIn(leader, {owner for owner, _ in successors})
+        # The next slot is probed by a standby within one interval (plus a
+        # tick of scheduling slack)
+        failover = successors[0][1] - killed_at
+        self.assertLess(failover, self.INTERVAL * (1 + 2 / HEARTBEATS_PER_INTERVAL))
+
+    def test_lease_failover(self):
+        """Workers sharing a SQLite database probe every slot exactly once across a failover"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            uri = f"sqlite:///{os.path.join(tmpdir, 'leases.db')}"
+            engine = create_engine(uri)
+            metadata.create_all(engine)
+            engine.dispose()
+            self.check_failover(uri, 'lease')
+
+    @unittest.skipUnless(os.environ.get('TEST_POSTGRES_URI'), 'set TEST_POSTGRES_URI to test advisory locks')
+    def test_advisory_failover(self):
+        """The same holds with PostgreSQL advisory locks"""
+        uri = os.environ['TEST_POSTGRES_URI']
+        engine = create_engine(uri)
+        metadata.create_all(engine)
+        engine.dispose()
+        self.check_failover(uri, 'advisory')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+import unittest
+import os
+import sys
+import urllib.request
+from datetime import datetime
+
+from sqlalchemy import event
+
+# Add the main project directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from backend.app import create_app
+from backend.models import db
+from backend import metrics
+
+
+class TestMetricsRegistry(unittest.TestCase):
+    """Test metric types and Prometheus text rendering."""
+
+    def setUp(self):
+        metrics.REGISTRY.clear()
+
+    def test_histogram_rendering(self):
+        """Histograms render cumulative buckets, sum and count"""
+        registry = metrics.Registry()
+        histogram = registry.histogram('test_seconds', 'Test histogram', ['path'], buckets=(1, 5))
+        histogram.observe_many([0.5, 2, 7], path='/a')
+
+        text = registry.render()
+        self.assertIn('# TYPE test_seconds histogram', text)
+        self.assertIn('test_seconds_bucket{path="/a",le="1.0"} 1', text)
+        self.assertIn('test_seconds_bucket{path="/a",le="5.0"} 2', text)
+        self.assertIn('test_seconds_bucket{path="/a",le="+Inf"} 3', text)
+        self.assertIn('test_seconds_sum{path="/a"} 9.5', text)
+        self.assertIn('test_seconds_count{path="/a"} 3', text)
+
+    def test_label_escaping_and_validation(self):
+        """Label values are escaped and label names are enforced"""
+        registry = metrics.Registry()
+        gauge = registry.gauge('test_gauge', 'Test gauge', ['target'])
+        gauge.set(1, target='a"b')
+        self.assertIn('test_gauge{target="a\\"b"} 1', registry.render())
+        with self.assertRaises(ValueError):
+            gauge.set(1, host='x')
+
+    def test_record_result(self):
+        """Ingested results update per-target gauges, RTT histogram and counts"""
+        metrics.record_result({
+            'timestamp': datetime(2024, 1, 1),
+            'target': '1.1.1.1',
+            'packet_loss': 2.5,
+            'min_latency': 9.0,
+            'avg_latency': 12.0,
+            'max_latency': 30.0,
+            'jitter': 1.5,
+            'rtt_samples': [9.0, 12.0, 30.0]
+        })
+        self.assertEqual(metrics.TARGET_PACKET_LOSS.value(target='1.1.1.1'), 2.5)
+        self.assertEqual(metrics.TARGET_LATENCY.value(target='1.1.1.1', stat='max'), 30.0)
+        self.assertEqual(metrics.TARGET_LAST_RESULT.value(target='1.1.1.1'), 1704067200.0)
+        self.assertEqual(metrics.TARGET_RTT.count(target='1.1.1.1'), 3)
+        self.assertEqual(metrics.RESULTS_WRITTEN.value(target='1.1.1.1'), 1)
+
+    def test_standalone_metrics_server(self):
+        """The worker listener serves the registry over HTTP"""
+        metrics.RESULTS_WRITTEN.inc(target='8.8.8.8')
+        server = metrics.start_metrics_server(0, host='127.0.0.1')
+        try:
+            url = f'http://127.0.0.1:{server.server_port}/metrics'
+            with urllib.request.urlopen(url, timeout=5) as response:
+                body = response.read().decode()
+            self.assertIn('nes_results_written_total{target="8.8.8.8"} 1', body)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+class TestMetricsEndpoint(unittest.TestCase):
+    """Test the web service /metrics route."""
+
+    def setUp(self):
+        metrics.REGISTRY.clear()
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_metrics_endpoint_does_not_query_database(self):
+        """Rendering /metrics runs no SQL and includes API latency"""
+        self.client.get('/api/ping-results?hours=1')
+
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        event.listen(db.engine, 'before_cursor_execute', listener)
+        try:
+            response = self.client.get('/metrics')
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', listener)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(statements, [])
+        self.assertTrue(response.content_type.startswith('text/plain'))
+        body = response.get_data(as_text=True)
+        self.assertIn('nes_api_request_seconds_count{endpoint="/api/ping-results",method="GET",status="200"} 1', body)
+        self.assertIn('nes_api_rows_returned_total{endpoint="/api/ping-results"} 0', body)
+
+
+if __name__ == '__main__':
+    unittest.main()
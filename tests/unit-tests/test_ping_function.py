@@ -1,16 +1,31 @@
 import unittest
 import sys
 import os
+import subprocess
+import time
 from unittest.mock import patch, MagicMock
 from datetime import datetime
 
 # Add the main project directory to the Python path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
-from backend.pingTest import ping_test
+from backend.pingTest import SequenceTracker, _probe_ping, ping_test
+
+# Simulated ping binary used instead of the system ping
+FAKEPING_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'utility', 'fakeping')
 
 
 class TestPingFunction(unittest.TestCase):
+    def setUp(self):
+        # The mocked output below has no timestamps, as without -D
+        patcher = patch('backend.pingTest.timestamps_supported', return_value=False)
+        self.timestamps_supported = patcher.start()
+        self.addCleanup(patcher.stop)
+        # ... and numbers packets from 1, like iputils
+        patcher = patch('backend.pingTest.first_sequence', return_value=1)
+        self.first_sequence = patcher.start()
+        self.addCleanup(patcher.stop)
+
     @patch('backend.pingTest.subprocess.Popen')
     def test_successful_ping(self, mock_popen):
         # Setup mock
@@ -95,6 +110,139 @@ class TestPingFunction(unittest.TestCase):
         self.assertEqual(result["avg_latency"], 0)
         self.assertEqual(result["jitter"], 0)
         
+    @patch('backend.pingTest.subprocess.Popen')
+    def test_duplicate_replies_ignored(self, mock_popen):
+        # Duplicate replies must not count as extra received packets
+        mock_process = MagicMock()
+        mock_popen.return_value = mock_process
+        mock_process.stdout.readline.side_effect = [
+            "PING 1.1.1.1 (1.1.1.1) 56(84) bytes of data.",
+            "64 bytes from 1.1.1.1: icmp_seq=1 ttl=55 time=12.3 ms",
+            "64 bytes from 1.1.1.1: icmp_seq=1 ttl=55 time=12.4 ms (DUP!)",
+            "64 bytes from 1.1.1.1: icmp_seq=2 ttl=55 time=14.5 ms",
+            ""
+        ]
+        
+        result = ping_test(target="1.1.1.1", count=2, interval="0.1")
+        
+        self.assertEqual(result["packets_received"], 2)
+        self.assertEqual(result["packet_loss"], 0.0)
+        self.assertEqual(result["rtt_samples"], [12.3, 14.5])
+        mock_process.wait.assert_called_once()
+        
+    @patch('backend.pingTest.subprocess.Popen')
+    def test_sequence_metrics(self, mock_popen):
+        # Late, duplicate and missing sequence numbers are tracked per test
+        mock_process = MagicMock()
+        mock_popen.return_value = mock_process
+        mock_process.stdout.readline.side_effect = [
+            "PING 1.1.1.1 (1.1.1.1) 56(84) bytes of data.",
+            "64 bytes from 1.1.1.1: icmp_seq=1 ttl=55 time=12.3 ms",
+            "64 bytes from 1.1.1.1: icmp_seq=3 ttl=55 time=12.1 ms",
+            "64 bytes from 1.1.1.1: icmp_seq=2 ttl=55 time=19.0 ms",
+            "64 bytes from 1.1.1.1: icmp_seq=2 ttl=55 time=19.1 ms (DUP!)",
+            "64 bytes from 1.1.1.1: icmp_seq=3 ttl=55 time=12.2 ms",
+            "64 bytes from 1.1.1.1: icmp_seq=7 ttl=55 time=12.5 ms",
+            ""
+        ]
+        
+        result = ping_test(target="1.1.1.1", count=8, interval="0.1")
+        
+        self.assertEqual(result["packets_received"], 4)
+        self.assertEqual(result["reordered_packets"], 1)
+        self.assertEqual(result["duplicate_packets"], 2)
+        self.assertEqual((result["loss_max_run"], result["loss_bursts"]), (3, 2))
+        self.assertEqual(result["loss_burst_histogram"], [1, 1, 0, 0, 0, 0])
+
+    @patch('backend.pingTest.subprocess.Popen')
+    def test_output_without_timestamps(self, mock_popen):
+        # BusyBox and BSD ping print no timestamps; replies get their arrival time
+        mock_process = MagicMock()
+        mock_popen.return_value = mock_process
+        mock_process.stdout.readline.side_effect = [
+            "PING 1.1.1.1 (1.1.1.1): 56 data bytes",
+            "64 bytes from 1.1.1.1: seq=1 ttl=55 time=12.3 ms",
+            "64 bytes from 1.1.1.1: seq=2 ttl=55 time=14.5 ms",
+            ""
+        ]
+        
+        before = time.time()
+        result = ping_test(target="1.1.1.1", count=2, interval="0.1")
+        
+        self.assertNotIn("-D", mock_popen.call_args[0][0])
+        self.assertEqual(result["rtt_samples"], [12.3, 14.5])
+        self.assertEqual(len(result["rtt_times"]), 2)
+        self.assertTrue(all(before <= stamp <= time.time() for stamp in result["rtt_times"]))
+        
+        # With timestamp support the reply's own timestamp is used
+        self.timestamps_supported.return_value = True
+        mock_process.stdout.readline.side_effect = [
+            "[1700000000.250000] 64 bytes from 1.1.1.1: icmp_seq=1 ttl=55 time=12.3 ms", ""
+        ]
+        result = ping_test(target="1.1.1.1", count=1, interval="0.1")
+        self.assertIn("-D", mock_popen.call_args[0][0])
+        self.assertEqual(result["rtt_times"], [1700000000.25])
+
+    def test_timestamp_detection(self):
+        # -D is only used where a loopback probe shows it prints timestamps,
+        # and the same probe tells where sequence numbers start
+        _probe_ping.cache_clear()
+        self.addCleanup(_probe_ping.cache_clear)
+        rejected = subprocess.CompletedProcess([], 1, stdout="", stderr="ping: unrecognized option '-D'")
+        busybox = subprocess.CompletedProcess([], 0, stdout="64 bytes from 127.0.0.1: seq=0 ttl=64 time=0.05 ms\n")
+        iputils = subprocess.CompletedProcess([], 0, stdout="[1700000000.1] 64 bytes from 127.0.0.1: "
+                                                              "icmp_seq=1 ttl=64 time=0.05 ms\n")
+        with patch('backend.pingTest.subprocess.run', side_effect=[rejected, busybox]):
+            self.assertEqual(_probe_ping('/bin/busybox-ping'), (False, 0))
+        with patch('backend.pingTest.subprocess.run', return_value=iputils) as run:
+            self.assertEqual(_probe_ping('/bin/iputils-ping'), (True, 1))
+            self.assertEqual(_probe_ping('/bin/iputils-ping'), (True, 1))
+            run.assert_called_once()
+        with patch('backend.pingTest.subprocess.run', side_effect=FileNotFoundError):
+            self.assertEqual(_probe_ping(None), (False, None))
+
+    def test_loss_runs(self):
+        # Spread-out drops and one outage of the same size are told apart
+        spread, outage = SequenceTracker(400), SequenceTracker(400)
+        for seq in range(1, 401):
+            if seq % 10:
+                spread.reply(seq)
+            if not 200 <= seq < 240:
+                outage.reply(seq)
+        self.assertEqual(spread.loss_runs(), (1, 40, [40, 0, 0, 0, 0, 0]))
+        self.assertEqual(outage.loss_runs(), (40, 1, [0, 0, 0, 0, 0, 1]))
+        # Packets lost at the end, and a test with no replies at all
+        tail = SequenceTracker(10)
+        for seq in range(1, 6):
+            tail.reply(seq)
+        self.assertEqual(tail.loss_runs(), (5, 1, [0, 0, 1, 0, 0, 0]))
+        self.assertEqual(SequenceTracker(10).loss_runs(), (10, 1, [0, 0, 0, 1, 0, 0]))
+
+    @patch('backend.pingTest.subprocess.Popen')
+    def test_lost_first_packet_numbered_from_zero(self, mock_popen):
+        # BSD and BusyBox number packets from 0; losing packet 0 is a loss at
+        # the start, not one after the last packet
+        self.first_sequence.return_value = 0
+        mock_process = MagicMock()
+        mock_popen.return_value = mock_process
+        mock_process.stdout.readline.side_effect = [
+            "PING 1.1.1.1 (1.1.1.1): 56 data bytes",
+            "64 bytes from 1.1.1.1: icmp_seq=1 ttl=55 time=12.3 ms",
+            "64 bytes from 1.1.1.1: icmp_seq=2 ttl=55 time=12.1 ms",
+            ""
+        ]
+        
+        result = ping_test(target="1.1.1.1", count=4, interval="0.1")
+        
+        # Packets 0 and 3 were lost: two single losses, not one run of two
+        self.assertEqual(result["packets_received"], 2)
+        self.assertEqual((result["loss_max_run"], result["loss_bursts"]), (1, 2))
+        
+        tracker = SequenceTracker(4, first=0)
+        for seq in (0, 1, 2, 3):
+            tracker.reply(seq)
+        self.assertEqual(tracker.loss_runs(), (0, 0, [0, 0, 0, 0, 0, 0]))
+
     @patch('backend.pingTest.subprocess.Popen', side_effect=KeyboardInterrupt)
     def test_keyboard_interrupt(self, mock_popen):
         # Test what happens when the user interrupts the test
@@ -104,5 +252,49 @@ class TestPingFunction(unittest.TestCase):
         self.assertEqual(result, {})
 
 
+class TestPingWithSimulatedBinary(unittest.TestCase):
+    """Run ping_test() against the simulated ping in tests/utility/fakeping."""
+
+    def run_fake(self, count=200, **settings):
+        env = {'PATH': FAKEPING_DIR + os.pathsep + os.environ.get('PATH', ''), 'FAKE_PING_SEED': '7'}
+        env.update({f'FAKE_PING_{name.upper()}': value for name, value in settings.items()})
+        with patch.dict(os.environ, env), patch('sys.stdout'):
+            return ping_test(target="192.0.2.1", count=count, interval="0.01")
+
+    def test_simulator_on_path(self):
+        """The simulator resolves as ping when its directory leads PATH"""
+        env = dict(os.environ, PATH=FAKEPING_DIR + os.pathsep + os.environ.get('PATH', ''))
+        output = subprocess.run(["ping", "-c", "1", "192.0.2.1"], env=env,
+                                capture_output=True, text=True).stdout
+        self.assertIn("1 packets transmitted, 1 received", output)
+
+    def test_rtt_distribution(self):
+        """Latency statistics follow the configured distribution"""
+        result = self.run_fake(rtt='uniform:20:30')
+        self.assertEqual(result["packets_received"], 200)
+        self.assertGreaterEqual(result["min_latency"], 20)
+        self.assertLessEqual(result["max_latency"], 30)
+        self.assertAlmostEqual(result["avg_latency"], 25, delta=1.5)
+
+    def test_loss_duplicates_and_late_replies(self):
+        """Lost and late replies count as loss; duplicates are not double counted"""
+        result = self.run_fake(rtt='constant:10', loss='0.1', dup='0.3', delay='0.1:5000')
+        self.assertLess(result["packets_received"], 200)
+        self.assertGreater(result["packet_loss"], 5)
+        self.assertLess(result["packet_loss"], 35)
+        self.assertEqual(len(result["rtt_samples"]), result["packets_received"])
+        self.assertGreater(result["duplicate_packets"], 0)
+
+    def test_bursts_and_reordering(self):
+        """Loss bursts and overtaken replies show up in the sequence metrics"""
+        result = self.run_fake(count=400, rtt='constant:10', burst='0.01:20', reorder='0.05')
+        self.assertGreaterEqual(result["loss_max_run"], 20)
+        self.assertEqual(result["loss_max_run"] % 20, 0)
+        self.assertEqual(sum(result["loss_burst_histogram"]), result["loss_bursts"])
+        self.assertEqual(result["loss_burst_histogram"][:4], [0, 0, 0, 0])
+        self.assertGreater(result["reordered_packets"], 0)
+        self.assertEqual(result["duplicate_packets"], 0)
+
+
 if __name__ == '__main__':
     unittest.main()
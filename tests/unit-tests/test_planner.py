@@ -0,0 +1,173 @@
+import unittest
+import os
+import sys
+from datetime import datetime, timedelta
+
+# Add the main project directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from backend.app import create_app
+from backend.models import db, PingResult, PingRollup
+from backend.planner import plan_range, parse_timestamp, Segment
+from backend.rollups import update_rollups, rebuild_rollups, bucket_start
+
+
+def make_result(timestamp, loss=0.0, latency=15.0, target="1.1.1.1"):
+    """Build a ping_test()-style result dictionary."""
+    return {
+        'timestamp': timestamp,
+        'target': target,
+        'packet_loss': loss,
+        'min_latency': latency - 5,
+        'max_latency': latency + 5,
+        'avg_latency': latency,
+        'jitter': 1.0,
+        'packets_sent': 100,
+        'packets_received': 100 - int(loss)
+    }
+
+
+class TestQueryPlanner(unittest.TestCase):
+    """Test range planning over raw results and rollup tiers."""
+
+    def test_parse_timestamp_normalizes_to_utc(self):
+        """Offsets and Z suffixes are converted to naive UTC"""
+        self.assertEqual(parse_timestamp('2024-03-05T02:00:00Z'), datetime(2024, 3, 5, 2, 0))
+        self.assertEqual(parse_timestamp('2024-03-05T04:00:00+02:00'), datetime(2024, 3, 5, 2, 0))
+        self.assertEqual(parse_timestamp('2024-03-05T02:00:00'), datetime(2024, 3, 5, 2, 0))
+        with self.assertRaises(ValueError):
+            parse_timestamp('last tuesday')
+
+    def test_short_range_uses_raw(self):
+        """A two hour zoom at high resolution reads raw results only"""
+        start = datetime(2024, 3, 5, 2, 0)
+        plan = plan_range(start, start + timedelta(hours=2), points=500)
+        self.assertEqual(plan, [Segment('raw', None, start, start + timedelta(hours=2))])
+
+    def test_wide_range_uses_coarse_tier_with_fine_edges(self):
+        """A month at 20 points uses daily buckets, finer tiers at the edges"""
+        start = datetime(2024, 1, 1, 7, 20)
+        end = datetime(2024, 2, 1, 13, 5)
+        plan = plan_range(start, end, points=20)
+
+        # Segments are contiguous and cover the whole range
+        self.assertEqual(plan[0].start, start)
+        self.assertEqual(plan[-1].end, end)
+        for previous, current in zip(plan, plan[1:]):
+            self.assertEqual(previous.end, current.start)
+
+        # The middle is answered by the daily tier
+        self.assertIn(Segment('rollup', 86400, datetime(2024, 1, 2), datetime(2024, 2, 1)), plan)
+        # Raw results are only read for the unaligned minutes at each end
+        raw = [segment for segment in plan if segment.source == 'raw']
+        for segment in raw:
+            self.assertLessEqual(segment.end - segment.start, timedelta(minutes=15))
+
+    def test_plan_never_coarser_than_requested(self):
+        """Tiers wider than one output point are never used"""
+        start = datetime(2024, 1, 1)
+        plan = plan_range(start, start + timedelta(days=2), points=100)
+        tiers = {segment.tier for segment in plan if segment.source == 'rollup'}
+        self.assertEqual(tiers, {900})
+
+
+class TestRollupsAndSeries(unittest.TestCase):
+    """Test incremental rollups and the /api/series endpoint."""
+
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def insert(self, result):
+        db.session.add(PingResult(**result))
+        update_rollups(db.session.connection(), result)
+
+    def test_incremental_rollups_match_rebuild(self):
+        """Rollups built at ingest equal rollups rebuilt from raw results"""
+        start = datetime(2024, 3, 5)
+        for minute in range(0, 180, 7):
+            self.insert(make_result(start + timedelta(minutes=minute), loss=minute % 3, latency=10 + minute % 5))
+        db.session.commit()
+
+        def snapshot():
+            return sorted(
+                (r.tier, r.bucket_start, r.result_count, r.packets_received, r.packet_loss_sum,
+                 r.max_packet_loss, r.latency_sum, r.min_latency, r.max_latency)
+                for r in PingRollup.query.all()
+            )
+
+        incremental = snapshot()
+        rebuild_rollups(db.session.connection(), start, start + timedelta(hours=3))
+        db.session.commit()
+        self.assertEqual(incremental, snapshot())
+
+        hourly = PingRollup.query.filter_by(tier=3600, bucket_start=start).one()
+        self.assertEqual(hourly.result_count, 9)
+        self.assertEqual(bucket_start(datetime(2024, 3, 5, 13, 47), 900), datetime(2024, 3, 5, 13, 45))
+
+    def test_series_endpoint_answers_from_rollups(self):
+        """Old, wide ranges are served from rollups with correct weighting"""
+        start = datetime(2024, 3, 1)
+        for hour in range(48):
+            for minute in (0, 30):
+                self.insert(make_result(start + timedelta(hours=hour, minutes=minute), latency=10.0 + hour % 2))
+        db.session.commit()
+
+        response = self.client.get('/api/series?start=2024-03-01T00:00:00Z&end=2024-03-03T00:00:00Z&points=48')
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()
+
+        self.assertEqual([segment['source'] for segment in data['plan']], ['rollup'])
+        self.assertEqual(data['plan'][0]['tier'], 3600)
+        self.assertEqual(len(data['series']['timestamps']), 48)
+        self.assertEqual(sum(data['series']['counts']), 96)
+        self.assertAlmostEqual(data['series']['avg_latency'][0], 10.0)
+        self.assertAlmostEqual(data['series']['avg_latency'][1], 11.0)
+
+    def test_rollup_means_skip_lost_results(self):
+        """Merged rollup buckets average latency over the results that have one"""
+        start = datetime(2024, 3, 1)
+        for minute in (0, 30):
+            self.insert(make_result(start + timedelta(minutes=minute), latency=10.0))
+        self.insert(make_result(start + timedelta(hours=1), latency=20.0))
+        for minute in range(1, 10):
+            self.insert(dict(make_result(start + timedelta(hours=1, minutes=minute), loss=100.0),
+                             min_latency=None, max_latency=None, avg_latency=None, jitter=None))
+        db.session.commit()
+
+        response = self.client.get('/api/series?start=2024-03-01T00:00:00Z&end=2024-03-03T00:00:00Z&points=24')
+        data = response.get_json()
+        self.assertEqual(data['plan'][0]['tier'], 3600)
+        self.assertEqual(data['series']['counts'], [12])
+        # Weighted by the 3 results with a latency, not by all 12 results
+        self.assertAlmostEqual(data['series']['avg_latency'][0], 40.0 / 3)
+        self.assertAlmostEqual(data['series']['jitter'][0], 1.0)
+        self.assertAlmostEqual(data['series']['packet_loss'][0], 900.0 / 12)
+
+    def test_range_parameters_on_ping_results(self):
+        """ping-results honours start/end and rejects invalid ranges"""
+        start = datetime(2024, 3, 5)
+        for hour in range(6):
+            self.insert(make_result(start + timedelta(hours=hour)))
+        db.session.commit()
+
+        response = self.client.get('/api/ping-results?start=2024-03-05T02:00:00&end=2024-03-05T04:00:00')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.get_json()), 3)
+
+        response = self.client.get('/api/ping-results?start=2024-03-05T04:00:00&end=2024-03-05T02:00:00')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get('/api/series?start=yesterday')
+        self.assertEqual(response.status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,198 @@
+import unittest
+import json
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+# Add the main project directory to the Python path
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(PROJECT_ROOT)
+
+import numpy as np
+from sqlalchemy import insert, select, update
+
+from backend.codec import encode_samples
+from backend.ingest import get_engine, run_probe
+from backend.recompute import plan_chunks, recompute, result_statistics, write_chunk
+from backend.rollups import backfill_rollups, rebuild_rollups
+from backend.schema import incidents, metadata, ping_results, ping_rollups
+from backend.sketch import LatencySketch
+
+# Simulated ping binary used instead of the system ping
+FAKEPING_DIR = os.path.join(PROJECT_ROOT, 'tests', 'utility', 'fakeping')
+
+START = datetime(2024, 3, 4)
+
+
+class TestResultStatistics(unittest.TestCase):
+    """Test the vectorized per-result statistics."""
+
+    def test_matches_ping_test(self):
+        """Statistics recomputed from samples match what the probe stored"""
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        engine = get_engine(f"sqlite:///{os.path.join(tmpdir.name, 'probe.db')}")
+        self.addCleanup(engine.dispose)
+        metadata.create_all(engine)
+
+        env = {'PATH': FAKEPING_DIR + os.pathsep + os.environ.get('PATH', ''),
+               'FAKE_PING_RTT': 'normal:20:4', 'FAKE_PING_LOSS': '0.2', 'FAKE_PING_SEED': '8'}
+        with patch.dict(os.environ, env), patch('sys.stdout'):
+            for _ in range(2):
+                run_probe(engine, target='192.0.2.1', count=30, interval='0.2')
+
+        with engine.connect() as connection:
+            rows = connection.execute(select(ping_results)).mappings().all()
+        stats = result_statistics([row['samples'] for row in rows], [row['packets_sent'] for row in rows])
+        for index, row in enumerate(rows):
+            for name in ('packets_received', 'packet_loss', 'min_latency', 'max_latency', 'avg_latency', 'jitter'):
+                self.assertAlmostEqual(stats[name][index], row[name], places=6, msg=name)
+            self.assertEqual(stats['latency_sketch'][index], row['latency_sketch'])
+
+    def test_tests_without_replies(self):
+        """Tests with zero or one reply get zero latency and jitter"""
+        blobs = [encode_samples([], []), encode_samples([1.7e9], [12.5]),
+                 encode_samples([1.7e9, 1.7e9 + 0.1, 1.7e9 + 0.2], [10.0, 14.0, 11.0])]
+        stats = result_statistics(blobs, [4, 4, 4])
+        self.assertEqual(stats['packets_received'], [0, 1, 3])
+        self.assertEqual(stats['packet_loss'], [100.0, 75.0, 25.0])
+        self.assertEqual(stats['avg_latency'][:2], [0.0, 12.5])
+        self.assertEqual(stats['jitter'], [0.0, 0.0, 3.5])
+        self.assertIsNone(stats['latency_sketch'][0])
+
+    def test_chunks_align_to_days(self):
+        """Chunks cover whole days of the requested range"""
+        chunks = plan_chunks(START + timedelta(hours=5), START + timedelta(days=2, hours=1))
+        self.assertEqual(chunks, [(START, START + timedelta(days=1)),
+                                  (START + timedelta(days=1), START + timedelta(days=2)),
+                                  (START + timedelta(days=2), START + timedelta(days=3))])
+
+
+class TestRecompute(unittest.TestCase):
+    """Test recomputing stored history in parallel chunks."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.uri = f"sqlite:///{os.path.join(self.tmpdir.name, 'history.db')}"
+        self.checkpoint = os.path.join(self.tmpdir.name, 'checkpoint.json')
+        self.engine = get_engine(self.uri)
+        metadata.create_all(self.engine)
+
+        # Three days of tests every 20 minutes with stored samples
+        rng = np.random.default_rng(4)
+        self.rows = []
+        for index in range(3 * 72):
+            timestamp = START + timedelta(minutes=20 * index, seconds=7)
+            rtts = np.round(rng.normal(25, 3, 40), 1)
+            times = (timestamp - datetime(1970, 1, 1)).total_seconds() + np.arange(40) * 0.1 + rtts / 1e3
+            self.rows.append({
+                'timestamp': timestamp, 'target': '1.1.1.1', 'packets_sent': 50, 'packets_received': 40,
+                'packet_loss': 20.0, 'min_latency': float(rtts.min()), 'max_latency': float(rtts.max()),
+                'avg_latency': float(rtts.mean()), 'jitter': float(np.abs(np.diff(rtts)).mean()),
+                'samples': encode_samples(times, rtts), 'latency_sketch': LatencySketch.from_values(rtts).to_bytes()
+            })
+        with self.engine.begin() as connection:
+            connection.execute(insert(ping_results), self.rows)
+            rebuild_rollups(connection, START, START + timedelta(days=3))
+        self.expected = self.snapshot()
+
+        # Corrupt the derived data: stale jitter, a missing sketch, stale rollups
+        with self.engine.begin() as connection:
+            connection.execute(update(ping_results).values(jitter=99.0))
+            connection.execute(update(ping_results).where(ping_results.c.id == 5).values(latency_sketch=None))
+            connection.execute(update(ping_rollups).values(max_latency=0.0))
+
+    def tearDown(self):
+        metadata.drop_all(self.engine)
+        self.engine.dispose()
+        self.tmpdir.cleanup()
+
+    def snapshot(self):
+        with self.engine.connect() as connection:
+            results = connection.execute(select(ping_results).order_by(ping_results.c.id)).all()
+            rollups = connection.execute(
+                select(ping_rollups).order_by(ping_rollups.c.tier, ping_rollups.c.bucket_start)
+            ).all()
+        return results, rollups
+
+    def assert_restored(self):
+        results, rollups = self.snapshot()
+        self.assertEqual(len(results), len(self.expected[0]))
+        for row, expected in zip(results, self.expected[0]):
+            self.assertAlmostEqual(row.jitter, expected.jitter, places=9)
+            self.assertEqual(row.latency_sketch, expected.latency_sketch)
+        self.assertEqual(len(rollups), len(self.expected[1]))
+        for row, expected in zip(rollups, self.expected[1]):
+            for value, wanted in zip(row[1:], expected[1:]):
+                if isinstance(wanted, float):
+                    self.assertAlmostEqual(value, wanted, places=9)
+                else:
+                    self.assertEqual(value, wanted)
+
+    def test_backfill_rollups(self):
+        """History older than the first rollups is rolled up newest first, once"""
+        with self.engine.begin() as connection:
+            connection.execute(ping_rollups.delete().where(ping_rollups.c.bucket_start < START + timedelta(days=2)))
+        messages = []
+        self.assertEqual(backfill_rollups(self.engine, chunk_days=2, log=messages.append), len(self.rows))
+        self.assertEqual(messages[0], 'Building rollups for results from 2024-03-04 to 2024-03-07')
+        self.assertIn('back to 2024-03-05', messages[1])
+        self.assertEqual(backfill_rollups(self.engine, log=messages.append), 0)
+
+        with self.engine.begin() as connection:
+            connection.execute(ping_rollups.delete())
+        self.assertEqual(backfill_rollups(self.engine, log=messages.append), len(self.rows))
+        rollups = self.snapshot()[1]
+        self.assertEqual(sum(row.result_count for row in rollups if row.tier == 86400), len(self.rows))
+        self.assertTrue(all(row.max_latency > 0 for row in rollups))
+
+    def test_parallel_recompute(self):
+        """Worker processes recompute results and rollups, and report throughput"""
+        totals = recompute(self.uri, START, START + timedelta(days=3), workers=2,
+                           checkpoint=self.checkpoint, log=lambda message: None)
+        self.assertEqual((totals['chunks'], totals['rows'], totals['updated']), (3, 216, 216))
+        self.assertGreater(totals['rows_per_sec'], 0)
+        self.assertFalse(os.path.exists(self.checkpoint))
+        self.assert_restored()
+
+    def test_resume_skips_finished_chunks(self):
+        """An interrupted run continues from its checkpoint"""
+        calls = []
+
+        def interrupt(engine, output):
+            if calls:
+                raise KeyboardInterrupt
+            calls.append(output['start'])
+            write_chunk(engine, output)
+
+        end = START + timedelta(days=3)
+        with patch('backend.recompute.write_chunk', side_effect=interrupt):
+            with self.assertRaises(KeyboardInterrupt):
+                recompute(self.uri, START, end, workers=1, checkpoint=self.checkpoint, log=lambda message: None)
+        with open(self.checkpoint) as handle:
+            self.assertEqual(json.load(handle)['done'], [START.isoformat()])
+
+        # Starting over without --resume would redo finished work
+        with self.assertRaises(SystemExit):
+            recompute(self.uri, START, end, workers=1, checkpoint=self.checkpoint, log=lambda message: None)
+
+        totals = recompute(self.uri, START, end, workers=1, checkpoint=self.checkpoint,
+                           resume=True, log=lambda message: None)
+        self.assertEqual(totals['chunks'], 2)
+        self.assert_restored()
+
+    def test_incidents_step(self):
+        """The incidents step replays the range without recomputing chunks"""
+        totals = recompute(self.uri, START, START + timedelta(days=3), steps=['incidents'], workers=1,
+                           checkpoint=None, log=lambda message: None)
+        # Every seeded test lost 20% of its packets: one ongoing loss incident
+        self.assertEqual((totals['chunks'], totals['incidents']), (0, 1))
+        with self.engine.connect() as connection:
+            self.assertEqual(connection.execute(select(incidents.c.kind, incidents.c.ended_at)).all(),
+                             [('loss', None)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+import unittest
+import os
+import shutil
+import sys
+import tempfile
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+# Add the main project directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from sqlalchemy import select
+
+from backend.agent import encode_batch, to_wire
+from backend.app import create_app
+from backend.config import TestingConfig
+from backend.ingest import write_batch
+from backend.metrics import REPLICA_READS
+from backend.models import db
+from backend.schema import metadata, ping_results
+
+TOKEN = 'secret-token'
+
+
+def ping(target, minutes_ago=5):
+    """A recent result for a target."""
+    return {
+        'timestamp': datetime.utcnow().replace(microsecond=0) - timedelta(minutes=minutes_ago), 'target': target,
+        'packet_loss': 0.0, 'min_latency': 19.0, 'max_latency': 21.0, 'avg_latency': 20.0, 'jitter': 1.0,
+        'packets_sent': 10, 'packets_received': 10
+    }
+
+
+class ReplicaTestCase(unittest.TestCase):
+    """A primary and a replica in two SQLite files holding different results.
+
+    Each database holds one target, so responses show which engine a
+    request read from.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.primary_uri = f"sqlite:///{os.path.join(self.directory, 'primary.db')}"
+        with patch.multiple(TestingConfig, SQLALCHEMY_DATABASE_URI=self.primary_uri,
+                            READ_REPLICA_URI=self.replica_uri(), INGEST_TOKEN=TOKEN):
+            self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all(bind_key=None)
+        self.client = self.app.test_client()
+
+        with db.engine.begin() as connection:
+            write_batch(connection, [ping('1.1.1.1')])
+
+    def replica_uri(self):
+        return f"sqlite:///{os.path.join(self.directory, 'replica.db')}"
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all(bind_key=None)
+        for engine in db.engines.values():
+            engine.dispose()
+        self.app_context.pop()
+        # The extension is shared by every test's app; without this later
+        # apps' create_all() would look for the replica bind too
+        db.metadatas.pop('replica', None)
+        shutil.rmtree(self.directory)
+
+    def read_targets(self):
+        response = self.client.get('/api/ping-results?hours=1')
+        self.assertEqual(response.status_code, 200)
+        orm = self.client.get('/api/targets').get_json()
+        return {row['target'] for row in response.get_json()}, {target['address'] for target in orm}
+
+    def stored_targets(self, engine):
+        with engine.connect() as connection:
+            return set(connection.execute(select(ping_results.c.target)).scalars())
+
+
+class TestReadReplica(ReplicaTestCase):
+    """Test reads going to the replica and writes to the primary."""
+
+    def setUp(self):
+        super().setUp()
+        metadata.create_all(db.engines['replica'])
+        with db.engines['replica'].begin() as connection:
+            write_batch(connection, [ping('8.8.8.8')])
+
+    def test_reads_use_replica(self):
+        """Core and ORM queries of GET /api/ requests read from the replica"""
+        before = REPLICA_READS.value(source='replica')
+        self.assertEqual(self.read_targets(), ({'8.8.8.8'}, {'8.8.8.8'}))
+        self.assertEqual(REPLICA_READS.value(source='replica'), before + 2)
+
+    def test_writes_use_primary(self):
+        """Ingested batches are written to the primary only"""
+        body = encode_batch('site-a', 'batch-1', [to_wire(ping('9.9.9.9', minutes_ago=1))])
+        response = self.client.post('/api/ingest', data=body, content_type='application/json', headers={
+            'Authorization': f'Bearer {TOKEN}', 'Content-Encoding': 'gzip'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.stored_targets(db.engines[None]), {'1.1.1.1', '9.9.9.9'})
+        self.assertEqual(self.stored_targets(db.engines['replica']), {'8.8.8.8'})
+
+
+class TestReplicaFallback(ReplicaTestCase):
+    """Test reading from the primary while the replica is unreachable."""
+
+    def replica_uri(self):
+        # SQLite cannot create a database in a missing directory
+        return f"sqlite:///{os.path.join(self.directory, 'missing', 'replica.db')}"
+
+    def test_falls_back_to_primary(self):
+        """Reads are served by the primary, and the replica is not retried until the delay passes"""
+        before = REPLICA_READS.value(source='primary')
+        with patch('sys.stdout'), patch.object(db.engines['replica'], 'connect',
+                                               wraps=db.engines['replica'].connect) as connect:
+            self.assertEqual(self.read_targets(), ({'1.1.1.1'}, {'1.1.1.1'}))
+            self.assertEqual(connect.call_count, 1)
+        self.assertEqual(REPLICA_READS.value(source='primary'), before + 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+import unittest
+import os
+import sys
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+# Add the main project directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from backend.app import create_app
+from backend.ingest import write_batch
+from backend.models import db
+from backend.reports import materialize_days, pending_days, period_range
+from backend.schema import daily_reports
+
+START = datetime(2024, 3, 4)
+DAYS = [START, START + timedelta(days=1)]
+
+
+def ping(minutes, target='1.1.1.1', loss=0.0, latency=20.0):
+    """A result `minutes` after START, with RTT samples around the given latency."""
+    received = round(100 * (1 - loss / 100))
+    rtts = [latency * (0.9 + 0.002 * i) for i in range(received)]
+    return {
+        'timestamp': START + timedelta(minutes=minutes), 'target': target, 'packet_loss': loss,
+        'min_latency': min(rtts, default=0), 'max_latency': max(rtts, default=0),
+        'avg_latency': latency if received else 0, 'jitter': 1.0 if received else 0,
+        'packets_sent': 100, 'packets_received': received, 'rtt_samples': rtts,
+        'rtt_times': [0.1 * i for i in range(received)]
+    }
+
+
+class TestReports(unittest.TestCase):
+    """Test materializing daily reports and /api/reports."""
+
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.client = self.app.test_client()
+
+        # Two days of one-minute results. On the first day 1.1.1.1 is down
+        # from 10:00 for ten minutes, loses packets from 14:00 for five and
+        # is not monitored from 20:00 to 21:00; 8.8.8.8 only starts on day two
+        results = []
+        for minute in range(2 * 24 * 60):
+            if 20 * 60 <= minute < 21 * 60:
+                continue
+            loss = 100.0 if 600 <= minute < 610 else 10.0 if 840 <= minute < 845 else 0.0
+            results.append(ping(minute, loss=loss))
+            if minute >= 24 * 60:
+                results.append(ping(minute, target='8.8.8.8', latency=30.0))
+        write_batch(db.session.connection(), results)
+        db.session.commit()
+        with patch('sys.stdout'):
+            self.assertEqual(materialize_days(db.engine, DAYS), 3)
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def report(self, query):
+        response = self.client.get(f'/api/reports?{query}')
+        self.assertEqual(response.status_code, 200)
+        return {target['target']: target for target in response.get_json()['targets']}
+
+    def test_daily_rows(self):
+        """Down and degraded time, gaps and the worst hour are materialized per day"""
+        row = db.session.execute(daily_reports.select().where(daily_reports.c.target == '1.1.1.1',
+                                                              daily_reports.c.day == START)).mappings().one()
+        # The result before the gap covers at most twice TEST_INTERVAL
+        self.assertEqual(row['monitored_seconds'], (24 * 60 - 61) * 60 + 120)
+        self.assertEqual((row['down_seconds'], row['degraded_seconds']), (600, 300))
+        self.assertEqual(row['worst_hour'], START + timedelta(hours=10))
+        self.assertAlmostEqual(row['worst_hour_loss'], 1000 / 60)
+        self.assertAlmostEqual(row['p50_latency'], 20.0, delta=0.5)
+
+    def test_month_report(self):
+        """Month reports sum the daily rows and break them down by day"""
+        targets = self.report('period=month&month=2024-03')
+        self.assertEqual(set(targets), {'1.1.1.1', '8.8.8.8'})
+        first = targets['1.1.1.1']
+        monitored = (24 * 60 - 61) * 60 + 120 + 24 * 60 * 60
+        self.assertEqual((first['days'], first['down_minutes'], first['degraded_minutes']), (2, 10.0, 5.0))
+        self.assertAlmostEqual(first['availability'], 100 * (1 - 600 / monitored))
+        self.assertEqual(first['worst_hour']['start'], (START + timedelta(hours=10)).isoformat())
+        self.assertEqual(first['worst_day']['day'], '2024-03-04')
+        self.assertEqual([day['period'] for day in first['breakdown']], ['2024-03-04', '2024-03-05'])
+        self.assertEqual(first['breakdown'][1]['availability'], 100.0)
+
+        second = targets['8.8.8.8']
+        self.assertEqual((second['days'], second['availability'], second['worst_day']), (1, 100.0, None))
+        self.assertAlmostEqual(second['p50_latency'], 30.0, delta=0.5)
+
+        self.assertEqual(set(self.report('month=2024-03&target=8.8.8.8')), {'8.8.8.8'})
+        self.assertEqual(self.report('month=2024-04'), {})
+
+    def test_year_report(self):
+        """Year reports break down by month"""
+        first = self.report('period=year&year=2024')['1.1.1.1']
+        self.assertEqual([month['period'] for month in first['breakdown']], ['2024-03'])
+        self.assertEqual(first['breakdown'][0]['down_minutes'], 10.0)
+
+    def test_invalid_parameters(self):
+        """Unknown periods and malformed months or years are rejected"""
+        for query in ('period=week', 'month=2024-13', 'month=March', 'period=year&year=24x'):
+            response = self.client.get(f'/api/reports?{query}')
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.get_json()['status'], 'error')
+        self.assertEqual(period_range('month', '2024-12'), (datetime(2024, 12, 1), datetime(2025, 1, 1)))
+
+    def test_rerun_and_pending(self):
+        """Rerunning a day replaces its rows; the nightly run refreshes recent days and fills gaps"""
+        write_batch(db.session.connection(), [ping(24 * 60 + 5, target='9.9.9.9', loss=100.0)])
+        db.session.commit()
+        with patch('sys.stdout'):
+            self.assertEqual(materialize_days(db.engine, DAYS), 4)
+        # A lone result covers up to twice TEST_INTERVAL
+        self.assertEqual(self.report('month=2024-03&target=9.9.9.9')['9.9.9.9']['down_minutes'], 2.0)
+
+        connection = db.session.connection()
+        self.assertEqual(pending_days(connection, START + timedelta(days=2)), DAYS)
+        self.assertEqual(pending_days(connection, START + timedelta(days=5), refresh_days=1),
+                         [START + timedelta(days=n) for n in (2, 3, 4)])
+        db.session.execute(daily_reports.delete())
+        self.assertEqual(pending_days(db.session.connection(), START + timedelta(days=2), refresh_days=0), DAYS)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,138 @@
+import unittest
+import os
+import sys
+from datetime import datetime, timedelta
+
+# Add the main project directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import numpy as np
+
+from backend.app import create_app
+from backend.models import db, PingResult, PingRollup
+from backend.planner import plan_cover
+from backend.rollups import rebuild_rollups, update_rollups
+from backend.sketch import LatencySketch, merge_sketches, percentiles
+
+
+class TestLatencySketch(unittest.TestCase):
+    """Test the DDSketch used for latency percentiles."""
+
+    def setUp(self):
+        self.values = np.random.default_rng(11).lognormal(np.log(20), 0.6, 50000)
+
+    def test_quantiles_within_relative_accuracy(self):
+        """Reported quantiles are within 1% of the exact ones"""
+        sketch = LatencySketch.from_values(self.values)
+        for q in (0.0, 0.5, 0.9, 0.95, 0.99, 1.0):
+            exact = np.quantile(self.values, q, method='lower')
+            self.assertLessEqual(abs(sketch.quantile(q) - exact) / exact, 0.01 + 1e-9)
+
+    def test_merge_is_exact(self):
+        """Merging part sketches equals sketching all values at once"""
+        whole = LatencySketch.from_values(self.values)
+        merged = merge_sketches(LatencySketch.from_values(part).to_bytes()
+                                for part in np.array_split(self.values, 300))
+        self.assertEqual(merged.count, whole.count)
+        self.assertEqual(merged.offset, whole.offset)
+        np.testing.assert_array_equal(merged.counts, whole.counts)
+
+    def test_subtract_undoes_merge(self):
+        """Subtracting a merged part leaves the sketch of the remaining values"""
+        first, second = np.array_split(self.values, 2)
+        sliding = LatencySketch.from_values(first).merge(LatencySketch.from_values(second))
+        sliding.subtract(LatencySketch.from_values(first))
+        remaining = LatencySketch.from_values(second)
+        self.assertEqual(sliding.count, remaining.count)
+        for q in (0.5, 0.95, 0.99):
+            self.assertEqual(sliding.quantile(q), remaining.quantile(q))
+
+    def test_serialization_round_trip(self):
+        """Sketches survive to_bytes/from_bytes, including zero and low values"""
+        sketch = LatencySketch.from_values([0.0, 0.0005, 0.02, 0.5, 15.3, 16.1, 950.0])
+        loaded = LatencySketch.from_bytes(sketch.to_bytes())
+        self.assertEqual((loaded.zero_count, loaded.offset), (2, sketch.offset))
+        np.testing.assert_array_equal(loaded.counts, sketch.counts)
+        self.assertEqual(loaded.quantile(0.1), 0.0)
+        # One test's 400 packets fit in well under a hundred bytes
+        test = LatencySketch.from_values(np.random.default_rng(1).normal(15, 1.5, 400))
+        self.assertLess(len(test.to_bytes()), 100)
+
+        for bad in (b'', b'\x07', sketch.to_bytes()[:-1]):
+            with self.assertRaises(ValueError):
+                LatencySketch.from_bytes(bad)
+
+    def test_empty_and_mismatched(self):
+        """Empty sketches report no percentiles; accuracies must match to merge"""
+        self.assertIsNone(merge_sketches([None, None]))
+        self.assertEqual(percentiles(None), {'p50': None, 'p95': None, 'p99': None, 'samples': 0})
+        with self.assertRaises(ValueError):
+            LatencySketch(0.01).merge(LatencySketch(0.02))
+
+
+class TestSketchRollups(unittest.TestCase):
+    """Test sketches in rollups and the percentiles in /api/ping-stats."""
+
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.client = self.app.test_client()
+
+        # 40 days of results every 3 hours; the last 24 hours are noticeably slower
+        rng = np.random.default_rng(5)
+        now = datetime.utcnow()
+        self.recent, self.month = [], []
+        for hour in range(1, 40 * 24, 3):
+            timestamp = now - timedelta(hours=hour, minutes=30)
+            rtts = rng.normal(40 if hour <= 23 else 20, 2, 100)
+            if hour <= 23:
+                self.recent.append(rtts)
+            if hour <= 719:
+                self.month.append(rtts)
+            result = {
+                'timestamp': timestamp, 'target': '1.1.1.1', 'packet_loss': 0.0,
+                'min_latency': rtts.min(), 'max_latency': rtts.max(), 'avg_latency': rtts.mean(),
+                'jitter': 1.0, 'packets_sent': 100, 'packets_received': 100,
+                'latency_sketch': LatencySketch.from_values(rtts).to_bytes()
+            }
+            db.session.add(PingResult(**result))
+            update_rollups(db.session.connection(), result)
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_rollup_sketches_match_raw(self):
+        """Incremental and rebuilt rollup sketches hold every packet"""
+        daily = PingRollup.query.filter_by(tier=86400).all()
+        total = sum(LatencySketch.from_bytes(rollup.latency_sketch).count for rollup in daily)
+        self.assertEqual(total, 100 * len(range(1, 40 * 24, 3)))
+
+        before = {(r.tier, r.bucket_start): r.latency_sketch for r in PingRollup.query}
+        start = datetime.utcnow() - timedelta(days=41)
+        rebuild_rollups(db.session.connection(), start, datetime.utcnow())
+        db.session.commit()
+        after = {(r.tier, r.bucket_start): r.latency_sketch for r in PingRollup.query}
+        self.assertEqual(before, after)
+
+    def test_ping_stats_percentiles(self):
+        """ping-stats reports p50/p95/p99 for 24h and 30d from a few hundred sketches"""
+        now = datetime.utcnow()
+        self.assertLess(len(plan_cover(now - timedelta(days=30), now)), 12)
+
+        stats = self.client.get('/api/ping-stats').get_json()['latency_percentiles']
+        for window, arrays in (('24h', self.recent), ('30d', self.month)):
+            values = np.concatenate(arrays)
+            self.assertEqual(stats[window]['samples'], values.size)
+            for key, q in (('p50', 0.5), ('p95', 0.95), ('p99', 0.99)):
+                exact = np.quantile(values, q, method='lower')
+                self.assertLessEqual(abs(stats[window][key] - exact) / exact, 0.0101)
+        self.assertGreater(stats['24h']['p50'], stats['30d']['p50'] * 1.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
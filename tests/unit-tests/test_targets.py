@@ -0,0 +1,136 @@
+import unittest
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+# Add the main project directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from sqlalchemy import create_engine, inspect, select, text
+
+from backend.app import create_app
+from backend.models import db, PingResult, Target
+from backend.migrate import upgrade
+from backend.rollups import update_rollups
+from backend.schema import targets
+from backend.targets import ensure_targets, register_targets
+
+
+class TestTargetMigration(unittest.TestCase):
+    """Test upgrading a pre-targets database and registering its targets."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.engine = create_engine(f"sqlite:///{os.path.join(self.tmpdir.name, 'legacy.db')}")
+        # ping_results as it existed before the targets table
+        with self.engine.begin() as connection:
+            connection.execute(text(
+                'CREATE TABLE ping_results (id INTEGER PRIMARY KEY, timestamp DATETIME NOT NULL, '
+                'target VARCHAR(50) NOT NULL, packet_loss FLOAT NOT NULL, min_latency FLOAT, '
+                'max_latency FLOAT, avg_latency FLOAT, jitter FLOAT, packets_sent INTEGER NOT NULL, '
+                'packets_received INTEGER NOT NULL)'
+            ))
+            for i in range(25):
+                connection.execute(text(
+                    "INSERT INTO ping_results (timestamp, target, packet_loss, packets_sent, packets_received) "
+                    "VALUES (:ts, :target, 0, 100, 100)"
+                ), {'ts': datetime(2024, 3, 5) + timedelta(minutes=i), 'target': ['1.1.1.1', '8.8.8.8'][i % 2]})
+
+    def tearDown(self):
+        self.engine.dispose()
+        self.tmpdir.cleanup()
+
+    def test_upgrade_registers_targets(self):
+        """Every legacy target is registered and per-target scans get their index"""
+        messages = []
+        upgrade(self.engine, batch_size=10, log=messages.append)
+
+        with self.engine.connect() as connection:
+            registered = connection.execute(select(targets.c.address).order_by(targets.c.address)).scalars().all()
+        self.assertEqual(registered, ['1.1.1.1', '8.8.8.8'])
+        self.assertIn('Registered 2 target(s)', messages)
+
+        indexes = {index['name']: index for index in inspect(self.engine).get_indexes('ping_results')}
+        self.assertEqual(indexes['ix_ping_results_target_time']['column_names'], ['target', 'timestamp'])
+        # Rows keep their width: the address is the only target column
+        self.assertNotIn('target_id', {column['name'] for column in inspect(self.engine).get_columns('ping_results')})
+
+    def test_upgrade_is_idempotent(self):
+        """Running the upgrade again changes nothing"""
+        upgrade(self.engine, log=lambda message: None)
+        messages = []
+        upgrade(self.engine, log=messages.append)
+        self.assertEqual(messages, [])
+
+
+class TestTargetFilters(unittest.TestCase):
+    """Test target= filtering on the API endpoints."""
+
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.client = self.app.test_client()
+
+        now = datetime.utcnow()
+        for minute in range(1, 31):
+            for target, latency in (('1.1.1.1', 10.0), ('8.8.8.8', 30.0)):
+                result = {
+                    'timestamp': now - timedelta(minutes=minute), 'target': target, 'packet_loss': 0.0,
+                    'min_latency': latency - 1, 'max_latency': latency + 1, 'avg_latency': latency,
+                    'jitter': 1.0, 'packets_sent': 100, 'packets_received': 100
+                }
+                db.session.add(PingResult(**result))
+                update_rollups(db.session.connection(), result)
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_orm_inserts_register_targets(self):
+        """Adding results through the ORM registers their targets"""
+        self.assertEqual([target.address for target in Target.query.order_by(Target.address)],
+                         ['1.1.1.1', '8.8.8.8'])
+
+        response = self.client.get('/api/targets')
+        self.assertEqual([target['address'] for target in response.get_json()], ['1.1.1.1', '8.8.8.8'])
+
+    def test_concurrent_registration(self):
+        """Registering an address another writer already added keeps its row instead of failing"""
+        connection = db.session.connection()
+        existing = Target.query.filter_by(address='1.1.1.1').one().id
+        register_targets(connection, ['1.1.1.1', '9.9.9.9'])
+        ensure_targets(connection, ['8.8.8.8', '9.9.9.9'])
+        self.assertEqual(Target.query.filter_by(address='1.1.1.1').one().id, existing)
+        self.assertEqual([target.address for target in Target.query.order_by(Target.address)],
+                         ['1.1.1.1', '8.8.8.8', '9.9.9.9'])
+
+    def test_endpoints_filter_by_target(self):
+        """Every endpoint returns only the requested target's data"""
+        results = self.client.get('/api/ping-results?target=8.8.8.8').get_json()
+        self.assertEqual(len(results), 30)
+        self.assertEqual({result['target'] for result in results}, {'8.8.8.8'})
+
+        stats = self.client.get('/api/ping-stats?target=1.1.1.1').get_json()
+        self.assertEqual(stats['latest']['target'], '1.1.1.1')
+        self.assertAlmostEqual(stats['day_stats']['avg_latency'], 10.0)
+
+        series = self.client.get('/api/series?hours=1&points=10&target=8.8.8.8').get_json()['series']
+        self.assertEqual(sum(series['counts']), 30)
+
+        dashboard = self.client.get('/api/dashboard?target=8.8.8.8').get_json()
+        self.assertEqual(dashboard['latest']['target'], '8.8.8.8')
+        self.assertAlmostEqual(dashboard['day_stats']['avg_latency'], 30.0)
+
+        export = self.client.get('/api/export?format=csv&target=1.1.1.1&target=8.8.8.8').get_data(as_text=True)
+        self.assertEqual(len(export.strip().split('\n')), 61)
+
+        self.assertEqual(self.client.get('/api/ping-results?target=192.0.2.1').get_json(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()